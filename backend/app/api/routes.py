@@ -1,33 +1,105 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Header, Request, WebSocket, WebSocketDisconnect
+from fastapi.requests import HTTPConnection
 from app.models.task import TaskRequest, ProgrammingLanguage
-from app.services.ai_service import generate_code_scaffolding
-from app.services.code_executor import execute_code
-from app.services.quiz_service import generate_quiz, check_quiz_answers
-from app.services.learning_service import generate_learning_content
-from app.services.code_service import analyze_code
+from app.models.batch import BatchRequest
+from app.services.ai_service import generate_code_scaffolding, stream_code_scaffolding, scaffolding_cache
+from app.services.code_executor import execute_code, execute_interactive, get_executor_backend, execution_cache, get_execution_stats, get_interactive_stats, EXEC_INTERACTIVE_ENABLED
+from app.services.local_executor import STOP_PROGRAM
+from app.services.quiz_service import generate_quiz, stream_quiz, check_quiz_answers, get_quiz_stats
+from app.services.learning_service import generate_learning_content, stream_learning_content
+from app.services.code_service import (
+    analyze_code_speculative, stream_code_analysis_speculative, get_speculation_stats,
+    analyze_tested_code, stream_tested_code_analysis
+)
+from app.services.harness import run_task_tests, get_harness_stats, test_case_cache, HARNESS_ENABLED
+from app.services.batch_runner import run_batch, summarize_batch, get_batch_stats, BATCH_MAX_JOBS
+from app.services.scheduler import execution_scheduler, ClientKey, SchedulerRejected
+from app.services.llm_client import get_llm_client
+from app.services.catalog import get_catalog
+from app.services.question_bank import assemble_quiz_from_bank, store_quiz, get_question_bank
+from app.services.prefetch import (
+    prefetch_store, prefetch_learning_sections, prefetch_explanations, prefetch_boilerplate,
+    learning_sections_key, explanations_key, boilerplate_key
+)
+from app.services.session_store import create_session_store
+from app.api.sse import sse_response
+import hmac
+import asyncio
 import logging
 import uuid
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
+import os
 import time
 from datetime import datetime
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
-# In-memory storage for quiz questions (in a real app, use Redis or a database)
-quiz_sessions = {}
+# Token required by the admin endpoints (admin endpoints are disabled when unset)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+# Addresses of reverse proxies whose X-Forwarded-For header is trusted (comma-separated)
+TRUSTED_PROXIES = {address.strip() for address in os.getenv("TRUSTED_PROXIES", "").split(",") if address.strip()}
+# Longest client ID kept; longer ones are truncated
+CLIENT_ID_MAX_LENGTH = 128
+# Frontend origins allowed by CORS and by the interactive WebSocket (comma-separated)
+CORS_ORIGINS = [origin.strip() for origin in os.getenv("CORS_ORIGINS", "http://localhost:3000").split(",") if origin.strip()]
+# Interactive runs: stdin messages held for a program that has not read them yet (more
+# are rejected), and the largest stdin message accepted (bytes)
+INTERACTIVE_STDIN_QUEUE_SIZE = int(os.getenv("INTERACTIVE_STDIN_QUEUE_SIZE", "64"))
+INTERACTIVE_STDIN_MAX_BYTES = int(os.getenv("INTERACTIVE_STDIN_MAX_BYTES", str(64 * 1024)))
 
-# Cleanup old sessions (older than 2 hours)
-def cleanup_old_sessions():
-    current_time = time.time()
-    to_delete = []
-    for session_id, data in quiz_sessions.items():
-        if current_time - data["created_at"] > 7200:  # 2 hours
-            to_delete.append(session_id)
-    
-    for session_id in to_delete:
-        del quiz_sessions[session_id]
-        logger.info(f"Cleaned up old session: {session_id}")
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Admin endpoints are disabled")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token.encode("utf-8"), ADMIN_TOKEN.encode("utf-8")):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+def client_address(connection: HTTPConnection) -> str:
+    """
+    Network address of the client. Behind a trusted proxy this is the right-most
+    X-Forwarded-For hop that is not itself a trusted proxy.
+    """
+    address = connection.client.host if connection.client else "unknown"
+    if address not in TRUSTED_PROXIES:
+        return address
+    forwarded = connection.headers.get("x-forwarded-for", "")
+    for hop in reversed([hop.strip() for hop in forwarded.split(",") if hop.strip()]):
+        if hop not in TRUSTED_PROXIES:
+            return hop
+    return address
+
+def client_key(connection: HTTPConnection, request: dict) -> ClientKey:
+    """
+    Identity used for fair execution queuing: the client ID the frontend sends (the
+    X-Client-Id header, or "client_id" where browsers cannot set headers, such as
+    WebSockets), else the quiz session, and the client address.
+    """
+    client_id = connection.headers.get("x-client-id") or request.get("client_id") or request.get("session_id")
+    return ClientKey(client_id[:CLIENT_ID_MAX_LENGTH] if client_id else None, client_address(connection))
+
+def student_key(http_request: Request, request: dict) -> Optional[str]:
+    """
+    Student identity for the question bank's no-repeat tracking: an explicit student ID
+    or the client ID the frontend sends (None for anonymous requests).
+    """
+    student_id = request.get("student_id") or http_request.headers.get("x-client-id")
+    return str(student_id)[:CLIENT_ID_MAX_LENGTH] if student_id else None
+
+def scheduler_rejection(e: SchedulerRejected) -> HTTPException:
+    return HTTPException(status_code=e.status_code, detail=e.detail, headers={"Retry-After": str(e.retry_after)})
+
+# Quiz questions by session ID (QUIZ_SESSION_BACKEND selects a store shared by server
+# processes); expired sessions are removed by the lifespan sweeper
+quiz_sessions = create_session_store("quiz", on_remove=prefetch_store.cancel_session)
+
+def parse_language(value: str) -> ProgrammingLanguage:
+    try:
+        return ProgrammingLanguage(value)
+    except ValueError:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid programming language. Must be one of: {', '.join([lang.value for lang in ProgrammingLanguage])}"
+        )
 
 @router.post("/generate_scaffolding")
 async def generate_scaffolding(request: TaskRequest):
@@ -48,7 +120,27 @@ async def generate_scaffolding(request: TaskRequest):
         
         # If coming from learning page, force newbie level for boilerplate code
         use_boilerplate = getattr(request, 'use_boilerplate', False)
-        if use_boilerplate:
+        cached = await get_catalog().get_scaffolding(
+            request.task_description,
+            "newbie" if use_boilerplate else request.difficulty_level,
+            request.language,
+            use_boilerplate=use_boilerplate,
+            concept_keywords=concept_keywords
+        )
+        prefetched = None
+        if use_boilerplate and not cached:
+            prefetched = await prefetch_store.claim(
+                request.session_id,
+                "scaffolding",
+                boilerplate_key(request.task_description, request.language, concept_keywords)
+            )
+        if cached:
+            logger.info("Serving scaffolding from the content catalog")
+            result = cached
+        elif prefetched:
+            logger.info("Serving prefetched boilerplate scaffolding")
+            result = prefetched
+        elif use_boilerplate:
             logger.info("Generating boilerplate code")
             request.difficulty_level = "newbie"
             # Force boilerplate code generation
@@ -83,8 +175,45 @@ async def generate_scaffolding(request: TaskRequest):
         logger.error(f"Error generating scaffolding: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/generate_scaffolding/stream")
+async def generate_scaffolding_stream(request: TaskRequest):
+    if not request.task_description:
+        raise HTTPException(status_code=400, detail="Task description is required")
+    if not request.difficulty_level:
+        raise HTTPException(status_code=400, detail="Difficulty level is required")
+    
+    logger.info(f"Streaming scaffolding for task: {request.task_description}")
+    
+    # Boilerplate requests from the learning page always use the newbie level
+    difficulty_level = "newbie" if request.use_boilerplate else request.difficulty_level
+    cached = await get_catalog().get_scaffolding(
+        request.task_description,
+        difficulty_level,
+        request.language,
+        use_boilerplate=request.use_boilerplate,
+        concept_keywords=request.concept_keywords
+    )
+    if not cached and request.use_boilerplate:
+        cached = await prefetch_store.claim(
+            request.session_id,
+            "scaffolding",
+            boilerplate_key(request.task_description, request.language, request.concept_keywords)
+        )
+    if cached:
+        async def replay():
+            yield "code", {"text": cached["scaffolding"]}
+            yield "done", cached
+        return sse_response(replay())
+    return sse_response(stream_code_scaffolding(
+        request.task_description,
+        difficulty_level,
+        request.language,
+        use_boilerplate=request.use_boilerplate,
+        concept_keywords=request.concept_keywords
+    ))
+
 @router.post("/run_code")
-async def run_code(request: dict):
+async def run_code(request: dict, http_request: Request):
     try:
         if not request.get("code"):
             raise HTTPException(status_code=400, detail="Code is required")
@@ -92,26 +221,210 @@ async def run_code(request: dict):
         if not request.get("language"):
             raise HTTPException(status_code=400, detail="Programming language is required")
         
-        try:
-            language = ProgrammingLanguage(request["language"])
-        except ValueError:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Invalid programming language. Must be one of: {', '.join([lang.value for lang in ProgrammingLanguage])}"
-            )
+        language = parse_language(request["language"])
         
         logger.info(f"Running code in {language.value}")
-        output = await execute_code(request["code"], language)
+        # Programs with nondeterministic output can opt out of the result cache
+        result = await execute_code(
+            request["code"],
+            language,
+            stdin=request.get("stdin", ""),
+            args=request.get("args"),
+            use_cache=not request.get("no_cache", False),
+            client=client_key(http_request, request)
+        )
         
-        return {"output": output}
+        return {"output": result.output, "cached": result.cached, "execution": result.summary()}
     except HTTPException:
         raise
+    except SchedulerRejected as e:
+        raise scheduler_rejection(e)
     except Exception as e:
         logger.error(f"Error running code: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/run_batch")
+async def run_batch_endpoint(request: BatchRequest, http_request: Request):
+    """
+    Run many (code, language, stdin) jobs concurrently. Streams a "result" event per job
+    as it completes and a final "done" summary; with "stream": false all results are
+    returned at once, in job order.
+    """
+    if not request.jobs:
+        raise HTTPException(status_code=400, detail="At least one job is required")
+    if len(request.jobs) > BATCH_MAX_JOBS:
+        raise HTTPException(status_code=400, detail=f"A batch may contain at most {BATCH_MAX_JOBS} jobs")
+
+    client = client_key(http_request, {"session_id": request.session_id})
+    started = time.monotonic()
+
+    if not request.stream:
+        try:
+            items = [item async for item in run_batch(request.jobs, client)]
+        except Exception as e:
+            logger.error(f"Error running batch: {str(e)}")
+            raise HTTPException(status_code=500, detail=str(e))
+        items.sort(key=lambda item: item.index)
+        return {
+            "results": [item.model_dump() for item in items],
+            "summary": summarize_batch(items, (time.monotonic() - started) * 1000).model_dump()
+        }
+
+    async def events():
+        items = []
+        async for item in run_batch(request.jobs, client):
+            items.append(item)
+            yield "result", item.model_dump()
+        yield "done", summarize_batch(items, (time.monotonic() - started) * 1000).model_dump()
+
+    return sse_response(events())
+
+@router.websocket("/ws/run_code")
+async def run_code_ws(websocket: WebSocket):
+    """
+    Interactive run. The client sends {"code", "language", "args", "client_id"} first, then
+    {"type": "stdin", "data"}, {"type": "eof"} or {"type": "kill"} messages. The server
+    streams {"type": "stdout" | "stderr", "data"} chunks and ends with
+    {"type": "exit", "execution", "error"}. Malformed or oversized messages, and stdin the
+    program is too far behind to take, are answered with {"type": "error", "detail"} and
+    ignored. A run the scheduler does not admit ends with an error carrying "retry_after"
+    and close code 1013.
+
+    CORS does not cover WebSockets, so browser connections from origins outside
+    CORS_ORIGINS are refused here.
+    """
+    origin = websocket.headers.get("origin")
+    if not EXEC_INTERACTIVE_ENABLED or (origin is not None and origin not in CORS_ORIGINS):
+        # Closing before accepting refuses the handshake with 403
+        await websocket.close(code=1008)
+        return
+    await websocket.accept()
+    receiver = None
+    try:
+        try:
+            request = await websocket.receive_json()
+        except (ValueError, TypeError, KeyError):
+            request = None
+        if not isinstance(request, dict) or not request.get("code") or not request.get("language"):
+            await websocket.send_json({"type": "error", "detail": "Code and programming language are required"})
+            await websocket.close(code=1008)
+            return
+        try:
+            language = parse_language(request["language"])
+        except HTTPException as e:
+            await websocket.send_json({"type": "error", "detail": e.detail})
+            await websocket.close(code=1008)
+            return
+
+        logger.info(f"Starting interactive run in {language.value}")
+        # One slot beyond the stdin messages is kept for the end of input
+        stdin: asyncio.Queue = asyncio.Queue(maxsize=INTERACTIVE_STDIN_QUEUE_SIZE + 1)
+
+        def stop_program():
+            # Pending input no longer matters; make room for the stop even when the queue is full
+            while not stdin.empty():
+                stdin.get_nowait()
+            stdin.put_nowait(STOP_PROGRAM)
+
+        async def receive():
+            try:
+                while True:
+                    try:
+                        message = await websocket.receive_json()
+                    except (ValueError, TypeError, KeyError):
+                        # Not JSON, or a binary frame
+                        message = None
+                    if not isinstance(message, dict):
+                        await websocket.send_json({"type": "error", "detail": "Messages must be JSON objects"})
+                        continue
+                    kind = message.get("type")
+                    if kind == "stdin":
+                        data = message.get("data", "")
+                        if not isinstance(data, str):
+                            await websocket.send_json({"type": "error", "detail": "stdin data must be a string"})
+                        elif len(data.encode("utf-8")) > INTERACTIVE_STDIN_MAX_BYTES:
+                            await websocket.send_json({"type": "error", "detail": f"stdin messages are limited to {INTERACTIVE_STDIN_MAX_BYTES} bytes"})
+                        elif stdin.qsize() >= INTERACTIVE_STDIN_QUEUE_SIZE:
+                            # Not waiting for room keeps kill and disconnects noticed
+                            await websocket.send_json({"type": "error", "detail": "The program has not read its earlier input yet"})
+                        else:
+                            stdin.put_nowait(data)
+                    elif kind == "eof":
+                        if not stdin.full():
+                            stdin.put_nowait(None)
+                    elif kind == "kill":
+                        return
+            except (WebSocketDisconnect, RuntimeError):
+                # The client went away
+                pass
+            finally:
+                # Whatever ended the loop (kill, disconnect, an error, or the run finishing),
+                # the program must not outlive it
+                stop_program()
+
+        async def on_output(stream: str, text: str):
+            await websocket.send_json({"type": stream, "data": text})
+
+        receiver = asyncio.ensure_future(receive())
+        result = await execute_interactive(request["code"], language, stdin, on_output, args=request.get("args"), client=client_key(websocket, request))
+        await websocket.send_json({
+            "type": "exit",
+            "execution": result.summary(),
+            "error": result.output if result.has_errors else None
+        })
+        await websocket.close()
+    except WebSocketDisconnect:
+        logger.info("Client disconnected from interactive run")
+    except SchedulerRejected as e:
+        try:
+            await websocket.send_json({"type": "error", "detail": e.detail, "retry_after": e.retry_after})
+            # 1013: try again later
+            await websocket.close(code=1013)
+        except Exception:
+            pass
+    except Exception as e:
+        logger.error(f"Error in interactive run: {str(e)}")
+        try:
+            await websocket.send_json({"type": "error", "detail": str(e)})
+            await websocket.close(code=1011)
+        except Exception:
+            pass
+    finally:
+        if receiver is not None:
+            receiver.cancel()
+
+@router.post("/run_tests")
+async def run_tests(request: dict, http_request: Request):
+    try:
+        if not request.get("code"):
+            raise HTTPException(status_code=400, detail="Code is required")
+
+        if not request.get("language"):
+            raise HTTPException(status_code=400, detail="Programming language is required")
+
+        if not request.get("task_description"):
+            raise HTTPException(status_code=400, detail="Task description is required")
+
+        language = parse_language(request["language"])
+        if not HARNESS_ENABLED:
+            raise HTTPException(status_code=404, detail="The test harness is disabled")
+
+        logger.info(f"Running test cases in {language.value}")
+        tests = await run_task_tests(request["code"], request["task_description"], language, client_key(http_request, request))
+        if tests is None:
+            raise HTTPException(status_code=404, detail="No test cases available for this task")
+
+        return tests.summary()
+    except HTTPException:
+        raise
+    except SchedulerRejected as e:
+        raise scheduler_rejection(e)
+    except Exception as e:
+        logger.error(f"Error running test cases: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.post("/analyze_code")
-async def analyze_code_endpoint(request: dict):
+async def analyze_code_endpoint(request: dict, http_request: Request):
     try:
         if not request.get("code"):
             raise HTTPException(status_code=400, detail="Code is required")
@@ -122,82 +435,134 @@ async def analyze_code_endpoint(request: dict):
         if not request.get("task_description"):
             raise HTTPException(status_code=400, detail="Task description is required")
         
-        try:
-            language = ProgrammingLanguage(request["language"])
-        except ValueError:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Invalid programming language. Must be one of: {', '.join([lang.value for lang in ProgrammingLanguage])}"
-            )
+        language = parse_language(request["language"])
         
         logger.info(f"Analyzing code in {language.value}")
         
-        # First execute the code to determine if it's working
-        has_execution_errors = False
-        try:
-            output = await execute_code(request["code"], language)
-            # Check for common error patterns in the output
-            execution_error_patterns = [
-                "error", "exception", "traceback", "syntax error", "runtime error",
-                "indexerror", "keyerror", "attributeerror", "typeerror", "nameerror",
-                "valueerror", "syntaxerror", "indentationerror", "fail"
-            ]
-            
-            has_execution_errors = any(pattern in output.lower() for pattern in execution_error_patterns)
-            
-            logger.info(f"Code execution result - Has errors: {has_execution_errors}")
-            if has_execution_errors:
-                logger.info(f"Execution errors detected in output: {output[:200]}...")
-                
-        except Exception as e:
-            has_execution_errors = True
-            output = str(e)
-            logger.info(f"Exception during code execution: {str(e)}")
-        
-        # Get a logical code correctness analysis from the AI service
-        # We use this approach because execution success doesn't always mean the code is correct
-        # for the specific task
-        analysis_result = await analyze_code(
-            request["code"], 
-            request["task_description"], 
-            language.value, 
-            has_errors=has_execution_errors
+        # With run_tests (opt-in), correctness is decided by the task's test cases when it
+        # has any; the LLM only coaches on failures or reviews passing code on request
+        if request.get("run_tests", False):
+            tests = await run_task_tests(request["code"], request["task_description"], language, client_key(http_request, request))
+            if tests is not None:
+                logger.info(f"Test cases: {tests.passed}/{len(tests.cases)} passed ({tests.mode})")
+                analysis_result = await analyze_tested_code(
+                    request["code"],
+                    request["task_description"],
+                    language.value,
+                    tests,
+                    review=request.get("review", False)
+                )
+                return {
+                    "analysis": analysis_result,
+                    "execution": tests.execution.summary() if tests.execution else None,
+                    "tests": tests.summary()
+                }
+
+        # Without test cases, execute the code and get a logical code correctness analysis
+        # from the AI service concurrently. We use this approach because execution success doesn't always mean
+        # the code is correct for the specific task
+        analysis_result, execution = await analyze_code_speculative(
+            request["code"],
+            request["task_description"],
+            language.value,
+            execute_code(request["code"], language, client=client_key(http_request, request))
         )
+        if execution and execution.has_errors:
+            logger.info(f"Execution failed in {execution.phase} phase (exit code {execution.exit_code}, signal {execution.signal}, status {execution.status})")
         
-        return {"analysis": analysis_result}
+        return {
+            "analysis": analysis_result,
+            "execution": execution.summary() if execution else None
+        }
     except HTTPException:
         raise
+    except SchedulerRejected as e:
+        raise scheduler_rejection(e)
     except Exception as e:
         logger.error(f"Error analyzing code: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/analyze_code/stream")
+async def analyze_code_stream(request: dict, http_request: Request):
+    if not request.get("code"):
+        raise HTTPException(status_code=400, detail="Code is required")
+    if not request.get("language"):
+        raise HTTPException(status_code=400, detail="Programming language is required")
+    if not request.get("task_description"):
+        raise HTTPException(status_code=400, detail="Task description is required")
+    
+    language = parse_language(request["language"])
+    logger.info(f"Streaming code analysis in {language.value}")
+    
+    async def events():
+        analysis = []
+        tests = None
+        if request.get("run_tests", False):
+            tests = await run_task_tests(request["code"], request["task_description"], language, client_key(http_request, request))
+        if tests is not None:
+            yield "execution", tests.execution.summary() if tests.execution else {"has_errors": not tests.all_passed}
+            yield "tests", tests.summary()
+            async for text in stream_tested_code_analysis(
+                request["code"],
+                request["task_description"],
+                language.value,
+                tests,
+                review=request.get("review", False)
+            ):
+                analysis.append(text)
+                yield "analysis", {"text": text}
+            yield "done", {"analysis": "".join(analysis).strip()}
+            return
+
+        async for event, data in stream_code_analysis_speculative(
+            request["code"],
+            request["task_description"],
+            language.value,
+            execute_code(request["code"], language, client=client_key(http_request, request))
+        ):
+            if event == "execution":
+                yield "execution", data.summary() if data else {"has_errors": True}
+            else:
+                analysis.append(data)
+                yield "analysis", {"text": data}
+        yield "done", {"analysis": "".join(analysis).strip()}
+    
+    return sse_response(events())
+
 @router.post("/generate_quiz")
-async def generate_quiz_endpoint(request: dict):
+async def generate_quiz_endpoint(request: dict, http_request: Request):
     try:
         if not request.get("task_description"):
             raise HTTPException(status_code=400, detail="Task description is required")
         if not request.get("language"):
             raise HTTPException(status_code=400, detail="Language is required")
         
-        # Clean up old sessions
-        cleanup_old_sessions()
-        
         # Generate a unique session ID for this quiz
         session_id = str(uuid.uuid4())
         
-        # Generate questions
-        questions = await generate_quiz(request["task_description"], request["language"])
+        # Assemble the quiz from the question bank, without questions the student has
+        # seen; otherwise serve a catalog variant or generate one and add it to the bank
+        student_id = student_key(http_request, request)
+        questions = await assemble_quiz_from_bank(request["task_description"], request["language"], student_id, request.get("concepts"))
+        if questions is None:
+            questions = await get_catalog().get_quiz(request["task_description"], request["language"])
+            if questions is None:
+                questions = await generate_quiz(request["task_description"], request["language"])
+            await store_quiz(request["task_description"], request["language"], questions, student_id)
         
         # Store questions in memory with session ID
-        quiz_sessions[session_id] = {
+        await quiz_sessions.set(session_id, {
             "questions": questions,
             "task_description": request["task_description"],
             "language": request["language"],
             "created_at": time.time()  # Current timestamp
-        }
+        })
         
         logger.info(f"Generated quiz with session ID: {session_id}")
         
+        # The learning sections only depend on the task; start them while the quiz is taken
+        await prefetch_learning_sections(session_id, request["task_description"], request["language"])
+        
         # Return questions with session ID
         return {
             "questions": questions,
@@ -207,6 +572,56 @@ async def generate_quiz_endpoint(request: dict):
         logger.error(f"Error generating quiz: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def iterate_questions(questions):
+    if isinstance(questions, list):
+        for question in questions:
+            yield question
+    else:
+        async for question in questions:
+            yield question
+
+@router.post("/generate_quiz/stream")
+async def generate_quiz_stream(request: dict, http_request: Request):
+    if not request.get("task_description"):
+        raise HTTPException(status_code=400, detail="Task description is required")
+    if not request.get("language"):
+        raise HTTPException(status_code=400, detail="Language is required")
+    
+    # Register the session up front so answers can be checked against the questions
+    # delivered so far, even while later questions are still being generated
+    session_id = str(uuid.uuid4())
+    session = {
+        "questions": [],
+        "task_description": request["task_description"],
+        "language": request["language"],
+        "created_at": time.time()
+    }
+    await quiz_sessions.set(session_id, session)
+    logger.info(f"Streaming quiz with session ID: {session_id}")
+    await prefetch_learning_sections(session_id, request["task_description"], request["language"])
+    
+    student_id = student_key(http_request, request)
+    bank_questions = await assemble_quiz_from_bank(request["task_description"], request["language"], student_id, request.get("concepts"))
+    cached_questions = bank_questions
+    if cached_questions is None:
+        cached_questions = await get_catalog().get_quiz(request["task_description"], request["language"])
+    
+    async def events():
+        yield "session", {"session_id": session_id}
+        if cached_questions is not None:
+            questions = cached_questions
+        else:
+            questions = stream_quiz(request["task_description"], request["language"])
+        async for question in iterate_questions(questions):
+            session["questions"].append(question)
+            await quiz_sessions.set(session_id, session)
+            yield "question", question
+        if bank_questions is None:
+            await store_quiz(request["task_description"], request["language"], session["questions"], student_id)
+        yield "done", {"session_id": session_id, "total_questions": len(session["questions"])}
+    
+    return sse_response(events())
+
 @router.post("/check_quiz")
 async def check_quiz_endpoint(request: dict):
     try:
@@ -217,12 +632,10 @@ async def check_quiz_endpoint(request: dict):
         
         session_id = request["session_id"]
         
-        # Check if session exists
-        if session_id not in quiz_sessions:
-            raise HTTPException(status_code=404, detail="Quiz session not found. Please generate a new quiz.")
-        
         # Get stored questions
-        session_data = quiz_sessions[session_id]
+        session_data = await quiz_sessions.get(session_id)
+        if session_data is None:
+            raise HTTPException(status_code=404, detail="Quiz session not found. Please generate a new quiz.")
         questions = session_data["questions"]
         
         # Log the answers received from the frontend
@@ -231,14 +644,43 @@ async def check_quiz_endpoint(request: dict):
         # Check answers using stored questions
         result = await check_quiz_answers(questions, request["answers"])
         
+        # Explain the wrong answers while the user reviews the results
+        prefetch_explanations(session_id, result.get("wrong_answers", []), session_data["language"])
+        
         # Log the result for debugging
         logger.info(f"Quiz check result: {result}")
         
         return result
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error checking quiz answers: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def claim_learning_prefetch(request: dict):
+    """
+    Learning sections from the catalog or the quiz-time prefetch, and wrong-answer
+    explanations prefetched when the quiz was checked (None when not available).
+    """
+    session_id = request.get("session_id")
+    sections = await get_catalog().get_learning_sections(request["task_description"], request["language"])
+    if sections is None:
+        sections = await prefetch_store.claim(
+            session_id,
+            "learning_sections",
+            learning_sections_key(request["task_description"], request["language"])
+        )
+    
+    wrong_answers = request.get("wrong_answers", [])
+    explanations = None
+    if wrong_answers:
+        explanations = await prefetch_store.claim(
+            session_id,
+            "learning_explanations",
+            explanations_key(wrong_answers, request["language"])
+        )
+    return sections, explanations
+
 @router.post("/generate_learning")
 async def generate_learning_endpoint(request: dict):
     try:
@@ -256,10 +698,13 @@ async def generate_learning_endpoint(request: dict):
             logger.info(f"Processing {len(wrong_answers)} wrong answers")
         
         try:
+            sections, explanations = await claim_learning_prefetch(request)
             content = await generate_learning_content(
                 request["task_description"], 
                 request["language"],
-                wrong_answers
+                wrong_answers,
+                sections=sections,
+                explanations=explanations
             )
             
             # Validate the response structure
@@ -275,6 +720,9 @@ async def generate_learning_endpoint(request: dict):
             if "concept_keywords" not in content:
                 content["concept_keywords"] = []
             
+            # The editor asks for boilerplate that skips these concepts next
+            await prefetch_boilerplate(request.get("session_id"), request["task_description"], request["language"], content["concept_keywords"])
+            
             return {"content": content}
         except Exception as e:
             logger.error(f"Error in learning content generation: {str(e)}")
@@ -283,4 +731,67 @@ async def generate_learning_endpoint(request: dict):
         raise e
     except Exception as e:
         logger.error(f"Unexpected error in generate_learning_endpoint: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e)) 
+
+@router.post("/generate_learning/stream")
+async def generate_learning_stream(request: dict):
+    if not request.get("task_description"):
+        raise HTTPException(status_code=400, detail="Task description is required")
+    if not request.get("language"):
+        raise HTTPException(status_code=400, detail="Language is required")
+    
+    logger.info(f"Streaming learning content for task: {request['task_description']}")
+    sections, explanations = await claim_learning_prefetch(request)
+    
+    async def events():
+        async for event, data in stream_learning_content(
+            request["task_description"],
+            request["language"],
+            request.get("wrong_answers", []),
+            sections=sections,
+            explanations=explanations
+        ):
+            if event == "done":
+                await prefetch_boilerplate(request.get("session_id"), request["task_description"], request["language"], data["content"]["concept_keywords"])
+            yield event, data
+    
+    return sse_response(events())
+
+@router.get("/metrics")
+async def metrics_endpoint():
+    try:
+        llm_stats = get_llm_client().stats()
+    except Exception as e:
+        llm_stats = {"error": str(e)}
+    return {
+        "llm": llm_stats,
+        "scaffolding_cache": scaffolding_cache.stats(),
+        "quiz": get_quiz_stats(),
+        "catalog": await asyncio.to_thread(get_catalog().stats),
+        "prefetch": prefetch_store.stats(),
+        "executor": {"backend": get_executor_backend().name, **get_executor_backend().stats()},
+        "execution_cache": execution_cache.stats(),
+        "execution": get_execution_stats(),
+        "analysis_speculation": get_speculation_stats(),
+        "test_harness": get_harness_stats(),
+        "execution_queues": execution_scheduler.stats(),
+        "interactive_executor": get_interactive_stats(),
+        "batch": get_batch_stats(),
+        "quiz_sessions": await quiz_sessions.stats(),
+        "question_bank": await asyncio.to_thread(get_question_bank().stats)
+    }
+
+@router.delete("/admin/cache/scaffolding", dependencies=[Depends(require_admin)])
+async def purge_scaffolding_cache():
+    removed = await scaffolding_cache.apurge()
+    return {"purged": removed}
+
+@router.delete("/admin/cache/execution", dependencies=[Depends(require_admin)])
+async def purge_execution_cache():
+    removed = await execution_cache.apurge()
+    return {"purged": removed}
+
+@router.delete("/admin/cache/test_cases", dependencies=[Depends(require_admin)])
+async def purge_test_case_cache():
+    removed = await test_case_cache.apurge()
+    return {"purged": removed}
@@ -0,0 +1,36 @@
+import json
+import logging
+from typing import Any, AsyncIterator, Tuple
+from fastapi.responses import StreamingResponse
+
+logger = logging.getLogger(__name__)
+
+
+def format_sse(event: str, data: Any) -> str:
+    """
+    Encode one Server-Sent Event with a JSON payload.
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def sse_response(events: AsyncIterator[Tuple[str, Any]]) -> StreamingResponse:
+    """
+    Wrap an async iterator of (event, data) pairs in a text/event-stream response.
+    Errors raised mid-stream are reported to the client as an "error" event.
+    """
+    async def body():
+        try:
+            async for event, data in events:
+                yield format_sse(event, data)
+        except Exception as e:
+            logger.error(f"Error while streaming response: {str(e)}")
+            yield format_sse("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        },
+    )
@@ -1,7 +1,13 @@
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
-from app.api.routes import router as api_router
+from app.api.routes import router as api_router, quiz_sessions, CORS_ORIGINS
+from app.services.catalog import CATALOG_WARMUP, run_catalog_worker
+from app.services.code_executor import start_executor, close_executor
+from app.services.session_store import run_session_sweeper
+from app.services.cache import run_cache_sweeper
+from contextlib import asynccontextmanager
+import asyncio
 import logging
 import traceback
 
@@ -9,12 +15,31 @@ import traceback
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="AI Coding Assistant API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Background workers started with the app and cancelled on shutdown
+    workers = []
+    await start_executor()
+    workers.append(asyncio.create_task(run_session_sweeper(quiz_sessions)))
+    workers.append(asyncio.create_task(run_cache_sweeper()))
+    if CATALOG_WARMUP:
+        logger.info("Starting content catalog warm-up worker")
+        workers.append(asyncio.create_task(run_catalog_worker()))
+    try:
+        yield
+    finally:
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        await close_executor()
+        await quiz_sessions.close()
+
+app = FastAPI(title="AI Coding Assistant API", lifespan=lifespan)
 
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["http://localhost:3000"],  # React frontend URL
+    allow_origins=CORS_ORIGINS,  # React frontend URL
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
@@ -0,0 +1,38 @@
+from pydantic import BaseModel, Field
+from typing import Optional, List, Dict, Any
+from app.models.task import ProgrammingLanguage
+
+class BatchJob(BaseModel):
+    id: Optional[str] = Field(None, description="Client reference echoed in the item's result")
+    code: str = Field(..., min_length=1, description="Source code to run")
+    language: ProgrammingLanguage = Field(..., description="Language of the code")
+    stdin: str = Field("", description="Input fed to the program")
+    args: List[str] = Field(default_factory=list, description="Command-line arguments")
+    no_cache: bool = Field(False, description="Run even when a cached result exists")
+
+class BatchRequest(BaseModel):
+    jobs: List[BatchJob] = Field(..., description="Programs or inputs to run")
+    stream: bool = Field(True, description="Stream results as Server-Sent Events as they complete; otherwise return them all at once")
+    session_id: Optional[str] = Field(None, description="Client identity for fair queuing")
+
+class BatchItemResult(BaseModel):
+    index: int = Field(..., description="Position of the job in the request")
+    id: Optional[str] = Field(None, description="Client reference of the job")
+    language: str = Field(..., description="Language the job was run as")
+    output: Optional[str] = Field(None, description="Console output, as returned by /run_code")
+    execution: Optional[Dict[str, Any]] = Field(None, description="Execution summary, as returned by /run_code")
+    error: Optional[str] = Field(None, description="Why the job could not be run")
+    retry_after: Optional[int] = Field(None, description="Seconds to wait before resubmitting a job rejected by the scheduler")
+    shared: bool = Field(False, description="Whether the result was reused from another job in the batch (identical job, or the same source failing to compile)")
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and not (self.execution or {}).get("has_errors", True)
+
+class BatchSummary(BaseModel):
+    total: int = Field(0, description="Jobs in the batch")
+    succeeded: int = Field(0, description="Jobs that ran without errors")
+    failed: int = Field(0, description="Jobs whose program failed to compile, crashed or hit a limit")
+    errors: int = Field(0, description="Jobs that could not be run (rejected or executor failure)")
+    executions: int = Field(0, description="Distinct executions after sharing identical jobs")
+    wall_time: Optional[float] = Field(None, description="Time to run the batch in milliseconds")
@@ -0,0 +1,137 @@
+from pydantic import BaseModel, Field
+from typing import Optional, Dict, Any
+
+class SyntaxErrorInfo(BaseModel):
+    message: str = Field(..., description="Parser error message")
+    line: Optional[int] = Field(None, description="1-based line of the error")
+    column: Optional[int] = Field(None, description="1-based column of the error")
+    text: Optional[str] = Field(None, description="Source line containing the error")
+    checker: Optional[str] = Field(None, description="Local checker that found the error")
+
+    def format(self) -> str:
+        """
+        Compiler-style rendering used as the console output.
+        """
+        lines = []
+        if self.line is not None:
+            lines.append(f"  File \"main\", line {self.line}" + (f", column {self.column}" if self.column else ""))
+        if self.text:
+            lines.append(f"    {self.text.strip()}")
+            if self.column:
+                indent = len(self.text) - len(self.text.lstrip())
+                lines.append("    " + " " * max(self.column - 1 - indent, 0) + "^")
+        lines.append(self.message)
+        return "\n".join(lines)
+
+class ExecutionResult(BaseModel):
+    language: str = Field(..., description="Language the code was run as")
+    version: Optional[str] = Field(None, description="Runtime version that executed the code")
+    stdout: str = Field("", description="Standard output of the failed phase or of the run")
+    stderr: str = Field("", description="Standard error of the failed phase or of the run")
+    exit_code: Optional[int] = Field(None, description="Exit code (None when killed by a signal)")
+    signal: Optional[str] = Field(None, description="Signal that terminated the program, e.g. SIGKILL")
+    phase: str = Field("run", description="Phase the result comes from: 'compile' (compilation failed) or 'run'")
+    status: Optional[str] = Field(None, description="Executor status code: TO timeout, OL/EL output limit, SG signal, RE runtime error, CE syntax error")
+    message: Optional[str] = Field(None, description="Executor message, e.g. which limit was exceeded")
+    wall_time: Optional[float] = Field(None, description="Wall-clock time in milliseconds")
+    cpu_time: Optional[float] = Field(None, description="CPU time in milliseconds")
+    memory: Optional[int] = Field(None, description="Peak memory in bytes")
+    stdout_truncated: bool = Field(False, description="Whether stdout hit the output limit")
+    stderr_truncated: bool = Field(False, description="Whether stderr hit the output limit")
+    cached: bool = Field(False, description="Whether the result was served from the execution cache")
+    compile_cached: Optional[bool] = Field(None, description="Whether a cached build was reused (compiled languages)")
+    compile_time: Optional[float] = Field(None, description="Compilation time in milliseconds (0 for a cached build)")
+    syntax_error: Optional[SyntaxErrorInfo] = Field(None, description="Set when the local syntax pre-check rejected the code (not executed)")
+
+    @property
+    def timed_out(self) -> bool:
+        return self.status == "TO"
+
+    @property
+    def has_errors(self) -> bool:
+        """
+        The program failed to compile, exited non-zero, was killed or hit a limit.
+        Output on stderr alone (e.g. warnings) is not an error.
+        """
+        if self.phase == "compile":
+            return True
+        if self.signal or self.status in ("TO", "OL", "EL", "SG", "RE", "XX"):
+            return True
+        return self.exit_code not in (0, None)
+
+    @property
+    def output(self) -> str:
+        """
+        Output as shown in the editor's console. Failed runs show their errors; stderr
+        of a successful run (warnings) is shown after stdout.
+        """
+        if not self.has_errors:
+            return self.stdout + self.stderr
+        errors = "\n".join(part for part in (self.stderr.rstrip("\n"), self.message) if part)
+        if not errors:
+            errors = f"Process terminated by {self.signal}" if self.signal else f"Process exited with code {self.exit_code}"
+        return f"Error:\n{errors}"
+
+    @classmethod
+    def from_syntax_error(cls, language: str, error: SyntaxErrorInfo) -> "ExecutionResult":
+        return cls(
+            language=language,
+            stderr=error.format(),
+            phase="compile",
+            status="CE",
+            syntax_error=error,
+        )
+
+    @classmethod
+    def from_piston(cls, reply: Dict[str, Any], cached: bool = False) -> "ExecutionResult":
+        """
+        Build a result from a Piston-style execute reply. A failed compile stage takes
+        precedence over the run stage.
+        """
+        stage = reply.get("run") or {}
+        phase = "run"
+        compile_stage = reply.get("compile")
+        compile_info = {
+            "compile_cached": compile_stage.get("cached"),
+            "compile_time": compile_stage.get("wall_time"),
+        } if compile_stage else {}
+        if compile_stage and (compile_stage.get("code") not in (0, None) or compile_stage.get("signal")):
+            stage = compile_stage
+            phase = "compile"
+        if not reply.get("run") and phase == "run":
+            return cls(
+                language=reply.get("language", ""),
+                version=reply.get("version"),
+                status="XX",
+                message=reply.get("message") or "No execution result received",
+                cached=cached,
+                **compile_info,
+            )
+
+        return cls(
+            language=reply.get("language", ""),
+            version=reply.get("version"),
+            stdout=stage.get("stdout") or "",
+            stderr=stage.get("stderr") or "",
+            exit_code=stage.get("code"),
+            signal=stage.get("signal"),
+            phase=phase,
+            status=stage.get("status"),
+            message=stage.get("message"),
+            wall_time=stage.get("wall_time"),
+            cpu_time=stage.get("cpu_time"),
+            memory=stage.get("memory"),
+            stdout_truncated=bool(stage.get("stdout_truncated")),
+            stderr_truncated=bool(stage.get("stderr_truncated")),
+            cached=cached,
+            **compile_info,
+        )
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Execution details returned to clients next to the formatted output.
+        """
+        return {
+            **self.model_dump(exclude={"stdout", "stderr"}),
+            "has_errors": self.has_errors,
+        }
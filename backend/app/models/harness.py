@@ -0,0 +1,54 @@
+from pydantic import BaseModel, Field
+from typing import Optional, List, Dict, Any
+from app.models.execution import ExecutionResult
+
+class HarnessCase(BaseModel):
+    description: str = Field("", description="What the case checks")
+    stdin: str = Field("", description="Input fed to the program")
+    expected_output: str = Field(..., description="Expected program output")
+    match: str = Field("tokens", description="How output is compared: 'tokens' (whitespace-normalized), 'exact' or 'contains'")
+
+class CaseResult(BaseModel):
+    index: int = Field(..., description="Position of the case in the task's case list")
+    description: str = Field("", description="What the case checks")
+    passed: bool = Field(False, description="Whether the output matched the expected output")
+    stdout: str = Field("", description="Output of the program for this case")
+    stderr: str = Field("", description="Error output of the program for this case")
+    error: Optional[str] = Field(None, description="Exception, exit or limit that ended the case early")
+    timed_out: bool = Field(False, description="Whether the case hit the per-case time limit")
+    time_ms: Optional[float] = Field(None, description="Run time of the case in milliseconds")
+
+class HarnessResult(BaseModel):
+    language: str = Field(..., description="Language the cases were run as")
+    mode: str = Field(..., description="'batched' (one execution for all cases) or 'per_case'")
+    cases: List[CaseResult] = Field(default_factory=list, description="Per-case results, in case order")
+    execution: Optional[ExecutionResult] = Field(None, description="The batched execution, or the rejected syntax check")
+    wall_time: Optional[float] = Field(None, description="Time to run all cases in milliseconds")
+
+    @property
+    def passed(self) -> int:
+        return sum(1 for case in self.cases if case.passed)
+
+    @property
+    def all_passed(self) -> bool:
+        return bool(self.cases) and self.passed == len(self.cases)
+
+    @property
+    def failed_cases(self) -> List[CaseResult]:
+        return [case for case in self.cases if not case.passed]
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Pass/fail matrix returned to clients.
+        """
+        return {
+            "language": self.language,
+            "mode": self.mode,
+            "total": len(self.cases),
+            "passed": self.passed,
+            "all_passed": self.all_passed,
+            "matrix": [case.passed for case in self.cases],
+            "cases": [case.model_dump() for case in self.cases],
+            "execution": self.execution.summary() if self.execution else None,
+            "wall_time": self.wall_time,
+        }
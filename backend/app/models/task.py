@@ -25,6 +25,7 @@ class TaskRequest(BaseModel):
     language: ProgrammingLanguage = Field(..., description="Programming language to use")
     use_boilerplate: bool = Field(False, description="Whether to generate boilerplate code")
     concept_keywords: Optional[List[str]] = Field(None, description="List of concepts to skip in code generation")
+    session_id: Optional[str] = Field(None, description="Quiz session ID, used to claim prefetched content")
 
     class Config:
         json_schema_extra = {
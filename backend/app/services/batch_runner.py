@@ -0,0 +1,187 @@
+import os
+import time
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from app.models.batch import BatchJob, BatchItemResult, BatchSummary
+from app.models.execution import ExecutionResult
+from app.services.code_executor import LANGUAGE_MAPPING, execute_code, get_executor_backend
+from app.services.determinism import is_deterministic
+from app.services.scheduler import ClientKey, SchedulerRejected
+
+logger = logging.getLogger(__name__)
+
+# Batch execution configuration
+BATCH_MAX_JOBS = int(os.getenv("BATCH_MAX_JOBS", "100"))
+# Executions of one batch running or queued at once per language. This is also the
+# batch's budget in the scheduler in place of EXEC_QUEUE_MAX_PER_CLIENT, so the jobs of
+# a batch do not get each other rejected; the per-address cap still applies
+BATCH_MAX_PARALLEL = int(os.getenv("BATCH_MAX_PARALLEL", "8"))
+
+batch_stats = {
+    "batches": 0,
+    "jobs": 0,
+    "executions": 0,
+    "shared_results": 0,
+    "shared_builds": 0,
+    "rejected": 0,
+    "errors": 0,
+    "total_wall_ms": 0.0,
+}
+
+
+def run_key(job: BatchJob) -> Optional[Tuple[Any, ...]]:
+    """
+    Key of jobs whose result can be shared: same program, input and arguments. None when
+    the job must run on its own (caching disabled or nondeterministic output).
+    """
+    language = LANGUAGE_MAPPING.get(job.language)
+    if job.no_cache or language is None or not is_deterministic(job.code, language, get_executor_backend().fixed_hash_seed(language)):
+        return None
+    return (job.language.value, job.code, job.stdin, tuple(job.args))
+
+
+class BatchRun:
+    """
+    One batch: identical jobs share an execution, and for compiled languages whose builds
+    are cached the first execution of a source runs alone so the others reuse its build
+    instead of compiling the same program concurrently.
+    """
+
+    def __init__(self, jobs: List[BatchJob], client: Optional[ClientKey]):
+        self.jobs = jobs
+        self.client = client
+        self.backend = get_executor_backend()
+        self._executions: Dict[Any, "asyncio.Future"] = {}
+        self._started: List["asyncio.Future"] = []
+        # (language, code) -> first execution of the source, which builds it
+        self._builds: Dict[Tuple[str, str], "asyncio.Future"] = {}
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    def semaphore(self, language: str) -> asyncio.Semaphore:
+        semaphore = self._semaphores.get(language)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(max(1, BATCH_MAX_PARALLEL))
+            self._semaphores[language] = semaphore
+        return semaphore
+
+    async def _execute(self, job: BatchJob, build: Optional["asyncio.Future"]) -> Tuple[ExecutionResult, bool]:
+        """
+        Execution result of the job and whether it was reused from the build run.
+        """
+        if build is not None:
+            try:
+                built, _ = await asyncio.shield(build)
+            except Exception:
+                # The build run was rejected or failed; build again in this run
+                built = None
+            if built is not None:
+                batch_stats["shared_builds"] += 1
+                if built.phase == "compile":
+                    # The source does not compile; every run of it fails the same way
+                    return built.model_copy(deep=True), True
+        async with self.semaphore(LANGUAGE_MAPPING[job.language]):
+            batch_stats["executions"] += 1
+            result = await execute_code(
+                job.code,
+                job.language,
+                stdin=job.stdin,
+                args=job.args,
+                use_cache=not job.no_cache,
+                client=self.client,
+                max_pending=max(1, BATCH_MAX_PARALLEL)
+            )
+        return result, False
+
+    def execution(self, job: BatchJob) -> Tuple["asyncio.Future", bool]:
+        """
+        The execution serving the job and whether it is shared with an earlier job.
+        """
+        key = run_key(job)
+        if key is not None and key in self._executions:
+            return self._executions[key], True
+        language = LANGUAGE_MAPPING[job.language]
+        build_key = (language, job.code)
+        build = self._builds.get(build_key) if self.backend.shares_builds(language) else None
+        execution = asyncio.ensure_future(self._execute(job, build))
+        self._started.append(execution)
+        if build is None and self.backend.shares_builds(language):
+            self._builds[build_key] = execution
+        if key is not None:
+            self._executions[key] = execution
+        return execution, False
+
+    async def run_job(self, index: int, job: BatchJob) -> BatchItemResult:
+        language = LANGUAGE_MAPPING[job.language]
+        execution, shared = self.execution(job)
+        item = BatchItemResult(index=index, id=job.id, language=language)
+        try:
+            # Shielded: a shared execution must survive one of its jobs being cancelled
+            result, reused = await asyncio.shield(execution)
+        except SchedulerRejected as e:
+            batch_stats["rejected"] += 1
+            item.error = e.detail
+            item.retry_after = e.retry_after
+            return item
+        except Exception as e:
+            batch_stats["errors"] += 1
+            item.error = str(e)
+            return item
+        item.shared = shared or reused
+        if item.shared:
+            batch_stats["shared_results"] += 1
+        item.output = result.output
+        item.execution = result.summary()
+        return item
+
+    async def results(self) -> AsyncIterator[BatchItemResult]:
+        started = time.monotonic()
+        batch_stats["batches"] += 1
+        batch_stats["jobs"] += len(self.jobs)
+        tasks = [asyncio.ensure_future(self.run_job(index, job)) for index, job in enumerate(self.jobs)]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            # The client went away: stop the jobs still queued or running
+            for task in tasks:
+                task.cancel()
+            for execution in self._started:
+                execution.cancel()
+            batch_stats["total_wall_ms"] += (time.monotonic() - started) * 1000
+
+
+async def run_batch(jobs: List[BatchJob], client: Optional[ClientKey] = None) -> AsyncIterator[BatchItemResult]:
+    """
+    Run the jobs concurrently through the execution scheduler and yield each job's
+    result as soon as it completes (not in request order; see `index`).
+    """
+    if not jobs:
+        raise ValueError("At least one job is required")
+    if len(jobs) > BATCH_MAX_JOBS:
+        raise ValueError(f"A batch may contain at most {BATCH_MAX_JOBS} jobs")
+    logger.info(f"Running batch of {len(jobs)} jobs")
+    async for item in BatchRun(jobs, client).results():
+        yield item
+
+
+def summarize_batch(items: List[BatchItemResult], wall_time: float) -> BatchSummary:
+    summary = BatchSummary(total=len(items), wall_time=wall_time)
+    for item in items:
+        if item.error is not None:
+            summary.errors += 1
+        elif item.ok:
+            summary.succeeded += 1
+        else:
+            summary.failed += 1
+    summary.executions = sum(1 for item in items if not item.shared)
+    return summary
+
+
+def get_batch_stats() -> Dict[str, Any]:
+    batches = batch_stats["batches"]
+    return {
+        **batch_stats,
+        "max_parallel": max(1, BATCH_MAX_PARALLEL),
+        "avg_jobs_per_batch": batch_stats["jobs"] / batches if batches else 0.0,
+    }
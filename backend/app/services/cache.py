@@ -0,0 +1,244 @@
+import os
+import copy
+import hashlib
+import json
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+from app.services.sqlite_store import connect
+
+logger = logging.getLogger(__name__)
+
+# How often expired entries are deleted from the persistent tier
+CACHE_SWEEP_INTERVAL_SECONDS = float(os.getenv("CACHE_SWEEP_INTERVAL_SECONDS", "3600"))
+
+# Every cache created in this process, for the sweeper
+_caches: List["TwoTierCache"] = []
+
+
+def make_cache_key(*parts: Any) -> str:
+    """
+    Build a content-addressed key from JSON-serializable parts.
+    """
+    payload = json.dumps(parts, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class TwoTierCache:
+    """
+    In-memory LRU with TTL in front of a persistent SQLite table.
+
+    Values must be JSON-serializable. Entries found only on disk are promoted to memory.
+    The memory tier is bounded by entry count and, optionally, by the total JSON size of
+    its values (`max_bytes`).
+
+    `get`/`set`/`purge` block on SQLite; async code uses `aget`/`aset`/`apurge`, which
+    answer memory hits inline and run the disk tier in a worker thread.
+    """
+
+    def __init__(self, namespace: str, max_entries: int = 256, ttl: float = 86400, db_name: str = "cache.db", persistent: bool = True, max_bytes: Optional[int] = None):
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "sets": 0,
+            "evictions": 0,
+            "expired": 0,
+        }
+        self._conn = None
+        if persistent:
+            try:
+                self._conn = connect(db_name)
+                self._conn.execute(
+                    """CREATE TABLE IF NOT EXISTS cache_entries (
+                        namespace TEXT NOT NULL,
+                        key TEXT NOT NULL,
+                        value TEXT NOT NULL,
+                        expires_at REAL NOT NULL,
+                        PRIMARY KEY (namespace, key)
+                    )"""
+                )
+            except Exception as e:
+                logger.error(f"Failed to open persistent cache '{namespace}', using memory only: {str(e)}")
+                self._conn = None
+        _caches.append(self)
+
+    def _get_memory(self, key: str, now: float) -> Optional[Any]:
+        entry = self._memory.get(key)
+        if entry is not None:
+            expires_at, value, _ = entry
+            if expires_at > now:
+                self._memory.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return copy.deepcopy(value)
+            self._forget(key)
+        return None
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            value = self._get_memory(key, now)
+            if value is not None:
+                return value
+
+            if self._conn is not None:
+                try:
+                    row = self._conn.execute(
+                        "SELECT value, expires_at FROM cache_entries WHERE namespace = ? AND key = ?",
+                        (self.namespace, key),
+                    ).fetchone()
+                    if row is not None:
+                        if row[1] > now:
+                            value = json.loads(row[0])
+                            self._remember(key, value, row[1])
+                            self._stats["disk_hits"] += 1
+                            return copy.deepcopy(value)
+                        self._conn.execute(
+                            "DELETE FROM cache_entries WHERE namespace = ? AND key = ?",
+                            (self.namespace, key),
+                        )
+                except Exception as e:
+                    logger.error(f"Cache read failed for '{self.namespace}': {str(e)}")
+
+            self._stats["misses"] += 1
+            return None
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._remember(key, copy.deepcopy(value), expires_at)
+            self._stats["sets"] += 1
+            self._write(key, json.dumps(value), expires_at)
+
+    def _write(self, key: str, payload: str, expires_at: float) -> None:
+        if self._conn is not None:
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO cache_entries (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                    (self.namespace, key, payload, expires_at),
+                )
+            except Exception as e:
+                logger.error(f"Cache write failed for '{self.namespace}': {str(e)}")
+
+    async def aget(self, key: str) -> Optional[Any]:
+        if self._conn is None:
+            return self.get(key)
+        with self._lock:
+            value = self._get_memory(key, time.time())
+        if value is not None:
+            return value
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        if self._conn is None:
+            self.set(key, value, ttl)
+            return
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._remember(key, copy.deepcopy(value), expires_at)
+            self._stats["sets"] += 1
+        payload = json.dumps(value)
+
+        def write():
+            with self._lock:
+                self._write(key, payload, expires_at)
+
+        await asyncio.to_thread(write)
+
+    def purge_expired(self) -> int:
+        """
+        Delete the expired entries of this namespace from both tiers. Returns the number
+        of disk rows removed.
+        """
+        now = time.time()
+        with self._lock:
+            for key in [key for key, (expires_at, _, _) in self._memory.items() if expires_at <= now]:
+                self._forget(key)
+            if self._conn is None:
+                return 0
+            try:
+                cursor = self._conn.execute(
+                    "DELETE FROM cache_entries WHERE namespace = ? AND expires_at <= ?",
+                    (self.namespace, now),
+                )
+            except Exception as e:
+                logger.error(f"Cache sweep failed for '{self.namespace}': {str(e)}")
+                return 0
+            self._stats["expired"] += cursor.rowcount
+            return cursor.rowcount
+
+    def purge(self) -> int:
+        """
+        Drop every entry of this namespace from both tiers. Returns the number of entries removed.
+        """
+        with self._lock:
+            removed = len(self._memory)
+            self._memory.clear()
+            self._bytes = 0
+            if self._conn is not None:
+                try:
+                    cursor = self._conn.execute("DELETE FROM cache_entries WHERE namespace = ?", (self.namespace,))
+                    removed = max(removed, cursor.rowcount)
+                except Exception as e:
+                    logger.error(f"Cache purge failed for '{self.namespace}': {str(e)}")
+            logger.info(f"Purged {removed} entries from cache '{self.namespace}'")
+            return removed
+
+    async def apurge(self) -> int:
+        return await asyncio.to_thread(self.purge)
+
+    def _remember(self, key: str, value: Any, expires_at: float) -> None:
+        if key in self._memory:
+            self._forget(key)
+        size = len(json.dumps(value)) if self.max_bytes is not None else 0
+        if self.max_bytes is not None and size > self.max_bytes:
+            # Larger than the whole memory budget; keep it on disk only
+            return
+        self._memory[key] = (expires_at, value, size)
+        self._bytes += size
+        while len(self._memory) > self.max_entries or (self.max_bytes is not None and self._bytes > self.max_bytes):
+            _, (_, _, evicted_size) = self._memory.popitem(last=False)
+            self._bytes -= evicted_size
+            self._stats["evictions"] += 1
+
+    def _forget(self, key: str) -> None:
+        _, _, size = self._memory.pop(key)
+        self._bytes -= size
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = self._stats["memory_hits"] + self._stats["disk_hits"]
+            lookups = hits + self._stats["misses"]
+            return {
+                "namespace": self.namespace,
+                "memory_entries": len(self._memory),
+                "max_entries": self.max_entries,
+                "memory_bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "persistent": self._conn is not None,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                **self._stats,
+            }
+
+
+async def run_cache_sweeper(interval: float = CACHE_SWEEP_INTERVAL_SECONDS) -> None:
+    """
+    Background loop started from the app lifespan that deletes expired disk entries,
+    which are otherwise only removed when they are read again.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        for cache in list(_caches):
+            removed = await asyncio.to_thread(cache.purge_expired)
+            if removed:
+                logger.info(f"Deleted {removed} expired entries from cache '{cache.namespace}'")
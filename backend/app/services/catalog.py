@@ -0,0 +1,262 @@
+import os
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+import threading
+from typing import Any, Dict, List, Optional
+from app.services.cache import make_cache_key
+from app.services.sqlite_store import connect
+from app.services.quiz_service import generate_quiz
+from app.services.learning_service import generate_learning_sections
+from app.services.ai_service import generate_code_scaffolding, default_scaffolding
+
+logger = logging.getLogger(__name__)
+
+# Catalog configuration
+CATALOG_TASKS_FILE = os.getenv(
+    "CATALOG_TASKS_FILE",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "catalog_tasks.json"),
+)
+CATALOG_QUIZ_VARIANTS = int(os.getenv("CATALOG_QUIZ_VARIANTS", "3"))
+CATALOG_MAX_AGE_SECONDS = float(os.getenv("CATALOG_MAX_AGE_SECONDS", str(7 * 24 * 3600)))
+CATALOG_CONCURRENCY = int(os.getenv("CATALOG_CONCURRENCY", "2"))
+CATALOG_REFRESH_INTERVAL_SECONDS = float(os.getenv("CATALOG_REFRESH_INTERVAL_SECONDS", "3600"))
+CATALOG_WARMUP = os.getenv("CATALOG_WARMUP", "0") == "1"
+
+# (difficulty_level, use_boilerplate) combinations the editor requests
+SCAFFOLDING_VARIANTS = [
+    ("newbie", False),
+    ("expert", False),
+    ("newbie", True),
+]
+
+
+def normalize_task(task_description: str) -> str:
+    return " ".join(task_description.split()).lower()
+
+
+def catalog_key(task_description: str, language: str, *parts: Any) -> str:
+    return make_cache_key(normalize_task(task_description), getattr(language, "value", language), *parts)
+
+
+class ContentCatalog:
+    """
+    Persistent store of pre-generated quizzes, learning sections and scaffolding for the
+    popular tasks, keyed by (kind, normalized inputs, variant).
+    """
+
+    def __init__(self, db_name: str = "catalog.db", max_age: float = CATALOG_MAX_AGE_SECONDS):
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._conn = connect(db_name)
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS catalog_entries (
+                kind TEXT NOT NULL,
+                key TEXT NOT NULL,
+                variant INTEGER NOT NULL,
+                payload TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (kind, key, variant)
+            )"""
+        )
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+        }
+
+    def get(self, kind: str, key: str, variant: Optional[int] = None) -> Optional[Any]:
+        """
+        Return a stored payload; with no variant, a random one of the stored variants.
+        """
+        with self._lock:
+            if variant is None:
+                rows = self._conn.execute(
+                    "SELECT payload FROM catalog_entries WHERE kind = ? AND key = ?",
+                    (kind, key),
+                ).fetchall()
+            else:
+                rows = self._conn.execute(
+                    "SELECT payload FROM catalog_entries WHERE kind = ? AND key = ? AND variant = ?",
+                    (kind, key, variant),
+                ).fetchall()
+            if not rows:
+                self._stats["misses"] += 1
+                return None
+            self._stats["hits"] += 1
+        return json.loads(random.choice(rows)[0])
+
+    def put(self, kind: str, key: str, payload: Any, variant: int = 0) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO catalog_entries (kind, key, variant, payload, created_at) VALUES (?, ?, ?, ?, ?)",
+                (kind, key, variant, json.dumps(payload), time.time()),
+            )
+
+    def is_fresh(self, kind: str, key: str, variant: int = 0) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT created_at FROM catalog_entries WHERE kind = ? AND key = ? AND variant = ?",
+                (kind, key, variant),
+            ).fetchone()
+        return row is not None and time.time() - row[0] < self.max_age
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            rows = self._conn.execute("SELECT kind, COUNT(*) FROM catalog_entries GROUP BY kind").fetchall()
+            return {
+                "entries": {kind: count for kind, count in rows},
+                **self._stats,
+            }
+
+    # Lookups used by the routes; the SQLite reads run in a worker thread
+
+    async def get_quiz(self, task_description: str, language: str) -> Optional[List[Dict[str, Any]]]:
+        return await asyncio.to_thread(self.get, "quiz", catalog_key(task_description, language))
+
+    async def get_learning_sections(self, task_description: str, language: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self.get, "learning_sections", catalog_key(task_description, language), 0)
+
+    async def get_scaffolding(self, task_description: str, difficulty_level: str, language: str, use_boilerplate: bool = False, concept_keywords: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        # Scaffolding that has to leave specific concepts unimplemented is always generated live
+        if concept_keywords:
+            return None
+        return await asyncio.to_thread(self.get, "scaffolding", catalog_key(task_description, language, difficulty_level, bool(use_boilerplate)), 0)
+
+
+_catalog: Optional[ContentCatalog] = None
+
+
+def get_catalog() -> ContentCatalog:
+    global _catalog
+    if _catalog is None:
+        _catalog = ContentCatalog()
+    return _catalog
+
+
+def load_catalog_tasks(path: str = CATALOG_TASKS_FILE) -> List[Dict[str, Any]]:
+    """
+    Load the task list: [{"task_description": ..., "languages": [...], "difficulties": [...]}]
+    """
+    if not os.path.exists(path):
+        logger.warning(f"Catalog task file not found: {path}")
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        tasks = json.load(f)
+    return [task for task in tasks if task.get("task_description")]
+
+
+async def refresh_task(catalog: ContentCatalog, task_description: str, language: str, difficulties: List[str], force: bool = False) -> Dict[str, int]:
+    """
+    Generate whatever is missing or stale for one (task, language). Returns counts of
+    generated, skipped and failed entries.
+    """
+    # Imported here: the question bank uses the catalog's task normalization
+    from app.services.question_bank import store_quiz
+
+    counts = {"generated": 0, "skipped": 0, "failed": 0}
+    key = catalog_key(task_description, language)
+
+    # Variants are generated one after another: identical concurrent prompts would be coalesced
+    for variant in range(CATALOG_QUIZ_VARIANTS):
+        if not force and await asyncio.to_thread(catalog.is_fresh, "quiz", key, variant):
+            counts["skipped"] += 1
+            continue
+        try:
+            questions = await generate_quiz(task_description, language)
+            await asyncio.to_thread(catalog.put, "quiz", key, questions, variant)
+            await store_quiz(task_description, language, questions)
+            counts["generated"] += 1
+        except Exception as e:
+            logger.error(f"Catalog quiz generation failed for '{task_description}' ({language}): {str(e)}")
+            counts["failed"] += 1
+
+    if not force and await asyncio.to_thread(catalog.is_fresh, "learning_sections", key):
+        counts["skipped"] += 1
+    else:
+        try:
+            sections = await generate_learning_sections(task_description, language)
+            await asyncio.to_thread(catalog.put, "learning_sections", key, sections)
+            counts["generated"] += 1
+        except Exception as e:
+            logger.error(f"Catalog learning generation failed for '{task_description}' ({language}): {str(e)}")
+            counts["failed"] += 1
+
+    for difficulty_level, use_boilerplate in SCAFFOLDING_VARIANTS:
+        if difficulty_level not in difficulties and not use_boilerplate:
+            continue
+        scaffolding_key = catalog_key(task_description, language, difficulty_level, use_boilerplate)
+        if not force and await asyncio.to_thread(catalog.is_fresh, "scaffolding", scaffolding_key):
+            counts["skipped"] += 1
+            continue
+        # Bypass the scaffolding cache: its TTL matches the catalog's, so a stale or forced
+        # entry would otherwise be refreshed with the same cached result
+        result = await generate_code_scaffolding(task_description, difficulty_level, language, use_boilerplate=use_boilerplate, use_cache=False)
+        # generate_code_scaffolding falls back to a default template instead of raising
+        if result == default_scaffolding(language):
+            counts["failed"] += 1
+            continue
+        await asyncio.to_thread(catalog.put, "scaffolding", scaffolding_key, result)
+        counts["generated"] += 1
+
+    return counts
+
+
+async def refresh_catalog(force: bool = False, tasks: Optional[List[Dict[str, Any]]] = None) -> Dict[str, int]:
+    """
+    Incrementally refresh the catalog for every (task, language) in the task list.
+    """
+    catalog = get_catalog()
+    tasks = load_catalog_tasks() if tasks is None else tasks
+    semaphore = asyncio.Semaphore(CATALOG_CONCURRENCY)
+    totals = {"generated": 0, "skipped": 0, "failed": 0}
+
+    async def refresh_one(task_description: str, language: str, difficulties: List[str]):
+        async with semaphore:
+            counts = await refresh_task(catalog, task_description, language, difficulties, force)
+        for name, value in counts.items():
+            totals[name] += value
+
+    await asyncio.gather(*[
+        refresh_one(task["task_description"], language, task.get("difficulties", ["newbie", "expert"]))
+        for task in tasks
+        for language in task.get("languages", ["python"])
+    ])
+    logger.info(f"Catalog refresh finished: {totals}")
+    return totals
+
+
+async def run_catalog_worker(interval: float = CATALOG_REFRESH_INTERVAL_SECONDS) -> None:
+    """
+    Background warm-up loop started from the app lifespan.
+    """
+    while True:
+        try:
+            await refresh_catalog()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Catalog refresh failed: {str(e)}")
+        await asyncio.sleep(interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-generate content for the popular tasks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    refresh_parser = subparsers.add_parser("refresh", help="Generate missing or stale catalog entries")
+    refresh_parser.add_argument("--force", action="store_true", help="Regenerate entries even if they are fresh")
+    refresh_parser.add_argument("--tasks-file", default=CATALOG_TASKS_FILE, help="Path to the task list JSON file")
+    subparsers.add_parser("stats", help="Show catalog entry counts")
+    args = parser.parse_args()
+
+    if args.command == "refresh":
+        totals = asyncio.run(refresh_catalog(force=args.force, tasks=load_catalog_tasks(args.tasks_file)))
+        print(json.dumps(totals))
+    else:
+        print(json.dumps(get_catalog().stats()))
+
+
+if __name__ == "__main__":
+    main()
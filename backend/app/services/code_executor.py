@@ -1,12 +1,45 @@
+import os
+import time
+import hashlib
+import asyncio
 import aiohttp
 import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional
 from app.models.task import ProgrammingLanguage
+from app.models.execution import ExecutionResult, SyntaxErrorInfo
+from app.services.cache import TwoTierCache, make_cache_key
+from app.services.syntax_check import check_syntax
+from app.services.determinism import is_deterministic
+from app.services.scheduler import execution_scheduler, ClientKey, SchedulerRejected
 import json
 
 logger = logging.getLogger(__name__)
 
-# Piston API configuration
-PISTON_API_URL = "https://emkc.org/api/v2/piston/execute"
+# Piston API configuration (point PISTON_API_URL at a self-hosted Piston to avoid the public rate limits)
+PISTON_API_URL = os.getenv("PISTON_API_URL", "https://emkc.org/api/v2/piston").rstrip("/")
+PISTON_POOL_SIZE = int(os.getenv("PISTON_POOL_SIZE", "32"))
+PISTON_TIMEOUT_SECONDS = float(os.getenv("PISTON_TIMEOUT_SECONDS", "30"))
+PISTON_CONNECT_TIMEOUT_SECONDS = float(os.getenv("PISTON_CONNECT_TIMEOUT_SECONDS", "5"))
+PISTON_KEEPALIVE_SECONDS = float(os.getenv("PISTON_KEEPALIVE_SECONDS", "30"))
+PISTON_DNS_CACHE_SECONDS = int(os.getenv("PISTON_DNS_CACHE_SECONDS", "300"))
+# How long the resolved runtime versions ("*" -> e.g. "3.10.0") are trusted
+PISTON_RUNTIMES_TTL_SECONDS = float(os.getenv("PISTON_RUNTIMES_TTL_SECONDS", "3600"))
+# First retry delay after a failed runtimes fetch; doubled per consecutive failure, up to the TTL
+PISTON_RUNTIMES_RETRY_SECONDS = float(os.getenv("PISTON_RUNTIMES_RETRY_SECONDS", "30"))
+
+# Execution result cache
+EXEC_CACHE_ENABLED = os.getenv("EXEC_CACHE_ENABLED", "1") == "1"
+EXEC_CACHE_MAX_ENTRIES = int(os.getenv("EXEC_CACHE_MAX_ENTRIES", "1024"))
+EXEC_CACHE_MAX_BYTES = int(os.getenv("EXEC_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+EXEC_CACHE_TTL_SECONDS = float(os.getenv("EXEC_CACHE_TTL_SECONDS", "3600"))
+
+# Execution backend: "piston" (public Piston API) or "local" (sandboxed worker processes)
+EXECUTOR_BACKEND = os.getenv("EXECUTOR_BACKEND", "piston")
+# Languages the local backend cannot run are sent to Piston instead of failing
+EXECUTOR_LOCAL_FALLBACK = os.getenv("EXECUTOR_LOCAL_FALLBACK", "1") == "1"
+# Interactive runs (streamed output, live stdin) always use local workers, even when
+# batch runs go to Piston, so they are off unless the local backend was chosen
+EXEC_INTERACTIVE_ENABLED = os.getenv("EXEC_INTERACTIVE_ENABLED", "1" if EXECUTOR_BACKEND == "local" else "0") == "1"
 
 # Language mapping for Piston
 LANGUAGE_MAPPING = {
@@ -22,48 +55,493 @@ LANGUAGE_MAPPING = {
     ProgrammingLanguage.SWIFT: "swift",
 }
 
-async def execute_code(code: str, language: ProgrammingLanguage) -> str:
+
+class ExecutorBackend:
     """
-    Execute the given code using Piston API and return the output.
+    Interface for the code execution backends. `run` returns a reply in the shape of
+    Piston's execute endpoint: {"language", "version", "run": {"stdout", "stderr", ...}}.
     """
-    try:
-        piston_language = LANGUAGE_MAPPING.get(language)
-        if not piston_language:
-            raise ValueError(f"Language {language} is not supported")
+    name = "base"
+
+    def supports(self, language: str) -> bool:
+        return True
+
+    def shares_builds(self, language: str) -> bool:
+        """
+        Whether runs of the same source reuse one build, so a later run skips compilation.
+        """
+        return False
+
+    def fixed_hash_seed(self, language: str) -> bool:
+        """
+        Whether programs run with a fixed hash seed, so that iteration order of hashed
+        collections is the same on every run (see determinism.is_deterministic).
+        """
+        return False
+
+    async def start(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    async def run(self, code: str, language: str, stdin: str = "", args: Optional[List[str]] = None) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    async def runtime_version(self, language: str) -> str:
+        """
+        Version of the runtime that would execute `language`, part of the result cache key.
+        """
+        return "*"
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+
+class PistonBackend(ExecutorBackend):
+    """
+    Executes code through the Piston API. One keep-alive session with a bounded
+    connection pool is shared by all requests; it is opened by the app lifespan (or on
+    first use) and closed on shutdown.
+    """
+    name = "piston"
+
+    def __init__(self, api_url: str = PISTON_API_URL, pool_size: int = PISTON_POOL_SIZE, timeout: float = PISTON_TIMEOUT_SECONDS):
+        self.api_url = api_url
+        self.execute_url = f"{api_url}/execute"
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._runtimes: Dict[str, str] = {}
+        self._runtimes_next_load = 0.0
+        self._runtimes_failures = 0
+        self._runtimes_lock = asyncio.Lock()
+        self._in_flight = 0
+        self._stats = {
+            "requests": 0,
+            "failures": 0,
+            "timeouts": 0,
+            "connections_created": 0,
+            "connections_reused": 0,
+            "peak_in_flight": 0,
+            "total_request_seconds": 0.0,
+        }
+
+    def _create_session(self) -> aiohttp.ClientSession:
+        trace_config = aiohttp.TraceConfig()
+
+        async def on_connection_create_end(session, context, params):
+            self._stats["connections_created"] += 1
+
+        async def on_connection_reuseconn(session, context, params):
+            self._stats["connections_reused"] += 1
+
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+
+        connector = aiohttp.TCPConnector(
+            limit=self.pool_size,
+            limit_per_host=self.pool_size,
+            ttl_dns_cache=PISTON_DNS_CACHE_SECONDS,
+            keepalive_timeout=PISTON_KEEPALIVE_SECONDS,
+        )
+        return aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout, connect=PISTON_CONNECT_TIMEOUT_SECONDS),
+            trace_configs=[trace_config],
+        )
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = self._create_session()
+            logger.info(f"Opened Piston client pool for {self.api_url} (limit {self.pool_size})")
+        return self._session
+
+    async def start(self) -> None:
+        self._get_session()
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
 
+    async def run(self, code: str, language: str, stdin: str = "", args: Optional[List[str]] = None) -> Dict[str, Any]:
         # Prepare the execution request
         execution_data = {
-            "language": piston_language,
+            "language": language,
             "version": "*",  # Use the latest version
             "files": [
                 {
-                    "name": f"main.{piston_language}",
+                    "name": f"main.{language}",
                     "content": code
                 }
             ],
-            "stdin": "",  # You can add input here if needed
-            "args": []
+            "stdin": stdin or "",
+            "args": args or []
         }
 
-        async with aiohttp.ClientSession() as session:
+        session = self._get_session()
+        self._in_flight += 1
+        self._stats["requests"] += 1
+        self._stats["peak_in_flight"] = max(self._stats["peak_in_flight"], self._in_flight)
+        started = time.monotonic()
+        try:
             async with session.post(
-                PISTON_API_URL,
+                self.execute_url,
                 json=execution_data
             ) as response:
                 if response.status != 200:
                     error_text = await response.text()
                     raise Exception(f"Failed to execute code: {error_text}")
-                
-                result = await response.json()
-                
-                if result.get("run"):
-                    run_result = result["run"]
-                    if run_result.get("stderr"):
-                        return f"Error:\n{run_result['stderr']}"
-                    return run_result.get("stdout", "No output")
-                else:
-                    return "Error: No execution result received"
 
+                return await response.json()
+        except asyncio.TimeoutError:
+            self._stats["timeouts"] += 1
+            raise Exception(f"Piston request timed out after {self.timeout}s")
+        except Exception:
+            self._stats["failures"] += 1
+            raise
+        finally:
+            self._in_flight -= 1
+            self._stats["total_request_seconds"] += time.monotonic() - started
+
+    async def runtime_version(self, language: str) -> str:
+        # Requests ask for version "*"; resolve it to the latest installed runtime
+        if time.time() >= self._runtimes_next_load:
+            async with self._runtimes_lock:
+                # Concurrent callers wait for a single fetch
+                if time.time() >= self._runtimes_next_load:
+                    await self._load_runtimes()
+        return self._runtimes.get(language, "*")
+
+    async def _load_runtimes(self) -> None:
+        """
+        Refresh the runtime versions. A failed fetch keeps the previous versions and is
+        retried after an exponential backoff rather than on every execution.
+        """
+        try:
+            async with self._get_session().get(f"{self.api_url}/runtimes") as response:
+                if response.status != 200:
+                    raise RuntimeError(f"HTTP {response.status}")
+                runtimes = {}
+                for runtime in await response.json():
+                    name = runtime.get("language")
+                    version = runtime.get("version", "")
+                    if name and version_tuple(version) >= version_tuple(runtimes.get(name, "")):
+                        runtimes[name] = version
+            self._runtimes = runtimes
+            self._runtimes_failures = 0
+            self._runtimes_next_load = time.time() + PISTON_RUNTIMES_TTL_SECONDS
+        except Exception as e:
+            self._runtimes_failures += 1
+            delay = min(PISTON_RUNTIMES_RETRY_SECONDS * 2 ** (self._runtimes_failures - 1), PISTON_RUNTIMES_TTL_SECONDS)
+            self._runtimes_next_load = time.time() + delay
+            logger.warning(f"Failed to load Piston runtimes, retrying in {delay:.0f}s: {str(e) or type(e).__name__}")
+
+    def stats(self) -> Dict[str, Any]:
+        connector = self._session.connector if self._session is not None and not self._session.closed else None
+        # aiohttp does not expose pool occupancy publicly; read it defensively
+        acquired = len(getattr(connector, "_acquired", ())) if connector else 0
+        idle = sum(len(conns) for conns in getattr(connector, "_conns", {}).values()) if connector else 0
+        requests = self._stats["requests"]
+        return {
+            "api_url": self.api_url,
+            "pool_size": self.pool_size,
+            "in_flight": self._in_flight,
+            "connections_in_use": acquired,
+            "connections_idle": idle,
+            "utilization": acquired / self.pool_size if self.pool_size else 0.0,
+            **self._stats,
+            "avg_request_seconds": self._stats["total_request_seconds"] / requests if requests else 0.0,
+        }
+
+
+class LocalBackend(ExecutorBackend):
+    """
+    Executes code in pre-warmed local worker processes, falling back to Piston for
+    languages without a local runtime.
+    """
+    name = "local"
+
+    def __init__(self, fallback: Optional[ExecutorBackend] = None):
+        from app.services.local_executor import LocalExecutor
+
+        self.executor = LocalExecutor()
+        self.fallback = fallback
+
+    def supports(self, language: str) -> bool:
+        return self.executor.supports(language) or self.fallback is not None
+
+    def shares_builds(self, language: str) -> bool:
+        # Built programs are kept in the artifact cache, keyed by source
+        return language in self.executor.compilers and self.executor.artifacts is not None
+
+    def fixed_hash_seed(self, language: str) -> bool:
+        # Local Python workers run with PYTHONHASHSEED=0
+        return language == "python" and self.executor.supports(language)
+
+    async def start(self) -> None:
+        await self.executor.start()
+        if self.fallback is not None:
+            await self.fallback.start()
+
+    async def close(self) -> None:
+        await self.executor.close()
+        if self.fallback is not None:
+            await self.fallback.close()
+
+    async def run(self, code: str, language: str, stdin: str = "", args: Optional[List[str]] = None) -> Dict[str, Any]:
+        if not self.executor.supports(language) and self.fallback is not None:
+            return await self.fallback.run(code, language, stdin, args)
+        return await self.executor.run(code, language, stdin, args)
+
+    async def runtime_version(self, language: str) -> str:
+        if not self.executor.supports(language) and self.fallback is not None:
+            return f"{self.fallback.name}:{await self.fallback.runtime_version(language)}"
+        return self.executor.languages[language].version if self.executor.supports(language) else "*"
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self.executor.stats()
+        if self.fallback is not None:
+            stats["fallback"] = {"backend": self.fallback.name, **self.fallback.stats()}
+        return stats
+
+
+def version_tuple(version: str) -> tuple:
+    return tuple(int(part) if part.isdigit() else 0 for part in version.split(".")) if version else ()
+
+
+_backend: Optional[ExecutorBackend] = None
+
+execution_cache = TwoTierCache(
+    "execution",
+    max_entries=EXEC_CACHE_MAX_ENTRIES,
+    max_bytes=EXEC_CACHE_MAX_BYTES,
+    ttl=EXEC_CACHE_TTL_SECONDS,
+    persistent=False,
+)
+
+
+def create_executor_backend(name: str = EXECUTOR_BACKEND) -> ExecutorBackend:
+    if name == "piston":
+        return PistonBackend()
+    if name == "local":
+        return LocalBackend(fallback=PistonBackend() if EXECUTOR_LOCAL_FALLBACK else None)
+    raise ValueError(f"Unknown execution backend: {name}")
+
+
+def get_executor_backend() -> ExecutorBackend:
+    """
+    Return the process-wide execution backend, creating it on first use.
+    """
+    global _backend
+    if _backend is None:
+        _backend = create_executor_backend()
+    return _backend
+
+
+def set_executor_backend(backend: Optional[ExecutorBackend]) -> None:
+    global _backend
+    _backend = backend
+
+
+async def start_executor() -> None:
+    """
+    Pre-warm the execution backend (called from the app lifespan).
+    """
+    await get_executor_backend().start()
+
+
+async def close_executor() -> None:
+    if _backend is not None:
+        await _backend.close()
+    if _interactive_executor is not None:
+        await _interactive_executor.close()
+
+
+_interactive_executor = None
+
+
+def get_interactive_executor():
+    """
+    Local executor for interactive runs: the backend's own when it is local, otherwise
+    one created on first use.
+    """
+    global _interactive_executor
+    backend = get_executor_backend()
+    if isinstance(backend, LocalBackend):
+        return backend.executor
+    if _interactive_executor is None:
+        from app.services.local_executor import LocalExecutor
+
+        _interactive_executor = LocalExecutor()
+    return _interactive_executor
+
+
+def get_interactive_stats() -> Optional[Dict[str, Any]]:
+    """
+    Stats of the separate interactive executor; None when interactive runs share the
+    local backend (its stats already include them) or none has run yet.
+    """
+    return _interactive_executor.stats() if _interactive_executor is not None else None
+
+
+execution_stats = {
+    "executions": 0,
+    "cache_hits": 0,
+    "syntax_rejections": 0,
+    "errors": 0,
+    "compile_errors": 0,
+    "timeouts": 0,
+    "truncated": 0,
+    "total_wall_ms": 0.0,
+    "total_cpu_ms": 0.0,
+    "timed_runs": 0,
+    "peak_memory_bytes": 0,
+}
+
+
+def record_execution(result: ExecutionResult) -> None:
+    execution_stats["executions"] += 1
+    if result.cached:
+        execution_stats["cache_hits"] += 1
+        return
+    if result.syntax_error:
+        execution_stats["syntax_rejections"] += 1
+    if result.has_errors:
+        execution_stats["errors"] += 1
+    if result.phase == "compile":
+        execution_stats["compile_errors"] += 1
+    if result.timed_out:
+        execution_stats["timeouts"] += 1
+    if result.stdout_truncated or result.stderr_truncated:
+        execution_stats["truncated"] += 1
+    if result.wall_time is not None:
+        execution_stats["timed_runs"] += 1
+        execution_stats["total_wall_ms"] += result.wall_time
+        execution_stats["total_cpu_ms"] += result.cpu_time or 0.0
+    if result.memory:
+        execution_stats["peak_memory_bytes"] = max(execution_stats["peak_memory_bytes"], result.memory)
+
+
+def get_execution_stats() -> Dict[str, Any]:
+    timed_runs = execution_stats["timed_runs"]
+    return {
+        **execution_stats,
+        "avg_wall_ms": execution_stats["total_wall_ms"] / timed_runs if timed_runs else 0.0,
+        "avg_cpu_ms": execution_stats["total_cpu_ms"] / timed_runs if timed_runs else 0.0,
+    }
+
+
+async def execution_cache_key(backend: ExecutorBackend, code: str, language: str, stdin: str, args: List[str]) -> str:
+    code_hash = hashlib.sha256(code.encode("utf-8")).hexdigest()
+    version = await backend.runtime_version(language)
+    return make_cache_key(code_hash, language, stdin, args, backend.name, version)
+
+
+async def precheck_syntax(code: str, language: str) -> Optional[SyntaxErrorInfo]:
+    """
+    Local syntax pre-check for code that the execution backend would run (see
+    check_syntax); `language` is the backend's language name.
+    """
+    return await check_syntax(code, language, await get_executor_backend().runtime_version(language))
+
+
+async def execute_code(code: str, language: ProgrammingLanguage, stdin: str = "", args: Optional[List[str]] = None, use_cache: bool = True, client: Optional[ClientKey] = None, max_pending: Optional[int] = None) -> ExecutionResult:
+    """
+    Execute the given code with the configured backend.
+
+    Code that fails the local syntax pre-check is not sent to the backend; the result
+    carries the structured syntax error instead. Results are cached by (sha256(code), language,
+    stdin, args, runtime version) unless `use_cache` is False or the program is not known
+    to be deterministic (see determinism.is_deterministic); runs killed by a signal
+    (timeouts, limits) are never cached.
+
+    Executions that reach the backend go through the per-language scheduler, queued
+    fairly by `client` (see ExecutionScheduler.run for `max_pending`); SchedulerRejected
+    is raised when one is not admitted.
+    """
+    try:
+        piston_language = LANGUAGE_MAPPING.get(language)
+        if not piston_language:
+            raise ValueError(f"Language {language} is not supported")
+
+        backend = get_executor_backend()
+        syntax_error = await check_syntax(code, piston_language, await backend.runtime_version(piston_language))
+        if syntax_error:
+            result = ExecutionResult.from_syntax_error(piston_language, syntax_error)
+            record_execution(result)
+            return result
+
+        args = [str(arg) for arg in args or []]
+        cache_key = None
+        if EXEC_CACHE_ENABLED and use_cache and is_deterministic(code, piston_language, backend.fixed_hash_seed(piston_language)):
+            cache_key = await execution_cache_key(backend, code, piston_language, stdin or "", args)
+            cached = await execution_cache.aget(cache_key)
+            if cached is not None:
+                result = ExecutionResult.from_piston(cached, cached=True)
+                record_execution(result)
+                return result
+
+        reply = await execution_scheduler.run(
+            piston_language,
+            client,
+            lambda: backend.run(code, piston_language, stdin or "", args),
+            max_pending
+        )
+        result = ExecutionResult.from_piston(reply)
+        if cache_key is not None and not result.signal and not result.timed_out and result.status != "XX":
+            await execution_cache.aset(cache_key, reply)
+        record_execution(result)
+        return result
+
+    except SchedulerRejected:
+        raise
     except Exception as e:
         logger.error(f"Error executing code: {str(e)}")
-        raise Exception(f"Failed to execute code: {str(e)}") 
\ No newline at end of file
+        raise Exception(f"Failed to execute code: {str(e)}")
+
+
+async def execute_interactive(code: str, language: ProgrammingLanguage, stdin: "asyncio.Queue", on_output: Callable[[str, str], Awaitable[None]], args: Optional[List[str]] = None, client: Optional[ClientKey] = None) -> ExecutionResult:
+    """
+    Run the code in a local worker with streamed output and live stdin (see
+    LocalExecutor.run_interactive). The result carries no stdout/stderr; they were
+    streamed through `on_output`. Interactive runs are never cached.
+
+    Runs are admitted by the per-language scheduler like other executions (raising
+    SchedulerRejected) and hold a worker slot while the program is built and started;
+    once it runs it mostly waits for input, so the slot is handed on.
+    """
+    if not EXEC_INTERACTIVE_ENABLED:
+        raise ValueError("Interactive execution is disabled")
+    piston_language = LANGUAGE_MAPPING.get(language)
+    if not piston_language:
+        raise ValueError(f"Language {language} is not supported")
+
+    executor = get_interactive_executor()
+    if not executor.supports(piston_language):
+        raise ValueError(f"Interactive execution is not available for {piston_language}")
+    syntax_error = await check_syntax(code, piston_language, executor.languages[piston_language].version)
+    if syntax_error:
+        result = ExecutionResult.from_syntax_error(piston_language, syntax_error)
+        record_execution(result)
+        return result
+
+    async def start() -> "asyncio.Task":
+        started = asyncio.Event()
+        run = asyncio.ensure_future(executor.run_interactive(code, piston_language, stdin, on_output, [str(arg) for arg in args or []], client, on_start=started.set))
+        waiter = asyncio.ensure_future(started.wait())
+        try:
+            await asyncio.wait([run, waiter], return_when=asyncio.FIRST_COMPLETED)
+        except asyncio.CancelledError:
+            run.cancel()
+            raise
+        finally:
+            waiter.cancel()
+        return run
+
+    run = await execution_scheduler.run(piston_language, client, start)
+    reply = await run
+    result = ExecutionResult.from_piston(reply)
+    record_execution(result)
+    return result
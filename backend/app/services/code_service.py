@@ -1,50 +1,71 @@
 import os
-import google.generativeai as genai
-from dotenv import load_dotenv
+import time
+import asyncio
 import logging
+import functools
+from app.services.llm_client import generate_text, stream_text
+from app.services.code_executor import precheck_syntax
+from app.services.scheduler import SchedulerRejected
+from app.models.harness import HarnessResult
 import json
-from typing import Dict, Any, List
+from typing import Dict, Any, List, AsyncIterator, Awaitable, Optional, Tuple
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Load environment variables
-load_dotenv()
+# Start the LLM analysis while the code is still executing, guessing whether it will fail
+ANALYZE_SPECULATIVE = os.getenv("ANALYZE_SPECULATIVE", "1") == "1"
 
-# Initialize model as None
-model = None
+speculation_stats = {
+    "speculations": 0,
+    "hits": 0,
+    "misses": 0,
+    "history_guesses": 0,
+    "syntax_hints": 0,
+    "total_latency_seconds": 0.0,
+}
+# Observed execution outcomes per language: [runs without errors, runs with errors]
+execution_outcomes: Dict[str, List[int]] = {}
 
-def initialize_gemini():
-    global model
-    try:
-        api_key = os.getenv("GEMINI_API_KEY")
-        if not api_key:
-            raise ValueError("GEMINI_API_KEY environment variable is not set")
-        
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-2.0-flash')
-        logger.info("Gemini API initialized successfully")
-    except Exception as e:
-        logger.error(f"Failed to initialize Gemini API: {str(e)}")
-        raise
+# Feedback for code that does not parse; answered without an LLM call
+SYNTAX_HINT_TEMPLATE = """Your code could not run because it does not parse yet.
+
+- The parser stopped {location}: {message}
+- The actual mistake is often just before that point, e.g. on the previous line
+{tips}
+
+Fix the syntax first, then run your code again to get feedback on your approach."""
+
+SYNTAX_HINT_TIPS = {
+    "python": [
+        "Check that every block statement (if, for, def, ...) ends with a colon",
+        "Make sure the indentation of each block is consistent",
+        "Look for unclosed brackets or quotes",
+    ],
+    "javascript": [
+        "Check that every opening brace, bracket and parenthesis is closed",
+        "Look for unclosed strings or template literals",
+    ],
+    "ruby": [
+        "Check that every def, do, if and class has a matching end",
+        "Look for unclosed brackets or quotes",
+    ],
+    "go": [
+        "Check that every opening brace is closed and sits on the same line as its statement",
+        "Make sure every assignment has a right-hand side",
+    ],
+    "php": [
+        "Check that every statement ends with a semicolon",
+        "Make sure variables start with $",
+    ],
+}
 
-# Initialize Gemini on module import
-try:
-    initialize_gemini()
-except Exception as e:
-    logger.error(f"Failed to initialize Gemini API during startup: {str(e)}")
 
 async def generate_code(task_description: str, language: str, use_boilerplate: bool = False) -> Dict[str, Any]:
     """
     Generate code for the task, either complete implementation or boilerplate.
     """
-    if not model:
-        try:
-            initialize_gemini()
-        except Exception as e:
-            raise Exception("Failed to initialize Gemini API. Please check your API key.")
-
     try:
         prompt = f"""Generate {language} code for the following task:
         Task: {task_description}
@@ -74,13 +95,13 @@ async def generate_code(task_description: str, language: str, use_boilerplate: b
           * Add comments explaining what needs to be implemented
           * Make sure the code is runnable even if incomplete"""
 
-        response = await model.generate_content_async(prompt)
+        response_text = await generate_text(prompt)
         
-        if not response or not response.text:
+        if not response_text:
             raise ValueError("No response from AI model")
         
         # Clean the response text to ensure it's valid JSON
-        response_text = response.text.strip()
+        response_text = response_text.strip()
         # Remove any markdown code block indicators
         response_text = response_text.replace('```json', '').replace('```', '')
         # Remove any leading/trailing whitespace
@@ -127,96 +148,340 @@ async def generate_code(task_description: str, language: str, use_boilerplate: b
         logger.error(f"Error generating code: {str(e)}")
         raise Exception(f"Failed to generate code: {str(e)}")
 
+def build_analysis_prompt(code: str, task_description: str, language: str, has_errors: bool = False) -> str:
+    """
+    Build the analysis prompt; code with errors gets a coaching-only prompt.
+    """
+    # Use different prompts based on whether the code has errors
+    if has_errors:
+        prompt = f"""Analyze the following {language} code for the task:
+        
+        Task: {task_description}
+        
+        Code:
+        ```{language}
+        {code}
+        ```
+        
+        Important instructions:
+        1. The code has errors or isn't working correctly
+        2. DO NOT directly solve the problem - your goal is to coach, not solve
+        3. DO NOT provide code snippets or direct solutions
+        4. DO NOT tell the user exactly what's wrong (no line numbers or exact error messages)
+        5. DO provide abstract hints that guide them to discover the issue themselves
+        6. Focus on conceptual understanding, not specific syntax fixes
+        7. Give 2-3 graduated hints that become progressively more specific
+        8. Use a supportive, encouraging tone
+        9. Keep your response CONCISE - use short paragraphs and bullet points
+        10. DO NOT reveal the complete solution or approach
+        
+        Example good hints:
+        - "Consider how your algorithm handles empty inputs"
+        - "Check your logic for handling boundary conditions"
+        - "Think about the initialization of your variables"
+        
+        Example bad hints (don't do these):
+        - "Change line 10 to fix the null reference" (too specific)
+        - "You should use a for loop instead of while" (direct solution)
+        - "Your code throws an IndexOutOfBoundsException" (exact error)
+        
+        Format your response as a clear, concise list of hints that progressively guide the user.
+        """
+    else:
+        prompt = f"""Analyze the following {language} code for the task:
+        
+        Task: {task_description}
+        
+        Code:
+        ```{language}
+        {code}
+        ```
+        
+        Important instructions:
+        1. First, determine if the code is correct and complete for the given task
+        2. If code is CORRECT:
+           a. Start with a brief success message
+           b. Analyze the time and space complexity
+           c. Suggest 1-2 alternative approaches that might be more efficient or elegant
+        3. If code seems INCOMPLETE or INCORRECT:
+           a. DO NOT provide direct corrections or solutions
+           b. Provide 2-3 abstract hints that guide the user to discover issues themselves
+           c. Be supportive and encouraging
+        4. Keep your response CONCISE - use short paragraphs and bullet points
+        5. DO NOT provide complete code rewrites or direct solutions in any case
+        6. DO NOT include any code snippets or specific syntax fixes
+        7. Use plain text only - no special formatting, markdown, or characters that might cause rendering issues
+        
+        Format your response as clear, concise sections with bullet points where appropriate.
+        """
+
+    return prompt
+
 async def analyze_code(code: str, task_description: str, language: str, has_errors: bool = False) -> str:
     """
     Analyze the user's code and provide feedback:
     - If code is correct: Provide alternative approaches or success messages
     - If code has errors: Provide abstract hints without directly revealing errors or solutions
     """
-    if not model:
-        try:
-            initialize_gemini()
-        except Exception as e:
-            raise Exception("Failed to initialize Gemini API. Please check your API key.")
-
     try:
-        # Use different prompts based on whether the code has errors
-        if has_errors:
-            prompt = f"""Analyze the following {language} code for the task:
-            
-            Task: {task_description}
-            
-            Code:
-            ```{language}
-            {code}
-            ```
-            
-            Important instructions:
-            1. The code has errors or isn't working correctly
-            2. DO NOT directly solve the problem - your goal is to coach, not solve
-            3. DO NOT provide code snippets or direct solutions
-            4. DO NOT tell the user exactly what's wrong (no line numbers or exact error messages)
-            5. DO provide abstract hints that guide them to discover the issue themselves
-            6. Focus on conceptual understanding, not specific syntax fixes
-            7. Give 2-3 graduated hints that become progressively more specific
-            8. Use a supportive, encouraging tone
-            9. Keep your response CONCISE - use short paragraphs and bullet points
-            10. DO NOT reveal the complete solution or approach
-            
-            Example good hints:
-            - "Consider how your algorithm handles empty inputs"
-            - "Check your logic for handling boundary conditions"
-            - "Think about the initialization of your variables"
-            
-            Example bad hints (don't do these):
-            - "Change line 10 to fix the null reference" (too specific)
-            - "You should use a for loop instead of while" (direct solution)
-            - "Your code throws an IndexOutOfBoundsException" (exact error)
-            
-            Format your response as a clear, concise list of hints that progressively guide the user.
-            """
-        else:
-            prompt = f"""Analyze the following {language} code for the task:
-            
-            Task: {task_description}
-            
-            Code:
-            ```{language}
-            {code}
-            ```
-            
-            Important instructions:
-            1. First, determine if the code is correct and complete for the given task
-            2. If code is CORRECT:
-               a. Start with a brief success message
-               b. Analyze the time and space complexity
-               c. Suggest 1-2 alternative approaches that might be more efficient or elegant
-            3. If code seems INCOMPLETE or INCORRECT:
-               a. DO NOT provide direct corrections or solutions
-               b. Provide 2-3 abstract hints that guide the user to discover issues themselves
-               c. Be supportive and encouraging
-            4. Keep your response CONCISE - use short paragraphs and bullet points
-            5. DO NOT provide complete code rewrites or direct solutions in any case
-            6. DO NOT include any code snippets or specific syntax fixes
-            7. Use plain text only - no special formatting, markdown, or characters that might cause rendering issues
-            
-            Format your response as clear, concise sections with bullet points where appropriate.
-            """
+        prompt = build_analysis_prompt(code, task_description, language, has_errors)
 
-        response = await model.generate_content_async(prompt)
+        response_text = await generate_text(prompt)
         
-        if not response or not response.text:
+        if not response_text:
             raise ValueError("No response from AI model")
         
         # Clean the response to avoid potential React rendering issues
-        clean_response = response.text.strip()
+        clean_response = response_text.strip()
         
         # Additional safety measures to prevent rendering issues
-        # Remove any potential JSX-like content or objects that could cause React errors
-        clean_response = clean_response.replace("<", "&lt;").replace(">", "&gt;")
+        clean_response = sanitize_analysis_text(clean_response)
         
         return clean_response
     
     except Exception as e:
         logger.error(f"Error analyzing code: {str(e)}")
-        return f"Unable to analyze code: {str(e)}" 
\ No newline at end of file
+        return f"Unable to analyze code: {str(e)}" 
+
+def sanitize_analysis_text(text: str) -> str:
+    # Remove any potential JSX-like content or objects that could cause React errors
+    return text.replace("<", "&lt;").replace(">", "&gt;")
+
+async def stream_code_analysis(code: str, task_description: str, language: str, has_errors: bool = False) -> AsyncIterator[str]:
+    """
+    Stream the analysis text as the model produces it, sanitized the same way as analyze_code.
+    """
+    prompt = build_analysis_prompt(code, task_description, language, has_errors)
+    started = False
+    async for chunk in stream_text(prompt):
+        if not started:
+            chunk = chunk.lstrip()
+            if not chunk:
+                continue
+            started = True
+        yield sanitize_analysis_text(chunk)
+
+
+@functools.lru_cache(maxsize=1024)
+def syntax_hint(language: str, message: str, line: Optional[int] = None, column: Optional[int] = None) -> str:
+    """
+    Feedback for a pure syntax error, rendered from a template instead of asking the LLM.
+    """
+    if line is not None:
+        location = f"on line {line}" + (f", column {column}" if column else "")
+    else:
+        location = "here"
+    tips = "\n".join(f"- {tip}" for tip in SYNTAX_HINT_TIPS.get(language, []))
+    return sanitize_analysis_text(SYNTAX_HINT_TEMPLATE.format(location=location, message=message, tips=tips).replace("\n\n\n", "\n\n"))
+
+async def precheck_syntax_hint(code: str, language: str) -> Optional[str]:
+    """
+    Template feedback when the local syntax pre-check rejects the code, None otherwise.
+    """
+    error = await precheck_syntax(code, language)
+    if error is None:
+        return None
+    speculation_stats["syntax_hints"] += 1
+    return syntax_hint(language, error.message, error.line, error.column)
+
+# Feedback when every test case passes and no review was asked for
+TESTS_PASSED_TEMPLATE = """All {total} test cases passed. Nice work!
+
+Ask for a review if you would like feedback on the complexity of your solution and alternative approaches."""
+
+def build_tests_analysis_prompt(code: str, task_description: str, language: str, tests: HarnessResult) -> str:
+    """
+    Analysis prompt informed by the test results; failing cases are described to the
+    model but must not be revealed to the user.
+    """
+    prompt = build_analysis_prompt(code, task_description, language, has_errors=not tests.all_passed)
+    if tests.all_passed:
+        return prompt + f"""
+        Test results: all {len(tests.cases)} test cases pass, so the code is CORRECT for the task.
+        """
+    failing = "\n".join(
+        f"        - {case.description or f'case {case.index + 1}'}" + (f" ({case.error})" if case.error else "")
+        for case in tests.failed_cases
+    )
+    return prompt + f"""
+        Test results: {tests.passed} of {len(tests.cases)} test cases pass. Failing cases:
+{failing}
+        Use the failing cases to decide what to hint at, but DO NOT reveal test inputs or expected outputs.
+        """
+
+def tests_feedback(code: str, language: str, tests: HarnessResult, review: bool) -> Optional[str]:
+    """
+    Feedback that needs no LLM call: a syntax hint, or the success message when every
+    case passed and no review was asked for.
+    """
+    syntax_error = tests.execution.syntax_error if tests.execution else None
+    if syntax_error:
+        speculation_stats["syntax_hints"] += 1
+        return syntax_hint(language, syntax_error.message, syntax_error.line, syntax_error.column)
+    if tests.all_passed and not review:
+        return TESTS_PASSED_TEMPLATE.format(total=len(tests.cases))
+    return None
+
+async def analyze_tested_code(code: str, task_description: str, language: str, tests: HarnessResult, review: bool = False) -> str:
+    """
+    Analysis based on the test results. The LLM is only asked to coach when cases fail,
+    or to review passing code on request.
+    """
+    feedback = tests_feedback(code, language, tests, review)
+    if feedback is not None:
+        return feedback
+    try:
+        response_text = await generate_text(build_tests_analysis_prompt(code, task_description, language, tests))
+        if not response_text:
+            raise ValueError("No response from AI model")
+        return sanitize_analysis_text(response_text.strip())
+    except Exception as e:
+        logger.error(f"Error analyzing code: {str(e)}")
+        return f"Unable to analyze code: {str(e)}"
+
+async def stream_tested_code_analysis(code: str, task_description: str, language: str, tests: HarnessResult, review: bool = False) -> AsyncIterator[str]:
+    """
+    Streaming variant of analyze_tested_code.
+    """
+    feedback = tests_feedback(code, language, tests, review)
+    if feedback is not None:
+        yield feedback
+        return
+    started = False
+    async for chunk in stream_text(build_tests_analysis_prompt(code, task_description, language, tests)):
+        if not started:
+            chunk = chunk.lstrip()
+            if not chunk:
+                continue
+            started = True
+        yield sanitize_analysis_text(chunk)
+
+def guess_has_errors(code: str, language: str) -> bool:
+    """
+    Most likely execution outcome: the more frequent outcome observed for the language
+    so far (no errors by default). Code that fails the syntax pre-check never gets here.
+    """
+    speculation_stats["history_guesses"] += 1
+    ok, failed = execution_outcomes.get(language, [0, 0])
+    return failed > ok
+
+def record_outcome(language: str, has_errors: bool, guess: bool, started: float) -> None:
+    outcomes = execution_outcomes.setdefault(language, [0, 0])
+    outcomes[1 if has_errors else 0] += 1
+    speculation_stats["speculations"] += 1
+    speculation_stats["hits" if has_errors == guess else "misses"] += 1
+    speculation_stats["total_latency_seconds"] += time.monotonic() - started
+
+def get_speculation_stats() -> Dict[str, Any]:
+    speculations = speculation_stats["speculations"]
+    return {
+        "enabled": ANALYZE_SPECULATIVE,
+        **speculation_stats,
+        "hit_rate": speculation_stats["hits"] / speculations if speculations else 0.0,
+        "avg_latency_seconds": speculation_stats["total_latency_seconds"] / speculations if speculations else 0.0,
+    }
+
+async def resolve_execution(execution: "asyncio.Future") -> Tuple[Any, bool]:
+    """
+    Await the execution and return (result, has_errors). A failed execution counts as
+    code with errors; a rejected execution is re-raised.
+    """
+    try:
+        result = await execution
+        return result, result.has_errors
+    except SchedulerRejected:
+        raise
+    except Exception as e:
+        logger.info(f"Exception during code execution: {str(e)}")
+        return None, True
+
+async def analyze_code_speculative(code: str, task_description: str, language: str, execution: Awaitable[Any]) -> Tuple[str, Any]:
+    """
+    Run the execution and the LLM analysis concurrently.
+
+    The analysis starts with the prompt for the guessed outcome; if the execution proves
+    the guess wrong it is cancelled and re-issued with the right prompt. Returns
+    (analysis, execution result or None when the execution failed). Code that fails the
+    local syntax pre-check gets template feedback without an LLM call.
+    """
+    execution_task = asyncio.ensure_future(execution)
+    hint = await precheck_syntax_hint(code, language)
+    if hint is not None:
+        result, _ = await resolve_execution(execution_task)
+        return hint, result
+    if not ANALYZE_SPECULATIVE:
+        result, has_errors = await resolve_execution(execution_task)
+        return await analyze_code(code, task_description, language, has_errors=has_errors), result
+
+    started = time.monotonic()
+    guess = guess_has_errors(code, language)
+    analysis_task = asyncio.ensure_future(analyze_code(code, task_description, language, has_errors=guess))
+    try:
+        result, has_errors = await resolve_execution(execution_task)
+        if has_errors == guess:
+            analysis = await analysis_task
+        else:
+            logger.info(f"Analysis guess missed (guessed has_errors={guess}); re-issuing")
+            analysis_task.cancel()
+            analysis = await analyze_code(code, task_description, language, has_errors=has_errors)
+        record_outcome(language, has_errors, guess, started)
+        return analysis, result
+    finally:
+        for task in (execution_task, analysis_task):
+            if not task.done():
+                task.cancel()
+
+async def stream_code_analysis_speculative(code: str, task_description: str, language: str, execution: Awaitable[Any]) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    Streaming variant of analyze_code_speculative. Yields ("execution", result or None)
+    once the execution finishes, then ("analysis", text) chunks. Chunks of the guessed
+    prompt are buffered until the guess is confirmed and discarded otherwise.
+    """
+    execution_task = asyncio.ensure_future(execution)
+    hint = await precheck_syntax_hint(code, language)
+    if hint is not None:
+        result, _ = await resolve_execution(execution_task)
+        yield "execution", result
+        yield "analysis", hint
+        return
+    if not ANALYZE_SPECULATIVE:
+        result, has_errors = await resolve_execution(execution_task)
+        yield "execution", result
+        async for text in stream_code_analysis(code, task_description, language, has_errors=has_errors):
+            yield "analysis", text
+        return
+
+    started = time.monotonic()
+    guess = guess_has_errors(code, language)
+    buffer: "asyncio.Queue" = asyncio.Queue()
+
+    async def consume():
+        try:
+            async for text in stream_code_analysis(code, task_description, language, has_errors=guess):
+                await buffer.put(("text", text))
+            await buffer.put(("end", None))
+        except Exception as e:
+            await buffer.put(("error", e))
+
+    consumer = asyncio.ensure_future(consume())
+    try:
+        result, has_errors = await resolve_execution(execution_task)
+        record_outcome(language, has_errors, guess, started)
+        yield "execution", result
+        if has_errors == guess:
+            while True:
+                kind, value = await buffer.get()
+                if kind == "end":
+                    return
+                if kind == "error":
+                    raise value
+                yield "analysis", value
+
+        logger.info(f"Analysis guess missed (guessed has_errors={guess}); re-issuing")
+        consumer.cancel()
+        async for text in stream_code_analysis(code, task_description, language, has_errors=has_errors):
+            yield "analysis", text
+    finally:
+        for task in (execution_task, consumer):
+            if not task.done():
+                task.cancel()
@@ -0,0 +1,179 @@
+import os
+import uuid
+import shutil
+import asyncio
+import logging
+import tempfile
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def directory_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+def remove_trees(paths: List[str]) -> None:
+    for path in paths:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+class ArtifactCache:
+    """
+    On-disk store of build outputs, one directory per key, evicted least recently used
+    first once the total size exceeds `max_bytes`.
+
+    Entries are published by renaming a finished build directory into place, so readers
+    never see a partial build. Entries leased by a running program are not evicted.
+
+    Bookkeeping happens on the event loop; walking and deleting directories runs in a
+    thread. An evicted entry is first renamed out of its key's path, so it can be
+    rebuilt and published again while the old copy is still being deleted.
+    """
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._leases: Dict[str, int] = {}
+        self._bytes = 0
+        self._stats = {
+            "stores": 0,
+            "evictions": 0,
+        }
+        os.makedirs(root, exist_ok=True)
+
+    def _scan(self) -> List[Any]:
+        # Build directories and toolchain caches are dot-prefixed and not entries
+        entries = []
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if name.startswith((".build-", ".evicted-")):
+                # Left over from an interrupted build or eviction
+                shutil.rmtree(path, ignore_errors=True)
+                continue
+            if name.startswith(".") or not os.path.isdir(path):
+                continue
+            entries.append((os.stat(path).st_mtime, name, directory_size(path)))
+        return sorted(entries)
+
+    async def start(self) -> None:
+        """
+        Load the entries left by previous runs, least recently used first.
+        """
+        entries = await asyncio.to_thread(self._scan)
+        for _, name, size in entries:
+            if name not in self._entries:
+                self._entries[name] = size
+                self._bytes += size
+        if entries:
+            logger.info(f"Loaded {len(entries)} cached build artifacts ({self._bytes} bytes) from {self.root}")
+        await self._evict()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def build_dir(self) -> str:
+        """
+        Fresh directory for a build, on the same filesystem as the entries.
+        """
+        return tempfile.mkdtemp(prefix=".build-", dir=self.root)
+
+    def acquire(self, key: str) -> Optional[str]:
+        """
+        Path of the cached artifact, leased until `release`; None on a miss.
+        """
+        if key not in self._entries or not os.path.isdir(self.path(key)):
+            self._forget(key)
+            return None
+        self._entries.move_to_end(key)
+        self._leases[key] = self._leases.get(key, 0) + 1
+        try:
+            os.utime(self.path(key))
+        except OSError:
+            pass
+        return self.path(key)
+
+    def release(self, key: str) -> None:
+        count = self._leases.get(key, 0) - 1
+        if count > 0:
+            self._leases[key] = count
+        else:
+            self._leases.pop(key, None)
+
+    async def put(self, key: str, build_dir: str) -> None:
+        """
+        Publish a finished build directory under `key`.
+        """
+        target = self.path(key)
+        if key in self._entries:
+            await asyncio.to_thread(shutil.rmtree, build_dir, True)
+            return
+        try:
+            os.rename(build_dir, target)
+        except OSError:
+            # Published concurrently (e.g. by another server process)
+            await asyncio.to_thread(shutil.rmtree, build_dir, True)
+            if not os.path.isdir(target):
+                raise
+        size = await asyncio.to_thread(directory_size, target)
+        if key in self._entries:
+            return
+        self._entries[key] = size
+        self._bytes += size
+        self._stats["stores"] += 1
+        await self._evict(keep=key)
+
+    def _forget(self, key: str) -> None:
+        size = self._entries.pop(key, None)
+        if size is not None:
+            self._bytes -= size
+
+    def _detach(self, key: str) -> Optional[str]:
+        """
+        Forget the entry and move its directory aside for deletion; returns the new path.
+        """
+        self._forget(key)
+        detached = os.path.join(self.root, f".evicted-{uuid.uuid4().hex}")
+        try:
+            os.rename(self.path(key), detached)
+        except OSError:
+            return None
+        return detached
+
+    async def _evict(self, keep: Optional[str] = None) -> None:
+        detached = []
+        for key in list(self._entries):
+            if self._bytes <= self.max_bytes:
+                break
+            if key == keep or self._leases.get(key):
+                continue
+            detached.append(self._detach(key))
+            self._stats["evictions"] += 1
+        await self._remove([path for path in detached if path])
+
+    async def _remove(self, paths: List[str]) -> None:
+        if paths:
+            await asyncio.to_thread(remove_trees, paths)
+
+    async def clear(self) -> int:
+        keys = [key for key in self._entries if not self._leases.get(key)]
+        await self._remove([path for path in map(self._detach, keys) if path])
+        return len(keys)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "leased": len(self._leases),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            **self._stats,
+        }
@@ -0,0 +1,143 @@
+import os
+import re
+from typing import Iterable, List, Optional, Pattern, Sequence, Set, Union
+
+# Languages whose execution results may be cached. Only languages with rules below can
+# be cached at all; a program is cached when it only imports modules on its language's
+# allow-list and uses none of the language's nondeterministic APIs.
+EXEC_CACHE_LANGUAGES = {
+    language.strip()
+    for language in os.getenv("EXEC_CACHE_LANGUAGES", "python,javascript,java,cpp,go,rust,csharp").split(",")
+    if language.strip()
+}
+
+
+class DeterminismRules:
+    """
+    What makes a program of one language cacheable. `imports` extracts the modules the
+    program uses (a comma-separated list, each optionally followed by an alias); each
+    must be in `allowed` (or below an allowed prefix ending in "." or "::"). `banned`
+    are APIs whose output changes between runs; an entry that is a sequence of patterns
+    only applies when all of them match. `unseeded` are banned as well unless the
+    backend runs the language with a fixed hash seed.
+    """
+
+    def __init__(self, imports: Sequence[str], allowed: Iterable[str], banned: Sequence[Union[str, Sequence[str]]], unseeded: Sequence[str] = ()):
+        self.imports = [re.compile(pattern, re.MULTILINE) for pattern in imports]
+        self.allowed: Set[str] = set(allowed)
+        self.banned = [self._compile(entry) for entry in banned]
+        self.unseeded = [self._compile(entry) for entry in unseeded]
+
+    @staticmethod
+    def _compile(entry: Union[str, Sequence[str]]) -> List[Pattern]:
+        patterns = [entry] if isinstance(entry, str) else entry
+        return [re.compile(pattern, re.MULTILINE) for pattern in patterns]
+
+    def module_allowed(self, module: str) -> bool:
+        if module in self.allowed:
+            return True
+        return any(prefix.endswith((".", "::")) and module.startswith(prefix) for prefix in self.allowed)
+
+    def is_deterministic(self, code: str, fixed_hash_seed: bool) -> bool:
+        for pattern in self.imports:
+            for match in pattern.finditer(code):
+                modules = [part.split()[0] for part in match.group(1).split(",") if part.strip()]
+                if not all(self.module_allowed(module) for module in modules):
+                    return False
+        checks = self.banned if fixed_hash_seed else self.banned + self.unseeded
+        return not any(all(pattern.search(code) for pattern in patterns) for patterns in checks)
+
+
+RULES = {
+    "python": DeterminismRules(
+        imports=[r"^\s*import\s+([\w.]+(?:[ \t]+as[ \t]+\w+)?(?:[ \t]*,[ \t]*[\w.]+(?:[ \t]+as[ \t]+\w+)?)*)", r"^\s*from\s+([\w.]+)\s+import\b"],
+        allowed=[
+            "math", "cmath", "string", "re", "collections", "collections.", "itertools", "functools",
+            "operator", "heapq", "bisect", "array", "copy", "typing", "dataclasses", "enum",
+            "fractions", "decimal", "statistics", "sys", "json", "textwrap", "abc", "numbers",
+        ],
+        banned=[
+            # Addresses and per-process hashes, and code that imports or runs other code
+            r"(?<![\w.])(?:id|hash|eval|exec|compile)\s*\(", r"__import__",
+        ],
+        # Iteration order of sets of strings depends on the hash seed
+        unseeded=[r"\b(?:set|frozenset)\s*\(", r"\{[^{}:]*,[^{}:]*\}", r"\{[^{}:]*\bfor\b[^{}:]*\}"],
+    ),
+    "javascript": DeterminismRules(
+        imports=[r"\brequire\s*\(\s*['\"](?:node:)?([\w/.-]+)['\"]", r"\bimport\b[^'\"\n]*['\"](?:node:)?([\w/.-]+)['\"]"],
+        allowed=["fs", "readline", "util", "assert", "string_decoder"],
+        banned=[
+            r"\bMath\.random\b", r"\bDate\b", r"\bperformance\b", r"\bcrypto\b",
+            # Modules whose names are only known at run time
+            r"\brequire\s*\(\s*[^'\"\s]", r"\bimport\s*\(",
+            r"\bprocess\.(?:hrtime|pid|ppid|env|uptime|memoryUsage|cpuUsage|resourceUsage)\b",
+        ],
+    ),
+    "java": DeterminismRules(
+        imports=[r"^\s*import\s+(?:static\s+)?([\w.]+)"],
+        allowed=["java.util.", "java.io.", "java.math.", "java.lang.", "java.text."],
+        banned=[
+            r"\bRandom\b", r"\bMath\.random\b", r"\bUUID\b", r"\bjava\.util\.concurrent\b",
+            r"\bSystem\.(?:currentTimeMillis|nanoTime|identityHashCode|getenv)\b",
+            r"\b(?:Instant|LocalDate|LocalDateTime|LocalTime|Clock|Thread|ExecutorService)\b",
+            r"\bparallel(?:Stream)?\s*\(",
+        ],
+    ),
+    "cpp": DeterminismRules(
+        imports=[r"^\s*#\s*include\s*[<\"]([\w./+]+)[>\"]"],
+        allowed=[
+            "iostream", "istream", "ostream", "cstdio", "cstdlib", "string", "vector", "algorithm",
+            "map", "set", "unordered_map", "unordered_set", "queue", "stack", "deque", "list",
+            "array", "utility", "numeric", "cmath", "climits", "cfloat", "cstring", "sstream",
+            "iomanip", "bitset", "functional", "tuple", "cassert", "cstdint", "limits", "iterator",
+            "optional", "string_view", "bits/stdc++.h",
+        ],
+        banned=[
+            r"\b(?:rand|srand|random|time|clock|getpid)\s*\(", r"\b(?:random_device|mt19937(?:_64)?|default_random_engine)\b",
+            r"\bchrono\b", r"\bstd::(?:j?thread|async)\b", r"\bj?thread\s+\w+\s*[({]", r"\bpthread_",
+            # Addresses change between runs
+            r"%p", r"\(\s*(?:const\s+)?void\s*\*\s*\)",
+        ],
+    ),
+    "go": DeterminismRules(
+        imports=[r"^\s*import\s+(?:\w+\s+)?\"([\w/]+)\"", r"^\s*(?:\w+\s+)?\"([\w/]+)\"\s*$"],
+        allowed=["fmt", "strings", "strconv", "sort", "math", "math/big", "math/bits", "bufio", "os", "bytes", "unicode", "unicode/utf8", "errors", "container/heap", "container/list", "slices"],
+        banned=[
+            r"\bgo\s+(?:func\b|[\w.]+\s*\()", r"\bselect\s*\{",
+            r"\bos\.(?:Getpid|Getppid|Getenv|Environ|Hostname|Getwd)\b",
+            # Map iteration order is randomized on every run
+            (r"\bmap\[", r"\brange\b"),
+        ],
+    ),
+    "rust": DeterminismRules(
+        imports=[r"^\s*use\s+([\w:]+)"],
+        allowed=["std::io", "std::io::", "std::collections::", "std::cmp", "std::cmp::", "std::fmt", "std::fmt::", "std::str::", "std::string::", "std::vec::", "std::mem", "std::ops::", "std::iter", "std::iter::", "std::convert::"],
+        banned=[
+            r"\b(?:std::time|Instant|SystemTime)\b", r"\bthread::", r"\bstd::process::id\b", r"\bstd::env\b",
+            r"\{:p\}", r"\bas\s+\*(?:const|mut)\b",
+            # Hashed collections iterate in a randomly seeded order
+            (r"\bHash(?:Map|Set)\b", r"\bfor\b|\.(?:iter|iter_mut|into_iter|keys|values|values_mut|drain)\s*\("),
+        ],
+    ),
+    "csharp": DeterminismRules(
+        imports=[r"^\s*using\s+(?:static\s+)?([\w.]+)\s*;"],
+        allowed=["System", "System.Collections.Generic", "System.Linq", "System.Text", "System.IO", "System.Numerics"],
+        banned=[
+            r"\b(?:Random|Guid|DateTime|DateTimeOffset|Stopwatch|Thread|Task|Parallel)\b",
+            r"\bEnvironment\.(?:TickCount|ProcessId|GetEnvironmentVariable|MachineName)\b",
+            r"\bGetHashCode\s*\(", r"\bunsafe\b",
+        ],
+    ),
+}
+
+
+def is_deterministic(code: str, language: str, fixed_hash_seed: bool = False) -> bool:
+    """
+    Whether a program's output can be cached: its language is in EXEC_CACHE_LANGUAGES
+    and has rules, and the program passes them. `fixed_hash_seed` tells whether the
+    backend runs it with a fixed hash seed (see ExecutorBackend.fixed_hash_seed).
+    """
+    rules: Optional[DeterminismRules] = RULES.get(language)
+    if rules is None or language not in EXEC_CACHE_LANGUAGES:
+        return False
+    return rules.is_deterministic(code, fixed_hash_seed)
@@ -0,0 +1,487 @@
+import os
+import re
+import json
+import time
+import uuid
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Set
+from app.models.task import ProgrammingLanguage
+from app.models.execution import ExecutionResult
+from app.models.harness import HarnessCase, CaseResult, HarnessResult
+from app.services.cache import TwoTierCache, make_cache_key
+from app.services.code_executor import LANGUAGE_MAPPING, execute_code, precheck_syntax
+from app.services.llm_client import generate_text
+from app.services.scheduler import execution_scheduler, ClientKey, SchedulerRejected
+
+logger = logging.getLogger(__name__)
+
+# Test harness configuration. Off by default: the scaffolding does not tell students the
+# stdin/stdout contract the generated cases assume, so correct solutions that hardcode
+# their data would fail every case
+HARNESS_ENABLED = os.getenv("HARNESS_ENABLED", "0") == "1"
+HARNESS_CASES = int(os.getenv("HARNESS_CASES", "5"))
+HARNESS_CASE_TIMEOUT_SECONDS = float(os.getenv("HARNESS_CASE_TIMEOUT_SECONDS", "2"))
+HARNESS_MAX_CASE_OUTPUT = int(os.getenv("HARNESS_MAX_CASE_OUTPUT", "4096"))
+# Parallel executions for languages that run one execution per case
+HARNESS_MAX_PARALLEL = int(os.getenv("HARNESS_MAX_PARALLEL", "4"))
+
+# Bump whenever the case generation prompt changes so stale case sets are not served
+HARNESS_PROMPT_VERSION = "2"
+
+MATCH_MODES = ("exact", "tokens", "contains")
+# Used when the model names no valid mode: the printed values in order, whitespace ignored
+DEFAULT_MATCH_MODE = "tokens"
+
+# Generated case sets keyed by the normalized task and language; [] marks untestable tasks
+test_case_cache = TwoTierCache(
+    "test_cases",
+    max_entries=int(os.getenv("HARNESS_CACHE_MAX_ENTRIES", "512")),
+    ttl=float(os.getenv("HARNESS_CACHE_TTL_SECONDS", str(30 * 24 * 3600))),
+)
+
+harness_stats = {
+    "runs": 0,
+    "batched_runs": 0,
+    "per_case_runs": 0,
+    "cases_run": 0,
+    "cases_passed": 0,
+    "case_sets_generated": 0,
+    "untestable_tasks": 0,
+    "forged_results": 0,
+    "total_wall_ms": 0.0,
+}
+
+# JavaScript that only finishes after the synchronous run (readline, timers, promises)
+# cannot be captured by the in-process driver and runs one execution per case instead
+JS_ASYNC_PATTERN = re.compile(r"\breadline\b|process\.stdin|\bset(?:Timeout|Interval|Immediate)\b|\bawait\b|\.then\(|\bPromise\b")
+
+# The drivers read their marker from the first line of stdin before any user code runs,
+# so it is in no file, argument, environment variable or global the program can look
+# up. A Python program could still dig it out of the interpreter's frames; a result it
+# forges for a case is then reported twice (the driver's own line follows) and rejected.
+PYTHON_DRIVER = """import contextlib, io, json, signal, sys, time, traceback
+
+
+class CaseTimeout(BaseException):
+    pass
+
+
+def on_timeout(signum, frame):
+    raise CaseTimeout()
+
+
+def reporter():
+    marker = sys.stdin.readline().rstrip("\\n")
+    stdout = sys.__stdout__
+
+    def report(result):
+        stdout.write(marker + json.dumps(result) + "\\n")
+        stdout.flush()
+    return report
+
+
+def main(report, source, cases, timeout, max_output):
+    signal.signal(signal.SIGALRM, on_timeout)
+    program, compile_error = None, None
+    try:
+        program = compile(source, "main.py", "exec")
+    except (SyntaxError, ValueError) as e:
+        compile_error = traceback.format_exception_only(type(e), e)[-1].strip()
+
+    for index, stdin in enumerate(cases):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        error, timed_out = compile_error, False
+        sys.stdin = io.StringIO(stdin)
+        started = time.perf_counter()
+        try:
+            if program is not None:
+                signal.setitimer(signal.ITIMER_REAL, timeout)
+                with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+                    exec(program, {{"__name__": "__main__", "__file__": "main.py", "__builtins__": __builtins__}})
+        except CaseTimeout:
+            error, timed_out = "Time limit exceeded", True
+        except SystemExit as e:
+            if e.code not in (None, 0):
+                error = f"SystemExit: {{e.code}}"
+        except BaseException as e:
+            error = traceback.format_exception_only(type(e), e)[-1].strip()
+        finally:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+        report({{
+            "index": index,
+            "stdout": stdout.getvalue()[:max_output],
+            "stderr": stderr.getvalue()[:max_output],
+            "error": error,
+            "timed_out": timed_out,
+            "time_ms": (time.perf_counter() - started) * 1000,
+        }})
+
+
+main(reporter(), {source}, {cases}, {timeout}, {max_output})
+"""
+
+JAVASCRIPT_DRIVER = """const fs = require('fs');
+const util = require('util');
+const vm = require('vm');
+
+const MARKER = fs.readFileSync(0, 'utf8').split('\\n', 1)[0];
+const SOURCE = {source};
+const CASES = {cases};
+const TIMEOUT_MS = {timeout_ms};
+const MAX_OUTPUT = {max_output};
+
+class ExitSignal {{
+  constructor(code) {{ this.code = code; }}
+}}
+
+let script = null;
+let compileError = null;
+try {{
+  script = new vm.Script(SOURCE, {{ filename: 'main.js' }});
+}} catch (e) {{
+  compileError = `${{e.name}}: ${{e.message}}`;
+}}
+
+CASES.forEach((stdin, index) => {{
+  let stdout = '';
+  let stderr = '';
+  const out = (...args) => {{ stdout += util.format(...args) + '\\n'; }};
+  const err = (...args) => {{ stderr += util.format(...args) + '\\n'; }};
+  const caseFs = Object.assign({{}}, fs, {{
+    readFileSync: (path, options) => {{
+      if (path !== 0 && path !== '/dev/stdin') return fs.readFileSync(path, options);
+      return (typeof options === 'string' || (options && options.encoding)) ? stdin : Buffer.from(stdin);
+    }},
+  }});
+  const caseProcess = {{
+    argv: ['node', 'main.js'],
+    env: {{}},
+    platform: process.platform,
+    version: process.version,
+    hrtime: process.hrtime,
+    stdout: {{ write: (chunk) => {{ stdout += String(chunk); return true; }} }},
+    stderr: {{ write: (chunk) => {{ stderr += String(chunk); return true; }} }},
+    exit: (code) => {{ throw new ExitSignal(code || 0); }},
+  }};
+  const module = {{ exports: {{}} }};
+  const context = vm.createContext({{
+    console: {{ log: out, info: out, debug: out, error: err, warn: err }},
+    process: caseProcess,
+    require: (name) => (name === 'fs' || name === 'node:fs') ? caseFs : require(name),
+    module,
+    exports: module.exports,
+    Buffer,
+    __filename: 'main.js',
+    __dirname: '.',
+  }});
+
+  let error = compileError;
+  let timedOut = false;
+  const started = process.hrtime.bigint();
+  if (script) {{
+    try {{
+      script.runInContext(context, {{ timeout: TIMEOUT_MS }});
+    }} catch (e) {{
+      if (e instanceof ExitSignal) {{
+        if (e.code !== 0) error = `Exited with code ${{e.code}}`;
+      }} else if (e && e.code === 'ERR_SCRIPT_EXECUTION_TIMEOUT') {{
+        error = 'Time limit exceeded';
+        timedOut = true;
+      }} else {{
+        error = e && e.name ? `${{e.name}}: ${{e.message}}` : String(e);
+      }}
+    }}
+  }}
+  const result = {{
+    index,
+    stdout: stdout.slice(0, MAX_OUTPUT),
+    stderr: stderr.slice(0, MAX_OUTPUT),
+    error,
+    timed_out: timedOut,
+    time_ms: Number(process.hrtime.bigint() - started) / 1e6,
+  }};
+  process.stdout.write(MARKER + JSON.stringify(result) + '\\n');
+}});
+"""
+
+
+def build_driver(code: str, language: str, stdins: List[str]) -> Optional[str]:
+    """
+    Program that runs `code` once per stdin inside a single execution and prints one
+    JSON result per case, prefixed with the marker it reads from stdin. None when the
+    code has to run per case.
+    """
+    if language == "python":
+        return PYTHON_DRIVER.format(
+            source=repr(code),
+            cases=repr(stdins),
+            timeout=HARNESS_CASE_TIMEOUT_SECONDS,
+            max_output=HARNESS_MAX_CASE_OUTPUT,
+        )
+    if language == "javascript" and not JS_ASYNC_PATTERN.search(code):
+        return JAVASCRIPT_DRIVER.format(
+            source=json.dumps(code),
+            cases=json.dumps(stdins),
+            timeout_ms=int(HARNESS_CASE_TIMEOUT_SECONDS * 1000),
+            max_output=HARNESS_MAX_CASE_OUTPUT,
+        )
+    return None
+
+
+def normalize_output(text: str) -> str:
+    lines = [line.rstrip() for line in text.replace("\r\n", "\n").split("\n")]
+    return "\n".join(lines).strip("\n")
+
+
+def output_matches(actual: str, expected: str, match: str) -> bool:
+    actual, expected = normalize_output(actual), normalize_output(expected)
+    if not expected:
+        # Any output would match; such cases are rejected when parsed
+        return False
+    if match == "exact":
+        return actual == expected
+    if match == "tokens":
+        return actual.split() == expected.split()
+    return expected in actual
+
+
+def execution_error(result: ExecutionResult) -> Optional[str]:
+    """
+    Short reason a per-case execution ended early, None when it completed normally.
+    """
+    if not result.has_errors:
+        return None
+    if result.syntax_error:
+        return result.syntax_error.message
+    if result.timed_out:
+        return "Time limit exceeded"
+    if result.phase == "compile":
+        return "Compilation failed"
+    if result.signal:
+        return f"Terminated by {result.signal}"
+    if result.exit_code not in (0, None):
+        return f"Exited with code {result.exit_code}"
+    return result.message or "Execution failed"
+
+
+def test_cases_key(task_description: str, language: str) -> str:
+    return make_cache_key(HARNESS_PROMPT_VERSION, " ".join(task_description.split()).lower(), getattr(language, "value", language))
+
+
+def build_test_cases_prompt(task_description: str, language: str) -> str:
+    return f"""Write {HARNESS_CASES} test cases for a {language} program that solves the following task,
+        reading its input from standard input and printing its results to standard output.
+        Task: {task_description}
+
+        Return ONLY a JSON array in the following format, no other text, markdown formatting, or backticks:
+        [
+            {{
+                "description": "What the case checks, e.g. 'empty list'",
+                "stdin": "The exact input the program reads, values separated by newlines",
+                "expected_output": "What the program should print for this input",
+                "match": "tokens, exact or contains"
+            }}
+        ]
+
+        Rules:
+        - Cover typical inputs, edge cases and boundary values
+        - "expected_output" is never empty
+        - Use "tokens" when the printed values and their order matter, "exact" only when the task fully
+          determines the output format, and "contains" only when the task leaves the surrounding text
+          open, with the key value that must appear somewhere in the output
+        - If the task is interactive, graphical, random or cannot be checked through standard input
+          and output, return []"""
+
+
+def parse_test_cases(response_text: str) -> List[HarnessCase]:
+    """
+    Parse the model's case list, dropping malformed cases.
+    """
+    response_text = response_text.strip().replace('```json', '').replace('```', '').strip()
+    items = json.loads(response_text)
+    if not isinstance(items, list):
+        raise ValueError("Response is not a list")
+
+    cases = []
+    for item in items[:HARNESS_CASES]:
+        try:
+            case = HarnessCase(**item)
+        except Exception as e:
+            logger.warning(f"Dropping malformed test case: {str(e)}")
+            continue
+        if not case.expected_output.strip():
+            logger.warning("Dropping test case without expected output")
+            continue
+        if case.match not in MATCH_MODES:
+            case.match = DEFAULT_MATCH_MODE
+        cases.append(case)
+    return cases
+
+
+async def get_test_cases(task_description: str, language: str) -> List[HarnessCase]:
+    """
+    Test cases for the task, generated once per (task, language) and cached. An empty list
+    means the task cannot be checked through standard input and output, or generation failed.
+    """
+    key = test_cases_key(task_description, language)
+    cached = await test_case_cache.aget(key)
+    if cached is not None:
+        return [HarnessCase(**case) for case in cached]
+
+    try:
+        cases = parse_test_cases(await generate_text(build_test_cases_prompt(task_description, language)))
+    except Exception as e:
+        # Not cached: the next request retries
+        logger.error(f"Error generating test cases: {str(e)}")
+        return []
+
+    await test_case_cache.aset(key, [case.model_dump() for case in cases])
+    harness_stats["case_sets_generated"] += 1
+    if not cases:
+        harness_stats["untestable_tasks"] += 1
+    logger.info(f"Generated {len(cases)} test cases for '{task_description[:50]}' ({language})")
+    return cases
+
+
+def case_result(index: int, case: HarnessCase, stdout: str = "", stderr: str = "", error: Optional[str] = None, timed_out: bool = False, time_ms: Optional[float] = None) -> CaseResult:
+    return CaseResult(
+        index=index,
+        description=case.description,
+        passed=error is None and output_matches(stdout, case.expected_output, case.match),
+        stdout=stdout,
+        stderr=stderr,
+        error=error,
+        timed_out=timed_out,
+        time_ms=time_ms,
+    )
+
+
+async def run_batched(language: ProgrammingLanguage, cases: List[HarnessCase], driver: str, marker: str, client: Optional[ClientKey] = None) -> HarnessResult:
+    # The driver measures time per case, so its results are never cached
+    execution = await execute_code(driver, language, stdin=marker + "\n", use_cache=False, client=client)
+    reported: Dict[int, Dict[str, Any]] = {}
+    forged: Set[int] = set()
+    for line in execution.stdout.splitlines():
+        if line.startswith(marker):
+            try:
+                result = json.loads(line[len(marker):])
+                index = result["index"]
+            except (ValueError, KeyError, TypeError):
+                continue
+            if index in reported:
+                # The driver reports each case once: the program printed a result itself
+                forged.add(index)
+            reported[index] = result
+
+    # Cases missing from the output were not reached before the batch was terminated
+    missing_error = execution_error(execution) or "Not run"
+    results = []
+    for index, case in enumerate(cases):
+        result = reported.get(index)
+        if result is None:
+            results.append(case_result(index, case, error=missing_error, timed_out=execution.timed_out))
+            continue
+        if index in forged:
+            harness_stats["forged_results"] += 1
+            results.append(case_result(index, case, error="The program printed its own test result"))
+            continue
+        results.append(case_result(
+            index,
+            case,
+            stdout=result.get("stdout") or "",
+            stderr=result.get("stderr") or "",
+            error=result.get("error"),
+            timed_out=bool(result.get("timed_out")),
+            time_ms=result.get("time_ms"),
+        ))
+    return HarnessResult(language=execution.language, mode="batched", cases=results, execution=execution)
+
+
+async def run_per_case(code: str, language: ProgrammingLanguage, cases: List[HarnessCase], client: Optional[ClientKey] = None) -> HarnessResult:
+    # Stay within the scheduler's per-client limit so the cases do not reject each other
+    semaphore = asyncio.Semaphore(max(1, min(HARNESS_MAX_PARALLEL, execution_scheduler.max_per_client)))
+
+    async def run_one(index: int, case: HarnessCase) -> CaseResult:
+        async with semaphore:
+            started = time.monotonic()
+            try:
+                result = await execute_code(code, language, stdin=case.stdin, client=client)
+            except SchedulerRejected:
+                raise
+            except Exception as e:
+                return case_result(index, case, error=str(e))
+        time_ms = result.wall_time if result.wall_time is not None else (time.monotonic() - started) * 1000
+        return case_result(
+            index,
+            case,
+            stdout=result.stdout[:HARNESS_MAX_CASE_OUTPUT],
+            stderr=result.stderr[:HARNESS_MAX_CASE_OUTPUT],
+            error=execution_error(result),
+            timed_out=result.timed_out,
+            time_ms=time_ms,
+        )
+
+    results = await asyncio.gather(*(run_one(index, case) for index, case in enumerate(cases)))
+    return HarnessResult(language=LANGUAGE_MAPPING[language], mode="per_case", cases=list(results))
+
+
+async def run_test_cases(code: str, language: ProgrammingLanguage, cases: List[HarnessCase], client: Optional[ClientKey] = None) -> HarnessResult:
+    """
+    Run the code against every case and return the pass/fail matrix. Python and
+    synchronous JavaScript run all cases in a single execution; other languages run one
+    (cached) execution per case.
+    """
+    piston_language = LANGUAGE_MAPPING.get(language)
+    if not piston_language:
+        raise ValueError(f"Language {language} is not supported")
+
+    started = time.monotonic()
+    syntax_error = await precheck_syntax(code, piston_language)
+    if syntax_error:
+        execution = ExecutionResult.from_syntax_error(piston_language, syntax_error)
+        harness = HarnessResult(
+            language=piston_language,
+            mode="batched",
+            cases=[case_result(index, case, error=syntax_error.message) for index, case in enumerate(cases)],
+            execution=execution,
+        )
+    else:
+        marker = f"@@harness-{uuid.uuid4().hex}@@"
+        driver = build_driver(code, piston_language, [case.stdin for case in cases])
+        if driver is not None:
+            harness = await run_batched(language, cases, driver, marker, client)
+        else:
+            harness = await run_per_case(code, language, cases, client)
+    harness.wall_time = (time.monotonic() - started) * 1000
+
+    harness_stats["runs"] += 1
+    harness_stats["batched_runs" if harness.mode == "batched" else "per_case_runs"] += 1
+    harness_stats["cases_run"] += len(harness.cases)
+    harness_stats["cases_passed"] += harness.passed
+    harness_stats["total_wall_ms"] += harness.wall_time
+    return harness
+
+
+async def run_task_tests(code: str, task_description: str, language: ProgrammingLanguage, client: Optional[ClientKey] = None) -> Optional[HarnessResult]:
+    """
+    Run the code against the task's test cases. None when the harness is disabled or the
+    task has no test cases.
+    """
+    if not HARNESS_ENABLED:
+        return None
+    cases = await get_test_cases(task_description, language.value)
+    if not cases:
+        return None
+    return await run_test_cases(code, language, cases, client)
+
+
+def get_harness_stats() -> Dict[str, Any]:
+    runs = harness_stats["runs"]
+    return {
+        "enabled": HARNESS_ENABLED,
+        **harness_stats,
+        "pass_rate": harness_stats["cases_passed"] / harness_stats["cases_run"] if harness_stats["cases_run"] else 0.0,
+        "avg_wall_ms": harness_stats["total_wall_ms"] / runs if runs else 0.0,
+        "case_cache": test_case_cache.stats(),
+    }
@@ -0,0 +1,184 @@
+import json
+import logging
+from typing import Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_ESCAPES = {
+    '"': '"',
+    '\\': '\\',
+    '/': '/',
+    'b': '\b',
+    'f': '\f',
+    'n': '\n',
+    'r': '\r',
+    't': '\t',
+}
+
+
+class JSONArrayStreamParser:
+    """
+    Incremental parser for the first JSON array in a streamed model reply.
+
+    Feed it text chunks as they arrive; every time an object element of the array is
+    closed it is decoded and returned. Text before the array (markdown fences, a wrapping
+    object such as {"sections": [...]}) is skipped. Elements that fail to decode are
+    counted in `errors` and skipped.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+        self._in_array = False
+        self._done = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._item_start: Optional[int] = None
+        self.items_parsed = 0
+        self.errors = 0
+
+    @property
+    def done(self) -> bool:
+        return self._done
+
+    def feed(self, chunk: str) -> List[Any]:
+        items = []
+        if self._done or not chunk:
+            return items
+
+        self._buffer += chunk
+        buffer = self._buffer
+        i = self._pos
+        while i < len(buffer):
+            char = buffer[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif not self._in_array:
+                if char == '[':
+                    self._in_array = True
+                    self._depth = 0
+            elif char in '{[':
+                if self._depth == 0 and char == '{':
+                    self._item_start = i
+                self._depth += 1
+            elif char in '}]':
+                if self._depth == 0 and char == ']':
+                    self._done = True
+                    break
+                self._depth -= 1
+                if self._depth == 0 and self._item_start is not None:
+                    raw = buffer[self._item_start:i + 1]
+                    self._item_start = None
+                    try:
+                        items.append(json.loads(raw))
+                        self.items_parsed += 1
+                    except json.JSONDecodeError as e:
+                        self.errors += 1
+                        logger.warning(f"Skipping malformed array element: {str(e)}")
+            i += 1
+
+        # Drop consumed text so long streams are not rescanned
+        keep_from = self._item_start if self._item_start is not None else i
+        self._buffer = buffer[keep_from:]
+        self._pos = i - keep_from
+        if self._item_start is not None:
+            self._item_start = 0
+        return items
+
+
+class JSONStringFieldStreamer:
+    """
+    Incrementally extract the decoded value of one top-level string field from a streamed
+    JSON object, e.g. the "scaffolding" code while the model is still writing it.
+    """
+
+    def __init__(self, field: str):
+        self._needle = json.dumps(field)
+        self._buffer = ""
+        self._state = "seek"
+        self._pending_escape = ""
+        self.complete = False
+
+    def feed(self, chunk: str) -> str:
+        if self.complete or not chunk:
+            return ""
+
+        self._buffer += chunk
+        if self._state == "seek":
+            index = self._buffer.find(self._needle)
+            if index < 0:
+                # Keep just enough text to match a needle split across chunks
+                self._buffer = self._buffer[-len(self._needle):]
+                return ""
+            self._buffer = self._buffer[index + len(self._needle):]
+            self._state = "colon"
+
+        if self._state == "colon":
+            stripped = self._buffer.lstrip()
+            if not stripped:
+                self._buffer = ""
+                return ""
+            if stripped[0] == ':':
+                stripped = stripped[1:].lstrip()
+            if not stripped:
+                self._buffer = ""
+                return ""
+            if stripped[0] != '"':
+                # Not a string value; nothing to stream
+                self.complete = True
+                return ""
+            self._buffer = stripped[1:]
+            self._state = "value"
+
+        out = []
+        text = self._pending_escape + self._buffer
+        self._pending_escape = ""
+        self._buffer = ""
+        i = 0
+        while i < len(text):
+            char = text[i]
+            if char == '"':
+                self.complete = True
+                break
+            if char != '\\':
+                out.append(char)
+                i += 1
+                continue
+            if i + 1 >= len(text):
+                self._pending_escape = text[i:]
+                break
+            code = text[i + 1]
+            if code == 'u':
+                if i + 6 > len(text):
+                    self._pending_escape = text[i:]
+                    break
+                try:
+                    codepoint = int(text[i + 2:i + 6], 16)
+                except ValueError:
+                    codepoint = 0xFFFD
+                # Surrogate pairs need the second half before they can be decoded
+                if 0xD800 <= codepoint < 0xDC00:
+                    if i + 12 > len(text):
+                        self._pending_escape = text[i:]
+                        break
+                    try:
+                        out.append(json.loads('"' + text[i:i + 12] + '"'))
+                    except json.JSONDecodeError:
+                        out.append('\ufffd')
+                    i += 12
+                    continue
+                out.append(chr(codepoint))
+                i += 6
+                continue
+            out.append(_ESCAPES.get(code, code))
+            i += 2
+
+        return "".join(out)
@@ -1,66 +1,36 @@
 import os
-import google.generativeai as genai
-from dotenv import load_dotenv
+import copy
+import asyncio
 import logging
+from app.services.llm_client import generate_text, stream_text
+from app.services.json_stream import JSONArrayStreamParser
 import json
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, AsyncIterator, Tuple
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Load environment variables
-load_dotenv()
+# Maximum number of learning prompts (explanations + sections) in flight per request
+LEARNING_MAX_CONCURRENCY = int(os.getenv("LEARNING_MAX_CONCURRENCY", "8"))
 
-# Initialize model as None
-model = None
+# How wrong answers are explained: "per_item" (one prompt each) or "batched" (one prompt for all)
+LEARNING_EXPLANATION_MODE = os.getenv("LEARNING_EXPLANATION_MODE", "per_item")
 
-def initialize_gemini():
-    global model
-    try:
-        api_key = os.getenv("GEMINI_API_KEY")
-        if not api_key:
-            raise ValueError("GEMINI_API_KEY environment variable is not set")
-        
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-2.0-flash')
-        logger.info("Gemini API initialized successfully")
-    except Exception as e:
-        logger.error(f"Failed to initialize Gemini API: {str(e)}")
-        raise
-
-# Initialize Gemini on module import
-try:
-    initialize_gemini()
-except Exception as e:
-    logger.error(f"Failed to initialize Gemini API during startup: {str(e)}")
-
-async def generate_learning_content(task_description: str, language: str, wrong_answers: List[Dict[str, Any]] = None) -> Dict[str, Any]:
-    """
-    Generate learning content based on the task description and wrong answers.
-    """
-    if not model:
-        try:
-            initialize_gemini()
-        except Exception as e:
-            raise Exception("Failed to initialize Gemini API. Please check your API key.")
+def default_explanation() -> Dict[str, Any]:
+    return {
+        "explanation": "Sorry, we couldn't generate an explanation for this question.",
+        "visual_explanation": {"type": "none", "content": ""},
+        "concept_keywords": []
+    }
 
-    try:
-        logger.info(f"Generating learning content for task: {task_description}")
-        logger.info(f"Number of wrong answers: {len(wrong_answers) if wrong_answers else 0}")
-        
-        # Generate explanations for wrong answers
-        wrong_answer_explanations = []
-        concept_keywords_set = set()
-        
-        if wrong_answers:
-            for wrong in wrong_answers:
-                explanation_prompt = f"""For the following programming question in {language}:
+def build_explanation_prompt(wrong: Dict[str, Any], language: str) -> str:
+    return f"""For the following programming question in {language}:
                 Question: {wrong['question']}
                 {f"Code snippet: {wrong['code_snippet']}" if 'code_snippet' in wrong and wrong['code_snippet'] else ""}
                 Correct answer: {wrong['correct_answer']}
                 User's answer: {wrong['user_answer']}
-                
+
                 Provide a detailed explanation that includes:
                 1. Why the correct answer is right (2-3 sentences)
                 2. What the user might have misunderstood
@@ -70,7 +40,7 @@ async def generate_learning_content(task_description: str, language: str, wrong_
                    - Algorithm steps
                    - Memory/stack operations
                    - Object relationships
-                
+
                 Format the response as JSON:
                 {{
                     "explanation": "Main explanation text",
@@ -80,65 +50,145 @@ async def generate_learning_content(task_description: str, language: str, wrong_
                     }},
                     "concept_keywords": ["keyword1", "keyword2", ...]  # Key concepts to focus on
                 }}
-                
+
                 If no visual explanation is needed, set visual_explanation.type to "none" and content to empty string."""
-                
-                try:
-                    response = await model.generate_content_async(explanation_prompt)
-                    if response and response.text:
-                        try:
-                            # Clean the response text
-                            clean_text = response.text.strip()
-                            if clean_text.startswith("```json"):
-                                clean_text = clean_text[7:]
-                            if clean_text.endswith("```"):
-                                clean_text = clean_text[:-3]
-                            clean_text = clean_text.strip()
-                            
-                            explanation = json.loads(clean_text)
-                            
-                            # Ensure all fields exist
-                            if "explanation" not in explanation:
-                                explanation["explanation"] = "No explanation provided."
-                            
-                            if "visual_explanation" not in explanation:
-                                explanation["visual_explanation"] = {"type": "none", "content": ""}
-                            elif "type" not in explanation["visual_explanation"]:
-                                explanation["visual_explanation"]["type"] = "none"
-                            elif "content" not in explanation["visual_explanation"]:
-                                explanation["visual_explanation"]["content"] = ""
-                            
-                            if "concept_keywords" not in explanation:
-                                explanation["concept_keywords"] = []
-                            
-                            # Add to explanations list
-                            wrong_answer_explanations.append(explanation)
-                            
-                            # Add keywords to set
-                            if explanation["concept_keywords"]:
-                                concept_keywords_set.update(explanation["concept_keywords"])
-                                
-                        except json.JSONDecodeError as e:
-                            logger.error(f"Failed to parse explanation JSON: {response.text}")
-                            logger.error(f"Error: {str(e)}")
-                            # Add a default explanation
-                            wrong_answer_explanations.append({
-                                "explanation": "Sorry, we couldn't generate an explanation for this question.",
-                                "visual_explanation": {"type": "none", "content": ""},
-                                "concept_keywords": []
-                            })
-                except Exception as e:
-                    logger.error(f"Error generating explanation: {str(e)}")
-                    wrong_answer_explanations.append({
-                        "explanation": "Sorry, we couldn't generate an explanation for this question.",
-                        "visual_explanation": {"type": "none", "content": ""},
-                        "concept_keywords": []
-                    })
-
-        # Generate general learning content
-        prompt = f"""Generate comprehensive learning content for the following programming task in {language}:
+
+def normalize_explanation(explanation: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Ensure all fields of an explanation object exist.
+    """
+    if "explanation" not in explanation:
+        explanation["explanation"] = "No explanation provided."
+
+    if "visual_explanation" not in explanation:
+        explanation["visual_explanation"] = {"type": "none", "content": ""}
+    elif "type" not in explanation["visual_explanation"]:
+        explanation["visual_explanation"]["type"] = "none"
+    elif "content" not in explanation["visual_explanation"]:
+        explanation["visual_explanation"]["content"] = ""
+
+    if "concept_keywords" not in explanation:
+        explanation["concept_keywords"] = []
+
+    return explanation
+
+async def explain_wrong_answer(wrong: Dict[str, Any], language: str) -> Dict[str, Any]:
+    """
+    Explain a single wrong answer. Never raises: failures return the default explanation.
+    """
+    try:
+        explanation_text = await generate_text(build_explanation_prompt(wrong, language))
+        if not explanation_text:
+            return default_explanation()
+        try:
+            # Clean the response text
+            clean_text = explanation_text.strip()
+            if clean_text.startswith("```json"):
+                clean_text = clean_text[7:]
+            if clean_text.endswith("```"):
+                clean_text = clean_text[:-3]
+            clean_text = clean_text.strip()
+
+            return normalize_explanation(json.loads(clean_text))
+        except json.JSONDecodeError as e:
+            logger.error(f"Failed to parse explanation JSON: {explanation_text}")
+            logger.error(f"Error: {str(e)}")
+            return default_explanation()
+    except Exception as e:
+        logger.error(f"Error generating explanation: {str(e)}")
+        return default_explanation()
+
+def build_batch_explanation_prompt(wrong_answers: List[Dict[str, Any]], language: str) -> str:
+    questions = []
+    for i, wrong in enumerate(wrong_answers):
+        snippet = f"\n                Code snippet: {wrong['code_snippet']}" if wrong.get('code_snippet') else ""
+        questions.append(f"""
+                [{i}] Question: {wrong['question']}{snippet}
+                Correct answer: {wrong['correct_answer']}
+                User's answer: {wrong['user_answer']}""")
+
+    return f"""For each of the following {len(wrong_answers)} programming questions in {language}, the user picked the wrong answer:
+                {''.join(questions)}
+
+                For EACH question provide a detailed explanation that includes:
+                1. Why the correct answer is right (2-3 sentences)
+                2. What the user might have misunderstood
+                3. A visual explanation if the question involves code execution flow, data structures,
+                   algorithm steps, memory/stack operations or object relationships
+
+                Format the response as a JSON array with exactly {len(wrong_answers)} objects, in the same order as the questions:
+                [
+                    {{
+                        "index": 0,
+                        "explanation": "Main explanation text",
+                        "visual_explanation": {{
+                            "type": "flowchart|diagram|steps|memory|none",
+                            "content": "ASCII art or text-based visualization if needed"
+                        }},
+                        "concept_keywords": ["keyword1", "keyword2", ...]
+                    }},
+                    ...
+                ]
+
+                If no visual explanation is needed, set visual_explanation.type to "none" and content to empty string.
+                Return ONLY the JSON array, no other text, markdown formatting, or backticks."""
+
+def parse_batch_explanations(response_text: str, count: int) -> List[Optional[Dict[str, Any]]]:
+    """
+    Parse a batched explanation reply into a list aligned with the questions.
+    Entries that are missing or malformed are None.
+    """
+    explanations: List[Optional[Dict[str, Any]]] = [None] * count
+    clean_text = response_text.strip().replace('```json', '').replace('```', '').strip()
+    try:
+        items = json.loads(clean_text)
+    except json.JSONDecodeError as e:
+        logger.error(f"Failed to parse batched explanation JSON: {str(e)}")
+        return explanations
+
+    if not isinstance(items, list):
+        logger.error("Batched explanation reply is not a list")
+        return explanations
+
+    for position, item in enumerate(items):
+        if not isinstance(item, dict) or not item.get("explanation"):
+            continue
+        index = item.pop("index", position)
+        if not isinstance(index, int) or not 0 <= index < count or explanations[index] is not None:
+            index = position
+        if 0 <= index < count and explanations[index] is None:
+            explanations[index] = normalize_explanation(item)
+
+    return explanations
+
+async def explain_wrong_answers_batched(wrong_answers: List[Dict[str, Any]], language: str, semaphore: Optional[asyncio.Semaphore] = None) -> List[Dict[str, Any]]:
+    """
+    Explain all wrong answers with a single prompt. Entries missing from the reply fall
+    back to the per-question prompt.
+    """
+    if not wrong_answers:
+        return []
+
+    try:
+        response_text = await limited(semaphore, generate_text(build_batch_explanation_prompt(wrong_answers, language)))
+        explanations = parse_batch_explanations(response_text or "", len(wrong_answers))
+    except Exception as e:
+        logger.error(f"Error generating batched explanations: {str(e)}")
+        explanations = [None] * len(wrong_answers)
+
+    missing = [i for i, explanation in enumerate(explanations) if explanation is None]
+    if missing:
+        logger.info(f"Falling back to per-question explanations for {len(missing)} of {len(wrong_answers)} questions")
+        fallbacks = await gather_limited([explain_wrong_answer(wrong_answers[i], language) for i in missing], semaphore=semaphore)
+        for i, explanation in zip(missing, fallbacks):
+            explanations[i] = default_explanation() if isinstance(explanation, BaseException) else explanation
+
+    return explanations
+
+def build_sections_prompt(task_description: str, language: str) -> str:
+    return f"""Generate comprehensive learning content for the following programming task in {language}:
         Task: {task_description}
-        
+
         Requirements:
         1. Break down the content into clear sections:
            - Core Concepts
@@ -160,76 +210,227 @@ async def generate_learning_content(task_description: str, language: str, wrong_
                 ...
             ]
         }}
-        
-        Important: 
+
+        Important:
         - Return ONLY the JSON object, no other text, markdown formatting, or backticks
         - The 'code' field should be a string containing the code example
         - If no code example is needed for a section, omit the 'code' field entirely
         - Make sure the JSON is properly formatted and valid"""
 
-        try:
-            response = await model.generate_content_async(prompt)
-            
-            if not response or not response.text:
-                raise ValueError("No response from AI model")
-            
-            # Clean the response text to ensure it's valid JSON
-            response_text = response.text.strip()
-            # Remove any markdown code block indicators
-            response_text = response_text.replace('```json', '').replace('```', '')
-            # Remove any leading/trailing whitespace
-            response_text = response_text.strip()
-            
-            # Parse the JSON response
-            content = json.loads(response_text)
-            
-            # Validate the structure
-            if not isinstance(content, dict):
-                raise ValueError("Response is not a dictionary")
-            
-            if "sections" not in content:
-                content["sections"] = []
-            
-            # Validate each section has the required fields
-            for i, section in enumerate(content["sections"]):
-                if "title" not in section:
-                    section["title"] = f"Section {i+1}"
-                if "content" not in section:
-                    section["content"] = "No content provided."
-                
-                # Convert all fields to strings
-                section["title"] = str(section["title"])
-                section["content"] = str(section["content"])
-                
-                if "code" in section:
-                    if section["code"] is None:
-                        del section["code"]
-                    else:
-                        section["code"] = str(section["code"])
-            
-            # Add wrong answer explanations if available
-            if wrong_answer_explanations:
-                content["wrong_answers"] = wrong_answer_explanations
-                
-                # Add concept keywords
-                content["concept_keywords"] = list(concept_keywords_set)
-            else:
-                content["wrong_answers"] = []
-                content["concept_keywords"] = []
-            
-            # Add a flag to indicate that boilerplate code should be used
-            content["use_boilerplate"] = True
-            
-            logger.info("Successfully generated learning content")
-            return content
-            
-        except json.JSONDecodeError as e:
-            logger.error(f"Error parsing learning content JSON: {str(e)}")
-            raise ValueError(f"Failed to parse learning content: Invalid JSON format - {str(e)}")
-        except ValueError as e:
-            logger.error(f"Error validating learning content format: {str(e)}")
-            raise ValueError(f"Failed to parse learning content: {str(e)}")
-    
+def normalize_section(section: Dict[str, Any], index: int) -> Dict[str, Any]:
+    """
+    Ensure a section has the required fields, all as strings.
+    """
+    if "title" not in section:
+        section["title"] = f"Section {index+1}"
+    if "content" not in section:
+        section["content"] = "No content provided."
+
+    # Convert all fields to strings
+    section["title"] = str(section["title"])
+    section["content"] = str(section["content"])
+
+    if "code" in section:
+        if section["code"] is None:
+            del section["code"]
+        else:
+            section["code"] = str(section["code"])
+
+    return section
+
+def parse_sections_response(response_text: str) -> Dict[str, Any]:
+    """
+    Parse the sections reply into {"sections": [...]}, normalizing every section.
+    """
+    try:
+        if not response_text:
+            raise ValueError("No response from AI model")
+
+        # Clean the response text to ensure it's valid JSON
+        response_text = response_text.strip()
+        # Remove any markdown code block indicators
+        response_text = response_text.replace('```json', '').replace('```', '')
+        # Remove any leading/trailing whitespace
+        response_text = response_text.strip()
+
+        # Parse the JSON response
+        content = json.loads(response_text)
+
+        # Validate the structure
+        if not isinstance(content, dict):
+            raise ValueError("Response is not a dictionary")
+
+        if "sections" not in content:
+            content["sections"] = []
+
+        # Validate each section has the required fields
+        for i, section in enumerate(content["sections"]):
+            normalize_section(section, i)
+
+        return content
+
+    except json.JSONDecodeError as e:
+        logger.error(f"Error parsing learning content JSON: {str(e)}")
+        raise ValueError(f"Failed to parse learning content: Invalid JSON format - {str(e)}")
+    except ValueError as e:
+        logger.error(f"Error validating learning content format: {str(e)}")
+        raise ValueError(f"Failed to parse learning content: {str(e)}")
+
+async def generate_learning_sections(task_description: str, language: str) -> Dict[str, Any]:
+    """
+    Generate the general learning sections for a task.
+    """
+    response_text = await generate_text(build_sections_prompt(task_description, language))
+    return parse_sections_response(response_text)
+
+def collect_concept_keywords(explanations: List[Dict[str, Any]]) -> List[str]:
+    """
+    Merge the concept keywords of all explanations, keeping first-seen order.
+    """
+    keywords = {}
+    for explanation in explanations:
+        for keyword in explanation.get("concept_keywords") or []:
+            keywords.setdefault(keyword, None)
+    return list(keywords)
+
+def assemble_learning_content(content: Dict[str, Any], wrong_answer_explanations: List[Dict[str, Any]]) -> Dict[str, Any]:
+    # Add wrong answer explanations if available
+    if wrong_answer_explanations:
+        content["wrong_answers"] = wrong_answer_explanations
+
+        # Add concept keywords
+        content["concept_keywords"] = collect_concept_keywords(wrong_answer_explanations)
+    else:
+        content["wrong_answers"] = []
+        content["concept_keywords"] = []
+
+    # Add a flag to indicate that boilerplate code should be used
+    content["use_boilerplate"] = True
+
+    return content
+
+async def limited(semaphore: Optional[asyncio.Semaphore], coroutine) -> Any:
+    """
+    Await the coroutine while holding a slot of the semaphore, if there is one.
+    """
+    if semaphore is None:
+        return await coroutine
+    async with semaphore:
+        return await coroutine
+
+async def gather_limited(coroutines: List, limit: Optional[int] = None, semaphore: Optional[asyncio.Semaphore] = None) -> List[Any]:
+    """
+    Run the coroutines concurrently with at most `limit` running at once, or within the
+    slots of a `semaphore` shared with other prompts of the same request.
+    Results are returned in the original order.
+    """
+    semaphore = semaphore or asyncio.Semaphore(limit or LEARNING_MAX_CONCURRENCY)
+    return await asyncio.gather(*(limited(semaphore, coroutine) for coroutine in coroutines), return_exceptions=True)
+
+async def explain_wrong_answers(wrong_answers: List[Dict[str, Any]], language: str, explanation_mode: Optional[str] = None, semaphore: Optional[asyncio.Semaphore] = None) -> List[Dict[str, Any]]:
+    """
+    Explain the wrong answers in the configured mode, in the original order.
+    """
+    explanation_mode = explanation_mode or LEARNING_EXPLANATION_MODE
+    if explanation_mode == "batched" and wrong_answers and len(wrong_answers) > 1:
+        return await explain_wrong_answers_batched(wrong_answers, language, semaphore)
+
+    results = await gather_limited([explain_wrong_answer(wrong, language) for wrong in wrong_answers or []], semaphore=semaphore)
+    return [
+        default_explanation() if isinstance(explanation, BaseException) else explanation
+        for explanation in results
+    ]
+
+async def provided(value: Any) -> Any:
+    """
+    Wrap an already available part so it can be gathered with the generated ones.
+    """
+    return value
+
+async def generate_learning_content(task_description: str, language: str, wrong_answers: List[Dict[str, Any]] = None, explanation_mode: Optional[str] = None, sections: Optional[Dict[str, Any]] = None, explanations: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """
+    Generate learning content based on the task description and wrong answers.
+
+    The explanation prompts and the sections prompt are issued concurrently, at most
+    LEARNING_MAX_CONCURRENCY of them at once. In "batched" mode all wrong answers are
+    explained by a single prompt. Pre-generated `sections`
+    (content catalog, prefetch) skip the sections prompt and prefetched `explanations`
+    skip the explanation prompts.
+    """
+    try:
+        explanation_mode = explanation_mode or LEARNING_EXPLANATION_MODE
+        logger.info(f"Generating learning content for task: {task_description}")
+        logger.info(f"Number of wrong answers: {len(wrong_answers) if wrong_answers else 0} ({explanation_mode} mode)")
+
+        semaphore = asyncio.Semaphore(LEARNING_MAX_CONCURRENCY)
+        content, wrong_answer_explanations = await asyncio.gather(
+            provided(copy.deepcopy(sections)) if sections is not None else limited(semaphore, generate_learning_sections(task_description, language)),
+            provided(explanations) if explanations is not None else explain_wrong_answers(wrong_answers or [], language, explanation_mode, semaphore)
+        )
+
+        content = assemble_learning_content(content, wrong_answer_explanations)
+
+        logger.info("Successfully generated learning content")
+        return content
+
     except Exception as e:
         logger.error(f"Error generating learning content: {str(e)}")
-        raise Exception(f"Failed to generate learning content: {str(e)}") 
\ No newline at end of file
+        raise Exception(f"Failed to generate learning content: {str(e)}")
+
+async def stream_learning_sections(task_description: str, language: str) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Yield the learning sections as soon as the model has finished writing each of them.
+    """
+    section_count = 0
+    parser = JSONArrayStreamParser()
+    reply = []
+    async for chunk in stream_text(build_sections_prompt(task_description, language)):
+        reply.append(chunk)
+        for section in parser.feed(chunk):
+            if not isinstance(section, dict):
+                continue
+            yield normalize_section(section, section_count)
+            section_count += 1
+
+    if not section_count:
+        # The reply could not be parsed incrementally; fall back to the full parser
+        for section in parse_sections_response("".join(reply))["sections"]:
+            yield section
+
+async def stream_learning_content(task_description: str, language: str, wrong_answers: List[Dict[str, Any]] = None, explanation_mode: Optional[str] = None, sections: Optional[Dict[str, Any]] = None, explanations: Optional[List[Dict[str, Any]]] = None) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    Stream learning content as (event, data) pairs:
+    - "section" for every section as soon as the model has finished writing it
+    - "explanation" for every wrong-answer explanation, in the original order
+    - "done" with the full content, identical in shape to generate_learning_content
+    Pre-generated `sections` and `explanations` are replayed instead of prompting the model.
+    """
+    logger.info(f"Streaming learning content for task: {task_description}")
+    semaphore = asyncio.Semaphore(LEARNING_MAX_CONCURRENCY)
+    if explanations is not None:
+        explanations_task = asyncio.ensure_future(provided(explanations))
+    else:
+        explanations_task = asyncio.ensure_future(explain_wrong_answers(wrong_answers or [], language, explanation_mode, semaphore))
+    try:
+        streamed_sections = []
+        if sections is not None:
+            for section in copy.deepcopy(sections.get("sections", [])):
+                streamed_sections.append(section)
+                yield "section", {"index": len(streamed_sections) - 1, "section": section}
+        else:
+            # The sections stream holds one of the request's prompt slots until it ends
+            async with semaphore:
+                async for section in stream_learning_sections(task_description, language):
+                    streamed_sections.append(section)
+                    yield "section", {"index": len(streamed_sections) - 1, "section": section}
+
+        wrong_answer_explanations = await explanations_task
+        for i, explanation in enumerate(wrong_answer_explanations):
+            yield "explanation", {"index": i, "explanation": explanation}
+
+        content = assemble_learning_content({"sections": streamed_sections}, wrong_answer_explanations)
+        logger.info("Successfully streamed learning content")
+        yield "done", {"content": content}
+    finally:
+        if not explanations_task.done():
+            explanations_task.cancel()
@@ -0,0 +1,286 @@
+import os
+import asyncio
+import hashlib
+import logging
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+from dotenv import load_dotenv
+from app.services.single_flight import SingleFlight
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+# LLM client configuration
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")
+GEMINI_MODEL_NAME = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+# Share one model call between concurrent requests with an identical prompt
+LLM_COALESCE = os.getenv("LLM_COALESCE", "1") == "1"
+
+
+class LLMBackend:
+    """
+    Interface for the text generation backends used by the services.
+    """
+    name = "base"
+
+    async def generate(self, prompt: str) -> str:
+        raise NotImplementedError
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        """
+        Yield the reply in chunks as they are produced. Backends without native streaming
+        yield the whole reply at once.
+        """
+        text = await self.generate(prompt)
+        if text:
+            yield text
+
+
+class GeminiBackend(LLMBackend):
+    """
+    Google Gemini backend. The SDK is configured once and the model object is reused
+    for every call.
+    """
+    name = "gemini"
+
+    def __init__(self, model_name: str = GEMINI_MODEL_NAME, api_key: Optional[str] = None):
+        import google.generativeai as genai
+
+        api_key = api_key or os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            raise ValueError("GEMINI_API_KEY environment variable is not set")
+
+        genai.configure(api_key=api_key)
+        self.model_name = model_name
+        self.model = genai.GenerativeModel(model_name)
+        logger.info(f"Gemini API initialized successfully ({model_name})")
+
+    async def generate(self, prompt: str) -> str:
+        response = await self.model.generate_content_async(prompt)
+        if not response or not response.text:
+            return ""
+        return response.text
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        response = await self.model.generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            try:
+                text = chunk.text
+            except ValueError:
+                # Chunks without text parts (e.g. safety metadata only)
+                continue
+            if text:
+                yield text
+
+
+class StubBackend(LLMBackend):
+    """
+    Deterministic in-process backend for local development and load testing.
+    The same prompt always produces the same text and no network call is made.
+    """
+    name = "stub"
+
+    def __init__(self, responder: Optional[Callable[[str], str]] = None, latency: float = 0.0, chunk_size: int = 64):
+        self.responder = responder
+        self.latency = latency
+        self.chunk_size = chunk_size
+
+    def _reply(self, prompt: str) -> str:
+        if self.responder:
+            return self.responder(prompt)
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:12]
+        return f"Stub response {digest}"
+
+    async def generate(self, prompt: str) -> str:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._reply(prompt)
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        text = self._reply(prompt)
+        for start in range(0, len(text), self.chunk_size):
+            if self.latency:
+                await asyncio.sleep(self.latency / 10)
+            yield text[start:start + self.chunk_size]
+
+
+BACKENDS = {
+    "gemini": GeminiBackend,
+    "stub": StubBackend,
+}
+
+
+class LLMTimeoutError(Exception):
+    pass
+
+
+class LLMClient:
+    """
+    Long-lived client shared by all services. Caps the number of in-flight model calls
+    and applies a timeout to each of them.
+    """
+
+    def __init__(self, backend: LLMBackend, max_concurrency: int = LLM_MAX_CONCURRENCY, timeout: float = LLM_TIMEOUT_SECONDS, coalesce: bool = LLM_COALESCE):
+        self.backend = backend
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.coalesce = coalesce
+        self._single_flight = SingleFlight("llm")
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._in_flight = 0
+        self._waiting = 0
+        self._stats = {
+            "calls": 0,
+            "failures": 0,
+            "timeouts": 0,
+        }
+
+    async def generate(self, prompt: str, timeout: Optional[float] = None) -> str:
+        """
+        Generate text for the prompt through the configured backend. Concurrent calls with
+        the same prompt fingerprint share a single backend call.
+
+        A shared call runs with the longer of the first caller's timeout and the client
+        timeout; an explicit `timeout` still bounds this caller's own wait. A caller that
+        joins with a longer timeout than the shared call's is limited to the shared call's.
+        """
+        if not self.coalesce:
+            return await self._generate(prompt, timeout)
+        fingerprint = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        shared_timeout = self.timeout if timeout is None else max(timeout, self.timeout)
+        try:
+            return await self._single_flight.do(fingerprint, lambda: self._generate(prompt, shared_timeout), timeout=timeout)
+        except asyncio.TimeoutError:
+            # This caller's own timeout; the shared call keeps running for the other waiters
+            self._stats["timeouts"] += 1
+            logger.error(f"LLM call timed out after {timeout}s")
+            raise LLMTimeoutError(f"LLM call timed out after {timeout}s")
+
+    async def _generate(self, prompt: str, timeout: Optional[float] = None) -> str:
+        timeout = self.timeout if timeout is None else timeout
+        self._waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self._waiting -= 1
+
+        self._in_flight += 1
+        self._stats["calls"] += 1
+        try:
+            return await asyncio.wait_for(self.backend.generate(prompt), timeout=timeout)
+        except asyncio.TimeoutError:
+            self._stats["timeouts"] += 1
+            logger.error(f"LLM call timed out after {timeout}s")
+            raise LLMTimeoutError(f"LLM call timed out after {timeout}s")
+        except Exception:
+            self._stats["failures"] += 1
+            raise
+        finally:
+            self._in_flight -= 1
+            self._semaphore.release()
+
+    async def stream(self, prompt: str, timeout: Optional[float] = None) -> AsyncIterator[str]:
+        """
+        Stream the reply for the prompt. The concurrency slot is held until the stream is
+        exhausted or closed, and the timeout applies to the whole stream.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        self._waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self._waiting -= 1
+
+        self._in_flight += 1
+        self._stats["calls"] += 1
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        chunks = self.backend.stream(prompt).__aiter__()
+        try:
+            while True:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError()
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), timeout=remaining)
+                except StopAsyncIteration:
+                    break
+                yield chunk
+        except asyncio.TimeoutError:
+            self._stats["timeouts"] += 1
+            logger.error(f"LLM stream timed out after {timeout}s")
+            raise LLMTimeoutError(f"LLM call timed out after {timeout}s")
+        except Exception:
+            self._stats["failures"] += 1
+            raise
+        finally:
+            aclose = getattr(chunks, "aclose", None)
+            if aclose:
+                try:
+                    await aclose()
+                except Exception:
+                    pass
+            self._in_flight -= 1
+            self._semaphore.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend.name,
+            "max_concurrency": self.max_concurrency,
+            "timeout": self.timeout,
+            "in_flight": self._in_flight,
+            "waiting": self._waiting,
+            **self._stats,
+            "single_flight": self._single_flight.stats(),
+        }
+
+
+_client: Optional[LLMClient] = None
+
+
+def create_backend(name: str = LLM_BACKEND) -> LLMBackend:
+    backend_cls = BACKENDS.get(name)
+    if not backend_cls:
+        raise ValueError(f"Unknown LLM backend: {name}")
+    return backend_cls()
+
+
+def get_llm_client() -> LLMClient:
+    """
+    Return the process-wide LLM client, creating it on first use.
+    """
+    global _client
+    if _client is None:
+        try:
+            _client = LLMClient(create_backend())
+        except Exception as e:
+            logger.error(f"Failed to initialize LLM backend: {str(e)}")
+            raise Exception("Failed to initialize Gemini API. Please check your API key.")
+    return _client
+
+
+def set_llm_client(client: Optional[LLMClient]) -> None:
+    """
+    Replace the process-wide client, e.g. with a StubBackend in development.
+    """
+    global _client
+    _client = client
+
+
+async def generate_text(prompt: str, timeout: Optional[float] = None) -> str:
+    """
+    Shortcut used by the services: generate text with the shared client.
+    """
+    return await get_llm_client().generate(prompt, timeout=timeout)
+
+
+def stream_text(prompt: str, timeout: Optional[float] = None) -> AsyncIterator[str]:
+    """
+    Shortcut used by the services: stream text with the shared client.
+    """
+    return get_llm_client().stream(prompt, timeout=timeout)
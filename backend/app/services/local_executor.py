@@ -0,0 +1,1328 @@
+import os
+import sys
+import json
+import time
+import shutil
+import signal
+import codecs
+import hashlib
+import asyncio
+import logging
+import platform
+import tempfile
+import functools
+import subprocess
+from typing import Any, Awaitable, Callable, Collection, Dict, List, Optional, Set, Tuple
+from app.services.cache import make_cache_key
+from app.services.compile_cache import ArtifactCache, remove_trees
+from app.services.single_flight import SingleFlight
+from app.services.scheduler import ClientKey
+from app.services.sqlite_store import DATA_DIR
+
+try:
+    import pwd
+    import resource
+except ImportError:  # Windows: no rlimits, the wall-clock limit still applies
+    pwd = None
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Local execution configuration
+LOCAL_EXEC_POOL_SIZE = int(os.getenv("LOCAL_EXEC_POOL_SIZE", "2"))
+LOCAL_EXEC_MAX_CONCURRENCY = int(os.getenv("LOCAL_EXEC_MAX_CONCURRENCY", str(os.cpu_count() or 2)))
+LOCAL_EXEC_CPU_SECONDS = int(os.getenv("LOCAL_EXEC_CPU_SECONDS", "5"))
+LOCAL_EXEC_WALL_SECONDS = float(os.getenv("LOCAL_EXEC_WALL_SECONDS", "10"))
+LOCAL_EXEC_MEMORY_MB = int(os.getenv("LOCAL_EXEC_MEMORY_MB", "256"))
+LOCAL_EXEC_MAX_OUTPUT_BYTES = int(os.getenv("LOCAL_EXEC_MAX_OUTPUT_BYTES", str(64 * 1024)))
+LOCAL_EXEC_MAX_FILE_BYTES = int(os.getenv("LOCAL_EXEC_MAX_FILE_BYTES", str(10 * 1024 * 1024)))
+# Processes and threads a program may start on top of those its account already runs
+# (RLIMIT_NPROC counts per user, so this contains fork bombs rather than sizing them exactly)
+LOCAL_EXEC_MAX_PROCESSES = int(os.getenv("LOCAL_EXEC_MAX_PROCESSES", "128"))
+# Range of otherwise unused uids ("first-last") that programs and compilers run as, one
+# uid per worker or build (the server must run as root to switch to them). Every process
+# a program starts keeps its uid, even after leaving the worker's session, so a run is
+# ended by killing everything its uid owns. Firewall the range (iptables owner match)
+# to take network access away as well.
+LOCAL_EXEC_UIDS = os.getenv("LOCAL_EXEC_UIDS")
+LOCAL_EXEC_GID = int(os.getenv("LOCAL_EXEC_GID", "65534"))
+# Development only: without LOCAL_EXEC_UIDS the local executor refuses to start, unless
+# this allows it to run programs as the server's own user (they can read its files)
+LOCAL_EXEC_ALLOW_UNISOLATED = os.getenv("LOCAL_EXEC_ALLOW_UNISOLATED", "0") == "1"
+# Rounds of SIGKILL sent to a uid's processes while forks in flight keep adding new ones
+LOCAL_EXEC_KILL_ROUNDS = 100
+# Interpreter for Python programs and the launcher of compiled ones; it must be
+# executable by the LOCAL_EXEC_UIDS (a virtualenv under the server's home often is not)
+LOCAL_EXEC_PYTHON = os.getenv("LOCAL_EXEC_PYTHON", sys.executable)
+# Scratch directories live on tmpfs when available
+LOCAL_EXEC_SCRATCH_DIR = os.getenv(
+    "LOCAL_EXEC_SCRATCH_DIR",
+    "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(),
+)
+
+# Interactive (streamed) runs wait for user input, so they get a longer wall clock, a
+# cap on the bytes streamed rather than buffered, and their own session limit
+LOCAL_EXEC_INTERACTIVE_WALL_SECONDS = float(os.getenv("LOCAL_EXEC_INTERACTIVE_WALL_SECONDS", "300"))
+LOCAL_EXEC_INTERACTIVE_MAX_OUTPUT_BYTES = int(os.getenv("LOCAL_EXEC_INTERACTIVE_MAX_OUTPUT_BYTES", str(1024 * 1024)))
+LOCAL_EXEC_INTERACTIVE_MAX_SESSIONS = int(os.getenv("LOCAL_EXEC_INTERACTIVE_MAX_SESSIONS", "16"))
+# Interactive runs one client ID, and one client address, may have open at once
+LOCAL_EXEC_INTERACTIVE_MAX_SESSIONS_PER_CLIENT = int(os.getenv("LOCAL_EXEC_INTERACTIVE_MAX_SESSIONS_PER_CLIENT", "2"))
+LOCAL_EXEC_INTERACTIVE_MAX_SESSIONS_PER_ADDRESS = int(os.getenv("LOCAL_EXEC_INTERACTIVE_MAX_SESSIONS_PER_ADDRESS", "8"))
+
+# Put on an interactive run's stdin queue to kill the program
+STOP_PROGRAM = object()
+
+# Compiled languages: build limits and the on-disk cache of built artifacts
+LOCAL_COMPILE_CPU_SECONDS = int(os.getenv("LOCAL_COMPILE_CPU_SECONDS", "30"))
+LOCAL_COMPILE_WALL_SECONDS = float(os.getenv("LOCAL_COMPILE_WALL_SECONDS", "60"))
+LOCAL_COMPILE_CACHE_DIR = os.getenv("LOCAL_COMPILE_CACHE_DIR", os.path.join(DATA_DIR, "compile_cache"))
+LOCAL_COMPILE_CACHE_MAX_BYTES = int(os.getenv("LOCAL_COMPILE_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+# Bootstraps run by the pre-warmed workers. A worker blocks until it receives a job on
+# stdin: a line with the source length, the source, a JSON line of arguments (a list, or
+# {"args": [...], "interactive": true} for streamed runs), then the program's own stdin. On exit it reports its CPU time (ms, excluding start-up) and peak
+# memory (bytes) as JSON on the file descriptor named by EXEC_STATS_FD.
+PYTHON_BOOTSTRAP = r"""
+import os, sys, json, atexit, resource, traceback
+stats_fd = int(os.environ.pop("EXEC_STATS_FD", "-1"))
+size = int(sys.stdin.buffer.readline())
+baseline = resource.getrusage(resource.RUSAGE_SELF)
+def peak_memory(usage):
+    # ru_maxrss survives exec (it would report the forking server); VmHWM does not
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return usage.ru_maxrss * 1024
+def report():
+    try:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        cpu = (usage.ru_utime + usage.ru_stime) - (baseline.ru_utime + baseline.ru_stime)
+        os.write(stats_fd, json.dumps({"cpu_time": cpu * 1000, "memory": peak_memory(usage)}).encode())
+    except Exception:
+        pass
+atexit.register(report)
+source = sys.stdin.buffer.read(size).decode("utf-8")
+options = json.loads(sys.stdin.buffer.readline() or "[]")
+if isinstance(options, dict):
+    if options.get("interactive"):
+        # Output is streamed to the client as it is printed
+        sys.stdout.reconfigure(line_buffering=True)
+    options = options.get("args", [])
+sys.argv = ["main.py"] + options
+# Keep a copy in the scratch directory so tracebacks can show the source lines
+with open("main.py", "w", encoding="utf-8") as f:
+    f.write(source)
+try:
+    code = compile(source, "main.py", "exec")
+    exec(code, {"__name__": "__main__", "__file__": "main.py", "__builtins__": __builtins__})
+except SystemExit:
+    raise
+except BaseException as e:
+    tb = e.__traceback__.tb_next if not isinstance(e, SyntaxError) else None
+    traceback.print_exception(type(e), e, tb)
+    sys.exit(1)
+"""
+
+JAVASCRIPT_BOOTSTRAP = r"""
+const fs = require('fs');
+const path = require('path');
+const Module = require('module');
+function readLine() {
+  const bytes = [];
+  const one = Buffer.alloc(1);
+  while (fs.readSync(0, one, 0, 1, null) === 1 && one[0] !== 10) bytes.push(one[0]);
+  return Buffer.from(bytes).toString('utf8');
+}
+function readExactly(size) {
+  const buffer = Buffer.alloc(size);
+  let offset = 0;
+  while (offset < size) {
+    const read = fs.readSync(0, buffer, offset, size - offset, null);
+    if (read === 0) break;
+    offset += read;
+  }
+  return buffer.toString('utf8', 0, offset);
+}
+const statsFd = parseInt(process.env.EXEC_STATS_FD || '-1', 10);
+delete process.env.EXEC_STATS_FD;
+const size = parseInt(readLine(), 10);
+const baseline = process.cpuUsage();
+function peakMemory() {
+  try {
+    const match = /VmHWM:\s+(\d+)/.exec(fs.readFileSync('/proc/self/status', 'utf8'));
+    if (match) return parseInt(match[1], 10) * 1024;
+  } catch (e) {}
+  return process.resourceUsage().maxRSS * 1024;
+}
+process.on('exit', () => {
+  try {
+    const cpu = process.cpuUsage(baseline);
+    fs.writeSync(statsFd, JSON.stringify({cpu_time: (cpu.user + cpu.system) / 1000, memory: peakMemory()}));
+  } catch (e) {}
+});
+const source = readExactly(size);
+const options = JSON.parse(readLine() || '[]');
+const args = Array.isArray(options) ? options : (options.args || []);
+const filename = path.join(process.cwd(), 'main.js');
+process.argv = [process.argv[0], filename, ...args];
+const main = new Module(filename, null);
+main.filename = filename;
+main.paths = Module._nodeModulePaths(process.cwd());
+require.main = main;
+main._compile(source, filename);
+"""
+
+# Compiled programs are started by a launcher worker: the job "source" is a JSON object
+# with the argv of the built program. The header is read unbuffered so the program
+# inherits stdin positioned at its own input; the launcher reports the program's usage
+# and exits the way the program did.
+LAUNCHER_BOOTSTRAP = r"""
+import os, sys, json, signal
+stats_fd = int(os.environ.pop("EXEC_STATS_FD", "-1"))
+def read_line():
+    data = bytearray()
+    while True:
+        byte = os.read(0, 1)
+        if not byte or byte == b"\n":
+            return bytes(data)
+        data += byte
+def read_exactly(size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = os.read(0, size - len(data))
+        if not chunk:
+            break
+        data += chunk
+    return bytes(data)
+size = int(read_line())
+job = json.loads(read_exactly(size))
+args = json.loads(read_line() or b"[]")
+if isinstance(args, dict):
+    args = args.get("args", [])
+pid = os.fork()
+if pid == 0:
+    os.close(stats_fd)
+    try:
+        os.execv(job["argv"][0], job["argv"] + args)
+    except OSError as e:
+        os.write(2, f"Failed to start program: {e}\n".encode())
+    os._exit(127)
+_, status, usage = os.wait4(pid, 0)
+try:
+    os.write(stats_fd, json.dumps({"cpu_time": (usage.ru_utime + usage.ru_stime) * 1000, "memory": usage.ru_maxrss * 1024}).encode())
+except Exception:
+    pass
+if os.WIFSIGNALED(status):
+    signal.signal(os.WTERMSIG(status), signal.SIG_DFL)
+    os.kill(os.getpid(), os.WTERMSIG(status))
+os._exit(os.waitstatus_to_exitcode(status))
+"""
+
+
+class LanguageSpec:
+    """
+    How to start a pre-warmed worker for one language.
+    """
+
+    def __init__(self, name: str, command: List[str], version: str, address_space_overhead_mb: int = 0):
+        self.name = name
+        self.command = command
+        self.version = version
+        # Runtimes that reserve virtual memory up front (V8) need extra address space
+        self.address_space_overhead_mb = address_space_overhead_mb
+
+
+class CompilerSpec:
+    """
+    How to build and start one compiled language. Commands are templates: {src} is the
+    source file and {out} the artifact directory.
+    """
+
+    def __init__(self, name: str, source_file: str, compile_command: List[str], run_command: List[str], version: str, env: Optional[Dict[str, str]] = None, address_space_overhead_mb: int = 0):
+        self.name = name
+        self.source_file = source_file
+        self.compile_command = compile_command
+        self.run_command = run_command
+        self.version = version
+        self.env = env or {}
+        self.address_space_overhead_mb = address_space_overhead_mb
+
+    def cache_key(self, code: str) -> str:
+        """
+        Artifacts are reused for the same source, toolchain version and flags.
+        """
+        return make_cache_key(hashlib.sha256(code.encode("utf-8")).hexdigest(), self.name, self.version, self.compile_command)
+
+    def compile_argv(self, source_path: str, out_dir: str) -> List[str]:
+        return [part.replace("{src}", source_path).replace("{out}", out_dir) for part in self.compile_command]
+
+    def run_argv(self, out_dir: str) -> List[str]:
+        return [part.replace("{out}", out_dir) for part in self.run_command]
+
+
+def first_output_line(command: List[str]) -> str:
+    try:
+        output = subprocess.run(command, capture_output=True, text=True, timeout=10)
+        lines = (output.stdout or output.stderr).strip().splitlines()
+        return lines[0] if lines else "unknown"
+    except Exception:
+        return "unknown"
+
+
+def detect_compilers(cache_dir: str = LOCAL_COMPILE_CACHE_DIR) -> Dict[str, CompilerSpec]:
+    """
+    Compiled languages whose toolchain is installed.
+    """
+    compilers = {}
+    gxx = shutil.which("g++")
+    if gxx:
+        compilers["cpp"] = CompilerSpec(
+            "cpp", "main.cpp",
+            [gxx, "-std=c++17", "-O2", "-pipe", "-o", "{out}/main", "{src}"],
+            ["{out}/main"],
+            first_output_line([gxx, "--version"]),
+        )
+    go = shutil.which("go")
+    if go:
+        compilers["go"] = CompilerSpec(
+            "go", "main.go",
+            [go, "build", "-o", "{out}/main", "{src}"],
+            ["{out}/main"],
+            first_output_line([go, "version"]),
+            # The toolchain's own build cache keeps the standard library compiled
+            env={"GOCACHE": os.path.join(cache_dir, ".gocache"), "GOPATH": os.path.join(cache_dir, ".gopath"), "CGO_ENABLED": "0"},
+            # The Go runtime reserves its heap address space up front
+            address_space_overhead_mb=1024,
+        )
+    rustc = shutil.which("rustc")
+    if rustc:
+        # A rustup proxy needs the user's rustup configuration; use the toolchain binary itself
+        sysroot = first_output_line([rustc, "--print", "sysroot"])
+        if os.path.isfile(os.path.join(sysroot, "bin", "rustc")):
+            rustc = os.path.join(sysroot, "bin", "rustc")
+        compilers["rust"] = CompilerSpec(
+            "rust", "main.rs",
+            [rustc, "-O", "--edition", "2021", "-o", "{out}/main", "{src}"],
+            ["{out}/main"],
+            first_output_line([rustc, "--version"]),
+        )
+    javac, java = shutil.which("javac"), shutil.which("java")
+    if javac and java:
+        compilers["java"] = CompilerSpec(
+            "java", "Main.java",
+            [javac, "-encoding", "UTF-8", "-d", "{out}", "{src}"],
+            [java, f"-Xmx{LOCAL_EXEC_MEMORY_MB}m", "-XX:+UseSerialGC", "-cp", "{out}", "Main"],
+            first_output_line([javac, "-version"]),
+            address_space_overhead_mb=2048,
+        )
+    mcs, mono = shutil.which("mcs"), shutil.which("mono")
+    if mcs and mono:
+        compilers["csharp"] = CompilerSpec(
+            "csharp", "main.cs",
+            [mcs, "-out:{out}/main.exe", "{src}"],
+            [mono, "{out}/main.exe"],
+            first_output_line([mcs, "--version"]),
+            address_space_overhead_mb=1024,
+        )
+    swiftc = shutil.which("swiftc")
+    if swiftc:
+        compilers["swift"] = CompilerSpec(
+            "swift", "main.swift",
+            [swiftc, "-O", "-o", "{out}/main", "{src}"],
+            ["{out}/main"],
+            first_output_line([swiftc, "--version"]),
+        )
+    return compilers
+
+
+def detect_languages(compilers: Optional[Dict[str, CompilerSpec]] = None) -> Dict[str, LanguageSpec]:
+    if LOCAL_EXEC_PYTHON == sys.executable:
+        python_version = platform.python_version()
+    else:
+        python_version = first_output_line([LOCAL_EXEC_PYTHON, "--version"]).replace("Python ", "")
+    languages = {
+        "python": LanguageSpec(
+            "python",
+            # Not -I, which would ignore PYTHONHASHSEED; the environment is ours anyway
+            [LOCAL_EXEC_PYTHON, "-s", "-S", "-c", PYTHON_BOOTSTRAP],
+            python_version,
+        ),
+    }
+    node = shutil.which("node")
+    if node:
+        try:
+            node_version = subprocess.run([node, "--version"], capture_output=True, text=True, timeout=5).stdout.strip().lstrip("v")
+        except Exception:
+            node_version = "unknown"
+        languages["javascript"] = LanguageSpec(
+            "javascript",
+            [node, f"--max-old-space-size={LOCAL_EXEC_MEMORY_MB}", "-e", JAVASCRIPT_BOOTSTRAP],
+            node_version,
+            address_space_overhead_mb=1024,
+        )
+    for name, compiler in (compilers or {}).items():
+        languages[name] = LanguageSpec(
+            name,
+            [LOCAL_EXEC_PYTHON, "-I", "-S", "-c", LAUNCHER_BOOTSTRAP],
+            compiler.version,
+            address_space_overhead_mb=compiler.address_space_overhead_mb,
+        )
+    return languages
+
+
+def read_process_status(pid: str) -> Optional[Tuple[int, int, str]]:
+    """
+    (real uid, threads, state) of a process from /proc, or None once it is gone.
+    """
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            owner = threads = state = None
+            for line in status:
+                if line.startswith("State:"):
+                    state = line.split()[1]
+                elif line.startswith("Uid:"):
+                    owner = int(line.split()[1])
+                elif line.startswith("Threads:"):
+                    threads = int(line.split()[1])
+                    break
+    except (OSError, ValueError, IndexError):
+        return None
+    if owner is None:
+        return None
+    return owner, threads or 1, state or "?"
+
+
+def list_pids() -> List[str]:
+    try:
+        return [entry for entry in os.listdir("/proc") if entry.isdigit()]
+    except OSError:
+        return []
+
+
+def count_user_tasks(uid: int) -> int:
+    """
+    Processes and threads currently owned by `uid`, as counted by RLIMIT_NPROC (0 when
+    /proc is not available). Scans /proc: call it from a thread.
+    """
+    count = 0
+    for pid in list_pids():
+        status = read_process_status(pid)
+        if status is not None and status[0] == uid:
+            count += status[1]
+    return count
+
+
+def kill_user_processes(uids: Collection[int], rounds: int = LOCAL_EXEC_KILL_ROUNDS) -> int:
+    """
+    SIGKILL every live process owned by one of `uids`, repeating while forks in flight
+    add new ones. Returns how many are still alive (0 once the uids are clear). Scans
+    /proc: call it from a thread.
+    """
+    uids = set(uids)
+    for attempt in range(rounds + 1):
+        pids = []
+        for pid in list_pids():
+            status = read_process_status(pid)
+            # Zombies are already dead; their parent reaps them
+            if status is not None and status[0] in uids and status[2] not in ("Z", "X"):
+                pids.append(int(pid))
+        if not pids or attempt == rounds:
+            return len(pids)
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        time.sleep(0.005)
+
+
+def parse_uid_range(spec: str) -> range:
+    first, _, last = spec.partition("-")
+    first, last = int(first), int(last or first)
+    if last < first:
+        raise ValueError(f"Invalid uid range: {spec}")
+    return range(first, last + 1)
+
+
+def resolve_exec_uids(spec: Optional[str], gid: int) -> Optional["ExecUids"]:
+    """
+    Uids programs run as, or None when LOCAL_EXEC_UIDS is not set. The range must be
+    unprivileged and belong to no account: everything its uids own gets killed.
+    """
+    if not spec:
+        return None
+    if pwd is None:
+        raise RuntimeError("LOCAL_EXEC_UIDS is not supported on this platform")
+    uids = parse_uid_range(spec)
+    if uids.start <= 0 or os.getuid() in uids:
+        raise RuntimeError(f"LOCAL_EXEC_UIDS ({spec}) must not include root or the server's own uid")
+    if os.getuid() != 0:
+        raise RuntimeError("LOCAL_EXEC_UIDS needs the server to run as root to switch to them")
+    accounts = [entry.pw_name for entry in pwd.getpwall() if entry.pw_uid in uids]
+    if accounts:
+        raise RuntimeError(f"LOCAL_EXEC_UIDS ({spec}) includes existing accounts: {', '.join(accounts)}")
+    return ExecUids(uids, gid)
+
+
+class ExecUids:
+    """
+    Leases the uids of LOCAL_EXEC_UIDS: every worker and build runs as a uid of its own,
+    which is handed out again only after every process it owns has been killed.
+    """
+
+    def __init__(self, uids: range, gid: int):
+        self.uids = uids
+        self.gid = gid
+        self._free: asyncio.Queue = asyncio.Queue()
+        for uid in uids:
+            self._free.put_nowait(uid)
+        self._leased: Set[int] = set()
+        self._sweeps: Set[asyncio.Task] = set()
+        self._stats = {
+            "quarantined": 0,
+        }
+
+    async def start(self) -> None:
+        # Processes left behind by an earlier server still hold the uids
+        await asyncio.to_thread(kill_user_processes, self.uids)
+
+    async def acquire(self) -> int:
+        uid = await self._free.get()
+        self._leased.add(uid)
+        return uid
+
+    async def sweep(self, uid: int) -> bool:
+        """
+        Kill everything `uid` owns; False if some of it survived.
+        """
+        return await asyncio.to_thread(kill_user_processes, (uid,)) == 0
+
+    def kill(self, uid: int) -> None:
+        """
+        Start killing everything `uid` owns (for callers that cannot wait).
+        """
+        self._track(self.sweep(uid))
+
+    def release(self, uid: int, scratch_dir: Optional[str] = None) -> None:
+        """
+        Kill what the lease left running, remove its scratch directory, then hand the uid
+        out again.
+        """
+        self._track(self._release(uid, scratch_dir))
+
+    async def _release(self, uid: int, scratch_dir: Optional[str]) -> None:
+        clear = False
+        try:
+            clear = await self.sweep(uid)
+            if scratch_dir is not None:
+                await asyncio.to_thread(shutil.rmtree, scratch_dir, True)
+        finally:
+            self._leased.discard(uid)
+            if clear:
+                self._free.put_nowait(uid)
+            else:
+                # A uid whose processes could not all be killed is never reused
+                self._stats["quarantined"] += 1
+                logger.error(f"Processes of uid {uid} survived the kill; the uid is no longer used")
+
+    def _track(self, coroutine) -> None:
+        task = asyncio.ensure_future(coroutine)
+        self._sweeps.add(task)
+        task.add_done_callback(self._sweeps.discard)
+
+    async def close(self) -> None:
+        while self._sweeps:
+            await asyncio.gather(*self._sweeps, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": len(self.uids),
+            "free": self._free.qsize(),
+            "leased": len(self._leased),
+            **self._stats,
+        }
+
+
+def process_options(work_dir: str, uids: Optional[ExecUids], uid: Optional[int]) -> Dict[str, Any]:
+    """
+    Subprocess options that run a program or compiler as its leased uid, which is given
+    ownership of its work directory.
+    """
+    if uids is None or uid is None:
+        return {}
+    os.chown(work_dir, uid, uids.gid)
+    return {"user": uid, "group": uids.gid, "extra_groups": []}
+
+
+def restore_ownership(path: str) -> None:
+    """
+    Give a tree written by a leased uid back to the server, so the next program to get
+    that uid cannot change it. Walks the tree: call it from a thread.
+    """
+    owner = (os.getuid(), os.getgid())
+    for root, dirs, files in os.walk(path):
+        for name in [root] + [os.path.join(root, entry) for entry in dirs + files]:
+            os.lchown(name, *owner)
+    # Programs run as other uids than the one that built them
+    os.chmod(path, 0o755)
+
+
+def kill_process_group(process: asyncio.subprocess.Process) -> None:
+    """
+    Kill the session started for the process. Children that left the session are only
+    reached through their uid (see ExecUids).
+    """
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+    except (PermissionError, AttributeError):
+        if process.returncode is None:
+            process.kill()
+
+
+class _Worker:
+    def __init__(self, process: asyncio.subprocess.Process, scratch_dir: str, stats_fd: int, uids: Optional[ExecUids] = None, uid: Optional[int] = None):
+        self.process = process
+        self.scratch_dir = scratch_dir
+        self.stats_fd = stats_fd
+        self.uids = uids
+        self.uid = uid
+        self.spawned_at = time.time()
+
+    def read_usage(self) -> Dict[str, Any]:
+        """
+        CPU time and peak memory reported by the worker on exit (empty if it was killed).
+        """
+        try:
+            return json.loads(os.read(self.stats_fd, 4096) or b"{}")
+        except (BlockingIOError, OSError, ValueError):
+            return {}
+
+
+class WorkerPool:
+    """
+    Pool of pre-started interpreter processes for one language. Every worker runs a
+    single job and exits; the pool is refilled in the background so the interpreter
+    start-up cost is paid before the next request arrives.
+    """
+
+    def __init__(self, spec: LanguageSpec, size: int = LOCAL_EXEC_POOL_SIZE, memory_mb: int = LOCAL_EXEC_MEMORY_MB, cpu_seconds: int = LOCAL_EXEC_CPU_SECONDS, uids: Optional[ExecUids] = None):
+        self.spec = spec
+        self.size = size
+        self.memory_mb = memory_mb
+        self.cpu_seconds = cpu_seconds
+        self.uids = uids
+        self._idle: List[_Worker] = []
+        self._refills: Set[asyncio.Task] = set()
+        self._closed = False
+        self._stats = {
+            "spawned": 0,
+            "warm_hits": 0,
+            "cold_starts": 0,
+        }
+
+    def _limit_resources(self, max_processes: int) -> None:
+        # Runs in the child between fork and exec
+        if resource is None:
+            return
+        memory = (self.memory_mb + self.spec.address_space_overhead_mb) * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+        resource.setrlimit(resource.RLIMIT_CPU, (self.cpu_seconds, self.cpu_seconds + 1))
+        resource.setrlimit(resource.RLIMIT_FSIZE, (LOCAL_EXEC_MAX_FILE_BYTES, LOCAL_EXEC_MAX_FILE_BYTES))
+        resource.setrlimit(resource.RLIMIT_NOFILE, (64, 64))
+        resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+        # Not enforced for root: run as LOCAL_EXEC_UIDS to contain fork bombs
+        resource.setrlimit(resource.RLIMIT_NPROC, (max_processes, max_processes))
+
+    async def _spawn(self) -> _Worker:
+        # A leased uid owns nothing yet, so the process limit applies to this worker alone
+        uid = await self.uids.acquire() if self.uids is not None else None
+        scratch_dir = tempfile.mkdtemp(prefix="exec-", dir=LOCAL_EXEC_SCRATCH_DIR)
+        stats_read, stats_write = os.pipe()
+        # Never block on the usage report (e.g. if a leftover child holds the pipe open)
+        os.set_blocking(stats_read, False)
+        env = {
+            "PATH": os.environ.get("PATH", "/usr/bin:/bin"),
+            "HOME": scratch_dir,
+            "TMPDIR": scratch_dir,
+            "LANG": "C.UTF-8",
+            "PYTHONIOENCODING": "utf-8",
+            "PYTHONDONTWRITEBYTECODE": "1",
+            # Same set iteration order on every run, so results can be cached
+            "PYTHONHASHSEED": "0",
+            "EXEC_STATS_FD": str(stats_write),
+        }
+        try:
+            max_processes = LOCAL_EXEC_MAX_PROCESSES
+            if uid is None:
+                max_processes += await asyncio.to_thread(count_user_tasks, os.getuid())
+            process = await asyncio.create_subprocess_exec(
+                *self.spec.command,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                cwd=scratch_dir,
+                env=env,
+                preexec_fn=functools.partial(self._limit_resources, max_processes) if resource is not None else None,
+                start_new_session=True,
+                pass_fds=(stats_write,),
+                **process_options(scratch_dir, self.uids, uid),
+            )
+        except BaseException:
+            os.close(stats_read)
+            if uid is not None:
+                self.uids.release(uid, scratch_dir)
+            else:
+                shutil.rmtree(scratch_dir, ignore_errors=True)
+            raise
+        finally:
+            os.close(stats_write)
+        self._stats["spawned"] += 1
+        return _Worker(process, scratch_dir, stats_read, self.uids, uid)
+
+    async def _refill(self) -> None:
+        while not self._closed and len(self._idle) < self.size:
+            try:
+                worker = await self._spawn()
+            except Exception as e:
+                logger.error(f"Failed to pre-start {self.spec.name} worker: {str(e)}")
+                return
+            if self._closed:
+                discard_worker(worker)
+                return
+            self._idle.append(worker)
+
+    def _schedule_refill(self) -> None:
+        if self._closed or self._refills:
+            return
+        task = asyncio.ensure_future(self._refill())
+        self._refills.add(task)
+        task.add_done_callback(self._refills.discard)
+
+    async def start(self) -> None:
+        await self._refill()
+
+    async def acquire(self) -> _Worker:
+        while self._idle:
+            worker = self._idle.pop(0)
+            if worker.process.returncode is None:
+                self._stats["warm_hits"] += 1
+                self._schedule_refill()
+                return worker
+            discard_worker(worker)
+        self._stats["cold_starts"] += 1
+        self._schedule_refill()
+        return await self._spawn()
+
+    async def close(self) -> None:
+        self._closed = True
+        for task in list(self._refills):
+            task.cancel()
+        await asyncio.gather(*self._refills, return_exceptions=True)
+        idle, self._idle = self._idle, []
+        for worker in idle:
+            discard_worker(worker)
+        await asyncio.gather(*(worker.process.wait() for worker in idle), return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "idle": len(self._idle),
+            "size": self.size,
+            **self._stats,
+        }
+
+
+def kill_worker(worker: _Worker) -> None:
+    kill_process_group(worker.process)
+    if worker.uid is not None:
+        # Including the children that left the session
+        worker.uids.kill(worker.uid)
+
+
+def discard_worker(worker: _Worker) -> None:
+    # Always kill: background children outlive a program that already exited
+    kill_process_group(worker.process)
+    if worker.stats_fd >= 0:
+        os.close(worker.stats_fd)
+        worker.stats_fd = -1
+    if worker.uid is not None:
+        uid, worker.uid = worker.uid, None
+        worker.uids.release(uid, worker.scratch_dir)
+    else:
+        shutil.rmtree(worker.scratch_dir, ignore_errors=True)
+
+
+async def read_capped(stream: asyncio.StreamReader, limit: int, on_overflow) -> bytes:
+    """
+    Read a stream until EOF, keeping at most `limit` bytes. `on_overflow` is called once
+    when the limit is exceeded (to stop the producer).
+    """
+    data = bytearray()
+    while True:
+        chunk = await stream.read(65536)
+        if not chunk:
+            return bytes(data)
+        if len(data) < limit:
+            data.extend(chunk[:limit - len(data)])
+        if len(data) >= limit:
+            on_overflow()
+
+
+class LocalExecutor:
+    """
+    Executes code in local worker processes with rlimit-based CPU, memory, file size,
+    descriptor and process limits, a wall-clock timeout and a private scratch directory.
+    Results have the same shape as Piston's execute reply (times in ms, memory in bytes).
+
+    Programs run as uids of their own (LOCAL_EXEC_UIDS), so they cannot read the
+    server's private files (keep backend/.env and backend/data unreadable to others) and
+    everything a run started is killed with it. There is no network isolation beyond
+    what a firewall rule on the uid range provides. The executor refuses to start without
+    the uids unless LOCAL_EXEC_ALLOW_UNISOLATED is set for development.
+    """
+    name = "local"
+
+    def __init__(self, pool_size: int = LOCAL_EXEC_POOL_SIZE, max_concurrency: int = LOCAL_EXEC_MAX_CONCURRENCY, wall_seconds: float = LOCAL_EXEC_WALL_SECONDS, max_output_bytes: int = LOCAL_EXEC_MAX_OUTPUT_BYTES):
+        self.uids = resolve_exec_uids(LOCAL_EXEC_UIDS, LOCAL_EXEC_GID)
+        if self.uids is None:
+            if not LOCAL_EXEC_ALLOW_UNISOLATED:
+                raise RuntimeError("The local executor needs LOCAL_EXEC_UIDS, a range of unused uids to run programs as (or LOCAL_EXEC_ALLOW_UNISOLATED=1 for development)")
+            logger.warning("Local executor runs programs as the server's own user (LOCAL_EXEC_ALLOW_UNISOLATED); do not expose it to untrusted users")
+        self.compilers = detect_compilers()
+        self.languages = detect_languages(self.compilers)
+        self.pools = {name: WorkerPool(spec, pool_size, uids=self.uids) for name, spec in self.languages.items()}
+        if self.uids is not None:
+            # Idle workers hold their uids; runs and builds beyond the rest wait for one
+            needed = pool_size * len(self.pools) + max_concurrency + LOCAL_EXEC_INTERACTIVE_MAX_SESSIONS
+            if len(self.uids.uids) < needed:
+                logger.warning(f"LOCAL_EXEC_UIDS has {len(self.uids.uids)} uids; {needed} avoid waiting for one")
+        self.artifacts = ArtifactCache(LOCAL_COMPILE_CACHE_DIR, LOCAL_COMPILE_CACHE_MAX_BYTES) if self.compilers else None
+        self.wall_seconds = wall_seconds
+        self.max_output_bytes = max_output_bytes
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._builds = SingleFlight("compile")
+        self._stats = {
+            "runs": 0,
+            "timeouts": 0,
+            "output_truncated": 0,
+            "interactive_runs": 0,
+            "interactive_rejected": 0,
+        }
+        self._interactive_sessions = 0
+        # "id:<client ID>" / "address:<address>" -> open interactive runs
+        self._interactive_clients: Dict[str, int] = {}
+        self._compile_stats = {
+            "compiles": 0,
+            "failures": 0,
+            "cache_hits": 0,
+            "total_compile_ms": 0.0,
+            "saved_compile_ms": 0.0,
+        }
+
+    def supports(self, language: str) -> bool:
+        return language in self.pools
+
+    async def start(self) -> None:
+        if self.uids is not None:
+            await self.uids.start()
+        if self.artifacts is not None:
+            await self.artifacts.start()
+        await asyncio.gather(*(pool.start() for pool in self.pools.values()))
+        logger.info(f"Local executor ready for: {', '.join(self.pools)}")
+
+    async def close(self) -> None:
+        await asyncio.gather(*(pool.close() for pool in self.pools.values()))
+        if self.uids is not None:
+            await self.uids.close()
+
+    async def run(self, code: str, language: str, stdin: str = "", args: Optional[List[str]] = None) -> Dict[str, Any]:
+        pool = self.pools.get(language)
+        if pool is None:
+            raise ValueError(f"Language {language} is not supported by the local executor")
+
+        compiler = self.compilers.get(language)
+        if compiler is None:
+            return await self._run(pool, code, language, stdin, args or [])
+
+        # Compiled languages: build (or reuse the cached build), then start the program
+        # through a launcher worker
+        key = compiler.cache_key(code)
+        artifact, compile_stage = await self._build(compiler, key, code)
+        if artifact is None:
+            return {
+                "language": language,
+                "version": compiler.version,
+                "compile": compile_stage,
+            }
+        try:
+            job = json.dumps({"argv": compiler.run_argv(artifact)})
+            reply = await self._run(pool, job, language, stdin, args or [])
+        finally:
+            self.artifacts.release(key)
+        reply["compile"] = compile_stage
+        return reply
+
+    def _interactive_limits(self, client: Optional[ClientKey]) -> List[Tuple[str, int]]:
+        if client is None:
+            return []
+        limits = [(f"address:{client.address}", LOCAL_EXEC_INTERACTIVE_MAX_SESSIONS_PER_ADDRESS)]
+        if client.client_id:
+            limits.append((f"id:{client.client_id}", LOCAL_EXEC_INTERACTIVE_MAX_SESSIONS_PER_CLIENT))
+        return limits
+
+    async def run_interactive(self, code: str, language: str, stdin: "asyncio.Queue", on_output: Callable[[str, str], Awaitable[None]], args: Optional[List[str]] = None, client: Optional[ClientKey] = None, on_start: Optional[Callable[[], None]] = None) -> Dict[str, Any]:
+        """
+        Run with streamed I/O: `on_output(stream, text)` is awaited for every chunk the
+        program writes, and items of the `stdin` queue are fed to it as they arrive (None
+        closes stdin, STOP_PROGRAM kills the program). Output is not buffered; the program
+        is killed once it has streamed LOCAL_EXEC_INTERACTIVE_MAX_OUTPUT_BYTES. Returns the
+        reply without stdout/stderr. `on_start()` is called once the program was built and
+        has a worker, before it receives its source.
+
+        Open runs are limited in total and per `client` ID and address.
+        """
+        pool = self.pools.get(language)
+        if pool is None:
+            raise ValueError(f"Language {language} is not supported by the local executor")
+        if self._interactive_sessions >= LOCAL_EXEC_INTERACTIVE_MAX_SESSIONS:
+            self._stats["interactive_rejected"] += 1
+            raise RuntimeError("Too many interactive runs in progress, please try again later")
+        limits = self._interactive_limits(client)
+        for key, limit in limits:
+            if self._interactive_clients.get(key, 0) >= limit:
+                self._stats["interactive_rejected"] += 1
+                raise RuntimeError("Too many interactive runs open for this client, please close one first")
+
+        self._interactive_sessions += 1
+        for key, _ in limits:
+            self._interactive_clients[key] = self._interactive_clients.get(key, 0) + 1
+        try:
+            compiler = self.compilers.get(language)
+            if compiler is None:
+                return await self._stream(pool, code, language, stdin, on_output, args or [], on_start)
+
+            key = compiler.cache_key(code)
+            artifact, compile_stage = await self._build(compiler, key, code)
+            if artifact is None:
+                return {
+                    "language": language,
+                    "version": compiler.version,
+                    "compile": compile_stage,
+                }
+            try:
+                job = json.dumps({"argv": compiler.run_argv(artifact)})
+                reply = await self._stream(pool, job, language, stdin, on_output, args or [], on_start)
+            finally:
+                self.artifacts.release(key)
+            reply["compile"] = compile_stage
+            return reply
+        finally:
+            self._interactive_sessions -= 1
+            for key, _ in limits:
+                self._interactive_clients[key] -= 1
+                if not self._interactive_clients[key]:
+                    del self._interactive_clients[key]
+
+    async def _stream(self, pool: WorkerPool, code: str, language: str, stdin: "asyncio.Queue", on_output: Callable[[str, str], Awaitable[None]], args: List[str], on_start: Optional[Callable[[], None]] = None) -> Dict[str, Any]:
+        # Interactive runs mostly wait for input, so they do not take a run slot
+        worker = await pool.acquire()
+        self._stats["interactive_runs"] += 1
+        try:
+            if on_start is not None:
+                on_start()
+            return await self._stream_job(worker, code, language, stdin, on_output, args)
+        finally:
+            discard_worker(worker)
+
+    async def _stream_job(self, worker: _Worker, code: str, language: str, stdin: "asyncio.Queue", on_output: Callable[[str, str], Awaitable[None]], args: List[str]) -> Dict[str, Any]:
+        process = worker.process
+        source = code.encode("utf-8")
+        limit = LOCAL_EXEC_INTERACTIVE_MAX_OUTPUT_BYTES
+        overflow = {"stdout": False, "stderr": False}
+        streamed = {"bytes": 0, "stopped": False}
+
+        async def pump(stream: asyncio.StreamReader, name: str):
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+            while True:
+                chunk = await stream.read(65536)
+                if not chunk:
+                    text = decoder.decode(b"", final=True)
+                    if text:
+                        await on_output(name, text)
+                    return
+                if overflow["stdout"] or overflow["stderr"]:
+                    continue
+                remaining = limit - streamed["bytes"]
+                if len(chunk) > remaining:
+                    chunk = chunk[:remaining]
+                    overflow[name] = True
+                    kill_worker(worker)
+                streamed["bytes"] += len(chunk)
+                text = decoder.decode(chunk)
+                if text:
+                    await on_output(name, text)
+
+        async def feed():
+            try:
+                process.stdin.write(b"%d\n" % len(source) + source + json_line({"args": args, "interactive": True}))
+                await process.stdin.drain()
+                while True:
+                    data = await stdin.get()
+                    if data is None:
+                        break
+                    if data is STOP_PROGRAM:
+                        streamed["stopped"] = True
+                        kill_worker(worker)
+                        break
+                    process.stdin.write(data.encode("utf-8"))
+                    await process.stdin.drain()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            finally:
+                try:
+                    process.stdin.close()
+                except Exception:
+                    pass
+
+        timed_out = False
+        started = time.monotonic()
+        feeder = asyncio.ensure_future(feed())
+        pumps = asyncio.gather(pump(process.stdout, "stdout"), pump(process.stderr, "stderr"))
+        try:
+            try:
+                await asyncio.wait_for(asyncio.shield(pumps), timeout=LOCAL_EXEC_INTERACTIVE_WALL_SECONDS)
+            except asyncio.TimeoutError:
+                timed_out = True
+                self._stats["timeouts"] += 1
+                kill_worker(worker)
+                await pumps
+        except BaseException:
+            # e.g. the client went away while output was being sent
+            kill_worker(worker)
+            pumps.cancel()
+            raise
+        finally:
+            feeder.cancel()
+        return_code = await process.wait()
+        return self._reply(
+            worker,
+            language,
+            return_code,
+            "",
+            "",
+            overflow,
+            timed_out,
+            time.monotonic() - started,
+            LOCAL_EXEC_INTERACTIVE_WALL_SECONDS,
+            limit,
+            stopped=streamed["stopped"],
+        )
+
+    async def _run(self, pool: WorkerPool, code: str, language: str, stdin: str, args: List[str]) -> Dict[str, Any]:
+        async with self._semaphore:
+            worker = await pool.acquire()
+            self._stats["runs"] += 1
+            try:
+                return await self._run_job(worker, code, language, stdin, args)
+            finally:
+                discard_worker(worker)
+
+    async def _build(self, compiler: CompilerSpec, key: str, code: str) -> Tuple[Optional[str], Dict[str, Any]]:
+        """
+        Leased artifact directory and the compile stage of the reply. The artifact is None
+        when compilation failed.
+        """
+        artifact = self.artifacts.acquire(key)
+        if artifact is not None:
+            self._compile_stats["cache_hits"] += 1
+            self._compile_stats["saved_compile_ms"] += read_build_info(artifact).get("compile_time", 0.0)
+            return artifact, compile_stage_reply(cached=True)
+
+        # Identical sources submitted concurrently are compiled once
+        stage = await self._builds.do(key, lambda: self._compile(compiler, key, code))
+        if stage["code"] != 0 or stage["signal"]:
+            return None, stage
+        artifact = self.artifacts.acquire(key)
+        if artifact is None:
+            return None, compile_stage_reply(code=1, stderr="Build artifact is no longer available, please run again\n")
+        return artifact, stage
+
+    async def _compile(self, compiler: CompilerSpec, key: str, code: str) -> Dict[str, Any]:
+        work_dir = tempfile.mkdtemp(prefix="build-", dir=LOCAL_EXEC_SCRATCH_DIR)
+        out_dir = self.artifacts.build_dir()
+        published = False
+        try:
+            source_path = os.path.join(work_dir, compiler.source_file)
+            with open(source_path, "w", encoding="utf-8") as f:
+                f.write(code)
+            env = {
+                "PATH": os.environ.get("PATH", "/usr/bin:/bin"),
+                "HOME": work_dir,
+                "TMPDIR": work_dir,
+                "LANG": "C.UTF-8",
+                **compiler.env,
+            }
+
+            async with self._semaphore:
+                # Compilers read what the source includes, so they run as the programs do
+                uid = await self.uids.acquire() if self.uids is not None else None
+                try:
+                    started = time.monotonic()
+                    if uid is not None:
+                        os.chown(out_dir, uid, self.uids.gid)
+                    process = await asyncio.create_subprocess_exec(
+                        *compiler.compile_argv(source_path, out_dir),
+                        stdin=asyncio.subprocess.DEVNULL,
+                        stdout=asyncio.subprocess.PIPE,
+                        stderr=asyncio.subprocess.PIPE,
+                        cwd=work_dir,
+                        env=env,
+                        preexec_fn=limit_compile_resources if resource is not None else None,
+                        start_new_session=True,
+                        **process_options(work_dir, self.uids, uid),
+                    )
+                    reads = asyncio.gather(
+                        read_capped(process.stdout, self.max_output_bytes, lambda: None),
+                        read_capped(process.stderr, self.max_output_bytes, lambda: None),
+                    )
+                    timed_out = False
+                    try:
+                        try:
+                            stdout, stderr = await asyncio.wait_for(asyncio.shield(reads), timeout=LOCAL_COMPILE_WALL_SECONDS)
+                        except asyncio.TimeoutError:
+                            timed_out = True
+                            self._kill_build(process, uid)
+                            stdout, stderr = await reads
+                        return_code = await process.wait()
+                    except asyncio.CancelledError:
+                        # Nobody waits for the build any more (e.g. every caller of the shared
+                        # build left): stop the compiler rather than leave it running unowned
+                        self._kill_build(process, uid)
+                        await asyncio.gather(reads, process.wait(), return_exceptions=True)
+                        raise
+                    compile_time = (time.monotonic() - started) * 1000
+                    if uid is not None:
+                        # Nothing the compiler left running may change the build once it
+                        # is published, and the uid's next lease must not own it
+                        if not await self.uids.sweep(uid):
+                            return compile_stage_reply(code=1, stderr="Build processes could not be stopped\n")
+                        await asyncio.to_thread(restore_ownership, out_dir)
+                finally:
+                    if uid is not None:
+                        self.uids.release(uid)
+
+            self._compile_stats["compiles"] += 1
+            self._compile_stats["total_compile_ms"] += compile_time
+            # Paths of the build directory are noise in compiler messages
+            stdout_text = stdout.decode("utf-8", errors="replace").replace(work_dir + "/", "")
+            stderr_text = stderr.decode("utf-8", errors="replace").replace(work_dir + "/", "")
+            signal_name = None
+            if return_code < 0:
+                try:
+                    signal_name = signal.Signals(-return_code).name
+                except ValueError:
+                    signal_name = str(-return_code)
+            message = None
+            status = None
+            if timed_out or signal_name in ("SIGXCPU", "SIGKILL"):
+                status = "TO"
+                message = "Compilation time limit exceeded"
+            elif signal_name:
+                status = "SG"
+            if return_code != 0:
+                self._compile_stats["failures"] += 1
+                return compile_stage_reply(
+                    stdout=stdout_text,
+                    stderr=stderr_text,
+                    code=return_code if return_code >= 0 else None,
+                    signal=signal_name,
+                    message=message,
+                    status=status,
+                    wall_time=compile_time,
+                )
+
+            with open(os.path.join(out_dir, BUILD_INFO_FILE), "w") as f:
+                json.dump({"language": compiler.name, "version": compiler.version, "compile_time": compile_time}, f)
+            await self.artifacts.put(key, out_dir)
+            published = True
+            logger.info(f"Compiled {compiler.name} program in {compile_time:.0f}ms")
+            return compile_stage_reply(stdout=stdout_text, stderr=stderr_text, wall_time=compile_time)
+        finally:
+            await asyncio.to_thread(remove_trees, [work_dir] if published else [work_dir, out_dir])
+
+    def _kill_build(self, process: asyncio.subprocess.Process, uid: Optional[int]) -> None:
+        kill_process_group(process)
+        if uid is not None:
+            self.uids.kill(uid)
+
+    async def _run_job(self, worker: _Worker, code: str, language: str, stdin: str, args: List[str]) -> Dict[str, Any]:
+        process = worker.process
+        source = code.encode("utf-8")
+        job = b"%d\n" % len(source) + source + json_line(args) + (stdin or "").encode("utf-8")
+        overflow = {"stdout": False, "stderr": False}
+
+        def stop(stream_name):
+            def on_overflow():
+                if not overflow[stream_name]:
+                    overflow[stream_name] = True
+                    kill_worker(worker)
+            return on_overflow
+
+        async def feed():
+            try:
+                process.stdin.write(job)
+                await process.stdin.drain()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            finally:
+                try:
+                    process.stdin.close()
+                except Exception:
+                    pass
+
+        timed_out = False
+        started = time.monotonic()
+        reads = asyncio.gather(
+            read_capped(process.stdout, self.max_output_bytes, stop("stdout")),
+            read_capped(process.stderr, self.max_output_bytes, stop("stderr")),
+            feed(),
+        )
+        try:
+            stdout, stderr, _ = await asyncio.wait_for(asyncio.shield(reads), timeout=self.wall_seconds)
+        except asyncio.TimeoutError:
+            timed_out = True
+            self._stats["timeouts"] += 1
+            kill_worker(worker)
+            stdout, stderr, _ = await reads
+        return_code = await process.wait()
+        elapsed = time.monotonic() - started
+        return self._reply(
+            worker,
+            language,
+            return_code,
+            stdout.decode("utf-8", errors="replace"),
+            stderr.decode("utf-8", errors="replace"),
+            overflow,
+            timed_out,
+            elapsed,
+            self.wall_seconds,
+            self.max_output_bytes,
+        )
+
+    def _reply(self, worker: _Worker, language: str, return_code: int, stdout_text: str, stderr_text: str, overflow: Dict[str, bool], timed_out: bool, elapsed: float, wall_seconds: float, max_output_bytes: int, stopped: bool = False) -> Dict[str, Any]:
+        usage = worker.read_usage()
+        signal_name = None
+        if return_code < 0:
+            try:
+                signal_name = signal.Signals(-return_code).name
+            except ValueError:
+                signal_name = str(-return_code)
+
+        # Status codes and messages follow Piston: TO timeout, OL/EL output limits,
+        # SG killed by a signal, RE runtime error
+        status = None
+        message = None
+        if timed_out:
+            status = "TO"
+            message = f"Time limit exceeded ({wall_seconds:g}s wall clock)"
+        elif overflow["stdout"] or overflow["stderr"]:
+            self._stats["output_truncated"] += 1
+            status = "OL" if overflow["stdout"] else "EL"
+            message = f"Output limit exceeded ({max_output_bytes} bytes)"
+        elif stopped:
+            status = "SG"
+            message = "Stopped by the client"
+        elif signal_name in ("SIGXCPU", "SIGKILL"):
+            status = "TO"
+            message = f"CPU time limit exceeded ({self.pools[language].cpu_seconds}s)"
+        elif signal_name:
+            status = "SG"
+        elif return_code != 0:
+            status = "RE"
+
+        return {
+            "language": language,
+            "version": self.languages[language].version,
+            "run": {
+                "stdout": stdout_text,
+                "stderr": stderr_text,
+                "output": stdout_text + stderr_text,
+                "code": return_code if return_code >= 0 else None,
+                "signal": signal_name,
+                "message": message,
+                "status": status,
+                "wall_time": round(elapsed * 1000, 1),
+                "cpu_time": round(usage["cpu_time"], 1) if "cpu_time" in usage else None,
+                "memory": usage.get("memory"),
+                "stdout_truncated": overflow["stdout"],
+                "stderr_truncated": overflow["stderr"],
+            },
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        stats = {
+            **self._stats,
+            "pools": {name: pool.stats() for name, pool in self.pools.items()},
+        }
+        if self.uids is not None:
+            stats["uids"] = self.uids.stats()
+        if self.artifacts is not None:
+            compiles = self._compile_stats["compiles"]
+            builds = compiles + self._compile_stats["cache_hits"]
+            stats["compile"] = {
+                **self._compile_stats,
+                "cache_hit_rate": self._compile_stats["cache_hits"] / builds if builds else 0.0,
+                "avg_compile_ms": self._compile_stats["total_compile_ms"] / compiles if compiles else 0.0,
+                "artifacts": self.artifacts.stats(),
+            }
+        return stats
+
+
+
+BUILD_INFO_FILE = ".build.json"
+
+
+def read_build_info(artifact: str) -> Dict[str, Any]:
+    try:
+        with open(os.path.join(artifact, BUILD_INFO_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def compile_stage_reply(stdout: str = "", stderr: str = "", code: Optional[int] = 0, signal: Optional[str] = None, message: Optional[str] = None, status: Optional[str] = None, wall_time: float = 0.0, cached: bool = False) -> Dict[str, Any]:
+    """
+    Piston-style compile stage; `cached` marks a reused build.
+    """
+    return {
+        "stdout": stdout,
+        "stderr": stderr,
+        "output": stdout + stderr,
+        "code": code,
+        "signal": signal,
+        "message": message,
+        "status": status,
+        "wall_time": round(wall_time, 1),
+        "cached": cached,
+    }
+
+
+def limit_compile_resources() -> None:
+    # Runs in the compiler process between fork and exec; compilers need far more
+    # address space than the programs they build, so only CPU and file size are limited
+    resource.setrlimit(resource.RLIMIT_CPU, (LOCAL_COMPILE_CPU_SECONDS, LOCAL_COMPILE_CPU_SECONDS + 1))
+    resource.setrlimit(resource.RLIMIT_FSIZE, (256 * 1024 * 1024, 256 * 1024 * 1024))
+    resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+
+
+def json_line(args: Any) -> bytes:
+    if isinstance(args, dict):
+        args = {**args, "args": [str(arg) for arg in args.get("args", [])]}
+    else:
+        args = [str(arg) for arg in args]
+    return (json.dumps(args) + "\n").encode("utf-8")
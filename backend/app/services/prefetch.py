@@ -0,0 +1,234 @@
+import os
+import time
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from app.services.cache import make_cache_key
+from app.services.catalog import get_catalog, normalize_task
+from app.services.learning_service import generate_learning_sections, explain_wrong_answers
+from app.services.ai_service import generate_code_scaffolding
+
+logger = logging.getLogger(__name__)
+
+# Speculative prefetch configuration
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "1") == "1"
+# Budget: speculative tasks running at once and slots parked overall
+PREFETCH_MAX_IN_FLIGHT = int(os.getenv("PREFETCH_MAX_IN_FLIGHT", "4"))
+PREFETCH_MAX_SLOTS = int(os.getenv("PREFETCH_MAX_SLOTS", "256"))
+# Slots not claimed within this time belong to abandoned sessions and are cancelled
+PREFETCH_TTL_SECONDS = float(os.getenv("PREFETCH_TTL_SECONDS", "900"))
+
+
+def prefetch_key(*parts: Any) -> str:
+    """
+    Fingerprint of the inputs a stage was started with. A slot is only handed out when
+    the claiming request has the same inputs.
+    """
+    return make_cache_key(*parts)
+
+
+class _Slot:
+    def __init__(self, task: "asyncio.Task", inputs_key: str):
+        self.task = task
+        self.inputs_key = inputs_key
+        self.created_at = time.time()
+
+
+class PrefetchStore:
+    """
+    Per-session slots holding the speculatively started next stage of the
+    Quiz -> Learning -> CodeEditor flow.
+
+    An endpoint starts the next stage as soon as its inputs are known; the next endpoint
+    claims the slot and awaits the (usually finished) task instead of starting cold.
+    Slots are bounded by a budget and cancelled when their session is abandoned.
+    """
+
+    def __init__(self, enabled: bool = PREFETCH_ENABLED, max_in_flight: int = PREFETCH_MAX_IN_FLIGHT, max_slots: int = PREFETCH_MAX_SLOTS, ttl: float = PREFETCH_TTL_SECONDS):
+        self.enabled = enabled
+        self.max_in_flight = max_in_flight
+        self.max_slots = max_slots
+        self.ttl = ttl
+        self._slots: Dict[Tuple[str, str], _Slot] = {}
+        self._stats = {
+            "started": 0,
+            "hits": 0,
+            "misses": 0,
+            "mismatches": 0,
+            "failures": 0,
+            "over_budget": 0,
+            "cancelled": 0,
+        }
+
+    def _in_flight(self) -> int:
+        return sum(1 for slot in self._slots.values() if not slot.task.done())
+
+    def start(self, session_id: Optional[str], stage: str, inputs_key: str, factory: Callable[[], Awaitable[Any]]) -> bool:
+        """
+        Start `factory()` in the background and park it in the (session, stage) slot.
+        Returns False when prefetching is disabled or over budget.
+        """
+        if not self.enabled or not session_id:
+            return False
+        self.sweep()
+
+        self._discard((session_id, stage))
+        if self._in_flight() >= self.max_in_flight or len(self._slots) >= self.max_slots:
+            self._stats["over_budget"] += 1
+            logger.info(f"Skipping '{stage}' prefetch for session {session_id}: over budget")
+            return False
+
+        task = asyncio.ensure_future(factory())
+        # Retrieve the exception so unclaimed failures are not reported as never retrieved
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self._slots[(session_id, stage)] = _Slot(task, inputs_key)
+        self._stats["started"] += 1
+        logger.info(f"Started '{stage}' prefetch for session {session_id}")
+        return True
+
+    async def claim(self, session_id: Optional[str], stage: str, inputs_key: str) -> Optional[Any]:
+        """
+        Take the result parked for (session, stage). Returns None when there is no slot,
+        the inputs differ or the speculative task failed; the caller then generates as usual.
+        """
+        if not session_id:
+            return None
+        slot = self._slots.pop((session_id, stage), None)
+        if slot is None:
+            self._stats["misses"] += 1
+            return None
+        if slot.inputs_key != inputs_key:
+            self._stats["mismatches"] += 1
+            slot.task.cancel()
+            logger.info(f"Discarding '{stage}' prefetch for session {session_id}: inputs changed")
+            return None
+
+        try:
+            result = await slot.task
+        except asyncio.CancelledError:
+            if not slot.task.cancelled():
+                raise
+            self._stats["misses"] += 1
+            return None
+        except Exception as e:
+            self._stats["failures"] += 1
+            logger.warning(f"'{stage}' prefetch for session {session_id} failed: {str(e)}")
+            return None
+
+        self._stats["hits"] += 1
+        logger.info(f"Claimed '{stage}' prefetch for session {session_id}")
+        return result
+
+    def _discard(self, key: Tuple[str, str]) -> None:
+        slot = self._slots.pop(key, None)
+        if slot is not None and not slot.task.done():
+            slot.task.cancel()
+            self._stats["cancelled"] += 1
+
+    def cancel_session(self, session_id: str) -> None:
+        """
+        Cancel every slot of an abandoned or finished session.
+        """
+        for key in [key for key in self._slots if key[0] == session_id]:
+            self._discard(key)
+
+    def sweep(self) -> None:
+        """
+        Cancel slots that were not claimed within the TTL.
+        """
+        now = time.time()
+        for key in [key for key, slot in self._slots.items() if now - slot.created_at > self.ttl]:
+            logger.info(f"Expiring '{key[1]}' prefetch for session {key[0]}")
+            self._discard(key)
+
+    def stats(self) -> Dict[str, Any]:
+        claims = self._stats["hits"] + self._stats["misses"] + self._stats["mismatches"] + self._stats["failures"]
+        return {
+            "enabled": self.enabled,
+            "slots": len(self._slots),
+            "in_flight": self._in_flight(),
+            **self._stats,
+            "hit_rate": self._stats["hits"] / claims if claims else 0.0,
+        }
+
+
+prefetch_store = PrefetchStore()
+
+
+def wrong_answers_key(wrong_answers: List[Dict[str, Any]]) -> List[List[str]]:
+    """
+    Normalize wrong answers as returned by /check_quiz and as sent back by the learning
+    page, so both produce the same prefetch key.
+    """
+    return [
+        [
+            str(wrong.get("question") or ""),
+            str(wrong.get("code_snippet") or ""),
+            str(wrong.get("user_answer") or ""),
+            str(wrong.get("correct_answer") or ""),
+        ]
+        for wrong in wrong_answers or []
+    ]
+
+
+# Stages of the Quiz -> Learning -> CodeEditor flow
+
+def learning_sections_key(task_description: str, language: str) -> str:
+    return prefetch_key(normalize_task(task_description), getattr(language, "value", language))
+
+
+def explanations_key(wrong_answers: List[Dict[str, Any]], language: str) -> str:
+    return prefetch_key(wrong_answers_key(wrong_answers), getattr(language, "value", language))
+
+
+def boilerplate_key(task_description: str, language: str, concept_keywords: Optional[List[str]]) -> str:
+    return prefetch_key(normalize_task(task_description), getattr(language, "value", language), sorted(concept_keywords or []))
+
+
+async def prefetch_learning_sections(session_id: str, task_description: str, language: str) -> bool:
+    """
+    Started when a quiz is created: the generic learning sections only depend on the task.
+    """
+    if await get_catalog().get_learning_sections(task_description, language) is not None:
+        return False
+    return prefetch_store.start(
+        session_id,
+        "learning_sections",
+        learning_sections_key(task_description, language),
+        lambda: generate_learning_sections(task_description, language),
+    )
+
+
+def prefetch_explanations(session_id: str, wrong_answers: List[Dict[str, Any]], language: str) -> bool:
+    """
+    Started when the quiz is checked: the wrong answers are the explanation inputs.
+    """
+    if not wrong_answers:
+        return False
+    return prefetch_store.start(
+        session_id,
+        "learning_explanations",
+        explanations_key(wrong_answers, language),
+        lambda: explain_wrong_answers(wrong_answers, language),
+    )
+
+
+async def prefetch_boilerplate(session_id: str, task_description: str, language: str, concept_keywords: Optional[List[str]]) -> bool:
+    """
+    Started when learning content is returned: the editor then asks for newbie
+    boilerplate that leaves the learned concepts unimplemented.
+    """
+    if await get_catalog().get_scaffolding(task_description, "newbie", language, use_boilerplate=True, concept_keywords=concept_keywords) is not None:
+        return False
+    return prefetch_store.start(
+        session_id,
+        "scaffolding",
+        boilerplate_key(task_description, language, concept_keywords),
+        lambda: generate_code_scaffolding(
+            task_description,
+            "newbie",
+            language,
+            use_boilerplate=True,
+            concept_keywords=concept_keywords
+        ),
+    )
@@ -0,0 +1,310 @@
+import os
+import json
+import time
+import random
+import asyncio
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+from app.services.cache import make_cache_key
+from app.services.sqlite_store import connect
+from app.services.catalog import normalize_task
+from app.services.quiz_service import QUIZ_QUESTION_COUNT, question_fingerprint, find_question_problem, code_question_count
+
+logger = logging.getLogger(__name__)
+
+# Question bank configuration
+QUESTION_BANK_ENABLED = os.getenv("QUESTION_BANK_ENABLED", "1") == "1"
+# Questions a task needs in the bank before quizzes are assembled from it; below this
+# every quiz would repeat the same few questions
+QUESTION_BANK_MIN_POOL = int(os.getenv("QUESTION_BANK_MIN_POOL", str(2 * QUIZ_QUESTION_COUNT)))
+# How long a question served to a student is kept out of their quizzes
+QUESTION_BANK_SEEN_TTL_SECONDS = float(os.getenv("QUESTION_BANK_SEEN_TTL_SECONDS", str(30 * 24 * 3600)))
+
+MAX_CONCEPTS = 5
+MAX_CONCEPT_LENGTH = 40
+
+# Fields of a question kept in the bank; ids are assigned per quiz
+QUESTION_FIELDS = ("question", "code_snippet", "options", "correct_answer", "concepts")
+
+
+def task_fingerprint(task_description: str) -> str:
+    return make_cache_key(normalize_task(task_description))
+
+
+def normalize_concepts(concepts: Any) -> List[str]:
+    """
+    Lowercased, de-duplicated concept tags; anything that is not a list of strings is dropped.
+    """
+    if not isinstance(concepts, list):
+        return []
+    normalized = []
+    for concept in concepts:
+        if not isinstance(concept, str):
+            continue
+        concept = " ".join(concept.split()).lower()[:MAX_CONCEPT_LENGTH]
+        if concept and concept not in normalized:
+            normalized.append(concept)
+    return normalized[:MAX_CONCEPTS]
+
+
+class QuestionBank:
+    """
+    Persistent store of validated quiz questions, de-duplicated by content hash and
+    indexed by task and by (concept, language), from which quizzes are assembled without
+    an LLM call. Questions served to a student are not served to them again until
+    QUESTION_BANK_SEEN_TTL_SECONDS have passed.
+    """
+
+    def __init__(self, db_name: str = "question_bank.db", min_pool: int = QUESTION_BANK_MIN_POOL, seen_ttl: float = QUESTION_BANK_SEEN_TTL_SECONDS):
+        self.min_pool = min_pool
+        self.seen_ttl = seen_ttl
+        self._lock = threading.Lock()
+        self._conn = connect(db_name)
+        self._conn.executescript(
+            """CREATE TABLE IF NOT EXISTS questions (
+                id INTEGER PRIMARY KEY,
+                content_hash TEXT NOT NULL UNIQUE,
+                language TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                has_code INTEGER NOT NULL,
+                created_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS question_tasks (
+                task_key TEXT NOT NULL,
+                language TEXT NOT NULL,
+                question_id INTEGER NOT NULL,
+                PRIMARY KEY (task_key, language, question_id)
+            );
+            CREATE TABLE IF NOT EXISTS question_concepts (
+                concept TEXT NOT NULL,
+                language TEXT NOT NULL,
+                question_id INTEGER NOT NULL,
+                PRIMARY KEY (concept, language, question_id)
+            );
+            CREATE TABLE IF NOT EXISTS question_seen (
+                student_id TEXT NOT NULL,
+                question_id INTEGER NOT NULL,
+                seen_at REAL NOT NULL,
+                PRIMARY KEY (student_id, question_id)
+            );"""
+        )
+        self._stats = {
+            "questions_added": 0,
+            "duplicates": 0,
+            "rejected": 0,
+            "assembled": 0,
+            "thin": 0,
+        }
+
+    def add_questions(self, task_description: str, language: str, questions: List[Dict[str, Any]]) -> int:
+        """
+        Store the valid questions of a generated quiz and index them under the task and
+        their concepts. A question already in the bank (same content) is only linked to the
+        task. Returns the number of new questions.
+        """
+        language = getattr(language, "value", language)
+        task_key = task_fingerprint(task_description)
+        added = 0
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                for question in questions:
+                    if find_question_problem(question):
+                        self._stats["rejected"] += 1
+                        continue
+                    payload = {field: question[field] for field in QUESTION_FIELDS if question.get(field) is not None}
+                    payload["concepts"] = normalize_concepts(question.get("concepts"))
+                    content_hash = make_cache_key(language, question_fingerprint(question))
+                    cursor = self._conn.execute(
+                        "INSERT OR IGNORE INTO questions (content_hash, language, payload, has_code, created_at) VALUES (?, ?, ?, ?, ?)",
+                        (content_hash, language, json.dumps(payload), int(bool(payload.get("code_snippet"))), now),
+                    )
+                    if cursor.rowcount:
+                        question_id = cursor.lastrowid
+                        added += 1
+                    else:
+                        question_id = self._conn.execute(
+                            "SELECT id FROM questions WHERE content_hash = ?", (content_hash,)
+                        ).fetchone()[0]
+                        self._stats["duplicates"] += 1
+                    self._conn.execute(
+                        "INSERT OR IGNORE INTO question_tasks (task_key, language, question_id) VALUES (?, ?, ?)",
+                        (task_key, language, question_id),
+                    )
+                    self._conn.executemany(
+                        "INSERT OR IGNORE INTO question_concepts (concept, language, question_id) VALUES (?, ?, ?)",
+                        [(concept, language, question_id) for concept in payload["concepts"]],
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._stats["questions_added"] += added
+        if added:
+            logger.info(f"Added {added} questions to the question bank ({language})")
+        return added
+
+    def _candidates(self, task_key: str, language: str, concepts: List[str], student_id: Optional[str]) -> Dict[int, tuple]:
+        """
+        question_id -> (payload, has_code) for the task's questions and, with concepts, the
+        questions tagged with them, minus those the student has seen.
+        """
+        seen_after = time.time() - self.seen_ttl
+        rows = self._conn.execute(
+            """SELECT q.id, q.payload, q.has_code FROM question_tasks t JOIN questions q ON q.id = t.question_id
+            WHERE t.task_key = ? AND t.language = ?
+            AND NOT EXISTS (SELECT 1 FROM question_seen s WHERE s.student_id = ? AND s.question_id = q.id AND s.seen_at > ?)""",
+            (task_key, language, student_id or "", seen_after),
+        ).fetchall()
+        if concepts:
+            rows += self._conn.execute(
+                f"""SELECT DISTINCT q.id, q.payload, q.has_code FROM question_concepts c JOIN questions q ON q.id = c.question_id
+                WHERE c.language = ? AND c.concept IN ({", ".join("?" * len(concepts))})
+                AND NOT EXISTS (SELECT 1 FROM question_seen s WHERE s.student_id = ? AND s.question_id = q.id AND s.seen_at > ?)""",
+                (language, *concepts, student_id or "", seen_after),
+            ).fetchall()
+        return {question_id: (payload, has_code) for question_id, payload, has_code in rows}
+
+    def _pool_size(self, task_key: str, language: str, concepts: List[str]) -> int:
+        if not concepts:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM question_tasks WHERE task_key = ? AND language = ?",
+                (task_key, language),
+            ).fetchone()[0]
+        return self._conn.execute(
+            f"""SELECT COUNT(*) FROM (
+                SELECT question_id FROM question_tasks WHERE task_key = ? AND language = ?
+                UNION
+                SELECT question_id FROM question_concepts WHERE language = ? AND concept IN ({", ".join("?" * len(concepts))})
+            )""",
+            (task_key, language, language, *concepts),
+        ).fetchone()[0]
+
+    def assemble_quiz(self, task_description: str, language: str, student_id: Optional[str] = None, concepts: Optional[List[str]] = None, count: int = QUIZ_QUESTION_COUNT) -> Optional[List[Dict[str, Any]]]:
+        """
+        Draw a random quiz of `count` questions for the task, with the usual share of code
+        questions and none the student has seen. Questions tagged with `concepts` in the
+        same language widen the pool. Returns None when the bank is too thin; the caller
+        then generates the quiz.
+        """
+        language = getattr(language, "value", language)
+        task_key = task_fingerprint(task_description)
+        concepts = normalize_concepts(concepts)
+        with self._lock:
+            pool = self._pool_size(task_key, language, concepts)
+            candidates = self._candidates(task_key, language, concepts, student_id) if pool >= self.min_pool else {}
+            if len(candidates) < count:
+                self._stats["thin"] += 1
+                return None
+
+            ids = list(candidates)
+            code_ids = [question_id for question_id in ids if candidates[question_id][1]]
+            chosen = random.sample(code_ids, min(code_question_count(count), len(code_ids)))
+            rest = [question_id for question_id in ids if question_id not in chosen]
+            chosen += random.sample(rest, count - len(chosen))
+            random.shuffle(chosen)
+
+            if student_id:
+                now = time.time()
+                self._conn.execute("BEGIN")
+                self._conn.execute(
+                    "DELETE FROM question_seen WHERE student_id = ? AND seen_at <= ?",
+                    (student_id, now - self.seen_ttl),
+                )
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO question_seen (student_id, question_id, seen_at) VALUES (?, ?, ?)",
+                    [(student_id, question_id, now) for question_id in chosen],
+                )
+                self._conn.execute("COMMIT")
+            self._stats["assembled"] += 1
+
+        questions = []
+        for i, question_id in enumerate(chosen):
+            question = json.loads(candidates[question_id][0])
+            question["id"] = f"q{i + 1}"
+            questions.append(question)
+        return questions
+
+    def record_served(self, student_id: Optional[str], task_description: str, language: str, questions: List[Dict[str, Any]]) -> None:
+        """
+        Mark the questions of a generated quiz as seen by the student, so assembled quizzes
+        do not repeat them.
+        """
+        if not student_id or not questions:
+            return
+        language = getattr(language, "value", language)
+        hashes = [make_cache_key(language, question_fingerprint(question)) for question in questions]
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.execute(
+                f"""INSERT OR REPLACE INTO question_seen (student_id, question_id, seen_at)
+                SELECT ?, id, ? FROM questions WHERE content_hash IN ({", ".join("?" * len(hashes))})""",
+                (student_id, now, *hashes),
+            )
+            self._conn.execute("COMMIT")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            questions = self._conn.execute("SELECT COUNT(*) FROM questions").fetchone()[0]
+            tasks = self._conn.execute("SELECT COUNT(DISTINCT task_key || ':' || language) FROM question_tasks").fetchone()[0]
+            concepts = self._conn.execute("SELECT COUNT(DISTINCT concept) FROM question_concepts").fetchone()[0]
+            lookups = self._stats["assembled"] + self._stats["thin"]
+            return {
+                "enabled": QUESTION_BANK_ENABLED,
+                "questions": questions,
+                "tasks": tasks,
+                "concepts": concepts,
+                "min_pool": self.min_pool,
+                **self._stats,
+                "hit_rate": self._stats["assembled"] / lookups if lookups else 0.0,
+            }
+
+
+_question_bank: Optional[QuestionBank] = None
+
+
+def get_question_bank() -> QuestionBank:
+    global _question_bank
+    if _question_bank is None:
+        _question_bank = QuestionBank()
+    return _question_bank
+
+
+def _assemble_quiz(task_description: str, language: str, student_id: Optional[str], concepts: Optional[List[str]]) -> Optional[List[Dict[str, Any]]]:
+    return get_question_bank().assemble_quiz(task_description, language, student_id, concepts)
+
+
+def _store_quiz(task_description: str, language: str, questions: List[Dict[str, Any]], student_id: Optional[str]) -> None:
+    bank = get_question_bank()
+    bank.add_questions(task_description, language, questions)
+    bank.record_served(student_id, task_description, language, questions)
+
+
+async def assemble_quiz_from_bank(task_description: str, language: str, student_id: Optional[str] = None, concepts: Optional[List[str]] = None) -> Optional[List[Dict[str, Any]]]:
+    """
+    A quiz assembled from the bank, or None when the bank is disabled, too thin or
+    unavailable. The SQLite work runs in a thread.
+    """
+    if not QUESTION_BANK_ENABLED:
+        return None
+    try:
+        return await asyncio.to_thread(_assemble_quiz, task_description, language, student_id, concepts)
+    except Exception as e:
+        logger.error(f"Question bank lookup failed: {str(e)}")
+        return None
+
+
+async def store_quiz(task_description: str, language: str, questions: List[Dict[str, Any]], student_id: Optional[str] = None) -> None:
+    """
+    Add the questions of a generated or catalog quiz to the bank and mark them as seen
+    by the student. The SQLite work runs in a thread.
+    """
+    if not QUESTION_BANK_ENABLED or not questions:
+        return
+    try:
+        await asyncio.to_thread(_store_quiz, task_description, language, questions, student_id)
+    except Exception as e:
+        logger.error(f"Failed to store quiz in the question bank: {str(e)}")
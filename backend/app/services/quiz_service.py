@@ -1,65 +1,100 @@
 import os
-import google.generativeai as genai
-from dotenv import load_dotenv
+import re
+import time
+import asyncio
+import difflib
 import logging
+from app.services.llm_client import generate_text, stream_text
+from app.services.json_stream import JSONArrayStreamParser
 import json
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, AsyncIterator
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Load environment variables
-load_dotenv()
+# Number of questions in a quiz
+QUIZ_QUESTION_COUNT = int(os.getenv("QUIZ_QUESTION_COUNT", "10"))
 
-# Initialize model as None
-model = None
+# Number of parallel prompts a quiz is split into (1 = a single prompt for all questions)
+QUIZ_SHARDS = int(os.getenv("QUIZ_SHARDS", "1"))
 
-def initialize_gemini():
-    global model
-    try:
-        api_key = os.getenv("GEMINI_API_KEY")
-        if not api_key:
-            raise ValueError("GEMINI_API_KEY environment variable is not set")
-        
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-2.0-flash')
-        logger.info("Gemini API initialized successfully")
-    except Exception as e:
-        logger.error(f"Failed to initialize Gemini API: {str(e)}")
-        raise
+# Similarity above which two questions are considered duplicates when merging shards
+QUIZ_DUPLICATE_THRESHOLD = float(os.getenv("QUIZ_DUPLICATE_THRESHOLD", "0.9"))
+
+# Topics a quiz covers; shards split them between each other
+QUIZ_FOCUS_AREAS = [
+    "Core concepts related to the task",
+    "Implementation details",
+    "Best practices",
+    "Common pitfalls",
+    "Language-specific features",
+]
+
+# Number of repair prompts allowed per quiz when questions are missing or invalid
+QUIZ_REPAIR_ATTEMPTS = int(os.getenv("QUIZ_REPAIR_ATTEMPTS", "2"))
 
-# Initialize Gemini on module import
-try:
-    initialize_gemini()
-except Exception as e:
-    logger.error(f"Failed to initialize Gemini API during startup: {str(e)}")
+quiz_stats = {
+    "quizzes": 0,
+    "shards_configured": QUIZ_SHARDS,
+    "shard_calls": 0,
+    "shard_failures": 0,
+    "duplicates_removed": 0,
+    "total_latency_ms": 0.0,
+    "last_latency_ms": 0.0,
+    "last_shards": 0,
+}
 
-async def generate_quiz(task_description: str, language: str) -> List[Dict[str, Any]]:
+quiz_repair_stats = {
+    "questions_validated": 0,
+    "failures_by_type": {},
+    "quizzes_repaired": 0,
+    "repair_calls": 0,
+    "slots_repaired": 0,
+    "repair_failures": 0,
+}
+
+# Fields every generated question needs; ids are (re)assigned when questions are merged
+REQUIRED_QUESTION_FIELDS = ['question', 'options', 'correct_answer']
+
+# Validation failure types and the messages reported for them
+QUESTION_PROBLEMS = {
+    "not_object": "Question {n} is not an object",
+    "missing_fields": "Question {n} is missing required fields",
+    "option_count": "Question {n} must have exactly 4 options",
+    "answer_not_in_options": "Question {n} correct answer must be one of the options",
+    "code_snippet_type": "Question {n} code_snippet must be a string",
+    "invalid_json": "Reply is not a valid JSON array of questions",
+}
+
+def record_invalid_reply(count: int) -> None:
     """
-    Generate a quiz with 10 questions about the task and its implementation.
+    Count the `count` questions asked for by an unparsable reply as validated and failed,
+    so that failure rates are per requested question.
     """
-    if not model:
-        try:
-            initialize_gemini()
-        except Exception as e:
-            raise Exception("Failed to initialize Gemini API. Please check your API key.")
+    quiz_repair_stats["questions_validated"] += count
+    quiz_repair_stats["failures_by_type"]["invalid_json"] = quiz_repair_stats["failures_by_type"].get("invalid_json", 0) + count
 
-    try:
-        prompt = f"""Generate a quiz with 10 multiple-choice questions about the following programming task in {language}:
+def code_question_count(count: int) -> int:
+    """
+    Questions with code snippets in a quiz of `count` questions (3 in a full quiz).
+    """
+    return max(1, round(3 * count / QUIZ_QUESTION_COUNT))
+
+def build_quiz_prompt(task_description: str, language: str, count: int = QUIZ_QUESTION_COUNT, focus_areas: Optional[List[str]] = None) -> str:
+    topics = "\n".join(f"           - {area}" for area in (focus_areas or QUIZ_FOCUS_AREAS))
+    # Keep the share of code questions when a shard asks for fewer questions
+    code_questions = code_question_count(count)
+    return f"""Generate a quiz with {count} multiple-choice questions about the following programming task in {language}:
         Task: {task_description}
         
         Requirements:
         1. Questions should test understanding of:
-           - Core concepts related to the task
-           - Implementation details
-           - Best practices
-           - Common pitfalls
-           - Language-specific features
+{topics}
         2. Each question should have 4 options
         3. Include one correct answer per question
         4. Questions should be challenging but fair
-        5. Include at least 3 questions with code snippets that test understanding of code execution
+        5. Include at least {code_questions} questions with code snippets that test understanding of code execution
         6. Return the questions in the following JSON format:
         [
             {{
@@ -67,7 +102,8 @@ async def generate_quiz(task_description: str, language: str) -> List[Dict[str,
                 "question": "Question text",
                 "code_snippet": "Optional code snippet to analyze",
                 "options": ["Option A", "Option B", "Option C", "Option D"],
-                "correct_answer": "Option A"
+                "correct_answer": "Option A",
+                "concepts": ["concept tested", "another concept"]
             }},
             ...
         ]
@@ -76,55 +112,273 @@ async def generate_quiz(task_description: str, language: str) -> List[Dict[str,
         - Return ONLY the JSON array, no other text, markdown formatting, or backticks
         - For questions with code snippets, make sure the options are about what the code will do or output
         - For questions without code snippets, focus on conceptual understanding
-        - The code_snippet field should be omitted for non-code questions"""
+        - The code_snippet field should be omitted for non-code questions
+        - "concepts" lists 1-3 short, general concept tags per question (e.g. "recursion", "list slicing")"""
 
-        response = await model.generate_content_async(prompt)
-        
-        if not response or not response.text:
-            raise ValueError("No response from AI model")
+def clean_quiz_response(response_text: str) -> str:
+    # Clean the response text to ensure it's valid JSON
+    response_text = response_text.strip()
+    # Remove any markdown code block indicators
+    response_text = response_text.replace('```json', '').replace('```', '')
+    # Remove any leading/trailing whitespace
+    return response_text.strip()
+
+def find_question_problem(question: Any, required_fields: List[str] = REQUIRED_QUESTION_FIELDS) -> Optional[str]:
+    """
+    Return the failure type of an invalid question (a key of QUESTION_PROBLEMS), or None.
+    """
+    if not isinstance(question, dict):
+        return "not_object"
+    if not all(key in question for key in required_fields):
+        return "missing_fields"
+    if not isinstance(question['options'], list) or len(question['options']) != 4:
+        return "option_count"
+    if question['correct_answer'] not in question['options']:
+        return "answer_not_in_options"
+    
+    # Validate code_snippet if present
+    if 'code_snippet' in question and question['code_snippet'] is not None:
+        if not isinstance(question['code_snippet'], str):
+            return "code_snippet_type"
+    return None
+
+def plan_quiz_shards(count: int, shards: int) -> List[Dict[str, Any]]:
+    """
+    Split `count` questions into near-equal shards, each with its own focus areas.
+    """
+    shards = max(1, min(shards, count))
+    plan = []
+    for i in range(shards):
+        size = count // shards + (1 if i < count % shards else 0)
+        focus_areas = [area for j, area in enumerate(QUIZ_FOCUS_AREAS) if j % shards == i % len(QUIZ_FOCUS_AREAS)]
+        plan.append({"count": size, "focus_areas": focus_areas or [QUIZ_FOCUS_AREAS[i % len(QUIZ_FOCUS_AREAS)]]})
+    return plan
+
+def question_fingerprint(question: Dict[str, Any]) -> str:
+    options = " ".join(sorted(str(option) for option in question.get("options") or []))
+    text = f"{question.get('question', '')} {question.get('code_snippet') or ''} {options}"
+    return " ".join(re.findall(r"[a-z0-9]+", text.lower()))
+
+def is_duplicate_question(fingerprint: str, other: str) -> bool:
+    if fingerprint == other:
+        return True
+    # Questions that only differ in their numbers (e.g. f(3) vs f(4)) are distinct
+    if re.findall(r"\d+", fingerprint) != re.findall(r"\d+", other):
+        return False
+    return difflib.SequenceMatcher(None, fingerprint, other).ratio() >= QUIZ_DUPLICATE_THRESHOLD
+
+def merge_quiz_questions(question_lists: List[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """
+    Merge shard results, dropping near-identical questions, and reassign ids q1..qN.
+    """
+    merged = []
+    fingerprints = []
+    for questions in question_lists:
+        for question in questions:
+            fingerprint = question_fingerprint(question)
+            if any(is_duplicate_question(fingerprint, other) for other in fingerprints):
+                quiz_stats["duplicates_removed"] += 1
+                continue
+            fingerprints.append(fingerprint)
+            merged.append(question)
+    
+    for i, question in enumerate(merged):
+        question["id"] = f"q{i + 1}"
+    return merged
+
+def parse_quiz_reply(response_text: str) -> List[Any]:
+    """
+    Parse a quiz reply into a list of raw question objects. When the reply is not valid
+    JSON as a whole (e.g. truncated), every complete object in the array is salvaged.
+    """
+    response_text = clean_quiz_response(response_text or "")
+    try:
+        questions = json.loads(response_text)
+        if isinstance(questions, list):
+            return questions
+        if isinstance(questions, dict):
+            return [questions]
+        return []
+    except json.JSONDecodeError as e:
+        logger.error(f"Error parsing quiz JSON: {str(e)}")
+        return JSONArrayStreamParser().feed(response_text)
+
+def salvage_questions(questions: List[Any], required_fields: List[str] = REQUIRED_QUESTION_FIELDS) -> List[Dict[str, Any]]:
+    """
+    Keep the valid questions, recording the failure type of every invalid one.
+    """
+    valid = []
+    for i, question in enumerate(questions):
+        quiz_repair_stats["questions_validated"] += 1
+        problem = find_question_problem(question, required_fields)
+        if problem:
+            logger.warning(f"Dropping invalid question: {QUESTION_PROBLEMS[problem].format(n=i+1)}")
+            quiz_repair_stats["failures_by_type"][problem] = quiz_repair_stats["failures_by_type"].get(problem, 0) + 1
+            continue
+        valid.append(question)
+    return valid
+
+async def generate_quiz_questions(prompt: str, count: int) -> List[Dict[str, Any]]:
+    """
+    Run one quiz prompt and return the valid questions of the reply (at most `count`).
+    Invalid questions are dropped so that only their slots need to be repaired.
+    """
+    response_text = await generate_text(prompt)
+    
+    if not response_text:
+        raise ValueError("No response from AI model")
+    
+    questions = parse_quiz_reply(response_text)
+    if not questions:
+        record_invalid_reply(count)
+        logger.error(f"Raw response: {response_text}")
+    valid = salvage_questions(questions)
+    if len(valid) != count:
+        logger.warning(f"Quiz reply had {len(valid)} valid questions out of {count} requested")
+    return valid[:count]
+
+def build_repair_prompt(task_description: str, language: str, count: int, existing: List[Dict[str, Any]]) -> str:
+    asked = "\n".join(f"- {question['question']}" for question in existing)
+    return f"""Write {count} more multiple-choice questions about this {language} programming task: {task_description}
+Each question needs exactly 4 distinct options and a correct_answer that is copied exactly from its options.
+Do not repeat these questions:
+{asked or "- (none)"}
+Return ONLY a JSON array: [{{"question": "...", "code_snippet": "optional", "options": ["A", "B", "C", "D"], "correct_answer": "A", "concepts": ["1-3 short concept tags"]}}]"""
+
+async def repair_quiz(task_description: str, language: str, questions: List[Dict[str, Any]], count: int = QUIZ_QUESTION_COUNT) -> List[Dict[str, Any]]:
+    """
+    Fill the missing slots of a quiz by re-asking the model only for the missing number of
+    questions, with a bounded number of attempts. Returns the questions to add.
+    """
+    added = []
+    missing = count - len(questions)
+    if missing <= 0:
+        return added
+    
+    quiz_repair_stats["quizzes_repaired"] += 1
+    fingerprints = [question_fingerprint(question) for question in questions]
+    for attempt in range(QUIZ_REPAIR_ATTEMPTS):
+        missing = count - len(questions) - len(added)
+        if missing <= 0:
+            break
+        quiz_repair_stats["repair_calls"] += 1
+        logger.info(f"Repairing quiz: asking for {missing} questions (attempt {attempt + 1})")
+        try:
+            response_text = await generate_text(build_repair_prompt(task_description, language, missing, questions + added))
+        except Exception as e:
+            logger.error(f"Error repairing quiz: {str(e)}")
+            continue
+        questions_received = parse_quiz_reply(response_text or "")
+        if not questions_received:
+            record_invalid_reply(missing)
+        for question in salvage_questions(questions_received):
+            if len(questions) + len(added) >= count:
+                break
+            fingerprint = question_fingerprint(question)
+            if any(is_duplicate_question(fingerprint, other) for other in fingerprints):
+                quiz_stats["duplicates_removed"] += 1
+                continue
+            fingerprints.append(fingerprint)
+            added.append(question)
+    
+    quiz_repair_stats["slots_repaired"] += len(added)
+    if len(questions) + len(added) < count:
+        quiz_repair_stats["repair_failures"] += 1
+    return added
+
+async def generate_quiz(task_description: str, language: str, shards: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Generate a quiz with 10 questions about the task and its implementation.
+
+    With more than one shard, the questions are requested by parallel prompts that each
+    cover part of the focus areas, then merged and de-duplicated. Invalid or missing
+    questions, including those of a shard whose prompt failed, are repaired with a compact
+    follow-up prompt instead of regenerating the quiz.
+    """
+    started = time.monotonic()
+    shards = QUIZ_SHARDS if shards is None else shards
+    try:
+        plan = plan_quiz_shards(QUIZ_QUESTION_COUNT, shards)
+        quiz_stats["shard_calls"] += len(plan)
+        quiz_stats["last_shards"] = len(plan)
+        if len(plan) == 1:
+            shard_results = [await generate_quiz_questions(build_quiz_prompt(task_description, language), QUIZ_QUESTION_COUNT)]
+        else:
+            logger.info(f"Generating quiz in {len(plan)} shards: {[shard['count'] for shard in plan]}")
+            shard_results = await asyncio.gather(*[
+                generate_quiz_questions(
+                    build_quiz_prompt(task_description, language, shard["count"], shard["focus_areas"]),
+                    shard["count"]
+                )
+                for shard in plan
+            ], return_exceptions=True)
+            failures = [result for result in shard_results if isinstance(result, BaseException)]
+            if failures:
+                quiz_stats["shard_failures"] += len(failures)
+                # Nothing to repair from: report the error as the single prompt would
+                if len(failures) == len(shard_results):
+                    raise failures[0]
+                logger.warning(f"{len(failures)} of {len(plan)} quiz shards failed, repairing their questions: {str(failures[0])}")
+                shard_results = [result for result in shard_results if not isinstance(result, BaseException)]
+        questions = merge_quiz_questions(shard_results)
         
-        # Clean the response text to ensure it's valid JSON
-        response_text = response.text.strip()
-        # Remove any markdown code block indicators
-        response_text = response_text.replace('```json', '').replace('```', '')
-        # Remove any leading/trailing whitespace
-        response_text = response_text.strip()
+        if len(questions) < QUIZ_QUESTION_COUNT:
+            questions = merge_quiz_questions([questions, await repair_quiz(task_description, language, questions)])
+        if len(questions) != QUIZ_QUESTION_COUNT:
+            raise ValueError(f"Failed to parse quiz questions: Expected {QUIZ_QUESTION_COUNT} questions, got {len(questions)}")
         
-        # Parse the JSON response
-        try:
-            questions = json.loads(response_text)
-            if not isinstance(questions, list):
-                raise ValueError("Response is not a list")
-            if len(questions) != 10:
-                raise ValueError(f"Expected 10 questions, got {len(questions)}")
-            
-            # Validate each question has the required fields
-            for i, question in enumerate(questions):
-                if not all(key in question for key in ['id', 'question', 'options', 'correct_answer']):
-                    raise ValueError(f"Question {i+1} is missing required fields")
-                if not isinstance(question['options'], list) or len(question['options']) != 4:
-                    raise ValueError(f"Question {i+1} must have exactly 4 options")
-                if question['correct_answer'] not in question['options']:
-                    raise ValueError(f"Question {i+1} correct answer must be one of the options")
-                
-                # Validate code_snippet if present
-                if 'code_snippet' in question and question['code_snippet'] is not None:
-                    if not isinstance(question['code_snippet'], str):
-                        raise ValueError(f"Question {i+1} code_snippet must be a string")
-            
-            return questions
-        except json.JSONDecodeError as e:
-            logger.error(f"Error parsing quiz JSON: {str(e)}")
-            logger.error(f"Raw response: {response_text}")
-            raise ValueError("Failed to parse quiz questions: Invalid JSON format")
-        except ValueError as e:
-            logger.error(f"Error validating quiz format: {str(e)}")
-            raise ValueError(f"Failed to parse quiz questions: {str(e)}")
+        latency_ms = (time.monotonic() - started) * 1000
+        quiz_stats["quizzes"] += 1
+        quiz_stats["total_latency_ms"] += latency_ms
+        quiz_stats["last_latency_ms"] = latency_ms
+        return questions
     
     except Exception as e:
         logger.error(f"Error generating quiz: {str(e)}")
         raise Exception(f"Failed to generate quiz: {str(e)}")
 
+def get_quiz_stats() -> Dict[str, Any]:
+    quizzes = quiz_stats["quizzes"]
+    validated = quiz_repair_stats["questions_validated"]
+    return {
+        **quiz_stats,
+        "avg_latency_ms": quiz_stats["total_latency_ms"] / quizzes if quizzes else 0.0,
+        "repair": {
+            **quiz_repair_stats,
+            "failure_rates": {
+                problem: count / validated for problem, count in quiz_repair_stats["failures_by_type"].items()
+            } if validated else {},
+            "repair_rate": quiz_repair_stats["quizzes_repaired"] / quizzes if quizzes else 0.0,
+        },
+    }
+
+async def stream_quiz(task_description: str, language: str, count: int = QUIZ_QUESTION_COUNT) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Stream quiz questions as soon as each one has been generated and validated.
+
+    Invalid questions are dropped instead of failing the quiz; the missing slots are
+    repaired once the main reply is complete. Questions get stable ids q1..qN in the
+    order they are delivered.
+    """
+    accepted = []
+    parser = JSONArrayStreamParser()
+    async for chunk in stream_text(build_quiz_prompt(task_description, language, count)):
+        for question in parser.feed(chunk):
+            if len(accepted) >= count:
+                continue
+            if not salvage_questions([question]):
+                continue
+            question["id"] = f"q{len(accepted) + 1}"
+            accepted.append(question)
+            yield question
+    
+    if len(accepted) < count:
+        logger.info(f"Repairing {count - len(accepted)} streamed quiz questions")
+        for question in await repair_quiz(task_description, language, accepted, count):
+            question["id"] = f"q{len(accepted) + 1}"
+            accepted.append(question)
+            yield question
+
 async def check_quiz_answers(questions: List[Dict[str, Any]], answers: Dict[str, str]) -> Dict[str, Any]:
     """
     Check the quiz answers against the provided questions.
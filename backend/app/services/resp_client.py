@@ -0,0 +1,176 @@
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Union
+from urllib.parse import urlparse, unquote
+
+logger = logging.getLogger(__name__)
+
+CONNECTION_CLOSED = "Connection closed by the server"
+
+
+class RespError(Exception):
+    """
+    Error reply from the server (e.g. WRONGTYPE) or a broken connection.
+    """
+
+
+def encode_command(*args: Union[str, bytes, int, float]) -> bytes:
+    """
+    Encode a command as a RESP array of bulk strings.
+    """
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if isinstance(arg, bytes):
+            data = arg
+        else:
+            data = str(arg).encode("utf-8")
+        parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+    return b"".join(parts)
+
+
+async def read_reply(reader: asyncio.StreamReader) -> Any:
+    line = await reader.readline()
+    if not line.endswith(b"\r\n"):
+        raise RespError(CONNECTION_CLOSED)
+    kind, payload = line[:1], line[1:-2]
+    if kind == b"+":
+        return payload.decode("utf-8")
+    if kind == b"-":
+        raise RespError(payload.decode("utf-8", errors="replace"))
+    if kind == b":":
+        return int(payload)
+    if kind == b"$":
+        size = int(payload)
+        if size < 0:
+            return None
+        data = await reader.readexactly(size + 2)
+        return data[:-2]
+    if kind == b"*":
+        count = int(payload)
+        if count < 0:
+            return None
+        return [await read_reply(reader) for _ in range(count)]
+    raise RespError(f"Unexpected reply type: {line[:32]!r}")
+
+
+class RespConnection:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+
+    async def execute(self, *args: Union[str, bytes, int, float]) -> Any:
+        self.writer.write(encode_command(*args))
+        await self.writer.drain()
+        return await read_reply(self.reader)
+
+    def is_stale(self) -> bool:
+        """
+        Whether the server closed the connection while it sat in the pool.
+        """
+        return self.reader.at_eof() or self.writer.is_closing()
+
+    def close(self) -> None:
+        self.writer.close()
+
+
+class RespClient:
+    """
+    Minimal client for servers speaking the Redis protocol (Redis, Valkey, KeyDB,
+    Dragonfly), with a bounded pool of connections opened on demand.
+
+    URL format: redis://[:password@]host[:port][/db].
+    """
+
+    def __init__(self, url: str, pool_size: int = 8, timeout: float = 5.0):
+        parsed = urlparse(url)
+        if parsed.scheme != "redis":
+            raise ValueError(f"Unsupported URL scheme: {parsed.scheme}")
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.username = unquote(parsed.username) if parsed.username else None
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.timeout = timeout
+        self._idle: List[RespConnection] = []
+        self._slots = asyncio.Semaphore(pool_size)
+        self._stats = {
+            "commands": 0,
+            "connections_created": 0,
+            "stale_connections": 0,
+            "errors": 0,
+        }
+
+    async def _connect(self) -> RespConnection:
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        connection = RespConnection(reader, writer)
+        try:
+            if self.password is not None:
+                if self.username:
+                    await connection.execute("AUTH", self.username, self.password)
+                else:
+                    await connection.execute("AUTH", self.password)
+            if self.db:
+                await connection.execute("SELECT", self.db)
+        except Exception:
+            connection.close()
+            raise
+        self._stats["connections_created"] += 1
+        return connection
+
+    def _pooled(self) -> Optional[RespConnection]:
+        while self._idle:
+            connection = self._idle.pop()
+            if not connection.is_stale():
+                return connection
+            connection.close()
+            self._stats["stale_connections"] += 1
+        return None
+
+    async def execute(self, *args: Union[str, bytes, int, float]) -> Any:
+        """
+        Send one command and return its reply. Connections are dropped after a timeout or
+        I/O error (error replies leave them usable). Pooled connections the server closed
+        while idle are replaced before the command is sent; a command is never sent twice,
+        since it may have run even when its reply was lost.
+        """
+        async with self._slots:
+            connection = self._pooled()
+            try:
+                if connection is None:
+                    connection = await asyncio.wait_for(self._connect(), timeout=self.timeout)
+                self._stats["commands"] += 1
+                reply = await asyncio.wait_for(connection.execute(*args), timeout=self.timeout)
+            except RespError as e:
+                if connection is not None and str(e) != CONNECTION_CLOSED:
+                    self._idle.append(connection)
+                elif connection is not None:
+                    connection.close()
+                self._stats["errors"] += 1
+                raise
+            except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+                # Caught before OSError, which TimeoutError is since Python 3.11. The reply
+                # may still arrive; the connection cannot be reused
+                if connection is not None:
+                    connection.close()
+                if isinstance(e, asyncio.CancelledError):
+                    raise
+                self._stats["errors"] += 1
+                raise RespError(f"Redis command {args[0]} timed out after {self.timeout}s")
+            except (OSError, asyncio.IncompleteReadError) as e:
+                if connection is not None:
+                    connection.close()
+                self._stats["errors"] += 1
+                raise RespError(f"Redis command {args[0]} failed: {str(e) or type(e).__name__}")
+            self._idle.append(connection)
+            return reply
+
+    async def close(self) -> None:
+        while self._idle:
+            self._idle.pop().close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "url": f"redis://{self.host}:{self.port}/{self.db}",
+            "idle_connections": len(self._idle),
+            **self._stats,
+        }
@@ -0,0 +1,271 @@
+import os
+import math
+import time
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+# Execution scheduler configuration
+EXEC_SCHEDULER_ENABLED = os.getenv("EXEC_SCHEDULER_ENABLED", "1") == "1"
+# Concurrent executions per language; compiled languages hold a worker much longer
+EXEC_WORKERS_DEFAULT = int(os.getenv("EXEC_WORKERS_DEFAULT", "6"))
+EXEC_WORKERS_COMPILED = int(os.getenv("EXEC_WORKERS_COMPILED", "2"))
+# Executions waiting per language before new ones are rejected with 503
+EXEC_QUEUE_MAX_DEPTH = int(os.getenv("EXEC_QUEUE_MAX_DEPTH", "32"))
+# Executions one client (by the ID it sends) may have queued or running per language before 429
+EXEC_QUEUE_MAX_PER_CLIENT = int(os.getenv("EXEC_QUEUE_MAX_PER_CLIENT", "3"))
+# Executions one network address may have queued or running per language, whatever client
+# IDs its requests carry; a classroom behind NAT shares one address (0 = no limit)
+EXEC_QUEUE_MAX_PER_ADDRESS = int(os.getenv("EXEC_QUEUE_MAX_PER_ADDRESS", "24"))
+# Executions still queued after this long are rejected with 503
+EXEC_QUEUE_MAX_WAIT_SECONDS = float(os.getenv("EXEC_QUEUE_MAX_WAIT_SECONDS", "30"))
+
+COMPILED_LANGUAGES = {"java", "cpp", "csharp", "go", "rust", "swift"}
+
+# Weight of the latest run in the moving average of execution time
+SERVICE_TIME_SMOOTHING = 0.2
+
+
+def language_workers(language: str) -> int:
+    """
+    Worker limit for a language: EXEC_WORKERS_<LANGUAGE> when set, otherwise the default
+    for compiled or interpreted languages.
+    """
+    override = os.getenv(f"EXEC_WORKERS_{language.upper()}")
+    if override:
+        return int(override)
+    return EXEC_WORKERS_COMPILED if language in COMPILED_LANGUAGES else EXEC_WORKERS_DEFAULT
+
+
+class ClientKey(NamedTuple):
+    """
+    Who an execution runs for: the ID the client sent (None when it sent none) and its
+    network address.
+    """
+    client_id: Optional[str]
+    address: str
+
+    @property
+    def queue_key(self) -> str:
+        # Clients without an ID are queued, and limited, by address only
+        return f"id:{self.client_id}" if self.client_id else f"address:{self.address}"
+
+
+ANONYMOUS = ClientKey(None, "unknown")
+
+
+class SchedulerRejected(Exception):
+    """
+    Raised when an execution is not admitted: 429 when the client has too many executions
+    pending, 503 when the language queue is overloaded. `retry_after` is in seconds.
+    """
+
+    def __init__(self, status_code: int, detail: str, retry_after: int):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class LanguageQueue:
+    """
+    Worker slots for one language with per-client fair queuing: waiting clients are
+    served round-robin, so a client with many queued runs only gets every n-th slot.
+
+    Pending executions are capped per client ID (max_per_client) and per address
+    (max_per_address), so rotating the ID does not lift the address cap and clients that
+    share an address without sending an ID are not held to the per-client cap.
+    """
+
+    def __init__(self, language: str, workers: int, max_depth: int, max_per_client: int, max_wait: float, max_per_address: int = EXEC_QUEUE_MAX_PER_ADDRESS):
+        self.language = language
+        self.workers = workers
+        self.max_depth = max_depth
+        self.max_per_client = max_per_client
+        self.max_per_address = max_per_address
+        self.max_wait = max_wait
+        self.running = 0
+        self.queued = 0
+        # client -> waiters in arrival order; the first client is served next
+        self._waiting: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+        self._pending: Dict[str, int] = {}
+        self._address_pending: Dict[str, int] = {}
+        self._service_seconds = 1.0
+        self._stats = {
+            "admitted": 0,
+            "completed": 0,
+            "rejected_client": 0,
+            "rejected_address": 0,
+            "rejected_overload": 0,
+            "rejected_wait": 0,
+            "peak_queued": 0,
+            "total_wait_seconds": 0.0,
+        }
+
+    def retry_after(self) -> int:
+        """
+        Estimated seconds until a new execution would get a worker.
+        """
+        backlog = (self.queued + 1) / max(self.workers, 1)
+        return max(1, math.ceil(backlog * self._service_seconds))
+
+    def _admit(self, client: ClientKey, max_pending: Optional[int] = None) -> None:
+        limit = self.max_per_client if max_pending is None else max_pending
+        if client.client_id and self._pending.get(client.queue_key, 0) >= limit:
+            self._stats["rejected_client"] += 1
+            raise SchedulerRejected(
+                429,
+                f"Too many {self.language} executions pending for this client",
+                self.retry_after(),
+            )
+        if self.max_per_address and self._address_pending.get(client.address, 0) >= self.max_per_address:
+            self._stats["rejected_address"] += 1
+            raise SchedulerRejected(
+                429,
+                f"Too many {self.language} executions pending for this address",
+                self.retry_after(),
+            )
+        if self.running >= self.workers and self.queued >= self.max_depth:
+            self._stats["rejected_overload"] += 1
+            raise SchedulerRejected(
+                503,
+                f"The {self.language} execution queue is full",
+                self.retry_after(),
+            )
+
+    def _dispatch(self) -> None:
+        """
+        Hand free workers to waiting clients, round-robin.
+        """
+        while self.running < self.workers and self._waiting:
+            client_id, waiters = next(iter(self._waiting.items()))
+            waiter = waiters.popleft()
+            del self._waiting[client_id]
+            if waiters:
+                # Back of the line until every other waiting client had a turn
+                self._waiting[client_id] = waiters
+            self.queued -= 1
+            self.running += 1
+            waiter.set_result(None)
+
+    def _remove_waiter(self, client_id: str, waiter: "asyncio.Future") -> None:
+        waiters = self._waiting.get(client_id)
+        if waiters and waiter in waiters:
+            waiters.remove(waiter)
+            self.queued -= 1
+            if not waiters:
+                del self._waiting[client_id]
+
+    async def run(self, client: ClientKey, factory: Callable[[], Awaitable[Any]], max_pending: Optional[int] = None) -> Any:
+        self._admit(client, max_pending)
+        client_id = client.queue_key
+        self._pending[client_id] = self._pending.get(client_id, 0) + 1
+        self._address_pending[client.address] = self._address_pending.get(client.address, 0) + 1
+        self._stats["admitted"] += 1
+        enqueued = time.monotonic()
+        try:
+            if self.running < self.workers and not self._waiting:
+                self.running += 1
+            else:
+                waiter = asyncio.get_running_loop().create_future()
+                self._waiting.setdefault(client_id, deque()).append(waiter)
+                self.queued += 1
+                self._stats["peak_queued"] = max(self._stats["peak_queued"], self.queued)
+                try:
+                    await asyncio.wait_for(asyncio.shield(waiter), timeout=self.max_wait)
+                except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+                    if waiter.done():
+                        # Granted a worker while giving up: pass it on
+                        self.running -= 1
+                        self._dispatch()
+                    else:
+                        waiter.cancel()
+                        self._remove_waiter(client_id, waiter)
+                    if isinstance(e, asyncio.CancelledError):
+                        raise
+                    self._stats["rejected_wait"] += 1
+                    raise SchedulerRejected(
+                        503,
+                        f"Timed out waiting for a {self.language} execution worker",
+                        self.retry_after(),
+                    )
+            self._stats["total_wait_seconds"] += time.monotonic() - enqueued
+
+            started = time.monotonic()
+            try:
+                return await factory()
+            finally:
+                elapsed = time.monotonic() - started
+                self._service_seconds += SERVICE_TIME_SMOOTHING * (elapsed - self._service_seconds)
+                self._stats["completed"] += 1
+                self.running -= 1
+                self._dispatch()
+        finally:
+            self._pending[client_id] -= 1
+            if not self._pending[client_id]:
+                del self._pending[client_id]
+            self._address_pending[client.address] -= 1
+            if not self._address_pending[client.address]:
+                del self._address_pending[client.address]
+
+    def stats(self) -> Dict[str, Any]:
+        admitted = self._stats["admitted"]
+        return {
+            "workers": self.workers,
+            "running": self.running,
+            "queued": self.queued,
+            "waiting_clients": len(self._waiting),
+            "max_depth": self.max_depth,
+            **self._stats,
+            "utilization": self.running / self.workers if self.workers else 0.0,
+            "avg_wait_seconds": self._stats["total_wait_seconds"] / admitted if admitted else 0.0,
+            "avg_service_seconds": self._service_seconds,
+            "retry_after": self.retry_after(),
+        }
+
+
+class ExecutionScheduler:
+    """
+    Admission control and fair queuing in front of the execution backend, with one
+    queue and worker limit per language.
+    """
+
+    def __init__(self, enabled: bool = EXEC_SCHEDULER_ENABLED, max_depth: int = EXEC_QUEUE_MAX_DEPTH, max_per_client: int = EXEC_QUEUE_MAX_PER_CLIENT, max_wait: float = EXEC_QUEUE_MAX_WAIT_SECONDS, max_per_address: int = EXEC_QUEUE_MAX_PER_ADDRESS):
+        self.enabled = enabled
+        self.max_depth = max_depth
+        self.max_per_client = max_per_client
+        self.max_per_address = max_per_address
+        self.max_wait = max_wait
+        self._queues: Dict[str, LanguageQueue] = {}
+
+    def queue(self, language: str) -> LanguageQueue:
+        queue = self._queues.get(language)
+        if queue is None:
+            queue = LanguageQueue(language, language_workers(language), self.max_depth, self.max_per_client, self.max_wait, self.max_per_address)
+            self._queues[language] = queue
+        return queue
+
+    async def run(self, language: str, client: Optional[ClientKey], factory: Callable[[], Awaitable[Any]], max_pending: Optional[int] = None) -> Any:
+        """
+        Run `factory()` once a worker for the language is free. Raises SchedulerRejected
+        when the execution is not admitted.
+
+        `max_pending` replaces max_per_client for this execution, for callers such as
+        batches that bound their own concurrency and get their own budget; the address
+        cap, queue depth and fair queuing still apply.
+        """
+        if not self.enabled:
+            return await factory()
+        return await self.queue(language).run(client or ANONYMOUS, factory, max_pending)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "languages": {language: queue.stats() for language, queue in self._queues.items()},
+        }
+
+
+execution_scheduler = ExecutionScheduler()
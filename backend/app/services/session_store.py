@@ -0,0 +1,439 @@
+import os
+import json
+import time
+import zlib
+import heapq
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from app.services.sqlite_store import connect
+from app.services.resp_client import RespClient
+
+logger = logging.getLogger(__name__)
+
+# Quiz session store configuration
+# "memory" (one process), "sqlite" (processes on one host) or "redis" (several hosts)
+QUIZ_SESSION_BACKEND = os.getenv("QUIZ_SESSION_BACKEND", "memory")
+QUIZ_SESSION_TTL_SECONDS = float(os.getenv("QUIZ_SESSION_TTL_SECONDS", "7200"))
+QUIZ_SESSION_MAX_ENTRIES = int(os.getenv("QUIZ_SESSION_MAX_ENTRIES", "10000"))
+QUIZ_SESSION_MAX_BYTES = int(os.getenv("QUIZ_SESSION_MAX_BYTES", str(64 * 1024 * 1024)))
+QUIZ_SESSION_SWEEP_INTERVAL_SECONDS = float(os.getenv("QUIZ_SESSION_SWEEP_INTERVAL_SECONDS", "60"))
+QUIZ_SESSION_DB = os.getenv("QUIZ_SESSION_DB", "sessions.db")
+QUIZ_SESSION_REDIS_URL = os.getenv("QUIZ_SESSION_REDIS_URL", "redis://localhost:6379/0")
+QUIZ_SESSION_REDIS_PREFIX = os.getenv("QUIZ_SESSION_REDIS_PREFIX", "session:")
+QUIZ_SESSION_REDIS_POOL_SIZE = int(os.getenv("QUIZ_SESSION_REDIS_POOL_SIZE", "8"))
+
+# Serialized sessions at least this large are stored zlib-compressed
+COMPRESS_MIN_BYTES = 1024
+
+
+def encode_session(data: Any) -> bytes:
+    """
+    Compact serialization for the shared backends: minimal JSON, compressed when large.
+    The first byte tells which.
+    """
+    raw = json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    if len(raw) >= COMPRESS_MIN_BYTES:
+        return b"z" + zlib.compress(raw)
+    return b"j" + raw
+
+
+def decode_session(blob: bytes) -> Any:
+    if blob[:1] == b"z":
+        return json.loads(zlib.decompress(blob[1:]))
+    return json.loads(blob[1:])
+
+
+class SessionStore:
+    """
+    Interface for the session backends. Sessions have a fixed lifetime from creation;
+    `set` on an existing session saves its data without extending it. `on_remove(session_id)`
+    is called for sessions this process expires or evicts.
+    """
+    name = "base"
+
+    def __init__(self, namespace: str, ttl: float = QUIZ_SESSION_TTL_SECONDS, max_entries: int = QUIZ_SESSION_MAX_ENTRIES, max_bytes: int = QUIZ_SESSION_MAX_BYTES, on_remove: Optional[Callable[[str], None]] = None):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.on_remove = on_remove
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "writes": 0,
+            "expired": 0,
+            "evictions": 0,
+            "rejected": 0,
+            "errors": 0,
+            "sweeps": 0,
+        }
+
+    async def get(self, session_id: str) -> Optional[Any]:
+        """
+        The session's data in one lookup, or None when it does not exist or expired.
+        Changes to the data must be saved with `set`.
+        """
+        raise NotImplementedError
+
+    async def set(self, session_id: str, data: Any) -> bool:
+        """
+        Store a new session or save an existing one. Returns False when the session alone
+        exceeds `max_bytes`.
+        """
+        raise NotImplementedError
+
+    async def delete(self, session_id: str) -> bool:
+        raise NotImplementedError
+
+    async def sweep(self) -> int:
+        """
+        Remove expired sessions and enforce the caps. Returns the number removed.
+        """
+        return 0
+
+    async def close(self) -> None:
+        pass
+
+    def _reject(self, session_id: str, size: int) -> bool:
+        self._stats["rejected"] += 1
+        logger.warning(f"Session {session_id} ({size} bytes) exceeds the '{self.namespace}' store budget")
+        return False
+
+    def _removed(self, session_id: str) -> None:
+        if self.on_remove is not None:
+            try:
+                self.on_remove(session_id)
+            except Exception as e:
+                logger.error(f"Cleanup of session {session_id} failed: {str(e)}")
+
+    async def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.name,
+            "namespace": self.namespace,
+            "ttl": self.ttl,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            **self._stats,
+        }
+
+
+class MemorySessionStore(SessionStore):
+    """
+    Sessions in process memory, bounded by entry count and total JSON size.
+
+    Expiry uses a heap ordered by expiry time, so a sweep only touches the sessions that
+    expired; the caps are enforced on every write by evicting the least recently used
+    session. Only usable with a single server process.
+    """
+    name = "memory"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # session_id -> (expires_at, data, size), least recently used first
+        self._entries: "OrderedDict[str, Tuple[float, Any, int]]" = OrderedDict()
+        # (expires_at, session_id); entries of deleted sessions are skipped when popped
+        self._expiry: List[Tuple[float, str]] = []
+        self._bytes = 0
+
+    def _live(self, session_id: str) -> Optional[Tuple[float, Any, int]]:
+        entry = self._entries.get(session_id)
+        if entry is not None and entry[0] <= time.time():
+            # Expired but not swept yet
+            self._remove(session_id)
+            self._stats["expired"] += 1
+            return None
+        return entry
+
+    async def get(self, session_id: str) -> Optional[Any]:
+        # Not a copy: the caller's changes are visible before `set`, which only updates the size
+        entry = self._live(session_id)
+        if entry is None:
+            self._stats["misses"] += 1
+            return None
+        self._entries.move_to_end(session_id)
+        self._stats["hits"] += 1
+        return entry[1]
+
+    async def set(self, session_id: str, data: Any) -> bool:
+        size = len(json.dumps(data, separators=(",", ":"), ensure_ascii=False))
+        if size > self.max_bytes:
+            return self._reject(session_id, size)
+
+        entry = self._entries.pop(session_id, None)
+        if entry is not None:
+            expires_at = entry[0]
+            self._bytes -= entry[2]
+        else:
+            expires_at = time.time() + self.ttl
+            heapq.heappush(self._expiry, (expires_at, session_id))
+        self._entries[session_id] = (expires_at, data, size)
+        self._bytes += size
+        self._stats["writes"] += 1
+        self._evict(keep=session_id)
+        return True
+
+    async def delete(self, session_id: str) -> bool:
+        if session_id not in self._entries:
+            return False
+        self._remove(session_id)
+        return True
+
+    def _remove(self, session_id: str) -> None:
+        _, _, size = self._entries.pop(session_id)
+        self._bytes -= size
+        self._removed(session_id)
+        # Deleted sessions leave stale heap entries; rebuild once they dominate the heap
+        if len(self._expiry) > 2 * len(self._entries) + 64:
+            self._expiry = [(expires_at, key) for key, (expires_at, _, _) in self._entries.items()]
+            heapq.heapify(self._expiry)
+
+    def _evict(self, keep: Optional[str] = None) -> None:
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            session_id = next(iter(self._entries))
+            if session_id == keep:
+                break
+            logger.info(f"Evicting session {session_id} from the '{self.namespace}' store")
+            self._remove(session_id)
+            self._stats["evictions"] += 1
+
+    async def sweep(self) -> int:
+        now = time.time()
+        removed = 0
+        while self._expiry and self._expiry[0][0] <= now:
+            expires_at, session_id = heapq.heappop(self._expiry)
+            entry = self._entries.get(session_id)
+            if entry is None or entry[0] != expires_at:
+                continue
+            self._remove(session_id)
+            removed += 1
+        self._stats["expired"] += removed
+        self._stats["sweeps"] += 1
+        if removed:
+            logger.info(f"Expired {removed} sessions from the '{self.namespace}' store")
+        return removed
+
+    async def stats(self) -> Dict[str, Any]:
+        return {
+            **await super().stats(),
+            "sessions": len(self._entries),
+            "bytes": self._bytes,
+            "expiry_index_size": len(self._expiry),
+        }
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Sessions in a SQLite table in WAL mode, shared by all server processes on one host.
+
+    Expiry is indexed, so a sweep deletes only the expired rows. The caps are enforced by
+    the sweeper, oldest sessions first: tracking reads in a shared table would turn every
+    lookup into a write. Queries run in a worker thread so they never block the event loop.
+    """
+    name = "sqlite"
+
+    def __init__(self, *args, db_name: str = QUIZ_SESSION_DB, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._lock = threading.Lock()
+        self._conn = connect(db_name)
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS sessions (
+                namespace TEXT NOT NULL,
+                session_id TEXT NOT NULL,
+                data BLOB NOT NULL,
+                expires_at REAL NOT NULL,
+                PRIMARY KEY (namespace, session_id)
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_expiry ON sessions (namespace, expires_at)")
+
+    def _select(self, session_id: str) -> Optional[tuple]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT data FROM sessions WHERE namespace = ? AND session_id = ? AND expires_at > ?",
+                (self.namespace, session_id, time.time()),
+            ).fetchone()
+
+    async def get(self, session_id: str) -> Optional[Any]:
+        row = await asyncio.to_thread(self._select, session_id)
+        if row is None:
+            self._stats["misses"] += 1
+            return None
+        self._stats["hits"] += 1
+        return decode_session(row[0])
+
+    async def set(self, session_id: str, data: Any) -> bool:
+        blob = encode_session(data)
+        if len(blob) > self.max_bytes:
+            return self._reject(session_id, len(blob))
+        await asyncio.to_thread(self._upsert, session_id, blob)
+        self._stats["writes"] += 1
+        return True
+
+    def _upsert(self, session_id: str, blob: bytes) -> None:
+        now = time.time()
+        with self._lock:
+            # An existing session keeps its expiry unless it already expired
+            self._conn.execute(
+                """INSERT INTO sessions (namespace, session_id, data, expires_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT (namespace, session_id) DO UPDATE SET
+                    data = excluded.data,
+                    expires_at = CASE WHEN expires_at > ? THEN expires_at ELSE excluded.expires_at END""",
+                (self.namespace, session_id, blob, now + self.ttl, now),
+            )
+
+    def _delete(self, session_id: str) -> bool:
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM sessions WHERE namespace = ? AND session_id = ?",
+                (self.namespace, session_id),
+            )
+        return cursor.rowcount > 0
+
+    async def delete(self, session_id: str) -> bool:
+        return await asyncio.to_thread(self._delete, session_id)
+
+    def _delete_rows(self, session_ids: List[str]) -> None:
+        self._conn.executemany(
+            "DELETE FROM sessions WHERE namespace = ? AND session_id = ?",
+            [(self.namespace, session_id) for session_id in session_ids],
+        )
+
+    async def sweep(self) -> int:
+        expired, evicted = await asyncio.to_thread(self._sweep_rows)
+        # Callbacks run on the event loop, not in the worker thread
+        for session_id in expired + evicted:
+            self._removed(session_id)
+        self._stats["expired"] += len(expired)
+        self._stats["evictions"] += len(evicted)
+        self._stats["sweeps"] += 1
+        if expired or evicted:
+            logger.info(f"Expired {len(expired)} and evicted {len(evicted)} sessions from the '{self.namespace}' store")
+        return len(expired) + len(evicted)
+
+    def _sweep_rows(self) -> Tuple[List[str], List[str]]:
+        now = time.time()
+        with self._lock:
+            expired = [row[0] for row in self._conn.execute(
+                "SELECT session_id FROM sessions WHERE namespace = ? AND expires_at <= ?",
+                (self.namespace, now),
+            )]
+            self._delete_rows(expired)
+
+            count, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0) FROM sessions WHERE namespace = ?",
+                (self.namespace,),
+            ).fetchone()
+            evicted = []
+            if count > self.max_entries or total > self.max_bytes:
+                for session_id, size in self._conn.execute(
+                    "SELECT session_id, LENGTH(data) FROM sessions WHERE namespace = ? ORDER BY expires_at",
+                    (self.namespace,),
+                ):
+                    if count <= self.max_entries and total <= self.max_bytes:
+                        break
+                    evicted.append(session_id)
+                    count -= 1
+                    total -= size
+                self._delete_rows(evicted)
+        return expired, evicted
+
+    def _totals(self) -> Tuple[int, int]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0) FROM sessions WHERE namespace = ?",
+                (self.namespace,),
+            ).fetchone()
+
+    async def stats(self) -> Dict[str, Any]:
+        count, total = await asyncio.to_thread(self._totals)
+        return {
+            **await super().stats(),
+            "sessions": count,
+            "bytes": total,
+        }
+
+
+class RedisSessionStore(SessionStore):
+    """
+    Sessions in a Redis-protocol server, shared by every server process and host.
+
+    The server expires sessions itself (PX), so there is nothing to sweep. Entry and
+    byte caps belong in the server configuration (maxmemory with a volatile-lru policy);
+    only the per-session size limit is enforced here.
+    """
+    name = "redis"
+
+    def __init__(self, *args, url: str = QUIZ_SESSION_REDIS_URL, prefix: str = QUIZ_SESSION_REDIS_PREFIX, pool_size: int = QUIZ_SESSION_REDIS_POOL_SIZE, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prefix = prefix
+        self.client = RespClient(url, pool_size=pool_size)
+
+    def key(self, session_id: str) -> str:
+        return f"{self.prefix}{self.namespace}:{session_id}"
+
+    async def get(self, session_id: str) -> Optional[Any]:
+        try:
+            blob = await self.client.execute("GET", self.key(session_id))
+        except Exception:
+            self._stats["errors"] += 1
+            raise
+        if blob is None:
+            self._stats["misses"] += 1
+            return None
+        self._stats["hits"] += 1
+        return decode_session(blob)
+
+    async def set(self, session_id: str, data: Any) -> bool:
+        blob = encode_session(data)
+        if len(blob) > self.max_bytes:
+            return self._reject(session_id, len(blob))
+        key = self.key(session_id)
+        ttl_ms = int(self.ttl * 1000)
+        try:
+            # Create with an expiry, otherwise save keeping the remaining lifetime
+            # (it may have expired in between: create again)
+            if await self.client.execute("SET", key, blob, "PX", ttl_ms, "NX") is None:
+                if await self.client.execute("SET", key, blob, "XX", "KEEPTTL") is None:
+                    await self.client.execute("SET", key, blob, "PX", ttl_ms)
+        except Exception:
+            self._stats["errors"] += 1
+            raise
+        self._stats["writes"] += 1
+        return True
+
+    async def delete(self, session_id: str) -> bool:
+        return bool(await self.client.execute("DEL", self.key(session_id)))
+
+    async def close(self) -> None:
+        await self.client.close()
+
+    async def stats(self) -> Dict[str, Any]:
+        return {
+            **await super().stats(),
+            "client": self.client.stats(),
+        }
+
+
+def create_session_store(namespace: str, backend: str = QUIZ_SESSION_BACKEND, on_remove: Optional[Callable[[str], None]] = None) -> SessionStore:
+    if backend == "memory":
+        return MemorySessionStore(namespace, on_remove=on_remove)
+    if backend == "sqlite":
+        return SQLiteSessionStore(namespace, on_remove=on_remove)
+    if backend == "redis":
+        return RedisSessionStore(namespace, on_remove=on_remove)
+    raise ValueError(f"Unknown session backend: {backend}")
+
+
+async def run_session_sweeper(store: SessionStore, interval: float = QUIZ_SESSION_SWEEP_INTERVAL_SECONDS) -> None:
+    """
+    Background expiry loop started from the app lifespan.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await store.sweep()
+        except Exception as e:
+            logger.error(f"Session sweep failed for '{store.namespace}': {str(e)}")
@@ -0,0 +1,75 @@
+import asyncio
+import copy
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    def __init__(self, task: "asyncio.Future"):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls with the same key into one execution.
+
+    The first caller starts the work; callers arriving while it is in flight await the
+    same future and each receive their own copy of the result. A caller that is cancelled
+    (e.g. its client disconnected) only stops waiting; the shared work is cancelled when
+    no waiter is left.
+
+    The shared work runs with whatever limits the first caller's factory applies. A caller
+    can bound its own wait with `timeout` (asyncio.TimeoutError), which leaves the work
+    running for the other waiters; it cannot extend the work beyond the first caller's limits.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[str, _Call] = {}
+        self._stats = {
+            "executions": 0,
+            "coalesced": 0,
+            "abandoned": 0,
+        }
+
+    async def do(self, key: str, factory: Callable[[], Awaitable[Any]], timeout: Optional[float] = None) -> Any:
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(factory()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _, key=key, call=call: self._forget(key, call))
+            self._stats["executions"] += 1
+        else:
+            self._stats["coalesced"] += 1
+
+        call.waiters += 1
+        try:
+            result = await asyncio.wait_for(asyncio.shield(call.task), timeout)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # Forgotten before cancelling: the cancellation only completes on a later loop
+                # iteration, and a caller arriving in between must start new work
+                self._forget(key, call)
+                self._stats["abandoned"] += 1
+                logger.info(f"Cancelling abandoned '{self.name}' call")
+                call.task.cancel()
+
+        # Every caller gets its own copy so one caller's mutations cannot leak to another
+        return copy.deepcopy(result)
+
+    def _forget(self, key: str, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        # Retrieve the exception so abandoned failures are not reported as never retrieved
+        if call.task.done() and not call.task.cancelled():
+            call.task.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self._calls),
+            **self._stats,
+        }
@@ -0,0 +1,34 @@
+import os
+import sqlite3
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Directory holding the backend's SQLite databases
+DATA_DIR = os.getenv(
+    "APP_DATA_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "data"),
+)
+
+
+def get_db_path(db_name: str) -> str:
+    if os.path.isabs(db_name) or db_name == ":memory:":
+        return db_name
+    return os.path.join(DATA_DIR, db_name)
+
+
+def connect(db_name: str) -> sqlite3.Connection:
+    """
+    Open a SQLite connection in WAL mode so readers never block the writer and several
+    worker processes can share the same file.
+    """
+    path = get_db_path(db_name)
+    if path != ":memory:":
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=10000")
+    logger.info(f"Opened SQLite database: {path}")
+    return conn
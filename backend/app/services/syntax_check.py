@@ -0,0 +1,194 @@
+import os
+import re
+import ast
+import sys
+import shutil
+import asyncio
+import hashlib
+import logging
+import tempfile
+from typing import Dict, List, Optional
+from app.models.execution import SyntaxErrorInfo
+from app.services.cache import TwoTierCache
+
+logger = logging.getLogger(__name__)
+
+# Syntax pre-check configuration
+SYNTAX_PRECHECK = os.getenv("SYNTAX_PRECHECK", "1") == "1"
+SYNTAX_CHECK_TIMEOUT_SECONDS = float(os.getenv("SYNTAX_CHECK_TIMEOUT_SECONDS", "3"))
+SYNTAX_CACHE_MAX_ENTRIES = int(os.getenv("SYNTAX_CACHE_MAX_ENTRIES", "2048"))
+
+# Pre-check outcomes by sha256(code) and language; {"ok": True} or {"error": {...}}
+syntax_cache = TwoTierCache("syntax", max_entries=SYNTAX_CACHE_MAX_ENTRIES, ttl=86400, persistent=False)
+
+
+class SyntaxChecker:
+    """
+    Local parser for one language. `check` returns the first syntax error, None when the
+    code parses, and raises when the checker itself could not run.
+    """
+    name = "base"
+
+    def available(self) -> bool:
+        return True
+
+    def supports_version(self, version: Optional[str]) -> bool:
+        """
+        Whether the checker's grammar matches the runtime `version` that will run the code.
+        """
+        return True
+
+    async def check(self, code: str) -> Optional[SyntaxErrorInfo]:
+        raise NotImplementedError
+
+
+class PythonChecker(SyntaxChecker):
+    """
+    Parses with the server's own grammar, so only code for a runtime of the same minor
+    version is checked (e.g. `match` is a syntax error before 3.10, `type X = int` before
+    3.12). The parse runs in a thread: large sources take a while.
+    """
+    name = "ast"
+
+    def supports_version(self, version: Optional[str]) -> bool:
+        # "3.10.0", or "piston:3.10.0" for a fallback backend; "*" or None when unknown
+        requested = (version or "").rsplit(":", 1)[-1].split(".")[:2]
+        return requested == [str(sys.version_info.major), str(sys.version_info.minor)]
+
+    async def check(self, code: str) -> Optional[SyntaxErrorInfo]:
+        return await asyncio.to_thread(self.parse, code)
+
+    def parse(self, code: str) -> Optional[SyntaxErrorInfo]:
+        try:
+            ast.parse(code, filename="main.py")
+        except SyntaxError as e:
+            return SyntaxErrorInfo(
+                message=f"{type(e).__name__}: {e.msg}",
+                line=e.lineno,
+                column=e.offset,
+                text=(e.text or "").rstrip("\n") or None,
+                checker=self.name,
+            )
+        except ValueError as e:
+            # e.g. source code containing null bytes
+            return SyntaxErrorInfo(message=f"SyntaxError: {str(e)}", checker=self.name)
+        return None
+
+
+class CommandChecker(SyntaxChecker):
+    """
+    Runs a parse-only toolchain command. The code is passed on stdin, or as a scratch
+    file when the command contains "{file}". `pattern` extracts line/column/message from
+    the command's output; a non-zero exit without a match still counts as a syntax error.
+
+    Only pure parsers belong here: checkers that also resolve headers or types (e.g.
+    g++ -fsyntax-only) could reject programs the execution backend would accept.
+    """
+
+    def __init__(self, name: str, command: List[str], pattern: str, suffix: str = ""):
+        self.name = name
+        self.command = command
+        self.pattern = re.compile(pattern, re.MULTILINE)
+        self.suffix = suffix
+
+    def available(self) -> bool:
+        return shutil.which(self.command[0]) is not None
+
+    async def check(self, code: str) -> Optional[SyntaxErrorInfo]:
+        path = None
+        command = self.command
+        stdin = code.encode("utf-8")
+        if "{file}" in command:
+            scratch_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+            fd, path = tempfile.mkstemp(suffix=self.suffix, dir=scratch_dir)
+            with os.fdopen(fd, "wb") as f:
+                f.write(stdin)
+            command = [part.replace("{file}", path) for part in command]
+            stdin = b""
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *command,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+            )
+            try:
+                stdout, stderr = await asyncio.wait_for(process.communicate(stdin), timeout=SYNTAX_CHECK_TIMEOUT_SECONDS)
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+                raise
+        finally:
+            if path:
+                os.unlink(path)
+
+        if process.returncode == 0:
+            return None
+        output = (stderr + stdout).decode("utf-8", errors="replace")
+        match = self.pattern.search(output)
+        if not match:
+            return SyntaxErrorInfo(message=output.strip()[:500] or "Syntax error", checker=self.name)
+        groups = match.groupdict()
+        return SyntaxErrorInfo(
+            message=(groups.get("message") or "Syntax error").strip(),
+            line=int(groups["line"]) if groups.get("line") else None,
+            column=int(groups["column"]) if groups.get("column") else None,
+            checker=self.name,
+        )
+
+
+class NodeChecker(CommandChecker):
+    def __init__(self):
+        super().__init__(
+            "node --check",
+            ["node", "--check", "{file}"],
+            r":(?P<line>\d+)\n(?:.*\n)*?(?P<message>SyntaxError: .*)",
+            suffix=".js",
+        )
+
+
+CHECKERS: Dict[str, SyntaxChecker] = {}
+
+
+def register_checker(language: str, checker: SyntaxChecker) -> None:
+    """
+    Register a checker for a language; it is skipped when its toolchain is not installed.
+    """
+    if checker.available():
+        CHECKERS[language] = checker
+    else:
+        logger.info(f"No local syntax checker for {language} ({checker.name} not installed)")
+
+
+register_checker("python", PythonChecker())
+register_checker("javascript", NodeChecker())
+register_checker("ruby", CommandChecker("ruby -c", ["ruby", "-c"], r"^-:(?P<line>\d+): (?P<message>.*)$"))
+register_checker("go", CommandChecker("gofmt", ["gofmt", "-e"], r"^<standard input>:(?P<line>\d+):(?P<column>\d+): (?P<message>.*)$"))
+register_checker("php", CommandChecker("php -l", ["php", "-l"], r"(?P<message>(?:PHP )?Parse error: .*?) in .* on line (?P<line>\d+)"))
+
+
+async def check_syntax(code: str, language: str, version: Optional[str] = None) -> Optional[SyntaxErrorInfo]:
+    """
+    Pre-check the code locally. Returns the syntax error, or None when the code parses,
+    no checker is available for the language, or the checker's grammar may differ from
+    the runtime `version` that will run the code.
+    """
+    checker = CHECKERS.get(language)
+    if not SYNTAX_PRECHECK or checker is None:
+        return None
+    if not checker.supports_version(version):
+        logger.debug(f"Skipping the {checker.name} syntax pre-check for {language} {version}")
+        return None
+
+    key = f"{language}:{hashlib.sha256(code.encode('utf-8')).hexdigest()}"
+    cached = syntax_cache.get(key)
+    if cached is not None:
+        return SyntaxErrorInfo(**cached["error"]) if cached.get("error") else None
+
+    try:
+        error = await checker.check(code)
+    except Exception as e:
+        logger.warning(f"Syntax pre-check with {checker.name} failed: {str(e)}")
+        return None
+    syntax_cache.set(key, {"error": error.model_dump() if error else None, "ok": error is None})
+    return error
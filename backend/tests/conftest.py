@@ -0,0 +1,47 @@
+import os
+import tempfile
+import pytest
+
+# Module-level caches open their SQLite files on import; keep them out of backend/data
+os.environ.setdefault("APP_DATA_DIR", tempfile.mkdtemp(prefix="backend-tests-"))
+
+
+class FakeClock:
+    """
+    Stands in for the `time` module of the code under test, so expiry can be tested
+    without sleeping.
+    """
+
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+
+@pytest.fixture
+def clock() -> FakeClock:
+    return FakeClock()
+
+
+@pytest.fixture
+def stub_llm():
+    """
+    Install a shared LLM client backed by StubBackend; returns a function that installs
+    one with a custom responder.
+    """
+    from app.services.llm_client import LLMClient, StubBackend, set_llm_client
+
+    def install(responder=None, **kwargs):
+        client = LLMClient(StubBackend(responder), **kwargs)
+        set_llm_client(client)
+        return client
+
+    yield install
+    set_llm_client(None)
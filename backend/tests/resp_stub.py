@@ -0,0 +1,136 @@
+import time
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
+from app.services.resp_client import RespError, read_reply
+
+
+def encode_reply(value: Any) -> bytes:
+    if isinstance(value, Exception):
+        return b"-%s\r\n" % str(value).encode("utf-8")
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, str):
+        return b"+%s\r\n" % value.encode("utf-8")
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+class RespStubServer:
+    """
+    In-process server speaking enough of the Redis protocol for the client and the
+    session store: AUTH, SELECT, PING, GET, SET (PX/NX/XX/KEEPTTL), DEL and INCR, with
+    per-database keys and expiry.
+
+    `delay` holds every reply back; `drop_next_reply` runs the next command and closes
+    the connection instead of replying.
+    """
+
+    def __init__(self, password: Optional[str] = None):
+        self.password = password
+        self.delay = 0.0
+        self.drop_next_reply = False
+        # Commands as received, with the connection number that sent them
+        self.commands: List[Tuple[int, List[bytes]]] = []
+        self.connections = 0
+        self._data: Dict[int, Dict[bytes, Tuple[bytes, Optional[float]]]] = {}
+        self._writers: List[asyncio.StreamWriter] = []
+        self._handlers: List[asyncio.Task] = []
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    @property
+    def port(self) -> int:
+        return self._server.sockets[0].getsockname()[1]
+
+    def url(self, credentials: str = "", db: int = 0) -> str:
+        return f"redis://{credentials}127.0.0.1:{self.port}/{db}"
+
+    async def __aenter__(self) -> "RespStubServer":
+        self._server = await asyncio.start_server(self._serve, "127.0.0.1", 0)
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.close_connections()
+        self._server.close()
+        for handler in self._handlers:
+            handler.cancel()
+        await asyncio.gather(*self._handlers, return_exceptions=True)
+        await self._server.wait_closed()
+
+    def close_connections(self) -> None:
+        """
+        Close every open connection, like a server timing out idle clients.
+        """
+        for writer in self._writers:
+            writer.close()
+        self._writers.clear()
+
+    def names(self) -> List[str]:
+        return [args[0].decode().upper() for _, args in self.commands]
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._handlers.append(asyncio.current_task())
+        self.connections += 1
+        number = self.connections
+        self._writers.append(writer)
+        state = {"db": 0, "authenticated": self.password is None}
+        try:
+            while True:
+                args = await read_reply(reader)
+                self.commands.append((number, args))
+                reply = self._execute(state, args)
+                if self.drop_next_reply:
+                    self.drop_next_reply = False
+                    break
+                if self.delay:
+                    await asyncio.sleep(self.delay)
+                writer.write(encode_reply(reply))
+                await writer.drain()
+        except (RespError, OSError, asyncio.IncompleteReadError):
+            # The client went away
+            pass
+        finally:
+            writer.close()
+
+    def _execute(self, state: Dict[str, Any], args: List[bytes]) -> Any:
+        name, params = args[0].decode().upper(), args[1:]
+        if name == "AUTH":
+            if params[-1].decode() != self.password:
+                return Exception("WRONGPASS invalid username-password pair")
+            state["authenticated"] = True
+            return "OK"
+        if not state["authenticated"]:
+            return Exception("NOAUTH Authentication required.")
+        if name == "SELECT":
+            state["db"] = int(params[0])
+            return "OK"
+        if name == "PING":
+            return "PONG"
+
+        data = self._data.setdefault(state["db"], {})
+        now = time.monotonic()
+        for key in [key for key, (_, expires_at) in data.items() if expires_at is not None and expires_at <= now]:
+            del data[key]
+        if name == "GET":
+            entry = data.get(params[0])
+            return entry[0] if entry else None
+        if name == "DEL":
+            return sum(1 for key in params if data.pop(key, None) is not None)
+        if name == "INCR":
+            value = int(data.get(params[0], (b"0", None))[0]) + 1
+            data[params[0]] = (str(value).encode(), None)
+            return value
+        if name == "SET":
+            key, value = params[0], params[1]
+            options = [option.decode().upper() for option in params[2:]]
+            existing = data.get(key)
+            if ("NX" in options and existing) or ("XX" in options and not existing):
+                return None
+            expires_at = None
+            if "PX" in options:
+                expires_at = now + int(options[options.index("PX") + 1]) / 1000
+            elif "KEEPTTL" in options and existing:
+                expires_at = existing[1]
+            data[key] = (value, expires_at)
+            return "OK"
+        return Exception(f"ERR unknown command '{name}'")
@@ -0,0 +1,129 @@
+import asyncio
+import pytest
+import app.services.batch_runner as batch_runner
+import app.services.code_executor as code_executor
+from app.models.batch import BatchJob
+from app.models.task import ProgrammingLanguage
+from app.services.batch_runner import run_batch, summarize_batch
+from app.services.cache import TwoTierCache
+from app.services.code_executor import ExecutorBackend, set_executor_backend
+from app.services.scheduler import ClientKey, ExecutionScheduler
+
+CLIENT = ClientKey("alice", "10.0.0.1")
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+class CountingBackend(ExecutorBackend):
+    """
+    Echoes stdin after a short delay, counting runs and the most running at once.
+    C++ builds are shared and fail for sources containing "error".
+    """
+    name = "counting"
+
+    def __init__(self):
+        self.runs = []
+        self.running = 0
+        self.peak = 0
+
+    def shares_builds(self, language):
+        return language == "cpp"
+
+    async def run(self, code, language, stdin="", args=None):
+        self.runs.append((code, stdin))
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        try:
+            await asyncio.sleep(0.01)
+        finally:
+            self.running -= 1
+        if "error" in code:
+            return {"language": language, "version": "1.0", "compile": {"stdout": "", "stderr": "error: expected ';'", "code": 1, "signal": None}}
+        return {"language": language, "version": "1.0", "run": {"stdout": stdin, "stderr": "", "code": 0}}
+
+    async def runtime_version(self, language):
+        return "1.0"
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    monkeypatch.setattr(code_executor, "execution_cache", TwoTierCache("execution-test", persistent=False))
+    scheduler = ExecutionScheduler(max_per_client=3)
+    scheduler.queue("python").workers = 100
+    scheduler.queue("cpp").workers = 100
+    monkeypatch.setattr(code_executor, "execution_scheduler", scheduler)
+    backend = CountingBackend()
+    set_executor_backend(backend)
+    yield backend
+    set_executor_backend(None)
+
+
+def collect(jobs):
+    async def scenario():
+        return sorted([item async for item in run_batch(jobs, CLIENT)], key=lambda item: item.index)
+
+    return run(scenario())
+
+
+def python_job(code="print(input())", stdin="", **fields):
+    return BatchJob(code=code, language=ProgrammingLanguage.PYTHON, stdin=stdin, **fields)
+
+
+def test_batches_have_their_own_scheduler_budget(backend, monkeypatch):
+    monkeypatch.setattr(batch_runner, "BATCH_MAX_PARALLEL", 6)
+    items = collect([python_job(stdin=str(n)) for n in range(12)])
+    # Above the scheduler's per-client cap of 3, without rejections
+    assert all(item.error is None for item in items)
+    assert backend.peak == 6
+    assert [item.output for item in items] == [str(n) for n in range(12)]
+
+
+def test_identical_jobs_share_one_execution(backend):
+    items = collect([
+        python_job(stdin="1"),
+        python_job(stdin="1"),
+        python_job(stdin="2"),
+        python_job(stdin="1", no_cache=True),
+        python_job(code="import random\nprint(random.random())"),
+        python_job(code="import random\nprint(random.random())"),
+    ])
+    assert [item.shared for item in items] == [False, True, False, False, False, False]
+    assert items[1].output == items[0].output
+    assert len(backend.runs) == 5
+    summary = summarize_batch(items, 1.0)
+    assert (summary.total, summary.executions, summary.succeeded) == (6, 5, 6)
+
+
+def test_runs_of_one_source_reuse_its_build(backend):
+    source = "int main() {}"
+    jobs = [BatchJob(code=source, language=ProgrammingLanguage.CPP, stdin=str(n)) for n in range(4)]
+    items = collect(jobs)
+    assert all(item.error is None and not item.shared for item in items)
+    # The first run builds alone; the rest start once it finished
+    assert backend.runs[0] == (source, "0")
+    assert backend.peak == 3
+    assert batch_runner.batch_stats["shared_builds"] >= 3
+
+
+def test_source_that_does_not_compile_fails_once(backend):
+    jobs = [BatchJob(code="int main() { error }", language=ProgrammingLanguage.CPP, stdin=str(n)) for n in range(3)]
+    items = collect(jobs)
+    assert len(backend.runs) == 1
+    assert [item.shared for item in items] == [False, True, True]
+    assert all(item.execution["phase"] == "compile" for item in items)
+    assert summarize_batch(items, 1.0).failed == 3
+
+
+def test_rejected_jobs_report_retry_after(backend, monkeypatch):
+    monkeypatch.setattr(batch_runner, "BATCH_MAX_PARALLEL", 4)
+    scheduler = ExecutionScheduler(max_per_client=3, max_per_address=2)
+    scheduler.queue("python").workers = 100
+    monkeypatch.setattr(code_executor, "execution_scheduler", scheduler)
+    items = collect([python_job(stdin=str(n)) for n in range(4)])
+    rejected = [item for item in items if item.error is not None]
+    # The address cap still applies to batches
+    assert len(rejected) == 2
+    assert all(item.retry_after >= 1 for item in rejected)
+    assert summarize_batch(items, 1.0).errors == 2
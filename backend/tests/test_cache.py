@@ -0,0 +1,149 @@
+import asyncio
+import pytest
+import app.services.cache as cache_module
+from app.services.cache import TwoTierCache, make_cache_key
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "cache.db")
+
+
+@pytest.fixture(autouse=True)
+def fake_time(monkeypatch, clock):
+    monkeypatch.setattr(cache_module, "time", clock)
+    # Caches created by a test are not swept by later ones
+    monkeypatch.setattr(cache_module, "_caches", [])
+
+
+def test_make_cache_key_is_order_independent_for_dicts():
+    assert make_cache_key({"a": 1, "b": 2}) == make_cache_key({"b": 2, "a": 1})
+    assert make_cache_key("a", "b") != make_cache_key("b", "a")
+
+
+def test_memory_entry_expires(clock, db_path):
+    cache = TwoTierCache("test", ttl=10, db_name=db_path, persistent=False)
+    cache.set("key", {"value": 1})
+    clock.advance(9)
+    assert cache.get("key") == {"value": 1}
+    clock.advance(2)
+    assert cache.get("key") is None
+    assert cache.stats()["memory_entries"] == 0
+
+
+def test_per_entry_ttl(clock, db_path):
+    cache = TwoTierCache("test", ttl=10, db_name=db_path, persistent=False)
+    cache.set("short", 1, ttl=1)
+    cache.set("long", 2)
+    clock.advance(5)
+    assert cache.get("short") is None
+    assert cache.get("long") == 2
+
+
+def test_disk_tier_survives_a_new_instance_until_expiry(clock, db_path):
+    TwoTierCache("test", ttl=10, db_name=db_path).set("key", [1, 2])
+
+    reopened = TwoTierCache("test", ttl=10, db_name=db_path)
+    assert reopened.get("key") == [1, 2]
+    assert reopened.stats()["disk_hits"] == 1
+    # Promoted to memory
+    assert reopened.get("key") == [1, 2]
+    assert reopened.stats()["memory_hits"] == 1
+
+    clock.advance(11)
+    assert TwoTierCache("test", ttl=10, db_name=db_path).get("key") is None
+
+
+def test_namespaces_are_separate(db_path):
+    TwoTierCache("one", db_name=db_path).set("key", 1)
+    assert TwoTierCache("two", db_name=db_path).get("key") is None
+
+
+def test_purge_expired_removes_expired_rows_only(clock, db_path):
+    cache = TwoTierCache("test", ttl=10, db_name=db_path)
+    cache.set("old", 1, ttl=5)
+    cache.set("new", 2)
+    clock.advance(6)
+    assert cache.purge_expired() == 1
+    assert cache.stats()["expired"] == 1
+    assert cache.stats()["memory_entries"] == 1
+
+    reopened = TwoTierCache("test", ttl=10, db_name=db_path)
+    assert reopened.get("old") is None
+    assert reopened.get("new") == 2
+
+
+def test_values_are_copies(db_path):
+    cache = TwoTierCache("test", db_name=db_path, persistent=False)
+    value = {"items": [1]}
+    cache.set("key", value)
+    value["items"].append(2)
+    cache.get("key")["items"].append(3)
+    assert cache.get("key") == {"items": [1]}
+
+
+def test_memory_tier_is_bounded(db_path):
+    cache = TwoTierCache("test", max_entries=2, db_name=db_path)
+    for key in ("a", "b", "c"):
+        cache.set(key, key)
+    stats = cache.stats()
+    assert stats["memory_entries"] == 2
+    assert stats["evictions"] == 1
+    # Evicted from memory, still on disk
+    assert cache.get("a") == "a"
+
+    small = TwoTierCache("small", max_bytes=10, db_name=db_path, persistent=False)
+    small.set("big", "x" * 20)
+    assert small.get("big") is None
+
+
+def test_async_access(clock, db_path):
+    async def scenario():
+        cache = TwoTierCache("test", ttl=10, db_name=db_path)
+        await cache.aset("key", {"value": 1})
+        memory = await cache.aget("key")
+        reopened = TwoTierCache("test", ttl=10, db_name=db_path)
+        disk = await reopened.aget("key")
+        clock.advance(11)
+        return memory, disk, await reopened.aget("key")
+
+    assert asyncio.run(scenario()) == ({"value": 1}, {"value": 1}, None)
+
+
+def test_apurge_drops_both_tiers(db_path):
+    cache = TwoTierCache("test", db_name=db_path)
+    cache.set("key", 1)
+    assert asyncio.run(cache.apurge()) == 1
+    assert TwoTierCache("test", db_name=db_path).get("key") is None
+
+
+@pytest.fixture
+def api(monkeypatch, tmp_path):
+    from fastapi.testclient import TestClient
+    import app.api.routes as routes
+    from app.main import app
+
+    cache = TwoTierCache("scaffolding-test", db_name=str(tmp_path / "api.db"))
+    cache.set("key", "value")
+    monkeypatch.setattr(routes, "scaffolding_cache", cache)
+    return TestClient(app), routes, cache
+
+
+def test_admin_endpoints_are_disabled_without_a_token(api, monkeypatch):
+    client, routes, cache = api
+    monkeypatch.setattr(routes, "ADMIN_TOKEN", None)
+    assert client.delete("/api/admin/cache/scaffolding").status_code == 404
+    assert client.delete("/api/admin/cache/scaffolding", headers={"X-Admin-Token": ""}).status_code == 404
+    assert cache.get("key") == "value"
+
+
+def test_admin_endpoints_require_the_token(api, monkeypatch):
+    client, routes, cache = api
+    monkeypatch.setattr(routes, "ADMIN_TOKEN", "secret")
+    assert client.delete("/api/admin/cache/scaffolding").status_code == 403
+    assert client.delete("/api/admin/cache/scaffolding", headers={"X-Admin-Token": "wrong"}).status_code == 403
+    assert cache.get("key") == "value"
+
+    response = client.delete("/api/admin/cache/scaffolding", headers={"X-Admin-Token": "secret"})
+    assert response.json() == {"purged": 1}
+    assert cache.get("key") is None
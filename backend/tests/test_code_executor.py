@@ -0,0 +1,153 @@
+import asyncio
+import pytest
+import app.services.code_executor as code_executor
+from app.models.task import ProgrammingLanguage
+from app.services.cache import TwoTierCache
+from app.services.code_executor import ExecutorBackend, execute_code, execution_cache_key, set_executor_backend
+from app.services.determinism import is_deterministic
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+class FakeBackend(ExecutorBackend):
+    name = "fake"
+
+    def __init__(self, version="3.11.0", seeded=False):
+        self.version = version
+        self.seeded = seeded
+        self.runs = 0
+        self.reply = {"run": {"stdout": "out\n", "stderr": "", "code": 0}}
+
+    def fixed_hash_seed(self, language):
+        return self.seeded
+
+    async def run(self, code, language, stdin="", args=None):
+        self.runs += 1
+        return {"language": language, "version": self.version, **self.reply}
+
+    async def runtime_version(self, language):
+        return self.version
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    monkeypatch.setattr(code_executor, "execution_cache", TwoTierCache("execution-test", persistent=False))
+    backend = FakeBackend()
+    set_executor_backend(backend)
+    yield backend
+    set_executor_backend(None)
+
+
+@pytest.mark.parametrize("code", [
+    "import math, sys as system\nprint(math.sqrt(4))",
+    "from collections import Counter\nprint(Counter('abc'))",
+    "import re\nprint(re.compile('a').match('a'))",
+    # Words in comments and identifiers are not API calls
+    "# time complexity: O(n)\ntime = 3\nrandom_value = time * 2\nprint(random_value)",
+])
+def test_deterministic_python(code):
+    assert is_deterministic(code, "python")
+
+
+@pytest.mark.parametrize("code", [
+    "import random\nprint(random.random())",
+    "import os, math\nprint(os.urandom(4))",
+    "from uuid import uuid4\nprint(uuid4())",
+    "print(id(object()))",
+    "print(hash('a'))",
+    "print(__import__('time').time())",
+])
+def test_nondeterministic_python(code):
+    assert not is_deterministic(code, "python")
+    assert not is_deterministic(code, "python", fixed_hash_seed=True)
+
+
+def test_python_sets_need_a_fixed_hash_seed():
+    code = "print({'b', 'a'})\nprint(set('abc'))"
+    assert not is_deterministic(code, "python")
+    assert is_deterministic(code, "python", fixed_hash_seed=True)
+
+
+@pytest.mark.parametrize("code, language, expected", [
+    ("const input = require('fs').readFileSync(0, 'utf8');\nconsole.log(input);", "javascript", True),
+    ("console.log(Date.now());", "javascript", False),
+    ("const name = 'os';\nrequire(name);", "javascript", False),
+    ("#include <iostream>\nint main() { std::cout << 1; }", "cpp", True),
+    ("#include <random>\nint main() { std::random_device rd; }", "cpp", False),
+    ("#include <cstdio>\nint main() { int x; printf(\"%p\", (void*)&x); }", "cpp", False),
+    ("package main\nimport \"fmt\"\nfunc main() { fmt.Println(1) }", "go", True),
+    ("package main\nimport \"fmt\"\nfunc main() { m := map[string]int{}\n for k := range m { fmt.Println(k) } }", "go", False),
+    ("use std::collections::BTreeMap;\nfn main() { let m: BTreeMap<i32, i32> = BTreeMap::new(); for x in m.iter() {} }", "rust", True),
+    ("use std::collections::HashMap;\nfn main() { let m: HashMap<i32, i32> = HashMap::new(); for x in m.iter() {} }", "rust", False),
+    ("import java.util.*;\npublic class Main { public static void main(String[] a) { System.out.println(new Random().nextInt()); } }", "java", False),
+    ("using System;\nclass P { static void Main() { Console.WriteLine(Guid.NewGuid()); } }", "csharp", False),
+    # Languages without rules are never cached
+    ("<?php echo 1;", "php", False),
+])
+def test_other_languages(code, language, expected):
+    assert is_deterministic(code, language) is expected
+
+
+def test_cache_key_covers_input_and_runtime():
+    async def keys():
+        backend = FakeBackend()
+        base = await execution_cache_key(backend, "print(1)", "python", "", [])
+        variants = [
+            await execution_cache_key(backend, "print(2)", "python", "", []),
+            await execution_cache_key(backend, "print(1)", "python", "in", []),
+            await execution_cache_key(backend, "print(1)", "python", "", ["x"]),
+            await execution_cache_key(FakeBackend(version="3.12.0"), "print(1)", "python", "", []),
+        ]
+        return base, variants, await execution_cache_key(backend, "print(1)", "python", "", [])
+
+    base, variants, again = run(keys())
+    assert again == base
+    assert len({base, *variants}) == 5
+
+
+def test_deterministic_results_are_cached(backend):
+    async def scenario():
+        first = await execute_code("print(1)", ProgrammingLanguage.PYTHON)
+        second = await execute_code("print(1)", ProgrammingLanguage.PYTHON)
+        other_input = await execute_code("print(1)", ProgrammingLanguage.PYTHON, stdin="x")
+        return first, second, other_input
+
+    first, second, other_input = run(scenario())
+    assert (first.cached, second.cached, other_input.cached) == (False, True, False)
+    assert second.stdout == "out\n"
+    assert backend.runs == 2
+
+
+def test_cache_bypass(backend):
+    async def scenario():
+        for _ in range(2):
+            await execute_code("import random\nprint(random.random())", ProgrammingLanguage.PYTHON)
+            await execute_code("print(1)", ProgrammingLanguage.PYTHON, use_cache=False)
+            await execute_code("print({'a', 'b'})", ProgrammingLanguage.PYTHON)
+
+    run(scenario())
+    assert backend.runs == 6
+
+
+def test_seeded_backend_caches_sets(backend):
+    backend.seeded = True
+
+    async def scenario():
+        await execute_code("print({'a', 'b'})", ProgrammingLanguage.PYTHON)
+        return await execute_code("print({'a', 'b'})", ProgrammingLanguage.PYTHON)
+
+    assert run(scenario()).cached is True
+    assert backend.runs == 1
+
+
+def test_killed_runs_are_not_cached(backend):
+    backend.reply = {"run": {"stdout": "", "stderr": "", "code": None, "signal": "SIGKILL", "status": "TO"}}
+
+    async def scenario():
+        await execute_code("while True: pass", ProgrammingLanguage.PYTHON)
+        return await execute_code("while True: pass", ProgrammingLanguage.PYTHON)
+
+    assert run(scenario()).cached is False
+    assert backend.runs == 2
@@ -0,0 +1,145 @@
+import os
+import asyncio
+import threading
+import app.services.compile_cache as compile_cache
+from app.services.compile_cache import ArtifactCache
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+async def build(cache, key, size=100):
+    build_dir = cache.build_dir()
+    with open(os.path.join(build_dir, "main"), "wb") as f:
+        f.write(b"x" * size)
+    await cache.put(key, build_dir)
+    return build_dir
+
+
+def entries(root):
+    return sorted(name for name in os.listdir(root) if not name.startswith("."))
+
+
+def test_publishing_renames_the_build_into_place(tmp_path):
+    async def scenario():
+        cache = ArtifactCache(str(tmp_path), max_bytes=1000)
+        await cache.start()
+        build_dir = await build(cache, "a")
+        return cache, build_dir
+
+    cache, build_dir = run(scenario())
+    assert not os.path.exists(build_dir)
+    assert cache.acquire("a") == str(tmp_path / "a")
+    assert (tmp_path / "a" / "main").read_bytes() == b"x" * 100
+    assert cache.stats()["bytes"] == 100
+    assert cache.acquire("missing") is None
+
+
+def test_concurrently_published_build_is_discarded(tmp_path):
+    async def scenario():
+        cache = ArtifactCache(str(tmp_path), max_bytes=1000)
+        # Another process published the same key first
+        other = ArtifactCache(str(tmp_path), max_bytes=1000)
+        await build(other, "a", size=10)
+        build_dir = await build(cache, "a", size=20)
+        return cache, build_dir
+
+    cache, build_dir = run(scenario())
+    assert not os.path.exists(build_dir)
+    assert (tmp_path / "a" / "main").read_bytes() == b"x" * 10
+    assert cache.stats()["entries"] == 1
+    assert [name for name in os.listdir(tmp_path) if name.startswith(".build-")] == []
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    async def scenario():
+        cache = ArtifactCache(str(tmp_path), max_bytes=250)
+        await build(cache, "a")
+        await build(cache, "b")
+        # Using "a" makes "b" the least recently used
+        cache.acquire("a")
+        cache.release("a")
+        await build(cache, "c")
+        return cache
+
+    cache = run(scenario())
+    assert entries(tmp_path) == ["a", "c"]
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["bytes"] == 200
+
+
+def test_leased_entries_are_not_evicted(tmp_path):
+    async def scenario():
+        cache = ArtifactCache(str(tmp_path), max_bytes=150)
+        await build(cache, "a")
+        cache.acquire("a")
+        await build(cache, "b")
+        leased = entries(tmp_path)
+        cache.release("a")
+        await build(cache, "c")
+        return cache, leased
+
+    cache, leased = run(scenario())
+    # Over budget while "a" was leased; evicted once released and something else was stored
+    assert leased == ["a", "b"]
+    assert entries(tmp_path) == ["c"]
+    assert cache.stats()["evictions"] == 2
+
+
+def test_evicted_key_can_be_published_again(tmp_path):
+    async def scenario():
+        cache = ArtifactCache(str(tmp_path), max_bytes=100)
+        await build(cache, "a")
+        await build(cache, "b")
+        await build(cache, "a", size=50)
+        return cache
+
+    cache = run(scenario())
+    assert entries(tmp_path) == ["a"]
+    assert (tmp_path / "a" / "main").read_bytes() == b"x" * 50
+    assert [name for name in os.listdir(tmp_path) if name.startswith(".evicted-")] == []
+
+
+def test_directories_are_removed_off_the_event_loop(tmp_path, monkeypatch):
+    removed_on = []
+    remove_trees = compile_cache.remove_trees
+
+    def record(paths):
+        removed_on.append(threading.current_thread())
+        remove_trees(paths)
+
+    monkeypatch.setattr(compile_cache, "remove_trees", record)
+
+    async def scenario():
+        cache = ArtifactCache(str(tmp_path), max_bytes=100)
+        await build(cache, "a")
+        await build(cache, "b")
+        await build(cache, "c")
+        assert await cache.clear() == 1
+        return cache
+
+    cache = run(scenario())
+    assert len(removed_on) == 3
+    assert threading.main_thread() not in removed_on
+    assert entries(tmp_path) == []
+    assert cache.stats()["bytes"] == 0
+
+
+def test_start_loads_entries_and_drops_leftovers(tmp_path):
+    async def scenario():
+        cache = ArtifactCache(str(tmp_path), max_bytes=1000)
+        await build(cache, "old")
+        await build(cache, "new")
+        os.utime(tmp_path / "old", (1, 1))
+        cache.build_dir()
+        (tmp_path / ".evicted-1234").mkdir()
+
+        reloaded = ArtifactCache(str(tmp_path), max_bytes=150)
+        await reloaded.start()
+        return reloaded
+
+    reloaded = run(scenario())
+    assert os.listdir(tmp_path) == ["new"]
+    assert reloaded.stats()["entries"] == 1
+    assert reloaded.stats()["evictions"] == 1
@@ -0,0 +1,112 @@
+from app.models.execution import ExecutionResult, SyntaxErrorInfo
+
+
+def run_stage(**overrides):
+    stage = {"stdout": "", "stderr": "", "code": 0, "signal": None, "status": None, "message": None}
+    stage.update(overrides)
+    return stage
+
+
+def test_successful_run():
+    result = ExecutionResult.from_piston({
+        "language": "python",
+        "version": "3.11.0",
+        "run": run_stage(stdout="42\n", stderr="DeprecationWarning\n", wall_time=12.5, cpu_time=3.0, memory=1024),
+    })
+    assert result.has_errors is False
+    assert result.phase == "run"
+    assert result.output == "42\nDeprecationWarning\n"
+    assert (result.wall_time, result.cpu_time, result.memory) == (12.5, 3.0, 1024)
+
+
+def test_non_zero_exit():
+    result = ExecutionResult.from_piston({"language": "python", "run": run_stage(stderr="Traceback\nValueError\n", code=1, status="RE")})
+    assert result.has_errors is True
+    assert result.exit_code == 1
+    assert result.output == "Error:\nTraceback\nValueError"
+
+    # Piston does not always send a status: the exit code alone is an error
+    silent = ExecutionResult.from_piston({"language": "c", "run": run_stage(code=3)})
+    assert silent.has_errors is True
+    assert silent.output == "Error:\nProcess exited with code 3"
+
+
+def test_compile_failure_takes_precedence():
+    result = ExecutionResult.from_piston({
+        "language": "cpp",
+        "compile": {"stdout": "", "stderr": "main.cpp:1: error: expected ';'\n", "code": 1, "signal": None, "wall_time": 350.0, "cached": False},
+        "run": run_stage(stdout="never shown"),
+    })
+    assert result.phase == "compile"
+    assert result.has_errors is True
+    assert result.stdout == ""
+    assert result.stderr.startswith("main.cpp:1")
+    assert (result.compile_cached, result.compile_time) == (False, 350.0)
+
+
+def test_compile_killed_by_signal():
+    result = ExecutionResult.from_piston({
+        "language": "rust",
+        "compile": {"stdout": "", "stderr": "", "code": None, "signal": "SIGKILL", "status": "TO", "message": "Compilation time limit exceeded"},
+    })
+    assert result.phase == "compile"
+    assert result.timed_out is True
+    assert result.output == "Error:\nCompilation time limit exceeded"
+
+
+def test_cached_build_reports_compile_info():
+    result = ExecutionResult.from_piston({
+        "language": "go",
+        "compile": {"stdout": "", "stderr": "", "code": 0, "signal": None, "wall_time": 0.0, "cached": True},
+        "run": run_stage(stdout="ok\n"),
+    })
+    assert result.phase == "run"
+    assert result.has_errors is False
+    assert (result.compile_cached, result.compile_time) == (True, 0.0)
+
+
+def test_killed_by_signal():
+    result = ExecutionResult.from_piston({"language": "cpp", "run": run_stage(code=None, signal="SIGSEGV", status="SG")})
+    assert result.has_errors is True
+    assert result.exit_code is None
+    assert result.timed_out is False
+    assert result.output == "Error:\nProcess terminated by SIGSEGV"
+
+
+def test_timeout():
+    result = ExecutionResult.from_piston({
+        "language": "python",
+        "run": run_stage(stdout="partial\n", code=None, signal="SIGKILL", status="TO", message="Time limit exceeded (10s wall clock)"),
+    })
+    assert result.timed_out is True
+    assert result.has_errors is True
+    assert result.output == "Error:\nTime limit exceeded (10s wall clock)"
+
+
+def test_output_limit():
+    result = ExecutionResult.from_piston({
+        "language": "python",
+        "run": run_stage(stdout="x" * 10, code=None, signal="SIGKILL", status="OL", message="Output limit exceeded (10 bytes)", stdout_truncated=True),
+    })
+    assert result.has_errors is True
+    assert result.stdout_truncated is True
+    assert result.stderr_truncated is False
+
+
+def test_missing_run_stage():
+    result = ExecutionResult.from_piston({"language": "python", "message": "python-3.99 runtime is unknown"}, cached=True)
+    assert result.status == "XX"
+    assert result.has_errors is True
+    assert result.cached is True
+    assert result.output == "Error:\npython-3.99 runtime is unknown"
+
+
+def test_syntax_error():
+    error = SyntaxErrorInfo(message="SyntaxError: invalid syntax", line=2, column=7, text="print(1 +)", checker="ast")
+    result = ExecutionResult.from_syntax_error("python", error)
+    assert result.phase == "compile"
+    assert result.status == "CE"
+    assert result.has_errors is True
+    assert result.stderr == '  File "main", line 2, column 7\n    print(1 +)\n          ^\nSyntaxError: invalid syntax'
+    assert result.summary()["has_errors"] is True
+    assert "stdout" not in result.summary()
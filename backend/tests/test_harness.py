@@ -0,0 +1,125 @@
+import sys
+import json
+import shutil
+import asyncio
+import subprocess
+import pytest
+import app.services.harness as harness
+from app.models.execution import ExecutionResult
+from app.models.harness import HarnessCase
+from app.models.task import ProgrammingLanguage
+from app.services.harness import build_driver, output_matches, parse_test_cases, run_batched
+
+MARKER = "@@harness-secret@@"
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def run_driver(command, driver, tmp_path, suffix):
+    path = tmp_path / f"main{suffix}"
+    path.write_text(driver)
+    process = subprocess.run(command + [str(path)], input=MARKER + "\n", capture_output=True, text=True, timeout=30)
+    return [json.loads(line[len(MARKER):]) for line in process.stdout.splitlines() if line.startswith(MARKER)], process.stdout
+
+
+def test_python_driver_runs_every_case(tmp_path):
+    driver = build_driver("n = int(input())\nprint(n * 2)\nif n == 3:\n    raise ValueError('three')", "python", ["1", "2", "3"])
+    results, _ = run_driver([sys.executable], driver, tmp_path, ".py")
+    assert [result["stdout"] for result in results] == ["2\n", "4\n", "6\n"]
+    assert [result["error"] for result in results] == [None, None, "ValueError: three"]
+
+
+def test_python_driver_keeps_marker_from_the_program(tmp_path):
+    code = (
+        "import os, sys\n"
+        "main = sys.modules['__main__']\n"
+        "places = [repr(vars(main)), repr(dict(os.environ)), repr(sys.argv), open(main.__file__).read(), sys.stdin.read()]\n"
+        "print(any('sec' + 'ret' in place for place in places))\n"
+    )
+    driver = build_driver(code, "python", [""])
+    assert MARKER not in driver
+    results, _ = run_driver([sys.executable], driver, tmp_path, ".py")
+    assert results[0]["error"] is None
+    assert results[0]["stdout"] == "False\n"
+
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="node is not installed")
+def test_javascript_driver_keeps_marker_from_the_program(tmp_path):
+    code = (
+        "const fs = require('fs');\n"
+        "const input = fs.readFileSync(0, 'utf8');\n"
+        f"const places = [typeof MARKER, JSON.stringify(process.env), fs.readFileSync({json.dumps(str(tmp_path / 'main.js'))}, 'utf8')];\n"
+        "console.log(input, places.some((place) => String(place).includes('sec' + 'ret')));\n"
+    )
+    driver = build_driver(code, "javascript", ["7"])
+    assert MARKER not in driver
+    results, _ = run_driver(["node"], driver, tmp_path, ".js")
+    assert results[0]["error"] is None
+    assert results[0]["stdout"] == "7 false\n"
+
+
+def test_asynchronous_javascript_runs_per_case():
+    assert build_driver("process.stdin.on('data', (d) => console.log(d))", "javascript", ["1"]) is None
+    assert build_driver("fn main() {}", "rust", ["1"]) is None
+
+
+def batch_stdout(*results):
+    return "".join(MARKER + json.dumps({"index": index, "stdout": stdout, "stderr": "", "error": None, "timed_out": False, "time_ms": 1.0}) + "\n" for index, stdout in results)
+
+
+def fake_execution(monkeypatch, stdout, **fields):
+    calls = []
+
+    async def execute_code(code, language, stdin="", use_cache=True, client=None):
+        calls.append(stdin)
+        return ExecutionResult(language="python", stdout=stdout, exit_code=0, **fields)
+
+    monkeypatch.setattr(harness, "execute_code", execute_code)
+    return calls
+
+
+def test_batched_results(monkeypatch):
+    cases = [HarnessCase(stdin="1", expected_output="2"), HarnessCase(stdin="2", expected_output="4"), HarnessCase(stdin="3", expected_output="6")]
+    calls = fake_execution(monkeypatch, "noise\n" + batch_stdout((0, "2\n"), (1, "5\n")), status="TO", signal="SIGKILL")
+    result = run(run_batched(ProgrammingLanguage.PYTHON, cases, "driver", MARKER))
+    assert calls == [MARKER + "\n"]
+    assert [case.passed for case in result.cases] == [True, False, False]
+    # The batch was killed before the last case reported
+    assert result.cases[2].error == "Time limit exceeded"
+    assert result.cases[2].timed_out is True
+
+
+def test_results_printed_by_the_program_are_rejected(monkeypatch):
+    cases = [HarnessCase(stdin="1", expected_output="2"), HarnessCase(stdin="2", expected_output="4")]
+    # A forged result for case 1 printed while case 0 ran, then the driver's own lines
+    fake_execution(monkeypatch, batch_stdout((1, "4\n"), (0, "2\n"), (1, "wrong\n")))
+    result = run(run_batched(ProgrammingLanguage.PYTHON, cases, "driver", MARKER))
+    assert result.cases[0].passed is True
+    assert result.cases[1].passed is False
+    assert result.cases[1].error == "The program printed its own test result"
+
+
+@pytest.mark.parametrize("actual, expected, match, passed", [
+    ("1 2\n3\n", "1\n2 3", "tokens", True),
+    ("1 2 3", "1 2 4", "tokens", False),
+    ("a  \nb\n\n", "a\nb", "exact", True),
+    ("a b", "a\nb", "exact", False),
+    ("The answer is 42.", "42", "contains", True),
+    ("anything", "   ", "contains", False),
+])
+def test_output_matches(actual, expected, match, passed):
+    assert output_matches(actual, expected, match) is passed
+
+
+def test_parse_test_cases_drops_malformed():
+    response = json.dumps([
+        {"description": "ok", "stdin": "1", "expected_output": "2", "match": "exact"},
+        {"description": "no output", "stdin": "1", "expected_output": " "},
+        {"description": "missing output", "stdin": "1"},
+        {"description": "bad mode", "stdin": "1", "expected_output": "2", "match": "regex"},
+    ])
+    cases = parse_test_cases(f"```json\n{response}\n```")
+    assert [case.description for case in cases] == ["ok", "bad mode"]
+    assert cases[1].match == "tokens"
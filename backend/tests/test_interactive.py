@@ -0,0 +1,217 @@
+import asyncio
+import pytest
+import app.api.routes as routes
+import app.services.code_executor as code_executor
+from app.models.execution import ExecutionResult
+from app.models.task import ProgrammingLanguage
+from app.services.code_executor import execute_interactive
+from app.services.local_executor import STOP_PROGRAM
+from app.services.scheduler import ClientKey, ExecutionScheduler, SchedulerRejected
+
+PROGRAM = {"code": "print(input())", "language": "python"}
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+class FakeRun:
+    """
+    Stands in for execute_interactive: announces itself, then records stdin until it ends.
+    """
+
+    def __init__(self, reject=None, reads=True):
+        self.reject = reject
+        self.reads = reads
+        self.received = []
+
+    async def __call__(self, code, language, stdin, on_output, args=None, client=None):
+        if self.reject:
+            raise self.reject
+        await on_output("stdout", "ready\n")
+        while not self.reads:
+            # A program that never reads: only look for the stop
+            await asyncio.sleep(0.01)
+            pending = [stdin.get_nowait() for _ in range(stdin.qsize())]
+            if STOP_PROGRAM in pending:
+                self.received = pending
+                return ExecutionResult(language="python", signal="SIGKILL")
+            for item in pending:
+                stdin.put_nowait(item)
+        while True:
+            item = await stdin.get()
+            self.received.append(item)
+            if item is None or item is STOP_PROGRAM:
+                return ExecutionResult(language="python", exit_code=0 if item is None else None, signal=None if item is None else "SIGKILL")
+
+
+@pytest.fixture
+def ws(monkeypatch):
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    monkeypatch.setattr(routes, "EXEC_INTERACTIVE_ENABLED", True)
+
+    def connect(fake):
+        monkeypatch.setattr(routes, "execute_interactive", fake)
+        return TestClient(app).websocket_connect("/api/ws/run_code")
+
+    return connect
+
+
+def test_malformed_messages_are_rejected(ws, monkeypatch):
+    monkeypatch.setattr(routes, "INTERACTIVE_STDIN_MAX_BYTES", 8)
+    fake = FakeRun()
+    with ws(fake) as socket:
+        socket.send_json(PROGRAM)
+        assert socket.receive_json() == {"type": "stdout", "data": "ready\n"}
+        socket.send_text("not json")
+        socket.send_json([1, 2])
+        socket.send_bytes(b"\x00")
+        socket.send_json({"type": "stdin", "data": 5})
+        socket.send_json({"type": "stdin", "data": "x" * 9})
+        for _ in range(5):
+            assert socket.receive_json()["type"] == "error"
+        socket.send_json({"type": "stdin", "data": "hi\n"})
+        socket.send_json({"type": "eof"})
+        assert socket.receive_json()["type"] == "exit"
+    assert fake.received == ["hi\n", None]
+
+
+def test_kill_stops_the_program(ws):
+    fake = FakeRun()
+    with ws(fake) as socket:
+        socket.send_json(PROGRAM)
+        socket.receive_json()
+        socket.send_json({"type": "kill"})
+        assert socket.receive_json()["execution"]["signal"] == "SIGKILL"
+    assert fake.received == [STOP_PROGRAM]
+
+
+def test_disconnect_stops_the_program(ws):
+    fake = FakeRun()
+    with ws(fake) as socket:
+        socket.send_json(PROGRAM)
+        socket.receive_json()
+    assert fake.received == [STOP_PROGRAM]
+
+
+def test_stdin_the_program_has_not_read_is_bounded(ws, monkeypatch):
+    monkeypatch.setattr(routes, "INTERACTIVE_STDIN_QUEUE_SIZE", 2)
+    fake = FakeRun(reads=False)
+    with ws(fake) as socket:
+        socket.send_json(PROGRAM)
+        socket.receive_json()
+        for data in ("a", "b", "c"):
+            socket.send_json({"type": "stdin", "data": data})
+        assert socket.receive_json()["detail"] == "The program has not read its earlier input yet"
+        # End of input still fits, and kill is still read
+        socket.send_json({"type": "eof"})
+        socket.send_json({"type": "kill"})
+        assert socket.receive_json()["type"] == "exit"
+    # Pending input is dropped in favour of the stop
+    assert fake.received == [STOP_PROGRAM]
+
+
+def test_rejected_run_reports_retry_after(ws):
+    with ws(FakeRun(reject=SchedulerRejected(429, "Too many python executions pending for this client", 4))) as socket:
+        socket.send_json(PROGRAM)
+        assert socket.receive_json() == {"type": "error", "detail": "Too many python executions pending for this client", "retry_after": 4}
+        assert socket.receive()["code"] == 1013
+
+
+def test_invalid_first_message_is_refused(ws):
+    with ws(FakeRun()) as socket:
+        socket.send_json(["code"])
+        assert socket.receive_json()["type"] == "error"
+        assert socket.receive()["code"] == 1008
+
+
+class FakeInteractiveExecutor:
+    """
+    Interactive executor whose programs start once `build` is set and end at end of input.
+    """
+
+    class Spec:
+        version = "3.11.0"
+
+    def __init__(self):
+        self.languages = {"python": self.Spec()}
+        self.build = asyncio.Event()
+        self.running = 0
+
+    def supports(self, language):
+        return language in self.languages
+
+    async def run_interactive(self, code, language, stdin, on_output, args, client, on_start=None):
+        await self.build.wait()
+        on_start()
+        self.running += 1
+        try:
+            while await stdin.get() is not None:
+                pass
+        finally:
+            self.running -= 1
+        return {"language": language, "version": "3.11.0", "run": {"stdout": "", "stderr": "", "code": 0}}
+
+
+@pytest.fixture
+def interactive(monkeypatch):
+    executor = FakeInteractiveExecutor()
+    scheduler = ExecutionScheduler(max_per_client=1)
+    scheduler.queue("python").workers = 1
+    monkeypatch.setattr(code_executor, "EXEC_INTERACTIVE_ENABLED", True)
+    monkeypatch.setattr(code_executor, "get_interactive_executor", lambda: executor)
+    monkeypatch.setattr(code_executor, "execution_scheduler", scheduler)
+    return executor, scheduler.queue("python")
+
+
+async def noop_output(stream, text):
+    pass
+
+
+def test_interactive_runs_are_admitted_by_the_scheduler(interactive):
+    executor, queue = interactive
+
+    async def scenario():
+        inputs = [asyncio.Queue(), asyncio.Queue()]
+        runs = [
+            asyncio.ensure_future(execute_interactive("print(1)", ProgrammingLanguage.PYTHON, stdin, noop_output, client=ClientKey(name, "10.0.0.1")))
+            for name, stdin in zip(("alice", "bob"), inputs)
+        ]
+        await asyncio.sleep(0.01)
+        # The first run holds the only worker slot while it is built
+        building = (queue.running, queue.queued)
+        with pytest.raises(SchedulerRejected) as rejected:
+            await execute_interactive("print(1)", ProgrammingLanguage.PYTHON, asyncio.Queue(), noop_output, client=ClientKey("alice", "10.0.0.1"))
+        executor.build.set()
+        await asyncio.sleep(0.01)
+        # Once started, runs waiting for input hand the slot on
+        started = (executor.running, queue.running, queue.queued)
+        for stdin in inputs:
+            stdin.put_nowait(None)
+        results = await asyncio.gather(*runs)
+        return building, rejected.value, started, results
+
+    building, rejected, started, results = run(scenario())
+    assert building == (1, 1)
+    assert rejected.status_code == 429
+    assert started == (2, 0, 0)
+    assert all(result.exit_code == 0 for result in results)
+
+
+def test_cancelled_interactive_run_is_stopped(interactive):
+    executor, queue = interactive
+
+    async def scenario():
+        task = asyncio.ensure_future(execute_interactive("print(1)", ProgrammingLanguage.PYTHON, asyncio.Queue(), noop_output))
+        await asyncio.sleep(0.01)
+        executor.build.set()
+        await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return executor.running, queue.stats()
+
+    running, stats = run(scenario())
+    assert running == 0
+    assert (stats["running"], stats["queued"]) == (0, 0)
@@ -0,0 +1,66 @@
+from app.services.json_stream import JSONArrayStreamParser, JSONStringFieldStreamer
+
+
+def feed_all(parser, chunks):
+    items = []
+    for chunk in chunks:
+        items += parser.feed(chunk)
+    return items
+
+
+def test_parses_items_split_across_chunks():
+    text = '[{"a": 1}, {"b": [1, 2, {"c": 3}]}, {"d": "x"}]'
+    parser = JSONArrayStreamParser()
+    items = feed_all(parser, [text[i:i + 3] for i in range(0, len(text), 3)])
+    assert items == [{"a": 1}, {"b": [1, 2, {"c": 3}]}, {"d": "x"}]
+    assert parser.done
+    assert parser.items_parsed == 3
+
+
+def test_items_are_returned_as_soon_as_they_close():
+    parser = JSONArrayStreamParser()
+    assert parser.feed('[{"a": 1}, {"b"') == [{"a": 1}]
+    assert parser.feed(': 2}') == [{"b": 2}]
+    assert not parser.done
+    assert parser.feed(']') == []
+    assert parser.done
+
+
+def test_brackets_and_escaped_quotes_inside_strings():
+    parser = JSONArrayStreamParser()
+    items = feed_all(parser, ['[{"q": "What does ', '\\"[x]\\" or {y} print?\\\\"}', ']'])
+    assert items == [{"q": 'What does "[x]" or {y} print?\\'}]
+
+
+def test_skips_text_before_the_array():
+    parser = JSONArrayStreamParser()
+    items = feed_all(parser, ['```json\n{"sections": ', '[{"title": "Intro"}]}\n```'])
+    assert items == [{"title": "Intro"}]
+    assert parser.done
+
+
+def test_malformed_element_is_skipped():
+    parser = JSONArrayStreamParser()
+    items = feed_all(parser, ['[{"a": 1,}, {"b": 2}]'])
+    assert items == [{"b": 2}]
+    assert parser.errors == 1
+
+
+def test_text_after_the_array_is_ignored():
+    parser = JSONArrayStreamParser()
+    assert parser.feed('[{"a": 1}] [{"b": 2}]') == [{"a": 1}]
+    assert parser.feed('{"c": 3}') == []
+
+
+def test_string_field_streamer_decodes_escapes_split_across_chunks():
+    streamer = JSONStringFieldStreamer("scaffolding")
+    text = '{"language": "python", "scaffolding": "def f():\\n    return \\"\\u00e9\\ud83d\\ude00\\"", "x": 1}'
+    out = "".join(streamer.feed(text[i:i + 2]) for i in range(0, len(text), 2))
+    assert out == 'def f():\n    return "é\U0001F600"'
+    assert streamer.complete
+
+
+def test_string_field_streamer_ignores_non_string_values():
+    streamer = JSONStringFieldStreamer("scaffolding")
+    assert streamer.feed('{"scaffolding": null}') == ""
+    assert streamer.complete
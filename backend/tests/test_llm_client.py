@@ -0,0 +1,143 @@
+import asyncio
+import pytest
+from app.services.llm_client import LLMBackend, LLMClient, LLMTimeoutError, StubBackend, create_backend, generate_text, stream_text
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+class SlowBackend(LLMBackend):
+    name = "slow"
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.running = 0
+        self.peak = 0
+        self.calls = 0
+
+    async def generate(self, prompt: str) -> str:
+        self.calls += 1
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        try:
+            await asyncio.sleep(self.latency)
+        finally:
+            self.running -= 1
+        return f"reply to {prompt}"
+
+
+def test_stub_backend_is_deterministic():
+    async def scenario():
+        backend = StubBackend()
+        return await backend.generate("prompt"), await backend.generate("prompt"), await backend.generate("other")
+
+    first, second, other = run(scenario())
+    assert first == second
+    assert first != other
+
+
+def test_concurrency_is_bounded():
+    backend = SlowBackend(0.02)
+
+    async def scenario():
+        client = LLMClient(backend, max_concurrency=2, coalesce=False)
+        replies = await asyncio.gather(*(client.generate(f"p{i}") for i in range(6)))
+        return replies, client.stats()
+
+    replies, stats = run(scenario())
+    assert replies == [f"reply to p{i}" for i in range(6)]
+    assert backend.peak == 2
+    assert stats["calls"] == 6
+    assert stats["in_flight"] == 0
+
+
+def test_identical_prompts_share_one_call():
+    backend = SlowBackend(0.02)
+
+    async def scenario():
+        client = LLMClient(backend)
+        return await asyncio.gather(*(client.generate("same") for _ in range(4)))
+
+    assert run(scenario()) == ["reply to same"] * 4
+    assert backend.calls == 1
+
+
+def test_timeout_raises_llm_timeout_error():
+    async def scenario():
+        client = LLMClient(SlowBackend(1), timeout=0.01, coalesce=False)
+        with pytest.raises(LLMTimeoutError):
+            await client.generate("prompt")
+        return client.stats()
+
+    stats = run(scenario())
+    assert stats["timeouts"] == 1
+    assert stats["in_flight"] == 0
+
+
+def test_caller_timeout_leaves_shared_call_running():
+    backend = SlowBackend(0.05)
+
+    async def scenario():
+        client = LLMClient(backend, timeout=1)
+        patient = asyncio.ensure_future(client.generate("same"))
+        await asyncio.sleep(0)
+        with pytest.raises(LLMTimeoutError):
+            await client.generate("same", timeout=0.01)
+        return await patient
+
+    assert run(scenario()) == "reply to same"
+    assert backend.calls == 1
+
+
+def test_failures_are_counted():
+    def responder(prompt):
+        raise RuntimeError("backend down")
+
+    async def scenario():
+        client = LLMClient(StubBackend(responder), coalesce=False)
+        with pytest.raises(RuntimeError):
+            await client.generate("prompt")
+        return client.stats()
+
+    assert run(scenario())["failures"] == 1
+
+
+def test_stream_yields_chunks_and_releases_the_slot():
+    async def scenario():
+        client = LLMClient(StubBackend(lambda prompt: "x" * 150, chunk_size=64), max_concurrency=1)
+        chunks = [chunk async for chunk in client.stream("prompt")]
+        # The slot was released: a second call does not wait
+        reply = await asyncio.wait_for(client.generate("prompt"), 1)
+        return chunks, reply
+
+    chunks, reply = run(scenario())
+    assert [len(chunk) for chunk in chunks] == [64, 64, 22]
+    assert reply == "x" * 150
+
+
+def test_stream_timeout_applies_to_the_whole_stream():
+    async def scenario():
+        client = LLMClient(StubBackend(lambda prompt: "x" * 100, latency=0.2, chunk_size=10), timeout=0.05)
+        with pytest.raises(LLMTimeoutError):
+            async for _ in client.stream("prompt"):
+                pass
+        return client.stats()
+
+    stats = run(scenario())
+    assert stats["timeouts"] == 1
+    assert stats["in_flight"] == 0
+
+
+def test_shared_client_shortcuts(stub_llm):
+    stub_llm(lambda prompt: prompt.upper())
+
+    async def scenario():
+        return await generate_text("hello"), [chunk async for chunk in stream_text("hi")]
+
+    assert run(scenario()) == ("HELLO", ["HI"])
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        create_backend("nope")
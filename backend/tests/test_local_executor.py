@@ -0,0 +1,163 @@
+import os
+import sys
+import asyncio
+import pytest
+import app.services.local_executor as local_executor
+from app.services.code_executor import ExecutorBackend, LocalBackend
+from app.services.local_executor import LocalExecutor, resolve_exec_uids
+
+EXEC_UIDS = range(61000, 61032)
+EXEC_PYTHON = "/usr/bin/python3"
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+@pytest.fixture(autouse=True)
+def interpreted_only(monkeypatch):
+    # Compiler detection runs every toolchain; these tests only need Python workers
+    monkeypatch.setattr(local_executor, "detect_compilers", lambda *args, **kwargs: {})
+
+
+@pytest.fixture
+def isolated(monkeypatch):
+    if os.getuid() != 0 or not os.access(EXEC_PYTHON, os.X_OK):
+        pytest.skip("needs root and a system Python to run programs as other uids")
+    monkeypatch.setattr(local_executor, "LOCAL_EXEC_UIDS", f"{EXEC_UIDS.start}-{EXEC_UIDS.stop - 1}")
+    monkeypatch.setattr(local_executor, "LOCAL_EXEC_PYTHON", EXEC_PYTHON)
+
+
+def execute(code, **kwargs):
+    async def scenario():
+        executor = LocalExecutor(pool_size=1)
+        for name, value in kwargs.items():
+            if name in ("cpu_seconds", "memory_mb"):
+                setattr(executor.pools["python"], name, value)
+            else:
+                setattr(executor, name, value)
+        await executor.start()
+        try:
+            return await executor.run(code, "python")
+        finally:
+            await executor.close()
+
+    return run(scenario())
+
+
+def test_refuses_to_start_without_isolation(monkeypatch):
+    monkeypatch.setattr(local_executor, "LOCAL_EXEC_UIDS", None)
+    monkeypatch.setattr(local_executor, "LOCAL_EXEC_ALLOW_UNISOLATED", False)
+    with pytest.raises(RuntimeError, match="LOCAL_EXEC_UIDS"):
+        LocalExecutor()
+
+    monkeypatch.setattr(local_executor, "LOCAL_EXEC_ALLOW_UNISOLATED", True)
+    assert LocalExecutor().uids is None
+
+
+def test_uid_range_must_be_unused_and_unprivileged():
+    for spec in ("0-10", str(os.getuid()), "65534", "20-10"):
+        with pytest.raises((RuntimeError, ValueError)):
+            resolve_exec_uids(spec, 65534)
+    assert resolve_exec_uids(None, 65534) is None
+
+
+def test_programs_run_as_leased_uid(isolated, tmp_path):
+    secret = tmp_path / "secret.env"
+    secret.write_text("GEMINI_API_KEY=x")
+    secret.chmod(0o600)
+    reply = execute(f"import os\nprint(os.getuid())\nopen({str(secret)!r}).read()")
+    assert int(reply["run"]["stdout"]) in EXEC_UIDS
+    assert "PermissionError" in reply["run"]["stderr"]
+
+
+def test_memory_limit(isolated):
+    reply = execute("data = bytearray(512 * 1024 * 1024)", memory_mb=64)
+    assert "MemoryError" in reply["run"]["stderr"]
+    assert reply["run"]["status"] == "RE"
+
+
+def test_cpu_limit(isolated):
+    reply = execute("while True:\n    pass", cpu_seconds=1)
+    assert reply["run"]["signal"] in ("SIGXCPU", "SIGKILL")
+    assert reply["run"]["status"] == "TO"
+    assert "CPU time limit" in reply["run"]["message"]
+
+
+def test_wall_clock_timeout_kills_run(isolated):
+    reply = execute("import time\ntime.sleep(30)", wall_seconds=0.5)
+    assert reply["run"]["status"] == "TO"
+    assert reply["run"]["signal"] == "SIGKILL"
+    assert reply["run"]["wall_time"] < 5000
+
+
+def test_output_is_capped(isolated):
+    reply = execute("while True:\n    print('x' * 1000)", max_output_bytes=1000)
+    assert reply["run"]["status"] == "OL"
+    assert reply["run"]["stdout_truncated"] is True
+    assert len(reply["run"]["stdout"]) == 1000
+
+
+def test_children_that_leave_the_session_are_killed(isolated):
+    code = (
+        "import os, time\n"
+        "if os.fork() == 0:\n"
+        "    os.setsid()\n"
+        "    if os.fork():\n"
+        "        os._exit(0)\n"
+        "    print(os.getpid(), flush=True)\n"
+        "    os.close(1)\n"
+        "    os.close(2)\n"
+        "    time.sleep(60)\n"
+        "else:\n"
+        "    os.wait()\n"
+    )
+    reply = execute(code)
+    pid = int(reply["run"]["stdout"])
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            state = next(line for line in status if line.startswith("State:"))
+    except FileNotFoundError:
+        return
+    # Killed; a zombie only until something reaps it
+    assert "Z" in state
+
+
+def test_unsupported_languages_fall_back_to_piston(monkeypatch):
+    monkeypatch.setattr(local_executor, "LOCAL_EXEC_UIDS", None)
+    monkeypatch.setattr(local_executor, "LOCAL_EXEC_ALLOW_UNISOLATED", True)
+    monkeypatch.setattr(local_executor, "LOCAL_EXEC_PYTHON", sys.executable)
+
+    class FakePiston(ExecutorBackend):
+        name = "piston"
+
+        def __init__(self):
+            self.runs = []
+
+        async def run(self, code, language, stdin="", args=None):
+            self.runs.append(language)
+            return {"language": language, "version": "1.0", "run": {"stdout": "remote", "code": 0}}
+
+        async def runtime_version(self, language):
+            return "1.0"
+
+    async def scenario():
+        fallback = FakePiston()
+        backend = LocalBackend(fallback=fallback)
+        remote = await backend.run("main = putStrLn \"hi\"", "haskell")
+        version = await backend.runtime_version("haskell")
+        local = await backend.run("print('local')", "python")
+        await backend.close()
+        return fallback.runs, remote, version, local
+
+    runs, remote, version, local = run(scenario())
+    assert runs == ["haskell"]
+    assert remote["run"]["stdout"] == "remote"
+    assert version == "piston:1.0"
+    assert local["run"]["stdout"] == "local\n"
+
+
+def test_python_runs_with_a_fixed_hash_seed(isolated):
+    first = execute("print(hash('a'), list({'a', 'b', 'c', 'd'}))")
+    second = execute("print(hash('a'), list({'a', 'b', 'c', 'd'}))")
+    assert first["run"]["stdout"] == second["run"]["stdout"]
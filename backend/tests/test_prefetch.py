@@ -0,0 +1,136 @@
+import asyncio
+import pytest
+import app.services.prefetch as prefetch
+from app.services.prefetch import PrefetchStore, boilerplate_key, explanations_key, learning_sections_key
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+@pytest.fixture(autouse=True)
+def fake_time(monkeypatch, clock):
+    monkeypatch.setattr(prefetch, "time", clock)
+    return clock
+
+
+async def value(result, delay=0.0):
+    await asyncio.sleep(delay)
+    return result
+
+
+def test_claim_returns_the_prefetched_result():
+    async def scenario():
+        store = PrefetchStore(enabled=True)
+        assert store.start("s1", "stage", "inputs", lambda: value({"items": [1]}))
+        return await store.claim("s1", "stage", "inputs"), await store.claim("s1", "stage", "inputs"), store.stats()
+
+    result, second, stats = run(scenario())
+    assert result == {"items": [1]}
+    # A slot is handed out once
+    assert second is None
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+
+
+def test_claim_with_other_inputs_discards_the_slot():
+    async def scenario():
+        store = PrefetchStore(enabled=True)
+        store.start("s1", "stage", "old", lambda: value("result", 1))
+        task = store._slots[("s1", "stage")].task
+        result = await store.claim("s1", "stage", "new")
+        await asyncio.sleep(0)
+        return result, task.cancelled(), store.stats()
+
+    result, cancelled, stats = run(scenario())
+    assert result is None
+    assert cancelled
+    assert stats["mismatches"] == 1
+
+
+def test_failed_prefetch_is_a_miss():
+    async def fail():
+        raise RuntimeError("model down")
+
+    async def scenario():
+        store = PrefetchStore(enabled=True)
+        store.start("s1", "stage", "inputs", fail)
+        return await store.claim("s1", "stage", "inputs"), store.stats()
+
+    result, stats = run(scenario())
+    assert result is None
+    assert stats["failures"] == 1
+
+
+def test_budget_limits_running_and_parked_slots():
+    async def scenario():
+        store = PrefetchStore(enabled=True, max_in_flight=2, max_slots=3)
+        started = [store.start(f"s{i}", "stage", "inputs", lambda: value(i, 1)) for i in range(3)]
+        for key in list(store._slots):
+            store._discard(key)
+        finished = []
+        for i in range(4):
+            finished.append(store.start(f"f{i}", "stage", "inputs", lambda: value(i)))
+            await asyncio.sleep(0)
+        return started, finished, store.stats()
+
+    started, finished, stats = run(scenario())
+    assert started == [True, True, False]
+    # Finished tasks still hold a slot until claimed
+    assert finished == [True, True, True, False]
+    assert stats["over_budget"] == 2
+
+
+def test_unclaimed_slots_expire(fake_time):
+    async def scenario():
+        store = PrefetchStore(enabled=True, ttl=60)
+        store.start("old", "stage", "inputs", lambda: value("old", 1))
+        old_task = store._slots[("old", "stage")].task
+        fake_time.advance(61)
+        store.start("new", "stage", "inputs", lambda: value("new"))
+        await asyncio.sleep(0)
+        return old_task.cancelled(), await store.claim("old", "stage", "inputs"), await store.claim("new", "stage", "inputs")
+
+    assert run(scenario()) == (True, None, "new")
+
+
+def test_cancel_session_only_cancels_that_session():
+    async def scenario():
+        store = PrefetchStore(enabled=True)
+        store.start("s1", "a", "inputs", lambda: value("a", 1))
+        store.start("s1", "b", "inputs", lambda: value("b", 1))
+        store.start("s2", "a", "inputs", lambda: value("other"))
+        store.cancel_session("s1")
+        return store.stats(), await store.claim("s1", "a", "inputs"), await store.claim("s2", "a", "inputs")
+
+    stats, cancelled, other = run(scenario())
+    assert stats["cancelled"] == 2
+    assert cancelled is None
+    assert other == "other"
+
+
+def test_disabled_or_anonymous_sessions_do_not_prefetch():
+    async def scenario():
+        calls = []
+
+        async def work():
+            calls.append(1)
+
+        assert not PrefetchStore(enabled=False).start("s1", "stage", "inputs", work)
+        assert not PrefetchStore(enabled=True).start(None, "stage", "inputs", work)
+        await asyncio.sleep(0)
+        return calls
+
+    assert run(scenario()) == []
+
+
+def test_input_keys_match_what_the_next_request_sends():
+    assert learning_sections_key("Reverse a list ", "python") == learning_sections_key("reverse a  list", "python")
+    assert learning_sections_key("Reverse a list", "python") != learning_sections_key("Reverse a list", "java")
+    assert boilerplate_key("Task", "python", ["b", "a"]) == boilerplate_key("task", "python", ["a", "b"])
+
+    # /check_quiz returns more fields than the learning page sends back
+    checked = [{"question_id": "q1", "question": "Q?", "user_answer": "A", "correct_answer": "B", "code_snippet": None, "explanation": "..."}]
+    sent_back = [{"question": "Q?", "user_answer": "A", "correct_answer": "B"}]
+    assert explanations_key(checked, "python") == explanations_key(sent_back, "python")
+    assert explanations_key(checked, "python") != explanations_key([{**sent_back[0], "user_answer": "C"}], "python")
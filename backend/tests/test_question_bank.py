@@ -0,0 +1,93 @@
+import pytest
+import app.services.question_bank as question_bank
+from app.services.question_bank import QuestionBank, normalize_concepts
+
+TASK = "Reverse a linked list"
+
+
+def make_question(n: int, **fields):
+    question = {
+        "id": f"q{n}",
+        "question": f"What is the result of step {n}?",
+        "options": [f"{n}", f"{n + 1}", f"{n + 2}", f"{n + 3}"],
+        "correct_answer": f"{n}",
+        "concepts": ["Linked Lists"],
+    }
+    question.update(fields)
+    return question
+
+
+@pytest.fixture
+def bank(tmp_path, monkeypatch, clock):
+    monkeypatch.setattr(question_bank, "time", clock)
+    return QuestionBank(db_name=str(tmp_path / "question_bank.db"), min_pool=4, seen_ttl=100)
+
+
+def test_normalize_concepts():
+    assert normalize_concepts(["Linked  Lists", "linked lists", 3, "Recursion"]) == ["linked lists", "recursion"]
+    assert normalize_concepts("loops") == []
+
+
+def test_duplicates_are_stored_once(bank):
+    assert bank.add_questions(TASK, "python", [make_question(1), make_question(2)]) == 2
+    # Same content up to case and punctuation, in another task
+    duplicate = make_question(1, question="WHAT is the result of step 1", id="other")
+    assert bank.add_questions("Another task", "python", [duplicate]) == 0
+    # The same question in another language is a different question
+    assert bank.add_questions(TASK, "java", [make_question(1)]) == 1
+
+    stats = bank.stats()
+    assert stats["questions"] == 3
+    assert stats["duplicates"] == 1
+    assert stats["tasks"] == 3
+
+
+def test_invalid_questions_are_rejected(bank):
+    invalid = [
+        make_question(1, options=["a", "b"]),
+        make_question(2, correct_answer="nope"),
+        {"question": "No options"},
+    ]
+    assert bank.add_questions(TASK, "python", invalid) == 0
+    assert bank.stats()["rejected"] == 3
+
+
+def test_thin_bank_returns_none(bank):
+    bank.add_questions(TASK, "python", [make_question(n) for n in range(3)])
+    assert bank.assemble_quiz(TASK, "python", count=3) is None
+    assert bank.stats()["thin"] == 1
+
+
+def test_assembled_quiz_has_fresh_ids(bank):
+    bank.add_questions(TASK, "python", [make_question(n) for n in range(6)])
+    quiz = bank.assemble_quiz("  reverse a LINKED list ", "python", count=4)
+    assert [question["id"] for question in quiz] == ["q1", "q2", "q3", "q4"]
+    assert len({question["question"] for question in quiz}) == 4
+
+
+def test_concepts_widen_the_pool(bank):
+    bank.add_questions("Another task", "python", [make_question(n) for n in range(4)])
+    assert bank.assemble_quiz(TASK, "python", count=4) is None
+    assert len(bank.assemble_quiz(TASK, "python", concepts=["linked lists"], count=4)) == 4
+
+
+def test_student_does_not_see_questions_again_until_ttl(bank, clock):
+    bank.add_questions(TASK, "python", [make_question(n) for n in range(8)])
+    first = bank.assemble_quiz(TASK, "python", student_id="student", count=4)
+    second = bank.assemble_quiz(TASK, "python", student_id="student", count=4)
+    assert not {q["question"] for q in first} & {q["question"] for q in second}
+    # Every question was served
+    assert bank.assemble_quiz(TASK, "python", student_id="student", count=4) is None
+    # Other students are not affected
+    assert bank.assemble_quiz(TASK, "python", student_id="other", count=4) is not None
+
+    clock.advance(101)
+    assert bank.assemble_quiz(TASK, "python", student_id="student", count=4) is not None
+
+
+def test_generated_quiz_counts_as_seen(bank):
+    questions = [make_question(n) for n in range(6)]
+    bank.add_questions(TASK, "python", questions)
+    bank.record_served("student", TASK, "python", questions[:3])
+    assert bank.assemble_quiz(TASK, "python", student_id="student", count=4) is None
+    assert bank.assemble_quiz(TASK, "python", student_id="student", count=3) is not None
@@ -0,0 +1,160 @@
+import asyncio
+import pytest
+from app.services.resp_client import RespClient, RespError, encode_command
+from tests.resp_stub import RespStubServer
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_encode_command():
+    assert encode_command("SET", "key", b"\x00value", 5) == b"*4\r\n$3\r\nSET\r\n$3\r\nkey\r\n$6\r\n\x00value\r\n$1\r\n5\r\n"
+
+
+def test_auth_and_select_on_connect():
+    async def scenario():
+        async with RespStubServer(password="secret") as server:
+            client = RespClient(server.url(":secret@", db=2))
+            assert await client.execute("SET", "key", "value") == "OK"
+            assert await client.execute("GET", "key") == b"value"
+            await client.close()
+
+            other = RespClient(server.url(":secret@", db=0))
+            assert await other.execute("GET", "key") is None
+            await other.close()
+            return server.names()
+
+    assert run(scenario()) == ["AUTH", "SELECT", "SET", "GET", "AUTH", "GET"]
+
+
+def test_auth_with_username():
+    async def scenario():
+        async with RespStubServer(password="secret") as server:
+            client = RespClient(server.url("app:secret@"))
+            await client.execute("PING")
+            await client.close()
+            return server.commands[0][1]
+
+    assert run(scenario()) == [b"AUTH", b"app", b"secret"]
+
+
+def test_failed_auth_is_not_pooled():
+    async def scenario():
+        async with RespStubServer(password="secret") as server:
+            client = RespClient(server.url(":wrong@"))
+            with pytest.raises(RespError, match="WRONGPASS"):
+                await client.execute("PING")
+            return client.stats()
+
+    stats = run(scenario())
+    assert stats["idle_connections"] == 0
+    assert stats["connections_created"] == 0
+    assert stats["errors"] == 1
+
+
+def test_error_reply_keeps_connection():
+    async def scenario():
+        async with RespStubServer() as server:
+            client = RespClient(server.url())
+            with pytest.raises(RespError, match="unknown command"):
+                await client.execute("NOPE")
+            assert await client.execute("PING") == "PONG"
+            await client.close()
+            return client.stats()
+
+    stats = run(scenario())
+    assert stats["connections_created"] == 1
+    assert stats["errors"] == 1
+
+
+def test_connection_closed_while_idle_is_replaced():
+    async def scenario():
+        async with RespStubServer() as server:
+            client = RespClient(server.url())
+            await client.execute("SET", "key", "value")
+            server.close_connections()
+            # Let the client's transport see the close
+            await asyncio.sleep(0.05)
+            assert await client.execute("GET", "key") == b"value"
+            await client.close()
+            return client.stats(), [number for number, _ in server.commands]
+
+    stats, connections = run(scenario())
+    assert stats["stale_connections"] == 1
+    assert stats["connections_created"] == 2
+    assert stats["errors"] == 0
+    assert connections == [1, 2]
+
+
+def test_command_is_not_sent_twice_when_reply_is_lost():
+    async def scenario():
+        async with RespStubServer() as server:
+            client = RespClient(server.url())
+            await client.execute("PING")
+            server.drop_next_reply = True
+            with pytest.raises(RespError):
+                await client.execute("INCR", "counter")
+            counter = await client.execute("GET", "counter")
+            stats = client.stats()
+            await client.close()
+            return counter, server.names().count("INCR"), stats
+
+    counter, sent, stats = run(scenario())
+    assert counter == b"1"
+    assert sent == 1
+    assert stats["idle_connections"] == 1
+    assert stats["connections_created"] == 2
+
+
+def test_timeout_discards_connection():
+    async def scenario():
+        async with RespStubServer() as server:
+            client = RespClient(server.url(), timeout=0.1)
+            await client.execute("SET", "key", "value")
+            server.delay = 0.3
+            with pytest.raises(RespError, match="timed out"):
+                await client.execute("GET", "key")
+            assert client.stats()["idle_connections"] == 0
+
+            # A new connection: the late reply of the timed-out command is never read
+            server.delay = 0.0
+            assert await client.execute("SET", "key", "other") == "OK"
+            assert await client.execute("GET", "key") == b"other"
+            await client.close()
+            return client.stats()
+
+    stats = run(scenario())
+    assert stats["connections_created"] == 2
+    assert stats["errors"] == 1
+
+
+def test_connection_refused():
+    async def scenario():
+        async with RespStubServer() as server:
+            url = server.url()
+        client = RespClient(url)
+        with pytest.raises(RespError, match="failed"):
+            await client.execute("PING")
+        return client.stats()
+
+    assert run(scenario())["errors"] == 1
+
+
+def test_pool_size_bounds_connections():
+    async def scenario():
+        async with RespStubServer() as server:
+            server.delay = 0.02
+            client = RespClient(server.url(), pool_size=2)
+            replies = await asyncio.gather(*(client.execute("PING") for _ in range(6)))
+            await client.close()
+            return replies, server.connections
+
+    replies, connections = run(scenario())
+    assert replies == ["PONG"] * 6
+    assert connections == 2
+
+
+def test_rejects_other_url_schemes():
+    with pytest.raises(ValueError):
+        RespClient("rediss://localhost:6379/0")
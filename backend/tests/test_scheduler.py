@@ -0,0 +1,216 @@
+import asyncio
+import pytest
+import app.services.code_executor as code_executor
+from app.services.cache import TwoTierCache
+from app.services.code_executor import ExecutorBackend, set_executor_backend
+from app.services.scheduler import ClientKey, ExecutionScheduler, LanguageQueue, SchedulerRejected
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def make_queue(workers=1, max_depth=32, max_per_client=10, max_wait=30.0, max_per_address=0):
+    return LanguageQueue("python", workers, max_depth, max_per_client, max_wait, max_per_address)
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_waiting_clients_are_served_round_robin():
+    async def scenario():
+        queue = make_queue()
+        release = asyncio.Event()
+        order = []
+
+        def job(name):
+            async def factory():
+                order.append(name)
+                await release.wait()
+            return factory
+
+        alice, bob = ClientKey("alice", "10.0.0.1"), ClientKey("bob", "10.0.0.2")
+        tasks = [asyncio.ensure_future(queue.run(alice, job(f"a{n}"))) for n in range(4)]
+        await settle()
+        tasks += [asyncio.ensure_future(queue.run(bob, job(f"b{n}"))) for n in range(2)]
+        await settle()
+        assert (queue.running, queue.queued) == (1, 5)
+        release.set()
+        await asyncio.gather(*tasks)
+        return order, queue.stats()
+
+    order, stats = run(scenario())
+    assert order == ["a0", "a1", "b0", "a2", "b1", "a3"]
+    assert (stats["admitted"], stats["completed"], stats["running"], stats["queued"]) == (6, 6, 0, 0)
+
+
+def hold(queue, clients):
+    """
+    Occupy the queue with one blocked execution per client; returns the release event and tasks.
+    """
+    release = asyncio.Event()
+    tasks = [asyncio.ensure_future(queue.run(client, release.wait)) for client in clients]
+    return release, tasks
+
+
+def test_client_cap_is_429_with_retry_after():
+    async def scenario():
+        queue = make_queue(max_per_client=2)
+        client = ClientKey("alice", "10.0.0.1")
+        release, tasks = hold(queue, [client, client])
+        await settle()
+        with pytest.raises(SchedulerRejected) as rejected:
+            await queue.run(client, release.wait)
+        # Another client is still admitted
+        tasks.append(asyncio.ensure_future(queue.run(ClientKey("bob", "10.0.0.1"), release.wait)))
+        await settle()
+        release.set()
+        await asyncio.gather(*tasks)
+        return rejected.value, queue.stats()
+
+    rejected, stats = run(scenario())
+    assert rejected.status_code == 429
+    assert "client" in rejected.detail
+    assert rejected.retry_after >= 1
+    assert stats["rejected_client"] == 1
+
+
+def test_address_cap_applies_whatever_the_client_id():
+    async def scenario():
+        queue = make_queue(max_per_client=1, max_per_address=3)
+        # Rotating IDs, and sending none, from one address
+        release, tasks = hold(queue, [ClientKey("a", "10.0.0.1"), ClientKey("b", "10.0.0.1"), ClientKey(None, "10.0.0.1")])
+        await settle()
+        rejections = []
+        for client in (ClientKey("c", "10.0.0.1"), ClientKey(None, "10.0.0.1")):
+            with pytest.raises(SchedulerRejected) as rejected:
+                await queue.run(client, release.wait)
+            rejections.append(rejected.value)
+        other = asyncio.ensure_future(queue.run(ClientKey(None, "10.0.0.2"), release.wait))
+        await settle()
+        release.set()
+        await asyncio.gather(*tasks, other)
+        return rejections, queue.stats()
+
+    rejections, stats = run(scenario())
+    assert [rejected.status_code for rejected in rejections] == [429, 429]
+    assert all("address" in rejected.detail for rejected in rejections)
+    assert stats["rejected_address"] == 2
+    assert stats["completed"] == 4
+
+
+def test_clients_without_id_are_not_held_to_the_client_cap():
+    async def scenario():
+        queue = make_queue(max_per_client=1)
+        release, tasks = hold(queue, [ClientKey(None, "10.0.0.1")] * 3)
+        await settle()
+        release.set()
+        await asyncio.gather(*tasks)
+        return queue.stats()
+
+    assert run(scenario())["completed"] == 3
+
+
+def test_full_queue_is_503():
+    async def scenario():
+        queue = make_queue(max_depth=1)
+        release, tasks = hold(queue, [ClientKey("a", "10.0.0.1"), ClientKey("b", "10.0.0.2")])
+        await settle()
+        with pytest.raises(SchedulerRejected) as rejected:
+            await queue.run(ClientKey("c", "10.0.0.3"), release.wait)
+        release.set()
+        await asyncio.gather(*tasks)
+        return rejected.value, queue.stats()
+
+    rejected, stats = run(scenario())
+    assert rejected.status_code == 503
+    # One queued ahead plus this one, on one worker, at the initial 1s service estimate
+    assert rejected.retry_after == 2
+    assert stats["rejected_overload"] == 1
+
+
+def test_waiting_too_long_is_503():
+    async def scenario():
+        queue = make_queue(max_wait=0.05)
+        release, tasks = hold(queue, [ClientKey("a", "10.0.0.1")])
+        await settle()
+        with pytest.raises(SchedulerRejected) as rejected:
+            await queue.run(ClientKey("b", "10.0.0.2"), release.wait)
+        release.set()
+        await asyncio.gather(*tasks)
+        return rejected.value, queue.stats()
+
+    rejected, stats = run(scenario())
+    assert rejected.status_code == 503
+    assert stats["rejected_wait"] == 1
+    assert (stats["running"], stats["queued"], stats["waiting_clients"]) == (0, 0, 0)
+
+
+def test_cancelled_waiter_frees_its_place():
+    async def scenario():
+        queue = make_queue(max_per_client=1)
+        release, tasks = hold(queue, [ClientKey("a", "10.0.0.1"), ClientKey("b", "10.0.0.2")])
+        await settle()
+        tasks[1].cancel()
+        await settle()
+        # b's pending count was released with the cancelled wait
+        tasks.append(asyncio.ensure_future(queue.run(ClientKey("b", "10.0.0.2"), release.wait)))
+        await settle()
+        release.set()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        return queue.stats()
+
+    stats = run(scenario())
+    assert (stats["running"], stats["queued"], stats["completed"]) == (0, 0, 2)
+
+
+def test_disabled_scheduler_runs_directly():
+    async def factory():
+        return "ran"
+
+    assert run(ExecutionScheduler(enabled=False, max_per_client=0).run("python", None, factory)) == "ran"
+
+
+class IdleBackend(ExecutorBackend):
+    name = "idle"
+
+    async def run(self, code, language, stdin="", args=None):
+        raise AssertionError("rejected executions must not reach the backend")
+
+    async def runtime_version(self, language):
+        return "3.11.0"
+
+
+@pytest.fixture
+def api(monkeypatch, stub_llm):
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    stub_llm(lambda prompt: "Looks fine.")
+    monkeypatch.setattr(code_executor, "execution_cache", TwoTierCache("execution-test", persistent=False))
+    set_executor_backend(IdleBackend())
+    yield TestClient(app)
+    set_executor_backend(None)
+
+
+def test_analyze_code_returns_scheduler_rejection(api, monkeypatch):
+    monkeypatch.setattr(code_executor, "execution_scheduler", ExecutionScheduler(max_per_client=0))
+    response = api.post(
+        "/api/analyze_code",
+        json={"code": "print(1)", "language": "python", "task_description": "Print 1"},
+        headers={"X-Client-Id": "alice"},
+    )
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+    assert "client" in response.json()["detail"]
+
+
+def test_run_code_returns_overload(api, monkeypatch):
+    scheduler = ExecutionScheduler(max_depth=0)
+    scheduler.queue("python").workers = 0
+    monkeypatch.setattr(code_executor, "execution_scheduler", scheduler)
+    response = api.post("/api/run_code", json={"code": "print(1)", "language": "python"})
+    assert response.status_code == 503
+    assert "Retry-After" in response.headers
@@ -0,0 +1,265 @@
+import asyncio
+import pytest
+import app.services.session_store as session_store
+from app.services.session_store import MemorySessionStore, RedisSessionStore, SQLiteSessionStore, decode_session, encode_session
+from app.services.resp_client import RespError
+from tests.resp_stub import RespStubServer
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+@pytest.fixture
+def fake_time(monkeypatch, clock):
+    monkeypatch.setattr(session_store, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def sqlite_store(tmp_path):
+    def create(**kwargs):
+        return SQLiteSessionStore("quiz", db_name=str(tmp_path / "sessions.db"), **kwargs)
+    return create
+
+
+def test_encode_session_compresses_large_sessions():
+    small = {"questions": [1, 2, 3]}
+    large = {"questions": ["question text"] * 200}
+    assert encode_session(small)[:1] == b"j"
+    assert encode_session(large)[:1] == b"z"
+    assert decode_session(encode_session(small)) == small
+    assert decode_session(encode_session(large)) == large
+
+
+def test_redis_store_round_trip():
+    async def scenario():
+        async with RespStubServer(password="secret") as server:
+            store = RedisSessionStore("quiz", url=server.url(":secret@", db=1), prefix="test:")
+            session = {"questions": [{"question": "Q?"}] * 100, "answers": {}}
+            assert await store.set("abc", session) is True
+            assert await store.get("abc") == session
+            assert await store.get("missing") is None
+            assert await store.delete("abc") is True
+            assert await store.delete("abc") is False
+            assert await store.get("abc") is None
+            stats = await store.stats()
+            await store.close()
+            return stats, server.commands
+
+    stats, commands = run(scenario())
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+    assert stats["writes"] == 1
+    assert [args[0] for _, args in commands[:2]] == [b"AUTH", b"SELECT"]
+    assert commands[2][1][:2] == [b"SET", b"test:quiz:abc"]
+
+
+def test_redis_store_save_keeps_expiry():
+    async def scenario():
+        async with RespStubServer() as server:
+            store = RedisSessionStore("quiz", url=server.url(), ttl=0.3)
+            await store.set("abc", {"answers": {}})
+            await asyncio.sleep(0.2)
+            # Saving does not extend the session's lifetime
+            await store.set("abc", {"answers": {"1": "A"}})
+            assert await store.get("abc") == {"answers": {"1": "A"}}
+            await asyncio.sleep(0.15)
+            expired = await store.get("abc")
+
+            # An expired session is created again
+            await store.set("abc", {"answers": {}})
+            recreated = await store.get("abc")
+            await store.close()
+            return expired, recreated, server.names()
+
+    expired, recreated, names = run(scenario())
+    assert expired is None
+    assert recreated == {"answers": {}}
+    # NX, then NX + XX KEEPTTL for the save, then NX again
+    assert names.count("SET") == 4
+
+
+def test_redis_store_rejects_oversized_session():
+    async def scenario():
+        async with RespStubServer() as server:
+            store = RedisSessionStore("quiz", url=server.url(), max_bytes=64)
+            stored = await store.set("abc", {"text": "x" * 100})
+            await store.close()
+            return stored, await store.stats(), server.commands
+
+    stored, stats, commands = run(scenario())
+    assert stored is False
+    assert stats["rejected"] == 1
+    assert commands == []
+
+
+def test_redis_store_counts_errors():
+    async def scenario():
+        async with RespStubServer() as server:
+            url = server.url()
+        store = RedisSessionStore("quiz", url=url)
+        with pytest.raises(RespError):
+            await store.get("abc")
+        with pytest.raises(RespError):
+            await store.set("abc", {})
+        return await store.stats()
+
+    assert run(scenario())["errors"] == 2
+
+
+def test_memory_store_expires_sessions(fake_time):
+    removed = []
+
+    async def scenario():
+        store = MemorySessionStore("quiz", ttl=10, on_remove=removed.append)
+        await store.set("a", {"n": 1})
+        fake_time.advance(5)
+        await store.set("b", {"n": 2})
+        # Saving does not extend the session's lifetime
+        await store.set("a", {"n": 3})
+        fake_time.advance(6)
+        swept = await store.sweep()
+        return swept, await store.get("a"), await store.get("b"), await store.stats()
+
+    swept, a, b, stats = run(scenario())
+    assert swept == 1
+    assert a is None
+    assert b == {"n": 2}
+    assert removed == ["a"]
+    assert stats["expired"] == 1
+    assert stats["sessions"] == 1
+
+
+def test_memory_store_expires_on_read_before_the_sweep(fake_time):
+    async def scenario():
+        store = MemorySessionStore("quiz", ttl=10)
+        await store.set("a", {})
+        fake_time.advance(11)
+        return await store.get("a"), await store.stats()
+
+    value, stats = run(scenario())
+    assert value is None
+    assert stats["expired"] == 1
+    assert stats["misses"] == 1
+
+
+def test_memory_store_evicts_least_recently_used():
+    removed = []
+
+    async def scenario():
+        store = MemorySessionStore("quiz", max_entries=2, on_remove=removed.append)
+        await store.set("a", {})
+        await store.set("b", {})
+        await store.get("a")
+        await store.set("c", {})
+        return [await store.get(key) is not None for key in ("a", "b", "c")], await store.stats()
+
+    present, stats = run(scenario())
+    assert present == [True, False, True]
+    assert removed == ["b"]
+    assert stats["evictions"] == 1
+
+
+def test_memory_store_byte_cap():
+    async def scenario():
+        store = MemorySessionStore("quiz", max_bytes=40)
+        first = await store.set("a", {"text": "x" * 10})
+        second = await store.set("b", {"text": "y" * 10})
+        oversized = await store.set("c", {"text": "z" * 50})
+        return first, second, oversized, await store.get("a"), await store.stats()
+
+    first, second, oversized, a, stats = run(scenario())
+    assert (first, second, oversized) == (True, True, False)
+    assert a is None
+    assert stats["rejected"] == 1
+    assert stats["evictions"] == 1
+    assert stats["bytes"] <= 40
+
+
+def test_memory_store_delete():
+    async def scenario():
+        store = MemorySessionStore("quiz")
+        await store.set("a", {})
+        return await store.delete("a"), await store.delete("a"), await store.get("a")
+
+    assert run(scenario()) == (True, False, None)
+
+
+def test_sqlite_store_expires_sessions(fake_time, sqlite_store):
+    removed = []
+
+    async def scenario():
+        store = sqlite_store(ttl=10, on_remove=removed.append)
+        await store.set("a", {"n": 1})
+        fake_time.advance(5)
+        await store.set("b", {"n": 2})
+        await store.set("a", {"n": 3})
+        fake_time.advance(6)
+        # Expired sessions are not returned before the sweep deletes them
+        a = await store.get("a")
+        swept = await store.sweep()
+        return a, swept, await store.get("b"), await store.stats()
+
+    a, swept, b, stats = run(scenario())
+    assert a is None
+    assert swept == 1
+    assert b == {"n": 2}
+    assert removed == ["a"]
+    assert stats["sessions"] == 1
+
+
+def test_sqlite_store_recreates_expired_session(fake_time, sqlite_store):
+    async def scenario():
+        store = sqlite_store(ttl=10)
+        await store.set("a", {"n": 1})
+        fake_time.advance(11)
+        await store.set("a", {"n": 2})
+        fake_time.advance(5)
+        return await store.get("a")
+
+    assert run(scenario()) == {"n": 2}
+
+
+def test_sqlite_store_caps_evict_oldest_sessions(fake_time, sqlite_store):
+    removed = []
+
+    async def scenario():
+        store = sqlite_store(max_entries=2, on_remove=removed.append)
+        for session_id in ("a", "b", "c"):
+            await store.set(session_id, {"id": session_id})
+            fake_time.advance(1)
+        swept = await store.sweep()
+        return swept, [await store.get(key) is not None for key in ("a", "b", "c")], await store.stats()
+
+    swept, present, stats = run(scenario())
+    assert swept == 1
+    assert present == [False, True, True]
+    assert removed == ["a"]
+    assert stats["evictions"] == 1
+
+
+def test_sqlite_store_is_shared_and_namespaced(tmp_path):
+    async def scenario():
+        path = str(tmp_path / "sessions.db")
+        first = SQLiteSessionStore("quiz", db_name=path)
+        second = SQLiteSessionStore("quiz", db_name=path)
+        other = SQLiteSessionStore("other", db_name=path)
+        large = {"questions": ["question text"] * 200}
+        await first.set("a", large)
+        return await second.get("a"), await other.get("a"), await second.delete("a"), await first.get("a")
+
+    assert run(scenario()) == ({"questions": ["question text"] * 200}, None, True, None)
+
+
+def test_metrics_report_sqlite_sessions(sqlite_store, monkeypatch):
+    from fastapi.testclient import TestClient
+    import app.api.routes as routes
+    from app.main import app
+
+    store = sqlite_store()
+    run(store.set("a", {"questions": [1]}))
+    monkeypatch.setattr(routes, "quiz_sessions", store)
+    sessions = TestClient(app).get("/api/metrics").json()["quiz_sessions"]
+    assert (sessions["backend"], sessions["sessions"]) == ("sqlite", 1)
+    assert sessions["bytes"] > 0
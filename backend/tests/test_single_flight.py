@@ -0,0 +1,145 @@
+import asyncio
+import pytest
+from app.services.single_flight import SingleFlight
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_concurrent_calls_share_one_execution():
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"items": [1]}
+
+    async def scenario():
+        flight = SingleFlight("test")
+        results = await asyncio.gather(*(flight.do("key", work) for _ in range(5)))
+        results[0]["items"].append(2)
+        return results, flight.stats()
+
+    results, stats = run(scenario())
+    assert len(calls) == 1
+    # Every caller gets its own copy
+    assert results[1] == {"items": [1]}
+    assert stats == {"in_flight": 0, "executions": 1, "coalesced": 4, "abandoned": 0}
+
+
+def test_cancelled_caller_leaves_work_for_the_others():
+    async def scenario():
+        flight = SingleFlight("test")
+        started = asyncio.Event()
+
+        async def work():
+            started.set()
+            await asyncio.sleep(0.05)
+            return "done"
+
+        first = asyncio.ensure_future(flight.do("key", work))
+        second = asyncio.ensure_future(flight.do("key", work))
+        await started.wait()
+        first.cancel()
+        result = await second
+        return first.cancelled(), result, flight.stats()
+
+    cancelled, result, stats = run(scenario())
+    assert cancelled
+    assert result == "done"
+    assert stats["abandoned"] == 0
+
+
+def test_work_is_cancelled_when_every_caller_leaves():
+    async def scenario():
+        flight = SingleFlight("test")
+        started = asyncio.Event()
+        finished = []
+
+        async def work():
+            started.set()
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                finished.append("cancelled")
+                raise
+            return "old"
+
+        caller = asyncio.ensure_future(flight.do("key", work))
+        await started.wait()
+        caller.cancel()
+        await asyncio.sleep(0)
+
+        async def fresh():
+            return "new"
+
+        # A caller arriving right after the last one left starts new work
+        result = await flight.do("key", fresh)
+        await asyncio.sleep(0)
+        return result, finished, flight.stats()
+
+    result, finished, stats = run(scenario())
+    assert result == "new"
+    assert finished == ["cancelled"]
+    assert stats["executions"] == 2
+    assert stats["abandoned"] == 1
+    assert stats["in_flight"] == 0
+
+
+def test_timeout_only_bounds_the_callers_wait():
+    async def scenario():
+        flight = SingleFlight("test")
+
+        async def work():
+            await asyncio.sleep(0.05)
+            return "done"
+
+        patient = asyncio.ensure_future(flight.do("key", work))
+        await asyncio.sleep(0)
+        with pytest.raises(asyncio.TimeoutError):
+            await flight.do("key", work, timeout=0.01)
+        return await patient, flight.stats()
+
+    result, stats = run(scenario())
+    assert result == "done"
+    assert stats["executions"] == 1
+    assert stats["abandoned"] == 0
+
+
+def test_timeout_of_the_last_caller_cancels_the_work():
+    async def scenario():
+        flight = SingleFlight("test")
+        cancelled = []
+
+        async def work():
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        with pytest.raises(asyncio.TimeoutError):
+            await flight.do("key", work, timeout=0.01)
+        await asyncio.sleep(0)
+        return cancelled, flight.stats()
+
+    cancelled, stats = run(scenario())
+    assert cancelled == [True]
+    assert stats["abandoned"] == 1
+    assert stats["in_flight"] == 0
+
+
+def test_errors_reach_every_caller():
+    async def scenario():
+        flight = SingleFlight("test")
+
+        async def work():
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        return await asyncio.gather(*(flight.do("key", work) for _ in range(3)), return_exceptions=True), flight.stats()
+
+    results, stats = run(scenario())
+    assert [type(result) for result in results] == [ValueError] * 3
+    assert stats["in_flight"] == 0
@@ -0,0 +1,110 @@
+import sys
+import asyncio
+import pytest
+import app.services.syntax_check as syntax_check
+from app.services.cache import TwoTierCache
+from app.services.syntax_check import CHECKERS, CommandChecker, PythonChecker, check_syntax
+
+SERVER_PYTHON = f"{sys.version_info.major}.{sys.version_info.minor}.0"
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    monkeypatch.setattr(syntax_check, "syntax_cache", TwoTierCache("syntax-test", persistent=False))
+
+
+def checker_for(language):
+    checker = CHECKERS.get(language)
+    if checker is None:
+        pytest.skip(f"no local syntax checker for {language}")
+    return checker
+
+
+def test_python_syntax_error():
+    error = run(check_syntax("x = 1\nprint(x +)\n", "python", SERVER_PYTHON))
+    assert error.line == 2
+    assert error.checker == "ast"
+    assert error.text == "print(x +)"
+    assert run(check_syntax("print(1)\n", "python", SERVER_PYTHON)) is None
+
+
+def test_python_null_bytes():
+    error = run(PythonChecker().check("print(1)\x00"))
+    assert error.message.startswith("SyntaxError")
+
+
+@pytest.mark.parametrize("version", ["3.8.10", "piston:3.99.0", "*", None])
+def test_python_skipped_for_other_versions(version):
+    # Another runtime's grammar may differ from the server's; only the runtime can tell
+    assert run(check_syntax("print(1 +)\n", "python", version)) is None
+
+
+def test_python_fallback_version_prefix():
+    assert PythonChecker().supports_version(f"piston:{SERVER_PYTHON}")
+
+
+def test_results_are_cached(monkeypatch):
+    calls = []
+    checker = PythonChecker()
+    original = checker.parse
+
+    def parse(code):
+        calls.append(code)
+        return original(code)
+
+    monkeypatch.setattr(checker, "parse", parse)
+    monkeypatch.setitem(CHECKERS, "python", checker)
+    first = run(check_syntax("print(1 +)\n", "python", SERVER_PYTHON))
+    second = run(check_syntax("print(1 +)\n", "python", SERVER_PYTHON))
+    assert first == second
+    assert len(calls) == 1
+
+
+def test_disabled(monkeypatch):
+    monkeypatch.setattr(syntax_check, "SYNTAX_PRECHECK", False)
+    assert run(check_syntax("print(1 +)\n", "python", SERVER_PYTHON)) is None
+
+
+def test_node():
+    checker_for("javascript")
+    error = run(check_syntax("const a = 1;\nconst b = ;\n", "javascript"))
+    assert error.line == 2
+    assert error.message.startswith("SyntaxError")
+    assert run(check_syntax("console.log(1);\n", "javascript")) is None
+
+
+def test_ruby():
+    checker_for("ruby")
+    error = run(check_syntax("puts 1\ndef x(\n", "ruby"))
+    assert error is not None
+    assert error.line is not None
+    assert run(check_syntax("puts 1\n", "ruby")) is None
+
+
+def test_gofmt():
+    checker_for("go")
+    error = run(check_syntax("package main\n\nfunc main() {\n\tx := \n}\n", "go"))
+    assert error.line == 5
+    assert error.column is not None
+    assert run(check_syntax("package main\n\nfunc main() {}\n", "go")) is None
+
+
+def test_php():
+    checker_for("php")
+    error = run(check_syntax("<?php\necho 1\necho 2;\n", "php"))
+    assert error.line == 3
+    assert run(check_syntax("<?php echo 1;\n", "php")) is None
+
+
+def test_languages_without_checker():
+    assert run(check_syntax("fn main( {", "rust")) is None
+
+
+def test_checker_failure_is_not_a_syntax_error(monkeypatch):
+    broken = CommandChecker("missing", ["definitely-not-installed-checker"], r"(?P<message>.*)")
+    monkeypatch.setitem(CHECKERS, "javascript", broken)
+    assert run(check_syntax("const a = ;", "javascript")) is None
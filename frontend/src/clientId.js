@@ -0,0 +1,29 @@
+import axios from 'axios';
+
+const STORAGE_KEY = 'clientId';
+
+const newClientId = () => {
+  if (window.crypto && window.crypto.randomUUID) {
+    return window.crypto.randomUUID();
+  }
+  return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+};
+
+// Stable ID of this browser, kept across reloads. The backend queues code runs fairly
+// per client ID and keeps quiz questions from repeating for the same student.
+export const getClientId = () => {
+  try {
+    let clientId = window.localStorage.getItem(STORAGE_KEY);
+    if (!clientId) {
+      clientId = newClientId();
+      window.localStorage.setItem(STORAGE_KEY, clientId);
+    }
+    return clientId;
+  } catch (error) {
+    // Storage disabled: the ID lasts until the page is reloaded
+    return newClientId();
+  }
+};
+
+// Sent with every API request
+axios.defaults.headers.common['X-Client-Id'] = getClientId();
@@ -50,6 +50,8 @@ const CodeEditor = () => {
   const isPerfectScore = location.state?.perfectScore || false;
   const isFromLearning = location.state?.fromLearning || false;
   const useBoilerplate = location.state?.use_boilerplate || false;
+  const conceptKeywords = location.state?.concept_keywords;
+  const sessionId = location.state?.sessionId;
   
   // Get task description and language from location state if available
   const task = location.state?.taskDescription || storeTask;
@@ -92,7 +94,9 @@ const CodeEditor = () => {
           task_description: task,
           difficulty_level: difficulty,
           language: language,
-          use_boilerplate: shouldUseBoilerplate
+          use_boilerplate: shouldUseBoilerplate,
+          concept_keywords: conceptKeywords,
+          session_id: sessionId
         });
         
         if (response.data) {
@@ -142,7 +146,7 @@ const CodeEditor = () => {
     };
 
     generateScaffolding();
-  }, [task, difficulty, language, navigate, setCode, isPerfectScore, isFromLearning]);
+  }, [task, difficulty, language, navigate, setCode, isPerfectScore, isFromLearning, conceptKeywords, sessionId]);
 
   const handleHintClick = (hintId) => {
     setExpandedHint(expandedHint === hintId ? null : hintId);
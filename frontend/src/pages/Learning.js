@@ -59,6 +59,7 @@ const Learning = () => {
   const totalQuestions = location.state?.totalQuestions || 0;
   const taskDescription = location.state?.taskDescription || storeTask;
   const language = location.state?.language || storeLanguage;
+  const sessionId = location.state?.sessionId;
 
   useEffect(() => {
     // Redirect to home if no task description or language
@@ -88,7 +89,8 @@ const Learning = () => {
         const response = await axios.post('http://localhost:8000/api/generate_learning', {
           task_description: taskDescription,
           language,
-          wrong_answers: wrongAnswerData
+          wrong_answers: wrongAnswerData,
+          session_id: sessionId
         });
         
         console.log("Received learning content response:", response.data);
@@ -114,7 +116,7 @@ const Learning = () => {
     };
 
     fetchLearningContent();
-  }, [taskDescription, language, wrongAnswers, navigate]);
+  }, [taskDescription, language, wrongAnswers, sessionId, navigate]);
 
   const handleStartCoding = () => {
     navigate('/editor', {
@@ -122,6 +124,7 @@ const Learning = () => {
         perfectScore: false,
         fromLearning: true,
         concept_keywords: learningData.conceptKeywords,
+        sessionId: sessionId,
         taskDescription: taskDescription,
         language: language
       }